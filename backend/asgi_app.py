@@ -0,0 +1,170 @@
+import asyncio
+import contextlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import RedirectResponse, Response
+from starlette.routing import Route
+
+import http_handlers
+from http_handlers import HandlerResponse, initialize_app_globals
+from config import ASGI_SHUTDOWN_DRAIN_SECONDS, ASGI_THREADPOOL_WORKERS
+from logging_utils import configure_logging
+from response_utils import compress_body
+from metrics_utils import drain_background_tasks
+from vertex_utils import open_http_client, close_http_client
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Modo ASGI (uvicorn asgi_app:app): mesmas rotas de main.py, com a lógica em http_handlers.
+# Cada worker tem um único event loop de longa duração, então o pool HTTP do Gemini é
+# compartilhado entre requisições e as tarefas em segundo plano (métricas, logs de interação,
+# indexação de documentos) terminam depois da resposta; o lifespan dispara o warm-up na subida
+# e espera essas tarefas no desligamento.
+
+
+def _render_json(content) -> bytes:
+    # Mesma tolerância do jsonify do Flask para datetime/UUID/Decimal nos payloads.
+    return json.dumps(content, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+
+
+def _to_starlette(result: HandlerResponse, request: Request) -> Response:
+    if result.redirect_url:
+        return RedirectResponse(result.redirect_url, status_code=302)
+    if result.body is None:
+        return Response(status_code=result.status, headers=result.headers)
+    # gzip/br conforme o Accept-Encoding do cliente.
+    raw, encoding_headers = compress_body(_render_json(result.body), request.headers.get("accept-encoding", ""))
+    return Response(raw, status_code=result.status, headers={**result.headers, **encoding_headers}, media_type="application/json")
+
+
+async def _json_body(request: Request) -> dict | None:
+    """Equivalente ao request.get_json(silent=True) do Flask."""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _log_request(request: Request):
+    http_handlers.log_request_info(request.method, request.url.path, request.client.host if request.client else None, request.headers)
+
+
+async def root_check(request: Request) -> Response:
+    return _to_starlette(http_handlers.root_check(), request)
+
+
+async def warmup(request: Request) -> Response:
+    return _to_starlette(await http_handlers.warmup_endpoint(), request)
+
+
+async def google_auth(request: Request) -> Response:
+    _log_request(request)
+    return _to_starlette(await http_handlers.google_auth(request.query_params), request)
+
+
+async def list_calendar_accounts(request: Request) -> Response:
+    _log_request(request)
+    return _to_starlette(await http_handlers.list_calendar_accounts(request.query_params), request)
+
+
+async def select_calendar_account(request: Request) -> Response:
+    _log_request(request)
+    return _to_starlette(await http_handlers.select_calendar_account(await _json_body(request)), request)
+
+
+async def oauth2callback(request: Request) -> Response:
+    _log_request(request)
+    return _to_starlette(await http_handlers.oauth2callback(str(request.url)), request)
+
+
+async def interact_api(request: Request) -> Response:
+    if request.method == "OPTIONS":
+        return _to_starlette(http_handlers.preflight("/interact"), request)
+    _log_request(request)
+    return _to_starlette(await http_handlers.interact(await _json_body(request), request.headers), request)
+
+
+async def actions_api(request: Request) -> Response:
+    if request.method == "OPTIONS":
+        return _to_starlette(http_handlers.preflight("/actions"), request)
+    _log_request(request)
+    return _to_starlette(await http_handlers.actions(await _json_body(request), request.headers), request)
+
+
+async def actions_batch_api(request: Request) -> Response:
+    if request.method == "OPTIONS":
+        return _to_starlette(http_handlers.preflight("/actions/batch"), request)
+    _log_request(request)
+    return _to_starlette(await http_handlers.actions_batch(await _json_body(request), request.headers), request)
+
+
+async def read_view_api(request: Request) -> Response:
+    if request.method == "OPTIONS":
+        return _to_starlette(http_handlers.preflight("/views"), request)
+    _log_request(request)
+    return _to_starlette(await http_handlers.read_view(request.path_params["view_name"], request.query_params, request.headers), request)
+
+
+async def upload_api(request: Request) -> Response:
+    if request.method == "OPTIONS":
+        return _to_starlette(http_handlers.preflight("/upload"), request)
+    _log_request(request)
+    return _to_starlette(await http_handlers.upload(await _json_body(request)), request)
+
+
+async def signed_upload_url_api(request: Request) -> Response:
+    if request.method == "OPTIONS":
+        return _to_starlette(http_handlers.preflight("/upload/signed-url"), request)
+    _log_request(request)
+    return _to_starlette(await http_handlers.signed_upload_url(await _json_body(request)), request)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    # Só lê o ambiente; os clientes do Google e o SDK do Vertex são criados pelo warm-up em uma
+    # thread, sem atrasar o início do worker (GET /_warmup espera o warm-up terminar).
+    # O executor padrão atende todos os asyncio.to_thread do worker; o default do Python é pequeno
+    # demais para as chamadas bloqueantes de várias requisições /interact ao mesmo tempo.
+    executor = ThreadPoolExecutor(max_workers=ASGI_THREADPOOL_WORKERS, thread_name_prefix="asgi-io")
+    asyncio.get_running_loop().set_default_executor(executor)
+    initialize_app_globals()
+    open_http_client()
+    logger.info(f"ASGI | Worker started; shared HTTP pool open, {ASGI_THREADPOOL_WORKERS} executor threads.")
+    try:
+        yield
+    finally:
+        remaining = await drain_background_tasks(ASGI_SHUTDOWN_DRAIN_SECONDS)
+        await close_http_client()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"ASGI | Worker stopped; {remaining} background task(s) abandoned.")
+
+
+routes = [
+    Route("/", root_check, methods=["GET"]),
+    Route("/_warmup", warmup, methods=["GET"]),
+    Route("/auth/google", google_auth, methods=["GET"]),
+    Route("/calendar/accounts", list_calendar_accounts, methods=["GET"]),
+    Route("/calendar/accounts/select", select_calendar_account, methods=["POST"]),
+    Route("/oauth2callback", oauth2callback, methods=["GET"]),
+    Route("/interact", interact_api, methods=["POST", "OPTIONS"]),
+    Route("/actions", actions_api, methods=["POST", "OPTIONS"]),
+    Route("/actions/batch", actions_batch_api, methods=["POST", "OPTIONS"]),
+    Route("/views/{view_name}", read_view_api, methods=["GET", "OPTIONS"]),
+    Route("/upload", upload_api, methods=["POST", "OPTIONS"]),
+    Route("/upload/signed-url", signed_upload_url_api, methods=["POST", "OPTIONS"]),
+]
+
+# Mesmo comportamento do CORS(app) do Flask: qualquer origem, em todas as rotas.
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,97 @@
+"""
+Benchmark do custo de logging por requisição nos caminhos de acesso a dados.
+
+Compara o padrão antigo (f-strings com caminho completo + payload inteiro, avaliadas
+mesmo com DEBUG desligado) com o padrão atual (%-style + guardas isEnabledFor),
+medindo tempo de CPU e alocações (tracemalloc) com o logger em INFO.
+
+Uso:
+    python benchmarks/bench_logging.py [--requests 2000] [--tasks 30]
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+
+logger = logging.getLogger("bench_logging")
+
+
+class _FakeDocRef:
+    """Imita DocumentReference.path, que monta a string do caminho a cada acesso."""
+
+    def __init__(self, *parts):
+        self._parts = parts
+
+    @property
+    def path(self):
+        return "/".join(self._parts)
+
+
+def _make_day(n_tasks: int) -> dict:
+    return {"tasks": [
+        {"id": f"task-{i}", "description": f"Tarefa número {i} com alguma descrição", "time": "09:00",
+         "completed": False, "duration_minutes": 30, "origin": "user_added"}
+        for i in range(n_tasks)
+    ]}
+
+
+def _request_old_style(user_id: str, date_str: str, data: dict):
+    doc_ref = _FakeDocRef("eixa_users", user_id, "agenda", date_str)
+    logger.debug(f"COLLECTIONS_MANAGER | Getting user document reference for user_id: '{user_id}'. Full path: {doc_ref.path}")
+    logger.debug(f"COLLECTIONS_MANAGER | Getting task doc ref for user '{user_id}' on date '{date_str}'. Full path: {doc_ref.path}")
+    logger.debug(f"EIXA_DATA | get_daily_tasks_data: Getting daily tasks for user '{user_id}' on date '{date_str}'. Doc path: {doc_ref.path}")
+    logger.debug(f"EIXA_DATA | get_daily_tasks_data: Raw data fetched for daily tasks for '{user_id}' on '{date_str}': {data}")
+    logger.debug(f"EIXA_DATA | get_daily_tasks_data: Processed daily tasks data for '{user_id}' on '{date_str}': {data}")
+    logger.debug(f"EIXA_DATA | save_daily_tasks_data: Attempting to save daily tasks for user '{user_id}' on '{date_str}'. Doc path: {doc_ref.path}. Data: {data}")
+
+
+def _request_new_style(user_id: str, date_str: str, data: dict):
+    doc_ref = _FakeDocRef("eixa_users", user_id, "agenda", date_str)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting user document reference for user_id: '%s'. Full path: %s", user_id, doc_ref.path)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting task doc ref for user '%s' on date '%s'. Full path: %s", user_id, date_str, doc_ref.path)
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    if debug_enabled:
+        logger.debug("EIXA_DATA | get_daily_tasks_data: Getting daily tasks for user '%s' on date '%s'. Doc path: %s", user_id, date_str, doc_ref.path)
+        logger.debug("EIXA_DATA | get_daily_tasks_data: Raw data fetched for '%s' on '%s': %d task(s).", user_id, date_str, len(data["tasks"]))
+        logger.debug("EIXA_DATA | get_daily_tasks_data: Processed %d task(s) for '%s' on '%s'.", len(data["tasks"]), user_id, date_str)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | save_daily_tasks_data: Attempting to save %d task(s) for user '%s' on '%s'. Doc path: %s", len(data["tasks"]), user_id, date_str, doc_ref.path)
+
+
+def _measure(fn, n_requests: int, data: dict) -> tuple[float, int]:
+    tracemalloc.start()
+    start_cpu = time.process_time()
+    for i in range(n_requests):
+        fn(f"user-{i % 50}", "2025-01-15", data)
+    cpu = time.process_time() - start_cpu
+    _, peak = tracemalloc.get_traced_memory()
+    total = sum(stat.size for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    return cpu, max(peak, total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    data = _make_day(args.tasks)
+
+    results = {}
+    for name, fn in (("f-string (antigo)", _request_old_style), ("lazy %-style (atual)", _request_new_style)):
+        fn("warmup", "2025-01-01", data)
+        results[name] = _measure(fn, args.requests, data)
+
+    print(f"{args.requests} requisições simuladas, {args.tasks} tarefas/dia, nível INFO")
+    for name, (cpu, alloc) in results.items():
+        print(f"  {name:22s} CPU/req: {cpu / args.requests * 1e6:8.1f} µs   pico de alocação: {alloc / 1024:8.1f} KiB")
+    (old_cpu, old_alloc), (new_cpu, new_alloc) = results.values()
+    print(f"  economia de CPU: {100 * (1 - new_cpu / old_cpu):.1f}%   economia de alocação: {100 * (1 - new_alloc / max(old_alloc, 1)):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark do formato do histórico no caminho Vertex SDK de call_gemini_api.
+
+Compara o formato antigo (histórico achatado em uma string "User: ... / Model: ...", imagens
+descartadas) com o atual (history_to_vertex_contents: Content/Part por turno, papéis e
+inlineData preservados).
+
+Offline (padrão): tempo de conversão e tokens estimados localmente (token_estimator) por
+formato, e quantas partes de imagem cada um envia.
+--live: usa o Vertex AI (GCP_PROJECT, REGION, ADC) para medir tokens reais (count_tokens),
+latência de generate_content e tokens servidos pelo cache implícito (cached_content_token_count)
+ao repetir a conversa crescendo turno a turno, como acontece no chat.
+
+Uso:
+    python benchmarks/bench_vertex_contents.py [--turns 20] [--with-image]
+    python benchmarks/bench_vertex_contents.py --live --turns 8 --model gemini-2.5-flash
+"""
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from token_estimator import estimate_tokens  # noqa: E402
+from vertex_utils import history_to_vertex_contents  # noqa: E402
+
+SYSTEM_PROMPT = ("Você é a EIXA, uma assistente de produtividade e bem-estar com foco em TDAH. "
+                 "Seja acolhedora, objetiva e sugira no máximo três próximos passos concretos. ") * 40
+
+
+def _flatten(conversation_history: list[dict]) -> str:
+    """Formato antigo do caminho SDK (mantido aqui só para comparação)."""
+    segments = []
+    for turn in conversation_history:
+        text = "\n".join(p["text"] for p in turn.get("parts", []) if isinstance(p, dict) and "text" in p)
+        if text:
+            segments.append(f"{'User:' if turn.get('role') == 'user' else 'Model:'} {text}")
+    return "\n".join(segments)
+
+
+def _make_history(turns: int, with_image: bool) -> list[dict]:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "parts": [{"text": f"Pergunta {i}: como organizo as tarefas de hoje sem me sobrecarregar?"}]})
+        history.append({"role": "model", "parts": [{"text": f"Resposta {i}: comece pela tarefa mais curta, faça uma pausa de 5 minutos e siga para a próxima. " * 3}]})
+    last = {"role": "user", "parts": [{"text": "E agora, o que faço primeiro?"}]}
+    if with_image:
+        png = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"\x00" * 2048).decode()
+        last["parts"].append({"inlineData": {"mimeType": "image/png", "data": png}})
+    history.append(last)
+    return history
+
+
+def _time(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def offline(turns: int, with_image: bool, repeat: int):
+    history = _make_history(turns, with_image)
+    flat = _flatten(history)
+    contents = history_to_vertex_contents(history)
+    structured_text = [p.text for c in contents for p in c.parts if "text" in p.to_dict()]
+    images = sum(1 for c in contents for p in c.parts if "inline_data" in p.to_dict())
+
+    print(f"Histórico: {len(history)} turnos{' + 1 imagem' if with_image else ''}\n")
+    print(f"  {'formato':<12} {'conversão (µs)':>15} {'tokens (estim.)':>16} {'imagens':>8}")
+    print(f"  {'achatado':<12} {_time(lambda: _flatten(history), repeat):15.1f} {estimate_tokens(flat):16d} {0:8d}")
+    print(f"  {'Content/Part':<12} {_time(lambda: history_to_vertex_contents(history), repeat):15.1f} "
+          f"{sum(estimate_tokens(t) for t in structured_text):16d} {images:8d}")
+
+
+def live(turns: int, with_image: bool, model_name: str):
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+
+    vertexai.init(project=os.environ["GCP_PROJECT"], location=os.environ.get("REGION", "us-east1"))
+    model = GenerativeModel(model_name, system_instruction=SYSTEM_PROMPT)
+    config = {"temperature": 0.4, "max_output_tokens": 128}
+
+    for label, build in (("achatado", lambda h: [_flatten(h)]), ("Content/Part", history_to_vertex_contents)):
+        latencies, prompt_tokens, cached_tokens = [], [], []
+        for n in range(1, turns + 1):
+            history = _make_history(n, with_image and n == turns)
+            start = time.perf_counter()
+            response = model.generate_content(build(history), generation_config=config)
+            latencies.append((time.perf_counter() - start) * 1000)
+            usage = response.usage_metadata
+            prompt_tokens.append(usage.prompt_token_count)
+            cached_tokens.append(getattr(usage, "cached_content_token_count", 0) or 0)
+        print(f"{label}: latência p50 {statistics.median(latencies):.0f}ms máx {max(latencies):.0f}ms | "
+              f"tokens de prompt {sum(prompt_tokens)} (count_tokens do último: {model.count_tokens(build(history)).total_tokens}) | "
+              f"servidos do cache implícito {sum(cached_tokens)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--with-image", action="store_true")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    args = parser.parse_args()
+    if args.live:
+        live(args.turns, args.with_image, args.model)
+    else:
+        offline(args.turns, args.with_image, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Calibração do estimador local de tokens (token_estimator) contra o countTokens do Gemini.
+
+Cada texto do corpus é contado pela API (models/<modelo>:countTokens) e os coeficientes do
+modelo linear são ajustados por mínimos quadrados não negativos. Reporta o erro relativo
+(médio, p95, máximo) do estimador atual e do ajustado, por idioma, num holdout, e salva os
+coeficientes com o erro p95 medido — que vira a margem de TokenEstimator.upper_bound.
+
+Fontes de texto (combináveis):
+    --input arquivo.jsonl   linhas {"text": ..., "lang": ...}; aceita também "message"
+                            (ex.: benchmarks/data/intent_eval_sample.jsonl)
+    --include-prompts       inclui os blocos estáticos de prompt_templates (persona, regras)
+Linhas que já têm "gemini_tokens" não são recontadas; use --save-labeled para não pagar
+a contagem de novo. Precisa de GEMINI_API_KEY para textos sem rótulo.
+
+Uso:
+    python benchmarks/calibrate_token_estimator.py --input benchmarks/data/token_calibration_corpus.jsonl \\
+        --input benchmarks/data/intent_eval_sample.jsonl --include-prompts \\
+        --save-labeled labeled.jsonl --output token_estimator_coefficients.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from token_estimator import TokenEstimator, fit_token_estimator, get_token_estimator, relative_error_percentile  # noqa: E402
+
+COUNT_TOKENS_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:countTokens"
+
+
+def _load_jsonl(path: str) -> list[dict]:
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            text = row.get("text") or row.get("message")
+            if text:
+                samples.append({"text": text, "lang": row.get("lang", "pt"), "gemini_tokens": row.get("gemini_tokens")})
+    return samples
+
+
+def _prompt_samples() -> list[dict]:
+    import prompt_templates
+    texts = [prompt_templates.INTENT_EXTRACTION_PROMPT.static_prefix, prompt_templates.RICH_UI_INSTRUCTIONS,
+             prompt_templates.COMBINED_OUTPUT_INSTRUCTIONS]
+    return [{"text": t, "lang": "pt", "gemini_tokens": None} for t in texts if t]
+
+
+async def _count_with_api(samples: list[dict], api_key: str, model: str):
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        for i, sample in enumerate(samples):
+            if sample["gemini_tokens"]:
+                continue
+            response = await client.post(COUNT_TOKENS_URL.format(model=model), params={"key": api_key},
+                                         json={"contents": [{"role": "user", "parts": [{"text": sample["text"]}]}]})
+            response.raise_for_status()
+            sample["gemini_tokens"] = response.json().get("totalTokens", 0)
+            print(f"  contado {i + 1}/{len(samples)}: {sample['gemini_tokens']} tokens", file=sys.stderr)
+
+
+def _report(title: str, estimator: TokenEstimator, samples: list[dict]):
+    print(title)
+    for lang in sorted({s["lang"] for s in samples}) + ["todos"]:
+        subset = [s for s in samples if lang == "todos" or s["lang"] == lang]
+        texts, counts = [s["text"] for s in subset], [s["gemini_tokens"] for s in subset]
+        errors = [abs(estimator.estimate(t) - y) / y for t, y in zip(texts, counts) if y]
+        if not errors:
+            continue
+        print(f"  {lang:>5}: n={len(errors):4d}  erro médio {sum(errors) / len(errors):6.1%}  "
+              f"p95 {relative_error_percentile(estimator, texts, counts, 0.95):6.1%}  máx {max(errors):6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", action="append", default=[])
+    parser.add_argument("--include-prompts", action="store_true")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--save-labeled")
+    parser.add_argument("--output", help="salva os coeficientes ajustados neste JSON (TOKEN_ESTIMATOR_COEFFICIENTS_PATH)")
+    parser.add_argument("--holdout", type=float, default=0.3)
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.input:
+        samples.extend(_load_jsonl(path))
+    if args.include_prompts:
+        samples.extend(_prompt_samples())
+    if not samples:
+        parser.error("nenhum texto (use --input e/ou --include-prompts)")
+
+    if any(not s["gemini_tokens"] for s in samples):
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            parser.error("GEMINI_API_KEY é necessário para contar textos sem 'gemini_tokens'")
+        asyncio.run(_count_with_api(samples, api_key, args.model))
+
+    if args.save_labeled:
+        with open(args.save_labeled, "w", encoding="utf-8") as f:
+            for s in samples:
+                f.write(json.dumps(s, ensure_ascii=False) + "\n")
+
+    shuffled = samples[:]
+    random.Random(42).shuffle(shuffled)
+    cut = int(len(shuffled) * (1 - args.holdout))
+    train, test = shuffled[:cut], shuffled[cut:] or shuffled
+
+    print(f"{len(samples)} textos ({len(train)} treino / {len(test)} teste), modelo {args.model}\n")
+    _report("Estimador atual (holdout):", get_token_estimator(), test)
+    fitted = fit_token_estimator([s["text"] for s in train], [s["gemini_tokens"] for s in train])
+    # Margem publicada = p95 no holdout, não no treino.
+    fitted.relative_error = relative_error_percentile(fitted, [s["text"] for s in test], [s["gemini_tokens"] for s in test], 0.95)
+    print()
+    _report("Estimador ajustado (holdout):", fitted, test)
+    print("\nCoeficientes:", json.dumps({k: round(v, 4) for k, v in fitted.coefficients.items()}), f"intercepto {fitted.intercept:.3f}")
+
+    if args.output:
+        data = fitted.to_json()
+        data.update({"model": args.model, "samples": len(samples)})
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"\nCoeficientes salvos em {args.output} (configure TOKEN_ESTIMATOR_COEFFICIENTS_PATH).")
+
+
+if __name__ == "__main__":
+    main()
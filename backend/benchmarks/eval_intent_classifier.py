@@ -0,0 +1,209 @@
+"""
+Avaliação offline do pré-classificador de intenção (intent_classifier) contra o extrator LLM.
+
+Cada amostra é uma mensagem do usuário rotulada com a intenção que o extrator LLM
+(_extract_llm_action_intent) detectou: positivo = task/project/routine, negativo = none.
+Reporta precisão, recall e a fração de chamadas ao extrator que seriam evitadas para
+cada limiar. Recall é a métrica que importa: um falso negativo é uma ação que o usuário
+pediu e o sistema não executou.
+
+Fontes de dados (combináveis):
+    --input arquivo.jsonl   linhas {"message": ..., "llm_intent": ...}; também aceita as colunas
+                            exportadas de user_interactions ("message_in", "intent") e de
+                            interactions do Firestore ("input")
+    --from-bigquery         lê as interações logadas em <GCP_PROJECT>.eixa.user_interactions
+Mensagens sem rótulo só entram com --label-with-llm, que roda o próprio extrator LLM
+(precisa de GCP_PROJECT/REGION e GEMINI_API_KEY ou ADC). Use --save-labeled para não
+pagar a rotulagem de novo.
+
+Uso:
+    python benchmarks/eval_intent_classifier.py --input benchmarks/data/intent_eval_sample.jsonl
+    python benchmarks/eval_intent_classifier.py --from-bigquery --limit 2000 --label-with-llm \\
+        --with-embeddings --save-labeled labeled.jsonl --fit-weights intent_classifier_weights.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_classifier import IntentClassifier, extract_features, get_intent_classifier, FEATURE_NAMES, _sigmoid  # noqa: E402
+
+POSITIVE_INTENTS = {"task", "project", "routine"}
+
+
+def _load_jsonl(path: str) -> list[dict]:
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            message = row.get("message") or row.get("message_in") or row.get("input")
+            if message:
+                samples.append({
+                    "message": message,
+                    "llm_intent": row.get("llm_intent") or row.get("intent"),
+                    "embedding": row.get("embedding"),
+                })
+    return samples
+
+
+def _load_bigquery(limit: int) -> list[dict]:
+    from google.cloud import bigquery
+    project_id = os.environ["GCP_PROJECT"]
+    client = bigquery.Client(project=project_id)
+    query = f"""
+        SELECT message_in, intent FROM `{project_id}.eixa.user_interactions`
+        WHERE message_in IS NOT NULL AND message_in != ''
+        ORDER BY timestamp DESC LIMIT @limit
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("limit", "INT64", limit)])
+    return [{"message": row.message_in, "llm_intent": row.intent, "embedding": None}
+            for row in client.query(query, job_config=job_config).result()]
+
+
+async def _label_with_llm(samples: list[dict]):
+    from eixa_orchestrator import _extract_llm_action_intent
+    from config import GEMINI_TEXT_MODEL
+    project_id, region = os.environ.get("GCP_PROJECT"), os.environ.get("REGION", "us-east1")
+    api_key = os.environ.get("GEMINI_API_KEY")
+    for i, sample in enumerate(samples):
+        if sample["llm_intent"] in POSITIVE_INTENTS or sample["llm_intent"] == "none":
+            continue
+        result = await _extract_llm_action_intent("eval", sample["message"], [], api_key, GEMINI_TEXT_MODEL, {}, [],
+                                                  gcp_project_id=project_id, region=region)
+        sample["llm_intent"] = (result or {}).get("intent_detected", "none")
+        print(f"  rotulado {i + 1}/{len(samples)}: {sample['llm_intent']}", file=sys.stderr)
+
+
+async def _add_embeddings(samples: list[dict]):
+    from vectorstore_utils import get_embedding
+    project_id, region = os.environ["GCP_PROJECT"], os.environ.get("REGION", "us-east1")
+    for sample in samples:
+        if not sample.get("embedding"):
+            sample["embedding"] = await get_embedding(sample["message"], project_id, region)
+
+
+def _is_positive(sample: dict) -> bool:
+    return sample["llm_intent"] in POSITIVE_INTENTS
+
+
+def evaluate(classifier: IntentClassifier, samples: list[dict], thresholds: list[float]) -> list[dict]:
+    probabilities = [classifier.predict(s["message"], s.get("embedding")).probability for s in samples]
+    results = []
+    for threshold in thresholds:
+        tp = fp = fn = tn = 0
+        for sample, probability in zip(samples, probabilities):
+            predicted, actual = probability >= threshold, _is_positive(sample)
+            tp += predicted and actual
+            fp += predicted and not actual
+            fn += actual and not predicted
+            tn += not predicted and not actual
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        results.append({
+            "threshold": threshold, "precision": precision, "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "skip_rate": (tn + fn) / len(samples), "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        })
+    return results
+
+
+def fit(samples: list[dict], epochs: int = 400, learning_rate: float = 0.3, l2: float = 0.01) -> IntentClassifier:
+    """Regressão logística por gradiente (batch) nas features de palavra-chave e, se houver, no embedding."""
+    xs = [[extract_features(s["message"])[name] for name in FEATURE_NAMES] for s in samples]
+    ys = [1.0 if _is_positive(s) else 0.0 for s in samples]
+    weights, bias = [0.0] * len(FEATURE_NAMES), 0.0
+    for _ in range(epochs):
+        grad_w, grad_b = [0.0] * len(weights), 0.0
+        for x, y in zip(xs, ys):
+            error = _sigmoid(bias + sum(w * v for w, v in zip(weights, x))) - y
+            grad_b += error
+            for j, v in enumerate(x):
+                grad_w[j] += error * v
+        n = len(xs)
+        bias -= learning_rate * grad_b / n
+        weights = [w - learning_rate * (g / n + l2 * w) for w, g in zip(weights, grad_w)]
+    classifier = IntentClassifier(feature_weights=dict(zip(FEATURE_NAMES, weights)), bias=bias)
+
+    embedded = [(s["embedding"], y) for s, y in zip(samples, ys) if s.get("embedding")]
+    if len(embedded) == len(samples):
+        dim = len(embedded[0][0])
+        e_weights, e_bias = [0.0] * dim, 0.0
+        for _ in range(epochs):
+            grad_w, grad_b = [0.0] * dim, 0.0
+            for emb, y in embedded:
+                error = _sigmoid(e_bias + sum(w * v for w, v in zip(e_weights, emb))) - y
+                grad_b += error
+                for j, v in enumerate(emb):
+                    grad_w[j] += error * v
+            n = len(embedded)
+            e_bias -= learning_rate * grad_b / n
+            e_weights = [w - learning_rate * (g / n + l2 * w) for w, g in zip(e_weights, grad_w)]
+        classifier.embedding_weights, classifier.embedding_bias = e_weights, e_bias
+    return classifier
+
+
+def _print_report(title: str, results: list[dict]):
+    print(title)
+    print(f"  {'limiar':>6}  {'precisão':>8}  {'recall':>6}  {'F1':>5}  {'evitadas':>8}   tp/fp/fn/tn")
+    for r in results:
+        print(f"  {r['threshold']:6.2f}  {r['precision']:8.2%}  {r['recall']:6.2%}  {r['f1']:5.2f}  {r['skip_rate']:8.2%}   "
+              f"{r['tp']}/{r['fp']}/{r['fn']}/{r['tn']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", action="append", default=[])
+    parser.add_argument("--from-bigquery", action="store_true")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--label-with-llm", action="store_true")
+    parser.add_argument("--with-embeddings", action="store_true")
+    parser.add_argument("--save-labeled")
+    parser.add_argument("--thresholds", default="0.1,0.2,0.3,0.4,0.5")
+    parser.add_argument("--fit-weights", help="treina pesos e salva no JSON indicado")
+    parser.add_argument("--holdout", type=float, default=0.3, help="fração reservada para avaliar os pesos treinados")
+    args = parser.parse_args()
+
+    samples = []
+    for path in args.input:
+        samples.extend(_load_jsonl(path))
+    if args.from_bigquery:
+        samples.extend(_load_bigquery(args.limit))
+    if args.label_with_llm:
+        asyncio.run(_label_with_llm(samples))
+    if args.with_embeddings:
+        asyncio.run(_add_embeddings(samples))
+    samples = [s for s in samples if s["llm_intent"] in POSITIVE_INTENTS or s["llm_intent"] == "none"]
+    if not samples:
+        parser.error("nenhuma amostra rotulada (use --input e/ou --from-bigquery, com --label-with-llm se preciso)")
+
+    if args.save_labeled:
+        with open(args.save_labeled, "w", encoding="utf-8") as f:
+            for s in samples:
+                f.write(json.dumps(s, ensure_ascii=False) + "\n")
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    positives = sum(_is_positive(s) for s in samples)
+    print(f"{len(samples)} amostras ({positives} com intenção de ação segundo o extrator LLM)\n")
+    _print_report("Classificador atual:", evaluate(get_intent_classifier(), samples, thresholds))
+
+    if args.fit_weights:
+        shuffled = samples[:]
+        random.Random(42).shuffle(shuffled)
+        cut = int(len(shuffled) * (1 - args.holdout))
+        train, test = shuffled[:cut], shuffled[cut:] or shuffled
+        trained = fit(train)
+        print()
+        _print_report(f"Pesos treinados ({len(train)} treino / {len(test)} teste):", evaluate(trained, test, thresholds))
+        with open(args.fit_weights, "w", encoding="utf-8") as f:
+            json.dump(trained.to_json(), f, indent=2)
+        print(f"\nPesos salvos em {args.fit_weights} (configure INTENT_CLASSIFIER_WEIGHTS_PATH).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Perfil de import da aplicação (cold start do Cloud Run).
+
+Roda `python -X importtime -c "import <módulo>"` num processo limpo e resume a saída:
+tempo total, módulos com maior tempo cumulativo (com o módulo da aplicação que os puxou)
+e quais dependências pesadas foram carregadas no import, que deveriam ficar para o primeiro
+uso ou para o warm-up (GET /_warmup).
+
+Uso:
+    python benchmarks/importtime_report.py                 # asgi_app
+    python benchmarks/importtime_report.py --module main --top 30
+    python benchmarks/importtime_report.py --raw importtime.txt
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependências que não devem ser carregadas no import (ver tests/test_startup_imports.py).
+LAZY_MODULES = ("vertexai", "fitz", "docx", "PIL", "dateparser", "googleapiclient.discovery",
+                "google_auth_oauthlib", "google.cloud.translate_v2", "google.cloud.aiplatform")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_import(module: str) -> tuple[list[tuple[int, int, int, str]], set[str], str]:
+    """Devolve ([(self_us, cumulative_us, depth, nome)], módulos pesados carregados, stderr bruto)."""
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"})
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} falhou:\n{result.stderr[-2000:]}")
+    rows = [(int(m[1]), int(m[2]), len(m[3]) // 2, m[4]) for m in map(_LINE.match, result.stderr.splitlines()) if m]
+    loaded = {name for name in result.stdout.strip().split(",") if name}
+    return rows, loaded, result.stderr
+
+
+def _importer_of(rows, index: int) -> str:
+    """Primeiro módulo da aplicação (arquivo em backend/) acima da linha `index` na árvore de imports."""
+    app_modules = {name[:-3] for name in os.listdir(BACKEND_DIR) if name.endswith(".py")}
+    depth = rows[index][2]
+    for _, _, d, name in rows[index + 1:]:
+        if d < depth:
+            if name in app_modules:
+                return name
+            depth = d
+    return "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="asgi_app")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--raw", help="grava a saída bruta do -X importtime neste arquivo")
+    args = parser.parse_args()
+
+    rows, loaded, raw = profile_import(args.module)
+    if args.raw:
+        with open(args.raw, "w", encoding="utf-8") as f:
+            f.write(raw)
+
+    total = next((cumulative for _, cumulative, _, name in rows if name == args.module), 0)
+    print(f"import {args.module}: {total / 1000:.0f} ms ({len(rows)} módulos)\n")
+    # Pacotes de topo de cada subárvore (sem repetir os submódulos de um pacote já listado).
+    seen, listed = set(), []
+    for i in sorted(range(len(rows)), key=lambda i: -rows[i][1]):
+        _, cumulative, _, name = rows[i]
+        root = name.split(".")[0]
+        if name == args.module or root in seen:
+            continue
+        seen.add(root)
+        listed.append((cumulative, name, _importer_of(rows, i)))
+        if len(listed) >= args.top:
+            break
+    print(f"  {'cumulativo (ms)':>16}  {'módulo':<40} importado por")
+    for cumulative, name, importer in listed:
+        print(f"  {cumulative / 1000:16.1f}  {name:<40} {importer}")
+
+    print(f"\nDependências pesadas carregadas no import: {', '.join(sorted(loaded)) or 'nenhuma'}")
+
+
+if __name__ == "__main__":
+    main()
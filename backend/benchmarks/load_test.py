@@ -0,0 +1,171 @@
+"""
+Teste de carga: Flask/gunicorn (SERVER_MODE=wsgi) vs Starlette/uvicorn (SERVER_MODE=asgi).
+
+Dispara requisições concorrentes contra um ou mais servidores e mede vazão, latências
+(p50/p95/p99) e erros. Com --spawn, sobe os dois modos localmente (mesmo código de rotas,
+http_handlers) em portas diferentes e compara lado a lado; sem --spawn, usa as URLs passadas
+em --url (ex.: duas revisões do Cloud Run, uma em cada modo).
+
+A rota padrão é POST /interact com benchmarks/data/interact_request.json: é ela que passa pelas
+chamadas bloqueantes (Firestore, BigQuery, SDK do Vertex) em asyncio.to_thread e, portanto, pelo
+executor de threads do worker (ASGI_THREADPOOL_WORKERS). Exige um ambiente com GCP_PROJECT,
+credenciais e Gemini configurados; sem eles as requisições esperam o Firestore até o timeout.
+--vary-message acrescenta o número da requisição à mensagem para não medir só o cache semântico.
+--path / mede apenas o custo do servidor e do event loop.
+
+Uso:
+    python benchmarks/load_test.py --spawn --requests 200 --concurrency 20 --vary-message
+    python benchmarks/load_test.py --spawn --path / --requests 2000 --concurrency 50
+    python benchmarks/load_test.py --url wsgi=https://eixa-wsgi-xyz.run.app --url asgi=https://eixa-asgi-xyz.run.app
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INTERACT_PAYLOAD = os.path.join(BACKEND_DIR, "benchmarks", "data", "interact_request.json")
+
+SERVER_COMMANDS = {
+    "wsgi": lambda port, workers: ["gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+                                   "--threads", "25", "--timeout", "300", "main:app"],
+    "asgi": lambda port, workers: [sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1",
+                                   "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+}
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def _wait_until_up(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/", timeout=2.0)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{base_url} não respondeu em {timeout}s")
+
+
+async def run_load(base_url: str, path: str, payload: dict | None, requests: int, concurrency: int, timeout: float,
+                   vary_message: bool = False) -> dict:
+    latencies, statuses, errors = [], {}, 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    if payload is None:
+                        response = await client.get(path)
+                    else:
+                        body = payload
+                        if vary_message and isinstance(payload.get("message"), str):
+                            body = {**payload, "message": f"{payload['message']} (#{i})"}
+                        response = await client.post(path, json=body)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "elapsed_s": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "statuses": statuses,
+        "errors": errors,
+    }
+
+
+def _print_results(results: dict[str, dict]):
+    print(f"\n  {'modo':<8} {'req/s':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} {'erros':>7}  status")
+    for label, r in results.items():
+        print(f"  {label:<8} {r['rps']:9.1f} {r['p50_ms']:10.1f} {r['p95_ms']:10.1f} {r['p99_ms']:10.1f} {r['errors']:7d}  {r['statuses']}")
+
+
+async def main_async(args):
+    payload = None
+    payload_path = args.payload or (DEFAULT_INTERACT_PAYLOAD if args.path == "/interact" else None)
+    if payload_path:
+        with open(payload_path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+
+    targets, processes = {}, []
+    if args.spawn:
+        for offset, mode in enumerate(args.modes):
+            port = args.base_port + offset
+            env = {**os.environ, "SERVER_MODE": mode}
+            processes.append(subprocess.Popen(SERVER_COMMANDS[mode](port, args.workers), cwd=BACKEND_DIR, env=env,
+                                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            targets[mode] = f"http://127.0.0.1:{port}"
+    for item in args.url:
+        label, _, url = item.partition("=")
+        targets[label if url else item] = (url or item).rstrip("/")
+
+    try:
+        for base_url in targets.values():
+            await _wait_until_up(base_url, args.startup_timeout)
+        results = {}
+        for label, base_url in targets.items():
+            # Aquecimento: conexões, imports preguiçosos e caches do primeiro acesso ficam fora da medição.
+            await run_load(base_url, args.path, payload, min(args.concurrency * 2, args.requests), args.concurrency, args.timeout)
+            results[label] = await run_load(base_url, args.path, payload, args.requests, args.concurrency, args.timeout,
+                                            args.vary_message)
+        print(f"{'GET' if payload is None else 'POST'} {args.path}: {args.requests} requisições, concorrência {args.concurrency}")
+        _print_results(results)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spawn", action="store_true", help="sobe os servidores localmente")
+    parser.add_argument("--modes", nargs="+", choices=sorted(SERVER_COMMANDS), default=["wsgi", "asgi"])
+    parser.add_argument("--url", action="append", default=[], help="rótulo=URL de um servidor já no ar (repetível)")
+    parser.add_argument("--path", default="/interact")
+    parser.add_argument("--payload", help="arquivo JSON da requisição POST (default em /interact: benchmarks/data/interact_request.json)")
+    parser.add_argument("--vary-message", action="store_true", help="numera a mensagem de cada requisição")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="workers por servidor com --spawn")
+    parser.add_argument("--base-port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    if not args.spawn and not args.url:
+        parser.error("informe --spawn ou ao menos um --url")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -547,7 +547,8 @@ def _build_memory_embeddings_table(schema_variant: str, full_table_id: str) -> b
             bigquery.SchemaField("output", "STRING"),
             bigquery.SchemaField("language", "STRING"),
             bigquery.SchemaField("created_at", "TIMESTAMP"),
-            bigquery.SchemaField("embedding", "VECTOR", mode="REQUIRED", description="Embedding vetorial (dim=768)")
+            bigquery.SchemaField("embedding", "VECTOR", mode="REQUIRED", description="Embedding vetorial (dim=768)"),
+            bigquery.SchemaField("memory_type", "STRING"),
         ]
     else:
         # Fallback ARRAY<FLOAT64>
@@ -559,7 +560,8 @@ def _build_memory_embeddings_table(schema_variant: str, full_table_id: str) -> b
             bigquery.SchemaField("output", "STRING"),
             bigquery.SchemaField("language", "STRING"),
             bigquery.SchemaField("created_at", "TIMESTAMP"),
-            bigquery.SchemaField("embedding", "FLOAT64", mode="REPEATED", description="Embedding como ARRAY<FLOAT64> (dim=768)")
+            bigquery.SchemaField("embedding", "FLOAT64", mode="REPEATED", description="Embedding como ARRAY<FLOAT64> (dim=768)"),
+            bigquery.SchemaField("memory_type", "STRING"),
         ]
     table = bigquery.Table(full_table_id, schema=schema)
     table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="created_at")
@@ -567,12 +569,27 @@ def _build_memory_embeddings_table(schema_variant: str, full_table_id: str) -> b
     table.description = "Memórias vetoriais (embeddings) do usuário para recuperação semântica"
     return table
 
+def build_memory_embedding_row(user_id: str, memory_id: str, content: str, input_text: str, output_text: str,
+                          language: str, embedding: List[float], memory_type: str = None) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "memory_id": memory_id,
+        "content": content,
+        "input": input_text,
+        "output": output_text,
+        "language": language,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding": embedding,
+        "memory_type": memory_type or "generic",
+    }
+
 class BigQueryManagerExtended(BigQueryManager):  # type: ignore
     async def ensure_memory_embeddings_table(self):  # type: ignore
         """Cria tabela de embeddings de memória se não existir. Tenta VECTOR e faz fallback para ARRAY."""
         full_table_id = _memory_embeddings_table_ref(self.project_id, self.dataset_id)
         if await _table_exists(self.client, full_table_id):
             logger.info("memory_embeddings table already exists")
+            await self._ensure_memory_type_column(full_table_id)
             return
 
         # Tenta primeiro VECTOR
@@ -586,6 +603,17 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
             await asyncio.to_thread(self.client.create_table, table_array, exists_ok=True)
             logger.info("memory_embeddings table created with ARRAY<FLOAT64> type")
 
+    async def _ensure_memory_type_column(self, full_table_id: str):
+        """Tabelas criadas antes da coluna memory_type recebem a coluna (inserts com memory_type falham sem ela)."""
+        try:
+            table = await asyncio.to_thread(self.client.get_table, full_table_id)
+            if not any(f.name == 'memory_type' for f in table.schema):
+                job = await asyncio.to_thread(self.client.query, f"ALTER TABLE `{full_table_id}` ADD COLUMN memory_type STRING")
+                await asyncio.to_thread(job.result)
+                logger.info("Added column memory_type to memory_embeddings")
+        except Exception as e:
+            logger.warning(f"Could not add memory_type column: {e}")
+
     async def log_memory_embedding(
         self,
         user_id: str,
@@ -594,36 +622,59 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
         input_text: str,
         output_text: str,
         language: str,
-        embedding: List[float]
+        embedding: List[float],
+        memory_type: str = None
     ) -> None:
         """Insere uma memória vetorial na tabela memory_embeddings."""
+        row = build_memory_embedding_row(user_id, memory_id, content, input_text, output_text, language, embedding, memory_type)
+        if await self.insert_memory_embeddings([row]):
+            logger.debug(f"Memory embedding logged for memory_id={memory_id} user_id={user_id}")
+
+    async def insert_memory_embeddings(self, rows: List[Dict[str, Any]]) -> bool:
+        """Insere várias memórias (linhas de build_memory_embedding_row) em uma única chamada de streaming insert."""
+        if not rows:
+            return True
         table_id = _memory_embeddings_table_ref(self.project_id, self.dataset_id)
-        row = {
-            "user_id": user_id,
-            "memory_id": memory_id,
-            "content": content,
-            "input": input_text,
-            "output": output_text,
-            "language": language,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "embedding": embedding,
-        }
         try:
-            errors = await asyncio.to_thread(self.client.insert_rows_json, table_id, [row], retry=retry.Retry(deadline=30))
+            # insertId = memory_id: o BigQuery descarta (best-effort) a mesma linha reenviada por um retry.
+            errors = await asyncio.to_thread(self.client.insert_rows_json, table_id, rows,
+                                             row_ids=[row["memory_id"] for row in rows], retry=retry.Retry(deadline=30))
             if errors:
                 logger.error(f"BigQuery insert errors (memory_embeddings): {errors}")
-            else:
-                logger.debug(f"Memory embedding logged for memory_id={memory_id} user_id={user_id}")
+                return False
+            return True
         except Exception as e:
-            logger.error(f"Error logging memory embedding: {e}", exc_info=True)
+            logger.error(f"Error logging memory embeddings: {e}", exc_info=True)
+            return False
+
+    async def list_memory_ids(self, user_id: str, memory_id_prefix: str) -> set[str] | None:
+        """memory_ids já gravados com o prefixo (ex.: os trechos de um documento); None se a consulta falhar."""
+        table_id = _memory_embeddings_table_ref(self.project_id, self.dataset_id)
+        query = f"SELECT DISTINCT memory_id FROM `{table_id}` WHERE user_id = @user_id AND STARTS_WITH(memory_id, @prefix)"
+        params = [
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("prefix", "STRING", memory_id_prefix),
+        ]
+        try:
+            job = await asyncio.to_thread(self.client.query, query, job_config=bigquery.QueryJobConfig(query_parameters=params))
+            rows = await asyncio.to_thread(job.result)
+            return {row.memory_id for row in rows}
+        except Exception as e:
+            logger.error(f"Error listing memories with prefix '{memory_id_prefix}' in memory_embeddings: {e}", exc_info=True)
+            return None
 
     async def search_memory_embeddings(
         self,
         user_id: str,
         query_embedding: List[float],
-        top_k: int = 5
+        top_k: int = 5,
+        memory_types: tuple = None,
+        exclude_memory_types: tuple = None,
+        memory_id_prefix: str = None
     ) -> List[Dict[str, Any]]:
-        """Busca memórias mais similares via BigQuery usando cosseno (ARRAY<FLOAT64>) ou VECTOR."""
+        """Busca memórias mais similares via BigQuery usando cosseno (ARRAY<FLOAT64>) ou VECTOR.
+        Filtros opcionais: memory_types / exclude_memory_types (memórias antigas sem tipo contam
+        como 'generic') e memory_id_prefix (ex.: trechos de um documento específico)."""
         table_id = _memory_embeddings_table_ref(self.project_id, self.dataset_id)
         # Detectar se tabela usa VECTOR (checando schema) – simples: obter table e ver tipo do campo embedding
         try:
@@ -644,15 +695,27 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
 
         is_vector = embedding_field.field_type.upper() == 'VECTOR'
 
+        filter_sql = ""
+        filter_params = []
+        if memory_types:
+            filter_sql += " AND IFNULL(memory_type, 'generic') IN UNNEST(@memory_types)"
+            filter_params.append(bigquery.ArrayQueryParameter("memory_types", "STRING", list(memory_types)))
+        if exclude_memory_types:
+            filter_sql += " AND IFNULL(memory_type, 'generic') NOT IN UNNEST(@exclude_memory_types)"
+            filter_params.append(bigquery.ArrayQueryParameter("exclude_memory_types", "STRING", list(exclude_memory_types)))
+        if memory_id_prefix:
+            filter_sql += " AND STARTS_WITH(memory_id, @memory_id_prefix)"
+            filter_params.append(bigquery.ScalarQueryParameter("memory_id_prefix", "STRING", memory_id_prefix))
+
         if is_vector:
             # Query usando VECTOR_DISTANCE
             query = f"""
             DECLARE query_vec VECTOR<768>;
             SET query_vec = (@query_embedding);
-            SELECT memory_id, content, input, output, language, created_at,
+            SELECT memory_id, content, input, output, language, created_at, memory_type,
                    VECTOR_DISTANCE(embedding, query_vec) AS distance
             FROM `{table_id}`
-            WHERE user_id = @user_id
+            WHERE user_id = @user_id{filter_sql}
             ORDER BY distance ASC
             LIMIT @top_k
             """
@@ -664,7 +727,7 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
         else:
             # ARRAY<FLOAT64> – calcular cosseno manual
             query = f"""
-            SELECT memory_id, content, input, output, language, created_at,
+            SELECT memory_id, content, input, output, language, created_at, memory_type,
                 (
                   (SELECT SUM(a*b) FROM UNNEST(embedding) a WITH OFFSET i JOIN UNNEST(@query_embedding) b WITH OFFSET j ON i=j)
                 ) /
@@ -673,7 +736,7 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
                   SQRT((SELECT SUM(b*b) FROM UNNEST(@query_embedding) b))
                 ) AS cosine_similarity
             FROM `{table_id}`
-            WHERE user_id = @user_id
+            WHERE user_id = @user_id{filter_sql}
             ORDER BY cosine_similarity DESC
             LIMIT @top_k
             """
@@ -683,7 +746,7 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
                 bigquery.ScalarQueryParameter("top_k", "INT64", top_k),
             ]
 
-        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+        job_config = bigquery.QueryJobConfig(query_parameters=query_params + filter_params)
         try:
             query_job = await asyncio.to_thread(self.client.query, query, job_config=job_config)
             results = await asyncio.to_thread(query_job.result)
@@ -697,7 +760,8 @@ class BigQueryManagerExtended(BigQueryManager):  # type: ignore
                     "language": row.language,
                     "created_at": row.created_at.isoformat() if hasattr(row.created_at, 'isoformat') else str(row.created_at),
                     "distance": row.distance if is_vector else (1 - (row.cosine_similarity or 0.0)),
-                    "similarity": None if is_vector else (row.cosine_similarity or 0.0)
+                    "similarity": None if is_vector else (row.cosine_similarity or 0.0),
+                    "memory_type": row.memory_type or "generic"
                 })
             return enriched
         except Exception as e:
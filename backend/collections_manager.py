@@ -17,7 +17,7 @@ def get_top_level_collection(logical_name: str) -> firestore.CollectionReference
     if not collection_real_name:
         logger.error(f"COLLECTIONS_MANAGER | Top-level logical collection name '{logical_name}' not found in map.") # Novo log
         raise KeyError(f"Nome lógico de coleção top-level '{logical_name}' não encontrado em TOP_LEVEL_COLLECTIONS_MAP. Nomes válidos: {list(TOP_LEVEL_COLLECTIONS_MAP.keys())}")
-    logger.debug(f"COLLECTIONS_MANAGER | Resolved top-level collection '{logical_name}' to real name '{collection_real_name}'.") # Novo log
+    logger.debug("COLLECTIONS_MANAGER | Resolved top-level collection '%s' to real name '%s'.", logical_name, collection_real_name)
     return db.collection(collection_real_name)
 
 # REVISADO: Esta função APENAS retorna a referência do documento do usuário.
@@ -26,7 +26,8 @@ def get_user_doc_ref(user_id: str) -> firestore.DocumentReference:
     db = _initialize_firestore_client_instance()
     # Continua usando USERS_COLLECTION, que aponta para o nome real 'eixa_users'
     user_doc_ref = db.collection(USERS_COLLECTION).document(user_id)
-    logger.debug(f"COLLECTIONS_MANAGER | Getting user document reference for user_id: '{user_id}' in collection: '{USERS_COLLECTION}'. Full path: {user_doc_ref.path}") # Novo log
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting user document reference for user_id: '%s' in collection: '%s'. Full path: %s", user_id, USERS_COLLECTION, user_doc_ref.path)
     return user_doc_ref
 
 def get_user_subcollection(user_id: str, logical_subcollection_name: str) -> firestore.CollectionReference:
@@ -40,31 +41,43 @@ def get_user_subcollection(user_id: str, logical_subcollection_name: str) -> fir
         raise KeyError(f"Subcoleção '{logical_subcollection_name}' não encontrada em SUBCOLLECTIONS_MAP. Nomes válidos: {list(SUBCOLLECTIONS_MAP.keys())}")
 
     subcollection_ref = user_doc_ref.collection(real_name)
-    # LINHA MODIFICADA AQUI: subcollection_ref.path -> f"{subcollection_ref.parent.path}/{subcollection_ref.id}"
-    logger.debug(f"COLLECTIONS_MANAGER | Getting subcollection '{logical_subcollection_name}' as '{real_name}' under user document '{user_id}'. Full path: {subcollection_ref.parent.path}/{subcollection_ref.id}") # NOVO LOG CORRIGIDO
+    # CollectionReference não tem .path; o caminho é montado a partir do pai, e só quando DEBUG está ativo.
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting subcollection '%s' as '%s' under user document '%s'. Full path: %s/%s", logical_subcollection_name, real_name, user_id, subcollection_ref.parent.path, subcollection_ref.id)
     return subcollection_ref
 
 def get_task_doc_ref(user_id: str, date_str: str) -> firestore.DocumentReference:
     task_doc_ref = get_user_subcollection(user_id, 'agenda').document(date_str)
-    logger.debug(f"COLLECTIONS_MANAGER | Getting task doc ref for user '{user_id}' on date '{date_str}'. Full path: {task_doc_ref.path}") # Novo log
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting task doc ref for user '%s' on date '%s'. Full path: %s", user_id, date_str, task_doc_ref.path)
     return task_doc_ref
 
 def get_project_doc_ref(user_id: str, project_id: str) -> firestore.DocumentReference:
     project_doc_ref = get_user_subcollection(user_id, 'projects').document(project_id)
-    logger.debug(f"COLLECTIONS_MANAGER | Getting project doc ref for user '{user_id}' project '{project_id}'. Full path: {project_doc_ref.path}") # Novo log
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting project doc ref for user '%s' project '%s'. Full path: %s", user_id, project_id, project_doc_ref.path)
     return project_doc_ref
 
 def get_unscheduled_tasks_collection(user_id: str) -> firestore.CollectionReference:
     collection_ref = get_user_subcollection(user_id, 'unscheduled')
-    logger.debug(f"COLLECTIONS_MANAGER | Getting unscheduled tasks collection for user '{user_id}'. Full path: {collection_ref.parent.path}/{collection_ref.id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting unscheduled tasks collection for user '%s'. Full path: %s/%s", user_id, collection_ref.parent.path, collection_ref.id)
     return collection_ref
 
 def get_unscheduled_task_doc_ref(user_id: str, task_id: str) -> firestore.DocumentReference:
     doc_ref = get_unscheduled_tasks_collection(user_id).document(task_id)
-    logger.debug(f"COLLECTIONS_MANAGER | Getting unscheduled task doc ref for user '{user_id}' task '{task_id}'. Full path: {doc_ref.path}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting unscheduled task doc ref for user '%s' task '%s'. Full path: %s", user_id, task_id, doc_ref.path)
     return doc_ref
 
 def get_vector_memory_doc_ref(user_id: str, memory_id: str) -> firestore.DocumentReference:
     vector_memory_doc_ref = get_user_subcollection(user_id, 'vector_memory').document(memory_id)
-    logger.debug(f"COLLECTIONS_MANAGER | Getting vector memory doc ref for user '{user_id}' memory '{memory_id}'. Full path: {vector_memory_doc_ref.path}") # Novo log
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting vector memory doc ref for user '%s' memory '%s'. Full path: %s", user_id, memory_id, vector_memory_doc_ref.path)
     return vector_memory_doc_ref
+
+def get_view_versions_doc_ref(user_id: str) -> firestore.DocumentReference:
+    doc_ref = get_user_subcollection(user_id, 'meta').document('view_versions')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("COLLECTIONS_MANAGER | Getting view versions doc ref for user '%s'. Full path: %s", user_id, doc_ref.path)
+    return doc_ref
@@ -24,7 +24,8 @@ SUBCOLLECTIONS_MAP = {
     'projects': 'projects',
     'checkpoints': 'self_checkpoints',
     'vector_memory': 'vector_memory',
-    'unscheduled': 'unscheduled_tasks'
+    'unscheduled': 'unscheduled_tasks',
+    'meta': 'meta'  # contadores de versão das views de leitura (view_versions)
 }
 
 USERS_COLLECTION = TOP_LEVEL_COLLECTIONS_MAP['eixa_user_data']
@@ -41,6 +42,154 @@ CONVERSATION_HARD_LIMIT_TOKENS = 8000
 MAX_PROMPT_TOKENS_BUDGET       = 8192
 DEFAULT_MAX_OUTPUT_TOKENS      = 4096
 
+# Orçamento (em tokens estimados) de cada seção truncável do system prompt principal.
+# O orçamento global continua sendo MAX_PROMPT_TOKENS_BUDGET. 'profile' e 'routines' fazem parte
+# do prefixo em cache: seus tetos são fixos e o corte global só atinge as seções dinâmicas.
+PROMPT_SECTION_BUDGETS = {
+    'tasks': 2500,
+    'projects': 800,
+    'routines': 1000,
+    'memories': 800,
+    'documents': 1500,
+    'profile': 1200,
+}
+
+# --- Cache de contexto do Gemini (cachedContents) ---
+# Prefixo estável por usuário (persona, Rich UI, perfil, rotinas) fica em cache no Gemini;
+# cada turno envia só o contexto dinâmico + histórico.
+GEMINI_CONTEXT_CACHE_ENABLED         = os.getenv('GEMINI_CONTEXT_CACHE_ENABLED', 'true').lower() == 'true'
+GEMINI_CONTEXT_CACHE_TTL_SECONDS     = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL_SECONDS', '3600'))
+GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = 120
+GEMINI_CONTEXT_CACHE_FAILURE_BACKOFF_SECONDS = 600
+# Mínimo de tokens aceito pela API para criar um cache explícito, por modelo.
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = {
+    'gemini-2.5-flash': 1024,
+    'gemini-2.5-flash-lite': 1024,
+    'gemini-2.5-pro': 4096,
+}
+GEMINI_CONTEXT_CACHE_DEFAULT_MIN_TOKENS = 4096
+
+# --- Chamadas ao Gemini: deadline, retries, hedging, circuit breaker, fallback ---
+# O deadline vem da requisição HTTP (INTERACT_REQUEST_DEADLINE_SECONDS ou header X-Request-Timeout);
+# fora de uma requisição vale GEMINI_DEFAULT_DEADLINE_SECONDS.
+INTERACT_REQUEST_DEADLINE_SECONDS = float(os.getenv('INTERACT_REQUEST_DEADLINE_SECONDS', '60'))
+GEMINI_DEFAULT_DEADLINE_SECONDS   = float(os.getenv('GEMINI_DEFAULT_DEADLINE_SECONDS', '90'))
+GEMINI_ATTEMPT_TIMEOUT_SECONDS    = float(os.getenv('GEMINI_ATTEMPT_TIMEOUT_SECONDS', '40'))
+GEMINI_MAX_ATTEMPTS               = int(os.getenv('GEMINI_MAX_ATTEMPTS', '3'))
+GEMINI_RETRY_BASE_DELAY_SECONDS   = 0.5
+GEMINI_RETRY_MAX_DELAY_SECONDS    = 8.0
+GEMINI_RETRYABLE_STATUS_CODES     = (408, 429, 500, 502, 503, 504)
+# Hedging: dispara uma segunda tentativa se a primeira passar do p95 observado do modelo.
+GEMINI_HEDGING_ENABLED            = os.getenv('GEMINI_HEDGING_ENABLED', 'false').lower() == 'true'
+GEMINI_HEDGE_PERCENTILE           = 0.95
+GEMINI_HEDGE_MIN_SAMPLES          = 20
+GEMINI_LATENCY_WINDOW             = 200
+# Circuit breaker por modelo: abre após N falhas retentáveis seguidas e deixa passar uma sonda após o cooldown.
+GEMINI_CIRCUIT_FAILURE_THRESHOLD  = 5
+GEMINI_CIRCUIT_OPEN_SECONDS       = 30
+# Modelo mais rápido usado quando o principal esgota as tentativas, está com o circuito aberto
+# ou quando sobra menos que GEMINI_FALLBACK_BUDGET_SECONDS do deadline. Vazio desativa.
+GEMINI_FALLBACK_MODEL             = os.getenv('GEMINI_FALLBACK_MODEL', 'gemini-2.5-flash-lite')
+GEMINI_FALLBACK_BUDGET_SECONDS    = 12.0
+# Chamadas simultâneas ao SDK do Vertex por event loop. Cada chamada ocupa uma thread do executor
+# até a resposta ou o timeout da tentativa (repassado ao gRPC); o limite impede que hedges e retries
+# esgotem o executor. Mantenha abaixo de ASGI_THREADPOOL_WORKERS.
+GEMINI_SDK_MAX_CONCURRENCY        = int(os.getenv('GEMINI_SDK_MAX_CONCURRENCY', '16'))
+
+# --- Extração de intenção de ação (CRUD/rotinas) ---
+# 'llm': sempre chama o extrator LLM antes da resposta (padrão)
+# 'classifier': pré-classificador local decide se chama o extrator LLM. Só vale ligar depois de
+#   ajustar os pesos em tráfego real (benchmarks/eval_intent_classifier.py --fit-weights).
+# 'combined': uma única chamada com saída JSON estruturada (intenção + resposta)
+INTENT_MODE                    = os.getenv('INTENT_MODE', 'llm').lower()
+INTENT_CLASSIFIER_THRESHOLD    = float(os.getenv('INTENT_CLASSIFIER_THRESHOLD', '0.3'))
+INTENT_CLASSIFIER_WEIGHTS_PATH = os.getenv('INTENT_CLASSIFIER_WEIGHTS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intent_classifier_weights.json'))
+
+# --- Cache semântico de respostas do chat (opt-in) ---
+# Reaproveita a resposta quando a mensagem é quase idêntica (cosseno dos embeddings) e o
+# contexto crítico (tarefas, projetos, rotinas, perfil, turnos recentes, memórias recuperadas,
+# data e faixa de horário) não mudou.
+SEMANTIC_CACHE_ENABLED              = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+SEMANTIC_CACHE_SIMILARITY_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_SIMILARITY_THRESHOLD', '0.95'))
+SEMANTIC_CACHE_TTL_SECONDS          = int(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', '900'))
+SEMANTIC_CACHE_MAX_ENTRIES_PER_USER = 32
+# Largura da faixa de horário na chave: perguntas como "o que tenho agora?" não atravessam faixas.
+SEMANTIC_CACHE_TIME_BUCKET_MINUTES  = int(os.getenv('SEMANTIC_CACHE_TIME_BUCKET_MINUTES', '10'))
+
+# --- Estimativa local de tokens (token_estimator) ---
+# JSON gerado por benchmarks/calibrate_token_estimator.py; modelo SentencePiece opcional para contagem exata.
+TOKEN_ESTIMATOR_COEFFICIENTS_PATH = os.getenv('TOKEN_ESTIMATOR_COEFFICIENTS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'token_estimator_coefficients.json'))
+TOKEN_ESTIMATOR_SPM_MODEL_PATH    = os.getenv('TOKEN_ESTIMATOR_SPM_MODEL_PATH')
+
+# --- Extração de texto de documentos (file_utils) ---
+# Orçamento do texto extraído que vai para o prompt: a extração para assim que é atingido.
+DOCUMENT_EXTRACTION_MAX_CHARS   = int(os.getenv('DOCUMENT_EXTRACTION_MAX_CHARS', '120000'))
+DOCUMENT_EXTRACTION_MAX_TOKENS  = int(os.getenv('DOCUMENT_EXTRACTION_MAX_TOKENS', '0')) or None
+
+# --- Ingestão de documentos na memória vetorial (RAG de uploads) ---
+# PDFs/DOCX enviados são divididos em trechos com sobreposição, embeddados em lote e gravados em
+# memory_embeddings com memory_type='document' (deduplicados pelo hash do texto). Documentos
+# maiores que DOCUMENT_INLINE_MAX_CHARS vão ao prompt só com os DOCUMENT_PROMPT_TOP_K trechos
+# mais relevantes; perguntas seguintes recuperam trechos de documentos já enviados.
+DOCUMENT_RAG_ENABLED             = os.getenv('DOCUMENT_RAG_ENABLED', 'true').lower() == 'true'
+DOCUMENT_CHUNK_CHARS             = 1500
+DOCUMENT_CHUNK_OVERLAP_CHARS     = 200
+DOCUMENT_INLINE_MAX_CHARS        = int(os.getenv('DOCUMENT_INLINE_MAX_CHARS', '12000'))
+DOCUMENT_PROMPT_TOP_K            = 6
+DOCUMENT_FOLLOWUP_TOP_K          = 4
+DOCUMENT_FOLLOWUP_MIN_SIMILARITY = 0.55
+DOCUMENT_EMBEDDING_BATCH_SIZE    = 16
+DOCUMENT_INGESTION_DRAIN_SECONDS = 10
+
+# --- Processamento de imagens (image_processing) ---
+# Imagens são reduzidas antes do Gemini (custo/latência crescem com os pixels) e do GCS,
+# reencodadas sem EXIF e gravadas com nome = hash do conteúdo (upload idêntico é gravado uma vez).
+IMAGE_LLM_MAX_DIMENSION     = int(os.getenv('IMAGE_LLM_MAX_DIMENSION', '1536'))
+IMAGE_STORAGE_MAX_DIMENSION = int(os.getenv('IMAGE_STORAGE_MAX_DIMENSION', '2048'))
+IMAGE_OUTPUT_FORMAT         = os.getenv('IMAGE_OUTPUT_FORMAT', 'WEBP').upper()  # WEBP ou JPEG
+IMAGE_OUTPUT_QUALITY        = int(os.getenv('IMAGE_OUTPUT_QUALITY', '82'))
+AVATAR_THUMBNAIL_SIZES      = (64, 128, 256)
+IMAGE_PROCESSING_WORKERS    = int(os.getenv('IMAGE_PROCESSING_WORKERS', str(min(2, os.cpu_count() or 1))))
+
+# --- Google Cloud Storage (image_handler) ---
+# Cliente único com pool HTTP; chamadas ao GCS rodam num executor limitado fora do event loop.
+GCS_HTTP_POOL_SIZE               = 32
+GCS_UPLOAD_WORKERS               = int(os.getenv('GCS_UPLOAD_WORKERS', '8'))
+GCS_RESUMABLE_MIN_BYTES          = 5 * 1024 * 1024
+GCS_RESUMABLE_CHUNK_SIZE         = 4 * 1024 * 1024     # múltiplo de 256 KiB
+GCS_PARALLEL_UPLOAD_MIN_BYTES    = 32 * 1024 * 1024
+GCS_PARALLEL_UPLOAD_CHUNK_BYTES  = 8 * 1024 * 1024
+# URLs V4 assinadas para o navegador enviar direto ao GCS (PUT), sem passar pela API.
+GCS_SIGNED_UPLOAD_URL_TTL_SECONDS = int(os.getenv('GCS_SIGNED_UPLOAD_URL_TTL_SECONDS', '900'))
+GCS_SIGNED_UPLOAD_MAX_BYTES      = int(os.getenv('GCS_SIGNED_UPLOAD_MAX_BYTES', str(25 * 1024 * 1024)))
+
+# --- Servidor (gunicorn/Flask ou uvicorn/ASGI) ---
+# 'wsgi': main:app no gunicorn, um event loop por requisição. 'asgi': asgi_app:app no uvicorn, um loop
+# por worker; o pool HTTP compartilhado e as tarefas em segundo plano sobrevivem à requisição.
+SERVER_MODE                  = os.getenv('SERVER_MODE', 'wsgi').lower()
+ASGI_SHUTDOWN_DRAIN_SECONDS  = float(os.getenv('ASGI_SHUTDOWN_DRAIN_SECONDS', '20'))
+# Threads do executor padrão do loop ASGI, usado por todo asyncio.to_thread (Firestore, BigQuery,
+# SDK do Vertex). O default do Python é min(32, CPUs + 4): 5 threads numa instância de 1 vCPU, o que
+# enfileira as chamadas bloqueantes de poucas requisições /interact simultâneas.
+ASGI_THREADPOOL_WORKERS      = int(os.getenv('ASGI_THREADPOOL_WORKERS', '40'))
+HTTP_POOL_MAX_CONNECTIONS    = int(os.getenv('HTTP_POOL_MAX_CONNECTIONS', '100'))
+HTTP_POOL_MAX_KEEPALIVE      = int(os.getenv('HTTP_POOL_MAX_KEEPALIVE', '20'))
+
+# --- Respostas HTTP (compressão, projeção de campos, delta) ---
+# Respostas JSON menores que o limite vão sem compressão (o ganho não paga a CPU).
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL            = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY        = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+# Snapshots (só os hashes por dia/item) guardados por worker para responder deltas a partir de um ETag.
+RESPONSE_DELTA_SNAPSHOTS_MAX   = int(os.getenv('RESPONSE_DELTA_SNAPSHOTS_MAX', '4096'))
+
+# --- Views de leitura (GET /views/*) com ETag por contador de versão ---
+# Entra no ETag: trocar o valor invalida o cache de todos os clientes (ex.: após uma migração de dados).
+VIEW_ETAG_EPOCH = os.getenv('VIEW_ETAG_EPOCH', '1')
+
+# --- Lote de ações CRUD (POST /actions/batch) ---
+ACTIONS_BATCH_MAX_OPERATIONS = int(os.getenv('ACTIONS_BATCH_MAX_OPERATIONS', '100'))
+
 DEFAULT_TIMEZONE           = os.getenv('DEFAULT_TIMEZONE', 'America/Sao_Paulo')
 DEFAULT_TIMEOUT_SECONDS    = 30
 CONFIG_SCHEMA_VERSION      = "2.0"
@@ -49,6 +198,24 @@ EMBEDDING_MODEL_NAME = "text-embedding-004"
 
 CHROMA_DB_PATH = "chroma_db"
 
+# --- Tradução / detecção de idioma ---
+LANG_DETECT_LOCAL_MIN_CONFIDENCE = float(os.getenv('LANG_DETECT_LOCAL_MIN_CONFIDENCE', '0.90'))
+TRANSLATION_CACHE_MAX_SIZE       = 512
+TRANSLATION_CACHE_TTL_SECONDS    = 6 * 60 * 60
+
+# --- Google Calendar ---
+# TTL da conta ativa e da flag "conectado" cacheadas em memória (por worker).
+CALENDAR_CONNECTION_CACHE_TTL_SECONDS = 300
+# Credenciais em memória: LRU limitado e com TTL, para que uma desconexão feita em outra
+# instância seja vista no máximo depois desse prazo.
+CALENDAR_CREDENTIALS_CACHE_TTL_SECONDS = 300
+CALENDAR_CREDENTIALS_CACHE_MAX_ENTRIES = 1024
+CALENDAR_SYNC_PAGE_SIZE               = 250
+CALENDAR_SYNC_MAX_CONCURRENCY_PER_USER = 4
+# O event_index do sync_state guarda só eventos a partir de N dias atrás (ou do início da janela
+# pedida, se for anterior); eventos passados saem do índice para o documento não crescer até 1 MiB.
+CALENDAR_EVENT_INDEX_RETENTION_DAYS   = 7
+
 # --- Variáveis de ambiente para o Google OAuth (podem ser necessárias no futuro, dependendo do fluxo) ---
 # GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 # GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
@@ -2,6 +2,7 @@ import logging
 import asyncio
 import uuid
 import re
+from contextvars import ContextVar
 from datetime import date, datetime, timezone # datetime e timezone são importantes para created_at
 from typing import Dict, Any
 
@@ -13,19 +14,32 @@ from eixa_data import (
     get_all_daily_tasks, get_all_projects,
     save_routine_template, apply_routine_to_day, delete_routine_template, get_all_routines,
     get_all_unscheduled_tasks, save_unscheduled_task, delete_unscheduled_task,
-    get_unscheduled_task
+    get_unscheduled_task, delete_daily_tasks_data, batched_writes
 )
-from collections_manager import get_task_doc_ref, get_project_doc_ref
+from collections_manager import get_project_doc_ref
+from config import ACTIONS_BATCH_MAX_OPERATIONS
+from semantic_cache import invalidate_user as invalidate_semantic_cache
+from view_versions import bump_view_versions
 # NÃO DEVE HAVER IMPORTAÇÃO DE crud_orchestrator AQUI (para evitar ciclo).
 
 logger = logging.getLogger(__name__)
 
-async def _build_agenda_html_payload(user_id: str) -> Dict[str, Any]:
+# True durante orchestrate_crud_batch: as operações não montam o payload de view (o lote monta uma vez no fim).
+_in_crud_batch: ContextVar[bool] = ContextVar("crud_batch_active", default=False)
+
+async def _build_agenda_html_payload(user_id: str) -> Dict[str, Any] | None:
     """Constrói payload HTML com agenda (by_date) e tarefas não agendadas."""
+    if _in_crud_batch.get():
+        return None
     agenda_by_date = await get_all_daily_tasks(user_id)
     unscheduled = await get_all_unscheduled_tasks(user_id)
     return {"agenda": {"by_date": agenda_by_date, "unscheduled": unscheduled}}
 
+async def _build_projects_html_payload(user_id: str) -> Dict[str, Any] | None:
+    if _in_crud_batch.get():
+        return None
+    return {"projetos": await get_all_projects(user_id)}
+
 # --- Funções CRUD Internas para Tarefas (Task) ---
 
 # MODIFICADO: Adicionados time_str e duration_minutes
@@ -226,13 +240,10 @@ async def _delete_task_by_id(user_id: str, date_str: str, task_id: str) -> Dict[
     tasks = [t for t in tasks if t.get("id") != task_id]
 
     if len(tasks) < original_len:
-        agenda_doc_ref = get_task_doc_ref(user_id, date_str)
-
         try:
             if not tasks:
-                logger.debug(f"CRUD | Task | Attempting to delete empty agenda doc at: {agenda_doc_ref.path} for user '{user_id}'.")
                 # Se não houver mais tarefas para o dia, deleta o documento do dia inteiro
-                await asyncio.to_thread(agenda_doc_ref.delete)
+                await delete_daily_tasks_data(user_id, date_str)
                 logger.info(f"CRUD | Task | Agenda document for '{date_str}' deleted as it became empty for user '{user_id}'.")
             else:
                 daily_data["tasks"] = tasks
@@ -286,8 +297,7 @@ async def _bulk_delete_tasks(user_id: str, tasks_payload: Dict[str, Any]) -> Dic
                 await save_daily_tasks_data(user_id, d_str, daily_data)
             else:
                 # delete doc if empty
-                agenda_doc_ref = get_task_doc_ref(user_id, d_str)
-                await asyncio.to_thread(agenda_doc_ref.delete)
+                await delete_daily_tasks_data(user_id, d_str)
             deleted.append({"task_id": t_id, "date": d_str})
             changed_days.add(d_str)
     else:
@@ -331,8 +341,8 @@ async def _bulk_delete_tasks(user_id: str, tasks_payload: Dict[str, Any]) -> Dic
                     day_data['tasks'] = keep
                     await save_daily_tasks_data(user_id, d_str, day_data)
                 else:
-                    agenda_doc_ref = get_task_doc_ref(user_id, d_str)
-                    await asyncio.to_thread(agenda_doc_ref.delete)
+                    await delete_daily_tasks_data(user_id, d_str)
+                invalidate_semantic_cache(user_id)
                 for t in removed_here:
                     deleted.append({"task_id": t.get('id'), "date": d_str})
                 changed_days.add(d_str)
@@ -405,8 +415,7 @@ async def _create_project_data(user_id: str, project_data: Dict[str, Any]) -> Di
         await save_project_data(user_id, project_id, new_project)
 
         logger.info(f"CRUD | Project | Project '{new_project['name']}' created with ID '{project_id}' for user '{user_id}'. Data saved successfully to Firestore.")
-        projects_data = await get_all_projects(user_id)
-        return {"status": "success", "message": f"Projeto '{new_project['name']}' criado!", "data": {"project_id": project_id}, "html_view_data": {"projetos": projects_data}}
+        return {"status": "success", "message": f"Projeto '{new_project['name']}' criado!", "data": {"project_id": project_id}, "html_view_data": await _build_projects_html_payload(user_id)}
     except Exception as e:
         logger.critical(f"CRUD | Project | CRITICAL ERROR: Failed to write project to Firestore for user '{user_id}' with data {new_project}: {e}", exc_info=True)
         return {"status": "error", "message": "Falha ao salvar o projeto no banco de dados.", "data": {}, "debug": str(e)}
@@ -438,8 +447,7 @@ async def _update_project_data(user_id: str, project_id: str, updates: Dict[str,
             logger.debug(f"CRUD | Project | _update_project_data: Calling save_project_data for project '{project_id}'.")
             await save_project_data(user_id, project_id, current_project_data)
             logger.info(f"CRUD | Project | Project '{project_id}' updated for user '{user_id}'. Changes: {list(updates.keys())}. Data updated successfully to Firestore.")
-            projects_data = await get_all_projects(user_id)
-            return {"status": "success", "message": "Projeto atualizado com sucesso.", "html_view_data": {"projetos": projects_data}} 
+            return {"status": "success", "message": "Projeto atualizado com sucesso.", "html_view_data": await _build_projects_html_payload(user_id)} 
         except Exception as e:
             logger.error(f"CRUD | Project | Failed to update project in Firestore for user '{user_id}': {e}", exc_info=True)
             return {"status": "error", "message": "Não foi possível atualizar o projeto."}
@@ -455,9 +463,10 @@ async def _delete_project_fully(user_id: str, project_id: str) -> Dict[str, Any]
         try:
             logger.debug(f"CRUD | Project | Attempting to delete project doc at: {project_doc_ref.path} for user '{user_id}'.")
             await asyncio.to_thread(project_doc_ref.delete)
+            invalidate_semantic_cache(user_id)
+            await bump_view_versions(user_id, "projects")
             logger.info(f"CRUD | Project | Project '{project_id}' deleted for user '{user_id}'.")
-            projects_data = await get_all_projects(user_id)
-            return {"status": "success", "message": "Projeto excluído com sucesso.", "html_view_data": {"projetos": projects_data}} 
+            return {"status": "success", "message": "Projeto excluído com sucesso.", "html_view_data": await _build_projects_html_payload(user_id)} 
         except Exception as e:
             logger.error(f"CRUD | Project | Failed to delete project document '{project_id}' for user '{user_id}': {e}", exc_info=True)
             return {"status": "error", "message": "Não foi possível excluir o projeto."}
@@ -732,4 +741,66 @@ async def orchestrate_crud_action(payload: Dict[str, Any]) -> Dict[str, Any]:
 
     except Exception as e:
         logger.critical(f"CRUD | CRITICAL ERROR: Unexpected error in orchestrate_crud_action for user '{user_id}'. Payload: {payload}: {e}", exc_info=True) 
-        return {"status": "error", "message": "Ocorreu um erro interno inesperado ao processar a ação CRUD.", "data": {}, "debug_info": {**debug_info, "exception": str(e)}}
\ No newline at end of file
+        return {"status": "error", "message": "Ocorreu um erro interno inesperado ao processar a ação CRUD.", "data": {}, "debug_info": {**debug_info, "exception": str(e)}}
+
+# --- Lote de ações CRUD (POST /actions/batch) ---
+
+# Tipos aceitos no lote. Rotinas montam o próprio payload de view e bulk_delete varre a agenda
+# inteira (não enxerga dias ainda não gravados do lote); os dois continuam no /actions individual.
+_BATCH_ITEM_TYPES = {"task", "project"}
+_BATCH_UNSUPPORTED_ACTIONS = {("task", "bulk_delete")}
+
+async def _run_batch_operation(user_id: str, operation: Any) -> Dict[str, Any]:
+    if not isinstance(operation, dict):
+        return {"status": "error", "message": "Operação inválida: esperado um objeto."}
+    item_type = str(operation.get('item_type') or '').strip().lower()
+    action = str(operation.get('action') or '').strip().lower()
+    if item_type not in _BATCH_ITEM_TYPES or (item_type, action) in _BATCH_UNSUPPORTED_ACTIONS:
+        return {"status": "error", "message": f"Operação '{item_type}/{action}' não é suportada em lote; use /actions."}
+    return await orchestrate_crud_action({**operation, "user_id": user_id})
+
+async def orchestrate_crud_batch(user_id: str, operations: Any) -> Dict[str, Any]:
+    """
+    Executa uma lista ordenada de ações CRUD (mesmo formato do orchestrate_crud_action, sem user_id).
+    Dias da agenda e tarefas sem data ficam em memória durante o lote (eixa_data.batched_writes):
+    cada dia é lido uma vez, as operações seguintes enxergam as anteriores e tudo vai ao Firestore
+    em um WriteBatch no fim. Projetos são gravados a cada operação. O payload de view é montado
+    uma vez, depois do commit.
+    Retorna {status: success|partial|error, message, results: [{index, status, message, ...}], html_view_data}.
+    """
+    if not isinstance(operations, list) or not operations:
+        return {"status": "error", "message": "'operations' deve ser uma lista não vazia.", "results": []}
+    if len(operations) > ACTIONS_BATCH_MAX_OPERATIONS:
+        return {"status": "error", "message": f"Máximo de {ACTIONS_BATCH_MAX_OPERATIONS} operações por lote.", "results": []}
+
+    results = []
+    touched_types = set()
+    token = _in_crud_batch.set(True)
+    try:
+        async with batched_writes(user_id):
+            for index, operation in enumerate(operations):
+                result = await _run_batch_operation(user_id, operation)
+                results.append({"index": index, **{k: v for k, v in result.items() if k != "html_view_data"}})
+                if result.get("status") != "error":
+                    touched_types.add(str(operation.get('item_type')).strip().lower())
+    except Exception as e:
+        logger.critical(f"CRUD | Batch | Failed to commit batch of {len(operations)} operation(s) for user '{user_id}': {e}", exc_info=True)
+        return {"status": "error", "message": "Falha ao gravar o lote; as alterações de tarefas não foram aplicadas.", "results": results, "committed": False}
+    finally:
+        _in_crud_batch.reset(token)
+
+    html_view_data = {}
+    if "task" in touched_types:
+        html_view_data.update(await _build_agenda_html_payload(user_id))
+    if "project" in touched_types:
+        html_view_data.update(await _build_projects_html_payload(user_id))
+
+    failed = sum(1 for r in results if r.get("status") == "error")
+    status = "success" if not failed else ("error" if failed == len(results) else "partial")
+    logger.info(f"CRUD | Batch | {len(results) - failed}/{len(results)} operation(s) applied for user '{user_id}'.")
+    return {
+        "status": status,
+        "message": f"{len(results) - failed} de {len(results)} operações aplicadas.",
+        "results": results,
+        "html_view_data": html_view_data
+    }
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+import bigquery_utils
+from config import (
+    DOCUMENT_RAG_ENABLED, DOCUMENT_CHUNK_CHARS, DOCUMENT_CHUNK_OVERLAP_CHARS, DOCUMENT_PROMPT_TOP_K,
+    DOCUMENT_FOLLOWUP_TOP_K, DOCUMENT_FOLLOWUP_MIN_SIMILARITY, DOCUMENT_EMBEDDING_BATCH_SIZE, EMBEDDING_MODEL_NAME,
+)
+from metrics_utils import measure_async, spawn_background_task, drain_background_tasks
+from vectorstore_utils import get_embeddings_batch
+
+logger = logging.getLogger(__name__)
+
+# Ingestão de PDFs/DOCX na memória vetorial (memory_embeddings, memory_type='document').
+# input_parser prepara o documento (trechos com sobreposição + hash do texto); o orquestrador
+# dispara a indexação em paralelo com o resto do turno. Documentos grandes vão ao prompt só com
+# os trechos mais relevantes para a pergunta; nos turnos seguintes, retrieve_document_chunks
+# traz os trechos de documentos já enviados. Um mesmo documento (mesmo hash) é indexado uma vez
+# por usuário: ele só conta como indexado quando todos os trechos estão gravados, e um envio
+# seguinte grava apenas os trechos que faltam.
+
+DOCUMENT_MEMORY_TYPE = "document"
+
+
+@dataclass
+class PreparedDocument:
+    filename: str
+    doc_hash: str
+    chunks: list[str]
+    text_chars: int
+    part_index: int  # posição da parte de texto do documento em prompt_parts_for_gemini
+
+    def memory_id_prefix(self, user_id: str) -> str:
+        return f"{user_id}_doc_{self.doc_hash[:16]}_"
+
+    def memory_id(self, user_id: str, index: int) -> str:
+        return f"{self.memory_id_prefix(user_id)}{index:04d}"
+
+
+def chunk_text(text: str, chunk_chars: int = DOCUMENT_CHUNK_CHARS, overlap_chars: int = DOCUMENT_CHUNK_OVERLAP_CHARS) -> list[str]:
+    """Janelas de até chunk_chars caracteres com overlap_chars de sobreposição, cortadas de
+    preferência em fim de parágrafo, de linha, de frase ou entre palavras."""
+    text = text.strip()
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            window = text[start:end]
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(separator)
+                if cut > chunk_chars // 2:
+                    end = start + cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        next_start = max(end - overlap_chars, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+def prepare_document(filename: str, text: str, part_index: int) -> PreparedDocument:
+    return PreparedDocument(
+        filename=filename,
+        doc_hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        chunks=chunk_text(text),
+        text_chars=len(text),
+        part_index=part_index,
+    )
+
+
+def ingestion_available() -> bool:
+    return DOCUMENT_RAG_ENABLED and bigquery_utils.bq_manager is not None
+
+
+def rank_chunks(query_embedding: list[float], chunk_embeddings: list, top_k: int) -> list[int]:
+    """Índices dos top_k trechos mais similares à pergunta, devolvidos na ordem do documento."""
+    indexed = [(i, emb) for i, emb in enumerate(chunk_embeddings) if emb]
+    if not indexed or not query_embedding:
+        return []
+    matrix = np.asarray([emb for _, emb in indexed], dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+    best = np.argsort(-scores)[:top_k]
+    return sorted(indexed[i][0] for i in best)
+
+
+def format_document_excerpts(document: PreparedDocument, indices: list[int]) -> str:
+    total = len(document.chunks)
+    excerpts = "\n\n".join(f"[Trecho {i + 1}/{total}]\n{document.chunks[i]}" for i in indices)
+    return (f"Trechos mais relevantes do arquivo '{document.filename}' ({len(indices)} de {total}; "
+            f"o documento completo foi indexado e outros trechos podem ser consultados nas próximas perguntas):\n"
+            f"{excerpts}\n\n")
+
+
+# --- Deduplicação (hash do documento) ---
+
+_known_documents: "OrderedDict[tuple[str, str], None]" = OrderedDict()
+_known_documents_lock = threading.Lock()
+_KNOWN_DOCUMENTS_MAX = 512
+
+
+def _remember_document(user_id: str, doc_hash: str):
+    with _known_documents_lock:
+        _known_documents[(user_id, doc_hash)] = None
+        _known_documents.move_to_end((user_id, doc_hash))
+        while len(_known_documents) > _KNOWN_DOCUMENTS_MAX:
+            _known_documents.popitem(last=False)
+
+
+def _is_known_document(user_id: str, doc_hash: str) -> bool:
+    with _known_documents_lock:
+        return (user_id, doc_hash) in _known_documents
+
+
+async def _indexed_chunk_ids(user_id: str, document: PreparedDocument) -> set[str] | None:
+    """Trechos do documento já gravados; None se o documento está completo (ou a consulta falhou)."""
+    if _is_known_document(user_id, document.doc_hash):
+        return None
+    stored = await bigquery_utils.bq_manager.list_memory_ids(user_id, document.memory_id_prefix(user_id))
+    if stored is None:
+        return set()
+    if all(document.memory_id(user_id, i) in stored for i in range(len(document.chunks))):
+        _remember_document(user_id, document.doc_hash)
+        return None
+    return stored
+
+
+# --- Indexação em segundo plano ---
+
+DOCUMENT_TASK_GROUP = "document_ingestion"
+
+
+async def drain_pending_ingestions(timeout: float):
+    """Espera (até timeout) as gravações de documentos do loop atual antes de a requisição terminar;
+    com o loop por requisição do Flask, tarefas ainda pendentes seriam canceladas no encerramento."""
+    await drain_background_tasks(timeout, DOCUMENT_TASK_GROUP)
+
+
+@measure_async("document.store_chunks")
+async def _store_document(user_id: str, document: PreparedDocument, embeddings: list, stored_ids: set[str]):
+    """Grava os trechos que ainda faltam. O documento só conta como indexado com todos os trechos gravados."""
+    rows = [
+        bigquery_utils.build_memory_embedding_row(
+            user_id, document.memory_id(user_id, i), chunk, document.filename, f"{i + 1}/{len(document.chunks)}",
+            None, embedding, DOCUMENT_MEMORY_TYPE)
+        for i, (chunk, embedding) in enumerate(zip(document.chunks, embeddings))
+        if document.memory_id(user_id, i) not in stored_ids
+    ]
+    if await bigquery_utils.bq_manager.insert_memory_embeddings(rows):
+        _remember_document(user_id, document.doc_hash)
+        logger.info(f"DOCUMENT_INGESTION | Indexed '{document.filename}' for user '{user_id}': {len(rows)} new of {len(document.chunks)} chunks.")
+    else:
+        logger.error(f"DOCUMENT_INGESTION | Failed to store '{document.filename}' for user '{user_id}'; missing chunks will be retried on the next upload.")
+
+
+async def _embed_chunks(document: PreparedDocument, project_id: str, region: str) -> list:
+    """Embeddings de todos os trechos; os que falharem são pedidos mais uma vez."""
+    embeddings = await get_embeddings_batch(document.chunks, project_id, region, model_name=EMBEDDING_MODEL_NAME,
+                                            batch_size=DOCUMENT_EMBEDDING_BATCH_SIZE)
+    missing = [i for i, embedding in enumerate(embeddings) if not embedding]
+    if missing:
+        retried = await get_embeddings_batch([document.chunks[i] for i in missing], project_id, region,
+                                             model_name=EMBEDDING_MODEL_NAME, batch_size=DOCUMENT_EMBEDDING_BATCH_SIZE)
+        for i, embedding in zip(missing, retried):
+            embeddings[i] = embedding
+    return embeddings
+
+
+async def _embed_new_document(user_id: str, document: PreparedDocument, project_id: str, region: str) -> list | None:
+    stored_ids = await _indexed_chunk_ids(user_id, document)
+    if stored_ids is None:
+        logger.info(f"DOCUMENT_INGESTION | '{document.filename}' ({document.doc_hash[:12]}) already indexed for user '{user_id}'.")
+        return None
+    embeddings = await _embed_chunks(document, project_id, region)
+    failed = sum(1 for embedding in embeddings if not embedding)
+    if failed:
+        # Sem gravação parcial: o documento inteiro fica para o próximo envio, e o ranking usa o que veio.
+        logger.error(f"DOCUMENT_INGESTION | {failed}/{len(embeddings)} chunks of '{document.filename}' failed to embed for user '{user_id}'; not indexing it.")
+        return embeddings
+    # A gravação segue em segundo plano; quem precisa só dos embeddings (ranking) não espera o insert.
+    spawn_background_task(_store_document(user_id, document, embeddings, stored_ids), DOCUMENT_TASK_GROUP)
+    return embeddings
+
+
+def start_document_ingestion(user_id: str, document: PreparedDocument, project_id: str, region: str) -> asyncio.Task:
+    """Dispara a indexação. A tarefa devolve os embeddings dos trechos, ou None se o documento já estava indexado."""
+    return spawn_background_task(_embed_new_document(user_id, document, project_id, region), DOCUMENT_TASK_GROUP)
+
+
+async def select_document_chunks(user_id: str, document: PreparedDocument, query_embedding: list[float] | None,
+                                 chunk_embeddings: list | None, top_k: int = DOCUMENT_PROMPT_TOP_K) -> list[int]:
+    """Trechos do documento enviado agora que vão ao prompt: os mais similares à pergunta (ranking
+    local quando os embeddings acabaram de ser gerados, busca no BigQuery se o documento já estava
+    indexado) ou, sem pergunta, o início do documento."""
+    if query_embedding and chunk_embeddings:
+        indices = rank_chunks(query_embedding, chunk_embeddings, top_k)
+        if indices:
+            return indices
+    if query_embedding and chunk_embeddings is None:
+        prefix = document.memory_id_prefix(user_id)
+        results = await bigquery_utils.bq_manager.search_memory_embeddings(
+            user_id=user_id, query_embedding=query_embedding, top_k=top_k,
+            memory_types=(DOCUMENT_MEMORY_TYPE,), memory_id_prefix=prefix)
+        indices = sorted({int(r["memory_id"][len(prefix):]) for r in results
+                          if r.get("memory_id", "").startswith(prefix) and r["memory_id"][len(prefix):].isdigit()})
+        indices = [i for i in indices if i < len(document.chunks)]
+        if indices:
+            return indices
+    return list(range(min(top_k, len(document.chunks))))
+
+
+@measure_async("document.retrieve_chunks")
+async def retrieve_document_chunks(user_id: str, embedding_task: asyncio.Task, top_k: int = DOCUMENT_FOLLOWUP_TOP_K) -> list[dict]:
+    """Trechos de documentos já enviados pelo usuário mais relevantes para a mensagem atual."""
+    query_embedding = await embedding_task
+    if not query_embedding or not ingestion_available():
+        return []
+    results = await bigquery_utils.bq_manager.search_memory_embeddings(
+        user_id=user_id, query_embedding=query_embedding, top_k=top_k, memory_types=(DOCUMENT_MEMORY_TYPE,))
+    # Sem limiar, todo turno levaria os trechos "menos distantes" mesmo quando a conversa não é sobre documentos.
+    return [r for r in results
+            if (r["similarity"] if r.get("similarity") is not None else 1 - (r.get("distance") or 1.0)) >= DOCUMENT_FOLLOWUP_MIN_SIMILARITY]
@@ -2,6 +2,9 @@ import logging
 import uuid
 from google.cloud import firestore
 import asyncio
+import contextlib
+import weakref
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone, time
 from typing import Dict, Any, List
 
@@ -9,7 +12,7 @@ from firestore_client_singleton import _initialize_firestore_client_instance
 from config import (
     USERS_COLLECTION, EIXA_INTERACTIONS_COLLECTION,
     EIXA_ROUTINES_COLLECTION, EIXA_GOOGLE_AUTH_COLLECTION,
-    SUBCOLLECTIONS_MAP
+    SUBCOLLECTIONS_MAP, CALENDAR_SYNC_MAX_CONCURRENCY_PER_USER, CALENDAR_EVENT_INDEX_RETENTION_DAYS
 )
 from collections_manager import (
     get_user_subcollection,
@@ -19,13 +22,12 @@ from collections_manager import (
     get_unscheduled_tasks_collection,
     get_unscheduled_task_doc_ref,
 )
-from google_calendar_utils import GoogleCalendarUtils
+from google_calendar_utils import get_google_calendar_utils, CalendarSyncTokenExpired
+from semantic_cache import invalidate_user as invalidate_semantic_cache
+from view_versions import bump_view_versions
 
 logger = logging.getLogger(__name__)
 
-# Instância do GoogleCalendarUtils
-google_calendar_utils = GoogleCalendarUtils()
-
 # --- Funções Auxiliares Comuns ---
 def _parse_time_str(time_str: str) -> time | None:
     """Tenta parsear uma string 'HH:MM' em um objeto datetime.time."""
@@ -75,26 +77,43 @@ async def get_all_unscheduled_tasks(user_id: str) -> List[dict]:
         return []
 
 async def save_unscheduled_task(user_id: str, task_id: str, data: dict):
+    batch = _active_batch(user_id)
+    if batch is not None:
+        batch.unscheduled[task_id] = data
+        return
     doc_ref = get_unscheduled_task_doc_ref(user_id, task_id)
-    logger.debug(f"EIXA_DATA | save_unscheduled_task: Saving unscheduled task '{task_id}' for user '{user_id}'. Path: {doc_ref.path}. Data: {data}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | save_unscheduled_task: Saving unscheduled task '%s' for user '%s'. Path: %s. Fields: %s", task_id, user_id, doc_ref.path, sorted(data))
     try:
         await asyncio.to_thread(doc_ref.set, data)
+        invalidate_semantic_cache(user_id)
+        await bump_view_versions(user_id, "agenda")
         logger.info(f"EIXA_DATA | save_unscheduled_task: Unscheduled task '{task_id}' saved for user '{user_id}'.")
     except Exception as e:
         logger.critical(f"EIXA_DATA | save_unscheduled_task: Failed to persist unscheduled task '{task_id}' for user '{user_id}': {e}", exc_info=True)
         raise
 
 async def delete_unscheduled_task(user_id: str, task_id: str):
+    batch = _active_batch(user_id)
+    if batch is not None:
+        batch.unscheduled[task_id] = None
+        return
     doc_ref = get_unscheduled_task_doc_ref(user_id, task_id)
-    logger.debug(f"EIXA_DATA | delete_unscheduled_task: Removing unscheduled task '{task_id}' for user '{user_id}'. Path: {doc_ref.path}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | delete_unscheduled_task: Removing unscheduled task '%s' for user '%s'. Path: %s", task_id, user_id, doc_ref.path)
     try:
         await asyncio.to_thread(doc_ref.delete)
+        invalidate_semantic_cache(user_id)
+        await bump_view_versions(user_id, "agenda")
         logger.info(f"EIXA_DATA | delete_unscheduled_task: Unscheduled task '{task_id}' deleted for user '{user_id}'.")
     except Exception as e:
         logger.error(f"EIXA_DATA | delete_unscheduled_task: Failed to delete unscheduled task '{task_id}' for user '{user_id}': {e}", exc_info=True)
         raise
 
 async def get_unscheduled_task(user_id: str, task_id: str) -> dict | None:
+    batch = _active_batch(user_id)
+    if batch is not None and task_id in batch.unscheduled:
+        return batch.unscheduled[task_id]
     doc_ref = get_unscheduled_task_doc_ref(user_id, task_id)
     doc = await asyncio.to_thread(doc_ref.get)
     if doc.exists:
@@ -107,16 +126,25 @@ async def get_unscheduled_task(user_id: str, task_id: str) -> dict | None:
 # --- Funções de Access to Data Agenda (Daily Tasks) ---
 
 async def get_daily_tasks_data(user_id: str, date_str: str) -> dict:
+    batch = _active_batch(user_id)
+    if batch is not None:
+        return await batch.day(date_str)
+    return await _read_daily_tasks_data(user_id, date_str)
+
+async def _read_daily_tasks_data(user_id: str, date_str: str) -> dict:
     doc_ref = get_task_doc_ref(user_id, date_str)
-    logger.debug(f"EIXA_DATA | get_daily_tasks_data: Getting daily tasks for user '{user_id}' on date '{date_str}'. Doc path: {doc_ref.path}")
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    if debug_enabled:
+        logger.debug("EIXA_DATA | get_daily_tasks_data: Getting daily tasks for user '%s' on date '%s'. Doc path: %s", user_id, date_str, doc_ref.path)
     doc = await asyncio.to_thread(doc_ref.get)
 
     if not doc.exists:
-        logger.info(f"EIXA_DATA | get_daily_tasks_data: No daily tasks document found for user '{user_id}' on '{date_str}'. Returning empty list.")
+        logger.debug("EIXA_DATA | get_daily_tasks_data: No daily tasks document found for user '%s' on '%s'. Returning empty list.", user_id, date_str)
         return {"tasks": []}
 
     data = doc.to_dict()
-    logger.debug(f"EIXA_DATA | get_daily_tasks_data: Raw data fetched for daily tasks for '{user_id}' on '{date_str}': {data}")
+    if debug_enabled:
+        logger.debug("EIXA_DATA | get_daily_tasks_data: Raw data fetched for '%s' on '%s': %d task(s).", user_id, date_str, len(data.get("tasks") or []))
 
     if "tasks" in data and isinstance(data["tasks"], list):
         modern_tasks = []
@@ -154,27 +182,51 @@ async def get_daily_tasks_data(user_id: str, date_str: str) -> dict:
         
         data["tasks"] = _sort_tasks_by_time(modern_tasks)
     else:
-        logger.critical(f"EIXA_DATA | CRITICAL: Document for '{user_id}' on '{date_str}' does NOT contain a 'tasks' list or 'tasks' field is missing. Data: {data}. Initializing 'tasks' as empty.", exc_info=True)
+        logger.critical("EIXA_DATA | CRITICAL: Document for '%s' on '%s' does NOT contain a 'tasks' list or 'tasks' field is missing. Fields: %s. Initializing 'tasks' as empty.", user_id, date_str, sorted(data))
         data["tasks"] = []
     
-    logger.debug(f"EIXA_DATA | get_daily_tasks_data: Processed daily tasks data for '{user_id}' on '{date_str}': {data}")
+    if debug_enabled:
+        logger.debug("EIXA_DATA | get_daily_tasks_data: Processed %d task(s) for '%s' on '%s'.", len(data["tasks"]), user_id, date_str)
     return data
 
-async def save_daily_tasks_data(user_id: str, date_str: str, data: dict):
+async def save_daily_tasks_data(user_id: str, date_str: str, data: dict, bump_version: bool = True):
+    # bump_version=False: quem grava vários dias em sequência incrementa a versão da agenda uma vez no fim.
+    batch = _active_batch(user_id)
+    if batch is not None:
+        if "tasks" in data and isinstance(data["tasks"], list):
+            data["tasks"] = _sort_tasks_by_time(data["tasks"])
+        batch.put_day(date_str, data)
+        return
     doc_ref = get_task_doc_ref(user_id, date_str)
-    logger.debug(f"EIXA_DATA | save_daily_tasks_data: Attempting to save daily tasks for user '{user_id}' on '{date_str}'. Doc path: {doc_ref.path}. Data: {data}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | save_daily_tasks_data: Attempting to save %d task(s) for user '%s' on '%s'. Doc path: %s", len(data.get("tasks") or []), user_id, date_str, doc_ref.path)
     try:
         if "tasks" in data and isinstance(data["tasks"], list):
             data["tasks"] = _sort_tasks_by_time(data["tasks"])
         await asyncio.to_thread(doc_ref.set, data)
-        logger.info(f"EIXA_DATA | save_daily_tasks_data: Daily tasks for user '{user_id}' on '{date_str}' saved to Firestore successfully.")
+        invalidate_semantic_cache(user_id)
+        if bump_version:
+            await bump_view_versions(user_id, "agenda")
+        logger.info("EIXA_DATA | save_daily_tasks_data: Daily tasks for user '%s' on '%s' saved to Firestore successfully.", user_id, date_str)
     except Exception as e:
-        logger.critical(f"EIXA_DATA | CRITICAL ERROR: Failed to save daily tasks to Firestore for user '{user_id}' on '{date_str}'. Doc Path: {doc_ref.path}. Payload: {data}. Error: {e}", exc_info=True)
+        logger.critical("EIXA_DATA | CRITICAL ERROR: Failed to save daily tasks to Firestore for user '%s' on '%s'. Doc Path: %s. Tasks: %d. Error: %s", user_id, date_str, doc_ref.path, len(data.get("tasks") or []), e, exc_info=True)
         raise
 
+async def delete_daily_tasks_data(user_id: str, date_str: str):
+    """Remove o documento do dia (usado quando a última tarefa do dia é excluída)."""
+    batch = _active_batch(user_id)
+    if batch is not None:
+        batch.delete_day(date_str)
+        return
+    doc_ref = get_task_doc_ref(user_id, date_str)
+    logger.debug("EIXA_DATA | delete_daily_tasks_data: Deleting agenda doc for user '%s' on '%s'.", user_id, date_str)
+    await asyncio.to_thread(doc_ref.delete)
+    invalidate_semantic_cache(user_id)
+    await bump_view_versions(user_id, "agenda")
+
 async def get_all_daily_tasks(user_id: str) -> dict:
     agenda_ref = get_user_subcollection(user_id, 'agenda')
-    logger.debug(f"EIXA_DATA | get_all_daily_tasks: Attempting to retrieve all daily tasks for user '{user_id}' from collection ID: {agenda_ref.id}. Full path: {agenda_ref.parent.id}/{agenda_ref.id}")
+    logger.debug("EIXA_DATA | get_all_daily_tasks: Attempting to retrieve all daily tasks for user '%s' from collection ID: %s.", user_id, agenda_ref.id)
     all_tasks = {}
     try:
         docs = await asyncio.to_thread(lambda: list(agenda_ref.stream()))
@@ -183,9 +235,9 @@ async def get_all_daily_tasks(user_id: str) -> dict:
         for doc_snapshot in docs:
             date_str = doc_snapshot.id
             all_tasks[date_str] = await get_daily_tasks_data(user_id, date_str)
-            logger.debug(f"EIXA_DATA | get_all_daily_tasks: Retrieved doc '{date_str}' for user '{user_id}'.")
+            logger.debug("EIXA_DATA | get_all_daily_tasks: Retrieved doc '%s' for user '%s'.", date_str, user_id)
         
-        logger.info(f"EIXA_DATA | get_all_daily_tasks: Retrieved all daily tasks for user '{user_id}'. Total days: {len(all_tasks)}")
+        logger.info("EIXA_DATA | get_all_daily_tasks: Retrieved all daily tasks for user '%s'. Total days: %d", user_id, len(all_tasks))
     except Exception as e:
         logger.error(f"EIXA_DATA | get_all_daily_tasks: Error retrieving all daily tasks for user '{user_id}': {e}", exc_info=True)
     return all_tasks
@@ -225,7 +277,8 @@ async def get_routine_template(user_id: str, routine_id_or_name: str) -> dict |
 async def save_routine_template(user_id: str, routine_id: str, data: dict):
     db = _initialize_firestore_client_instance()
     doc_ref = db.collection(USERS_COLLECTION).document(user_id).collection(EIXA_ROUTINES_COLLECTION).document(routine_id)
-    logger.debug(f"EIXA_DATA | save_routine_template: Saving routine '{routine_id}' for user '{user_id}'. Path: {doc_ref.parent.path}/{doc_ref.id}. Data: {data}") 
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | save_routine_template: Saving routine '%s' for user '%s'. Path: %s. Fields: %s", routine_id, user_id, doc_ref.path, sorted(data))
     try:
         current_time = datetime.now(timezone.utc).isoformat()
         data.setdefault("created_at", current_time)
@@ -245,6 +298,8 @@ async def save_routine_template(user_id: str, routine_id: str, data: dict):
                 item.setdefault("id", str(uuid.uuid4()))
 
         await asyncio.to_thread(doc_ref.set, data)
+        invalidate_semantic_cache(user_id)
+        await bump_view_versions(user_id, "routines")
         logger.info(f"EIXA_DATA | save_routine_template: Routine '{routine_id}' for user '{user_id}' saved successfully.")
     except Exception as e:
         logger.critical(f"EIXA_DATA | CRITICAL ERROR: Failed to save routine '{routine_id}' for user '{user_id}'. Error: {e}", exc_info=True)
@@ -258,9 +313,11 @@ async def delete_routine_template(user_id: str, routine_id_or_name: str) -> Dict
     
     if routine_to_delete:
         doc_ref = routines_ref.document(routine_to_delete['id'])
-        logger.debug(f"EIXA_DATA | delete_routine_template: Deleting routine '{routine_to_delete['id']}' for user '{user_id}'. Path: {doc_ref.path}")
+        logger.debug("EIXA_DATA | delete_routine_template: Deleting routine '%s' for user '%s'.", routine_to_delete['id'], user_id)
         try:
             await asyncio.to_thread(doc_ref.delete)
+            invalidate_semantic_cache(user_id)
+            await bump_view_versions(user_id, "routines")
             logger.info(f"EIXA_DATA | delete_routine_template: Routine '{routine_to_delete['id']}' for user '{user_id}' deleted successfully.")
             return {"status": "success", "message": f"Rotina '{routine_to_delete.get('name', routine_to_delete['id'])}' excluída com sucesso."}
         except Exception as e:
@@ -273,7 +330,8 @@ async def delete_routine_template(user_id: str, routine_id_or_name: str) -> Dict
 async def get_all_routines(user_id: str) -> list[dict]:
     db = _initialize_firestore_client_instance()
     routines_ref = db.collection(USERS_COLLECTION).document(user_id).collection(EIXA_ROUTINES_COLLECTION)
-    logger.debug(f"EIXA_DATA | get_all_routines: Retrieving all routines for user '{user_id}'. Path: {routines_ref.parent.path}/{routines_ref.id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | get_all_routines: Retrieving all routines for user '%s'. Path: %s/%s", user_id, routines_ref.parent.path, routines_ref.id)
     all_routines = []
     try:
         docs = await asyncio.to_thread(lambda: list(routines_ref.stream()))
@@ -357,7 +415,7 @@ async def apply_routine_to_day(user_id: str, date_str: str, routine_id_or_name:
         elif conflict_strategy == "overwrite":
             new_tasks_for_day.append(task)
 
-        logger.debug(f"EIXA_DATA | apply_routine_to_day: Processed task from routine: {task['description']} at {task['time']}")
+        logger.debug("EIXA_DATA | apply_routine_to_day: Processed task from routine: %s at %s", task['description'], task['time'])
     
     try:
         await save_daily_tasks_data(user_id, date_str, {"tasks": new_tasks_for_day})
@@ -370,147 +428,540 @@ async def apply_routine_to_day(user_id: str, date_str: str, routine_id_or_name:
 
 # --- Integração com Google Calendar (Pull Events) ---
 
-async def sync_google_calendar_events_to_eixa(user_id: str, start_date_obj: datetime, end_date_obj: datetime) -> Dict[str, Any]:
+def _to_utc_iso(dt: datetime) -> str:
+    return (dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).isoformat(timespec='seconds')
+
+
+def _calendar_event_to_task_fields(gc_event: dict) -> tuple[str, dict]:
     """
-    Puxa eventos do Google Calendar e os sincroniza com a agenda da EIXA.
-    Retorna um dicionário com status e mensagem, e o número de eventos adicionados/atualizados.
+    Converte um evento do Google Calendar em (date_str, campos da tarefa EIXA).
+    Lança ValueError se o evento não tiver início/fim interpretáveis.
     """
-    logger.info(f"EIXA_DATA | sync_google_calendar_events_to_eixa: Syncing Google Calendar events for user {user_id} from {start_date_obj} to {end_date_obj}.")
-    
-    try:
-        creds = await google_calendar_utils.get_credentials(user_id)
-        if not creds:
-            logger.warning(f"EIXA_DATA | sync_google_calendar_events_to_eixa: No Google Calendar credentials found for user {user_id}. Cannot sync.")
-            return {"status": "error", "message": "Credenciais do Google Calendar não encontradas. Por favor, conecte sua conta."}
+    event_id = gc_event.get('id')
+    start_info = gc_event.get('start')
+    end_info = gc_event.get('end')
+    if not start_info:
+        raise ValueError("Event has no start time/date.")
+
+    event_start_dt = None
+    event_end_dt = None
+    is_all_day = False
+
+    if start_info.get('dateTime'):
+        event_start_dt = datetime.fromisoformat(start_info['dateTime'])
+        if event_start_dt.tzinfo is None:
+            event_start_dt = event_start_dt.replace(tzinfo=timezone.utc)
+    elif start_info.get('date'):
+        is_all_day = True
+        event_start_dt = datetime.fromisoformat(start_info['date']).replace(tzinfo=timezone.utc)
+
+    if end_info and end_info.get('dateTime'):
+        event_end_dt = datetime.fromisoformat(end_info['dateTime'])
+        if event_end_dt.tzinfo is None:
+            event_end_dt = event_end_dt.replace(tzinfo=timezone.utc)
+    elif end_info and end_info.get('date') and is_all_day:
+        event_end_dt = datetime.fromisoformat(end_info['date']).replace(tzinfo=timezone.utc)
+
+    if not event_end_dt and event_start_dt:
+        event_end_dt = event_start_dt + timedelta(hours=1)
+
+    if not event_start_dt or not event_end_dt: raise ValueError("Could not determine start or end datetime.")
+
+    if not is_all_day:
+        duration_minutes = int((event_end_dt - event_start_dt).total_seconds() / 60)
+    else:
+        duration_minutes = (event_end_dt - event_start_dt).days * 24 * 60
 
-        google_events = await google_calendar_utils.list_calendar_events(user_id, start_date_obj, end_date_obj, credentials=creds)
-        
-        if not google_events:
-            logger.info(f"EIXA_DATA | No Google Calendar events found for user {user_id} in the specified period.")
-            return {"status": "info", "message": "Nenhum evento do Google Calendar encontrado para o período especificado."}
+    if duration_minutes < 0:
+        logger.warning(f"EIXA_DATA | Google Calendar event {event_id} has negative duration. Setting to 0.")
+        duration_minutes = 0
 
-        added_count = 0
-        updated_count = 0
+    return event_start_dt.strftime('%Y-%m-%d'), {
+        "description": gc_event.get('summary', 'Evento sem título'),
+        "time": event_start_dt.strftime('%H:%M'),
+        "duration_minutes": duration_minutes,
+        "origin": "google_calendar",
+        "google_calendar_event_id": event_id,
+        "is_synced_with_google_calendar": True,
+    }
 
-        tasks_to_save_by_date = {}
 
-        for gc_event in google_events:
-            event_id = gc_event.get('id')
-            summary = gc_event.get('summary', 'Evento sem título')
-            
-            start_info = gc_event.get('start')
-            end_info = gc_event.get('end')
+class _AgendaDayBuffer:
+    """
+    Carrega os documentos de dia da agenda sob demanda e registra quais foram alterados,
+    para que o sync grave apenas os dias efetivamente tocados pelas mudanças.
+    Pode ser compartilhado por vários syncs concorrentes: cada dia é lido uma única vez
+    e as listas de tarefas são sempre alteradas no lugar.
+    """
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.days: dict[str, dict] = {}
+        self.dirty: set[str] = set()
+        self._loading: dict[str, asyncio.Task] = {}
 
-            if not start_info:
-                logger.warning(f"EIXA_DATA | Google Calendar event {event_id} ({summary}) has no start time/date. Skipping.")
-                continue
+    async def day(self, date_str: str) -> dict:
+        if date_str not in self.days:
+            if date_str not in self._loading:
+                self._loading[date_str] = asyncio.create_task(_read_daily_tasks_data(self.user_id, date_str))
+            data = await self._loading[date_str]
+            self.days.setdefault(date_str, data)
+        return self.days[date_str]
 
-            event_start_dt = None
-            event_end_dt = None
-            is_all_day = False
+    async def tasks(self, date_str: str) -> list:
+        return (await self.day(date_str)).setdefault("tasks", [])
 
-            try:
-                if start_info.get('dateTime'):
-                    event_start_dt = datetime.fromisoformat(start_info['dateTime'])
-                    if event_start_dt.tzinfo is None:
-                        event_start_dt = event_start_dt.replace(tzinfo=timezone.utc)
-                elif start_info.get('date'):
-                    is_all_day = True
-                    event_start_dt = datetime.fromisoformat(start_info['date']).replace(tzinfo=timezone.utc)
-                
-                if end_info and end_info.get('dateTime'):
-                    event_end_dt = datetime.fromisoformat(end_info['dateTime'])
-                    if event_end_dt.tzinfo is None:
-                        event_end_dt = event_end_dt.replace(tzinfo=timezone.utc)
-                elif end_info and end_info.get('date') and is_all_day:
-                    event_end_dt = datetime.fromisoformat(end_info['date']).replace(tzinfo=timezone.utc)
-                
-                if not event_end_dt and event_start_dt:
-                    event_end_dt = event_start_dt + timedelta(hours=1)
-                
-                if not event_start_dt or not event_end_dt: raise ValueError("Could not determine start or end datetime.")
-                
-                date_str = event_start_dt.strftime('%Y-%m-%d')
-                time_str = event_start_dt.strftime('%H:%M')
-                
-                duration_minutes = 0
-                if not is_all_day:
-                    duration_minutes = int((event_end_dt - event_start_dt).total_seconds() / 60)
-                else:
-                    duration_days = (event_end_dt - event_start_dt).days
-                    duration_minutes = duration_days * 24 * 60
+    def mark_dirty(self, date_str: str):
+        self.dirty.add(date_str)
 
-                if duration_minutes < 0:
-                    logger.warning(f"EIXA_DATA | Google Calendar event {event_id} ({summary}) has negative duration. Setting to 0.")
-                    duration_minutes = 0
+    async def flush(self):
+        for date_str in sorted(self.dirty):
+            await save_daily_tasks_data(self.user_id, date_str, self.days[date_str], bump_version=False)
+        if self.dirty:
+            await bump_view_versions(self.user_id, "agenda")
 
-                if date_str not in tasks_to_save_by_date:
-                    tasks_to_save_by_date[date_str] = await get_daily_tasks_data(user_id, date_str)
-                current_daily_tasks = tasks_to_save_by_date[date_str].get("tasks", [])
 
-                existing_eixa_task_index = next(
-                    (i for i, t in enumerate(current_daily_tasks) if t.get('google_calendar_event_id') == event_id),
-                    None
-                )
+# Limite de escritas por WriteBatch do Firestore.
+_FIRESTORE_BATCH_MAX_WRITES = 500
 
-                eixa_task = {
-                    "id": current_daily_tasks[existing_eixa_task_index].get('id') if existing_eixa_task_index is not None else str(uuid.uuid4()),
-                    "description": summary,
-                    "completed": False,
-                    "time": time_str,
-                    "duration_minutes": duration_minutes,
-                    "origin": "google_calendar",
-                    "google_calendar_event_id": event_id,
-                    "is_synced_with_google_calendar": True,
-                    "created_at": current_daily_tasks[existing_eixa_task_index].get('created_at', datetime.now(timezone.utc).isoformat()) if existing_eixa_task_index is not None else datetime.now(timezone.utc).isoformat(),
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }
 
-                if existing_eixa_task_index is not None:
-                    logger.debug(f"EIXA_DATA | Updating existing EIXA task for GC event {event_id}: {summary}")
-                    current_daily_tasks[existing_eixa_task_index] = eixa_task
-                    updated_count += 1
+class _BatchedWrites(_AgendaDayBuffer):
+    """
+    Escritas de um lote de ações (POST /actions/batch) para um usuário: dias da agenda e tarefas
+    sem data ficam em memória enquanto as operações rodam (cada dia é lido uma vez, e operações
+    seguintes enxergam as anteriores) e vão ao Firestore em WriteBatch no commit.
+    """
+    def __init__(self, user_id: str):
+        super().__init__(user_id)
+        self.deleted_days: set[str] = set()
+        self.unscheduled: dict[str, dict | None] = {}  # task_id -> documento, ou None para excluir
+
+    def put_day(self, date_str: str, data: dict):
+        self.days[date_str] = data
+        self.deleted_days.discard(date_str)
+        self.mark_dirty(date_str)
+
+    def delete_day(self, date_str: str):
+        self.days[date_str] = {"tasks": []}
+        self.deleted_days.add(date_str)
+        self.mark_dirty(date_str)
+
+    async def commit(self) -> int:
+        """Grava tudo em WriteBatch (um por 500 escritas) e devolve o número de escritas."""
+        writes = []
+        for date_str in sorted(self.dirty):
+            doc_ref = get_task_doc_ref(self.user_id, date_str)
+            writes.append((doc_ref, None if date_str in self.deleted_days else self.days[date_str]))
+        for task_id, data in self.unscheduled.items():
+            writes.append((get_unscheduled_task_doc_ref(self.user_id, task_id), data))
+        if not writes:
+            return 0
+
+        db = _initialize_firestore_client_instance()
+        for start in range(0, len(writes), _FIRESTORE_BATCH_MAX_WRITES):
+            batch = db.batch()
+            for doc_ref, data in writes[start:start + _FIRESTORE_BATCH_MAX_WRITES]:
+                if data is None:
+                    batch.delete(doc_ref)
                 else:
-                    logger.debug(f"EIXA_DATA | Adding new EIXA task from GC event {event_id}: {summary}")
-                    current_daily_tasks.append(eixa_task)
-                    added_count += 1
-                
-                tasks_to_save_by_date[date_str]["tasks"] = current_daily_tasks
-
-            except ValueError as e:
-                logger.error(f"EIXA_DATA | Could not parse date/time for Google Calendar event {event_id} ({summary}): {e}", exc_info=True)
-            except Exception as e:
-                logger.critical(f"EIXA_DATA | Unexpected error processing Google Calendar event {event_id} ({summary}): {e}", exc_info=True)
+                    batch.set(doc_ref, data)
+            await asyncio.to_thread(batch.commit)
+        invalidate_semantic_cache(self.user_id)
+        await bump_view_versions(self.user_id, "agenda")
+        logger.info(f"EIXA_DATA | batched_writes: Committed {len(writes)} write(s) for user '{self.user_id}' ({len(self.dirty)} day(s), {len(self.unscheduled)} unscheduled task(s)).")
+        return len(writes)
+
+
+_active_write_batch: ContextVar[_BatchedWrites | None] = ContextVar("eixa_active_write_batch", default=None)
+
+
+def _active_batch(user_id: str) -> _BatchedWrites | None:
+    batch = _active_write_batch.get()
+    return batch if batch is not None and batch.user_id == user_id else None
+
+
+@contextlib.asynccontextmanager
+async def batched_writes(user_id: str):
+    """
+    Dentro do bloco, get/save/delete de dias da agenda e de tarefas sem data deste usuário usam
+    o buffer em vez do Firestore. Na saída sem exceção, tudo é gravado em um único WriteBatch;
+    com exceção, nada é gravado.
+    """
+    batch = _BatchedWrites(user_id)
+    token = _active_write_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _active_write_batch.reset(token)
+    await batch.commit()
+
+
+def _ical_dedupe_key(gc_event: dict) -> str | None:
+    """
+    Chave de deduplicação entre agendas/contas: o iCalUID, mais o originalStartTime no caso de
+    instâncias de eventos recorrentes (que compartilham o iCalUID). Não muda quando o evento é remarcado.
+    """
+    ical_uid = gc_event.get('iCalUID')
+    if not ical_uid:
+        return None
+    original_start = gc_event.get('originalStartTime')
+    if not original_start:
+        return ical_uid
+    return f"{ical_uid}|{original_start.get('dateTime') or original_start.get('date') or ''}"
 
-        for date_str, daily_data in tasks_to_save_by_date.items():
-            await save_daily_tasks_data(user_id, date_str, daily_data)
 
-        logger.info(f"EIXA_DATA | Finished syncing Google Calendar events for user {user_id}. Added: {added_count}, Updated: {updated_count}.")
-        return {"status": "success", "message": f"Sincronização com Google Calendar concluída! {added_count} novos eventos e {updated_count} atualizados."}
+async def _apply_calendar_event_changes(user_id: str, google_events: list, event_index: dict, days: _AgendaDayBuffer,
+                                        source_key: str = 'default', ical_owners: dict | None = None) -> dict:
+    """
+    Aplica eventos (completos ou delta) à agenda usando o índice event_id -> {date, task_id, ical_key}.
+    Eventos cancelados removem a tarefa; eventos que mudaram de dia saem do dia antigo.
+    Com ical_owners (chave iCal -> source_key), um evento já importado por outra agenda/conta é ignorado.
+    Retorna as contagens {added, updated, removed, unchanged, duplicates}.
+    """
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "duplicates": 0}
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    for gc_event in google_events:
+        event_id = gc_event.get('id')
+        if not event_id:
+            continue
+        indexed = event_index.get(event_id)
+
+        if gc_event.get('status') == 'cancelled':
+            if indexed:
+                tasks = await days.tasks(indexed["date"])
+                remaining = [t for t in tasks if t.get('google_calendar_event_id') != event_id]
+                if len(remaining) != len(tasks):
+                    tasks[:] = remaining
+                    days.mark_dirty(indexed["date"])
+                    counts["removed"] += 1
+                event_index.pop(event_id, None)
+                if ical_owners is not None and ical_owners.get(indexed.get("ical_key")) == source_key:
+                    ical_owners.pop(indexed.get("ical_key"), None)
+            continue
+
+        ical_key = _ical_dedupe_key(gc_event)
+        if ical_owners is not None and ical_key and not indexed:
+            owner = ical_owners.get(ical_key)
+            if owner and owner != source_key:
+                counts["duplicates"] += 1
+                continue
+            ical_owners[ical_key] = source_key
+
+        try:
+            date_str, fields = _calendar_event_to_task_fields(gc_event)
+        except ValueError as e:
+            logger.error(f"EIXA_DATA | Could not parse date/time for Google Calendar event {event_id} ({gc_event.get('summary')}): {e}")
+            continue
+
+        existing_task = None
+        if indexed and indexed["date"] != date_str:
+            # Evento mudou de dia: remove do dia antigo e preserva id/created_at.
+            old_tasks = await days.tasks(indexed["date"])
+            for i, t in enumerate(old_tasks):
+                if t.get('google_calendar_event_id') == event_id:
+                    existing_task = old_tasks.pop(i)
+                    days.mark_dirty(indexed["date"])
+                    break
+
+        tasks = await days.tasks(date_str)
+        existing_index = None
+        if existing_task is None:
+            existing_index = next((i for i, t in enumerate(tasks) if t.get('google_calendar_event_id') == event_id), None)
+            if existing_index is not None:
+                existing_task = tasks[existing_index]
+
+        if existing_task is not None and existing_index is not None and all(existing_task.get(k) == v for k, v in fields.items()):
+            counts["unchanged"] += 1
+        else:
+            eixa_task = {
+                "id": existing_task.get('id') if existing_task else str(uuid.uuid4()),
+                "completed": existing_task.get('completed', False) if existing_task else False,
+                "created_at": existing_task.get('created_at', now_iso) if existing_task else now_iso,
+                "updated_at": now_iso,
+            } | fields
+            if existing_index is not None:
+                logger.debug("EIXA_DATA | Updating existing EIXA task for GC event %s: %s", event_id, fields["description"])
+                tasks[existing_index] = eixa_task
+            else:
+                logger.debug("EIXA_DATA | Adding EIXA task from GC event %s: %s", event_id, fields["description"])
+                tasks.append(eixa_task)
+            counts["updated" if existing_task else "added"] += 1
+            days.mark_dirty(date_str)
+            existing_task = eixa_task
+
+        event_index[event_id] = {"date": date_str, "task_id": existing_task["id"], "ical_key": ical_key}
+
+    return counts
+
+
+def _event_index_keep_from(start_date_obj: datetime) -> str:
+    """Primeiro dia (YYYY-MM-DD) mantido no event_index: a retenção ou o início da janela pedida, o que vier antes."""
+    retention_start = (datetime.now(timezone.utc) - timedelta(days=CALENDAR_EVENT_INDEX_RETENTION_DAYS)).date().isoformat()
+    return min(retention_start, _to_utc_iso(start_date_obj)[:10])
+
+
+def _prune_event_index(event_index: dict, days: _AgendaDayBuffer, keep_from: str) -> int:
+    """
+    Remove do índice os eventos de dias anteriores a `keep_from` e os eventos cuja tarefa não
+    existe mais num dia já carregado pelo sync (tarefa excluída na EIXA). Retorna quantos saíram.
+    """
+    stale = []
+    for event_id, entry in event_index.items():
+        date_str = entry.get("date", "")
+        if date_str < keep_from:
+            stale.append(event_id)
+        elif date_str in days.days and not any(
+                t.get('google_calendar_event_id') == event_id for t in days.days[date_str].get("tasks", [])):
+            stale.append(event_id)
+    for event_id in stale:
+        event_index.pop(event_id, None)
+    return len(stale)
+
+
+async def _fetch_calendar_source_changes(user_id: str, creds, calendar_id: str, state: dict,
+                                         start_date_obj: datetime, end_date_obj: datetime,
+                                         isolated_http: bool = False) -> dict:
+    """
+    Busca as mudanças de uma agenda (conta + calendar_id) a partir do estado salvo.
+    Sync completo quando não há token, quando a janela pedida não está coberta pela já
+    sincronizada (usa a união das janelas) ou quando o token expirou; caso contrário, delta.
+    Retorna {"events", "sync_token", "window_start", "window_end", "incremental"}.
+    """
+    event_index = state.get("event_index", {})
+    window_start = _to_utc_iso(start_date_obj)
+    window_end = _to_utc_iso(end_date_obj)
+    sync_token = state.get("sync_token")
+    if sync_token and (window_start < state.get("window_start", window_start) or window_end > state.get("window_end", window_end)):
+        # Janela nova não coberta pelo token atual: refaz o sync completo da união das janelas.
+        logger.info(f"EIXA_DATA | Requested window not covered by stored sync state for user {user_id} (calendar {calendar_id}). Running full sync.")
+        window_start = min(window_start, state.get("window_start", window_start))
+        window_end = max(window_end, state.get("window_end", window_end))
+        sync_token = None
+    elif sync_token:
+        window_start, window_end = state.get("window_start", window_start), state.get("window_end", window_end)
+
+    try:
+        google_events, next_sync_token = await get_google_calendar_utils().fetch_event_changes(
+            user_id, creds, calendar_id, sync_token=sync_token,
+            time_min=datetime.fromisoformat(window_start), time_max=datetime.fromisoformat(window_end),
+            isolated_http=isolated_http
+        )
+    except CalendarSyncTokenExpired:
+        logger.warning(f"EIXA_DATA | Sync token expired for user {user_id} (calendar {calendar_id}). Falling back to full sync.")
+        sync_token = None
+        google_events, next_sync_token = await get_google_calendar_utils().fetch_event_changes(
+            user_id, creds, calendar_id,
+            time_min=datetime.fromisoformat(window_start), time_max=datetime.fromisoformat(window_end),
+            isolated_http=isolated_http
+        )
+
+    if not sync_token:
+        # Sync completo não traz os eventos apagados: quem está no índice, dentro da janela,
+        # e não veio na resposta é tratado como cancelado.
+        seen_ids = {e.get('id') for e in google_events}
+        google_events = google_events + [
+            {"id": event_id, "status": "cancelled"}
+            for event_id, entry in event_index.items()
+            if event_id not in seen_ids and window_start[:10] <= entry.get("date", "") <= window_end[:10]
+        ]
+
+    return {
+        "events": google_events,
+        "sync_token": next_sync_token,
+        "window_start": window_start,
+        "window_end": window_end,
+        "incremental": bool(sync_token),
+    }
+
+
+# Semáforos de sync por usuário, compartilhados entre as requisições do mesmo event loop (no ASGI, o
+# loop do worker): syncs simultâneos de um usuário somam no máximo CALENDAR_SYNC_MAX_CONCURRENCY_PER_USER
+# chamadas à API. Referências fracas: o semáforo some quando nenhum sync do usuário está rodando.
+_calendar_sync_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, weakref.WeakValueDictionary]" = weakref.WeakKeyDictionary()
+
+
+def _calendar_sync_semaphore(user_id: str) -> asyncio.Semaphore:
+    per_user = _calendar_sync_semaphores.setdefault(asyncio.get_running_loop(), weakref.WeakValueDictionary())
+    semaphore = per_user.get(user_id)
+    if semaphore is None:
+        semaphore = per_user[user_id] = asyncio.Semaphore(CALENDAR_SYNC_MAX_CONCURRENCY_PER_USER)
+    return semaphore
+
+
+def _sync_calendar_id(calendar: dict) -> str:
+    """A agenda primária é sempre 'primary' (e não o e-mail da conta), para ter um único sync_state."""
+    return 'primary' if calendar.get('primary') else calendar['id']
+
+
+def _sync_result_message(counts: dict, had_events: bool, incremental: bool) -> Dict[str, Any]:
+    if not had_events:
+        return {"status": "info", "message": "Nenhuma alteração no Google Calendar desde a última sincronização." if incremental else "Nenhum evento do Google Calendar encontrado para o período especificado."}
+    return {
+        "status": "success",
+        "message": f"Sincronização com Google Calendar concluída! {counts['added']} novos eventos, {counts['updated']} atualizados e {counts['removed']} removidos.",
+        "added": counts["added"], "updated": counts["updated"], "removed": counts["removed"],
+    }
+
+
+async def sync_google_calendar_events_to_eixa(user_id: str, start_date_obj: datetime, end_date_obj: datetime,
+                                              account_id: str | None = None, calendar_id: str = 'primary') -> Dict[str, Any]:
+    """
+    Sincroniza eventos de uma agenda do Google Calendar (por padrão a primária da conta ativa)
+    com a agenda da EIXA de forma incremental. O primeiro sync busca a janela completa com
+    paginação; os seguintes usam o nextSyncToken salvo e processam apenas o delta.
+    Só os dias tocados pelas mudanças são lidos e gravados.
+    Retorna um dicionário com status e mensagem, e o número de eventos adicionados/atualizados/removidos.
+    """
+    logger.info(f"EIXA_DATA | sync_google_calendar_events_to_eixa: Syncing Google Calendar events for user {user_id} from {start_date_obj} to {end_date_obj}.")
+    
+    try:
+        creds = await get_google_calendar_utils().get_credentials(user_id, account_id)
+        if not creds:
+            logger.warning(f"EIXA_DATA | sync_google_calendar_events_to_eixa: No Google Calendar credentials found for user {user_id}. Cannot sync.")
+            return {"status": "error", "message": "Credenciais do Google Calendar não encontradas. Por favor, conecte sua conta."}
+
+        account_id = account_id or await get_google_calendar_utils().get_active_account_id(user_id)
+        state = await get_google_calendar_utils().get_sync_state(user_id, account_id, calendar_id)
+        event_index = state.get("event_index", {})
+
+        async with _calendar_sync_semaphore(user_id):
+            fetched = await _fetch_calendar_source_changes(user_id, creds, calendar_id, state, start_date_obj, end_date_obj)
+
+        days = _AgendaDayBuffer(user_id)
+        counts = await _apply_calendar_event_changes(user_id, fetched["events"], event_index, days)
+        await days.flush()
+        pruned = _prune_event_index(event_index, days, _event_index_keep_from(start_date_obj))
+        if pruned:
+            logger.debug("EIXA_DATA | Pruned %d past/deleted events from the sync index of user %s.", pruned, user_id)
+
+        await get_google_calendar_utils().save_sync_state(user_id, account_id, calendar_id, {
+            "sync_token": fetched["sync_token"],
+            "window_start": fetched["window_start"],
+            "window_end": fetched["window_end"],
+            "event_index": event_index,
+        })
+
+        logger.info(f"EIXA_DATA | Finished syncing Google Calendar events for user {user_id}. Added: {counts['added']}, Updated: {counts['updated']}, Removed: {counts['removed']}, Unchanged: {counts['unchanged']}, Days written: {len(days.dirty)}.")
+        return _sync_result_message(counts, bool(fetched["events"]), fetched["incremental"])
     
     except Exception as e:
         logger.critical(f"EIXA_DATA | CRITICAL ERROR during Google Calendar sync for user {user_id}: {e}", exc_info=True)
         return {"status": "error", "message": "Falha crítica ao sincronizar com o Google Calendar."}
 
 
+async def sync_all_google_calendars_to_eixa(user_id: str, start_date_obj: datetime, end_date_obj: datetime) -> Dict[str, Any]:
+    """
+    Sincronização agregada: todas as contas vinculadas e todas as agendas visíveis de cada uma.
+    As buscas rodam em paralelo (no máximo CALENDAR_SYNC_MAX_CONCURRENCY_PER_USER por usuário) e
+    cada resultado é mesclado na agenda assim que chega; eventos repetidos entre agendas/contas
+    (mesmo iCalUID) entram uma única vez. Cada dia alterado é gravado uma vez no final.
+    """
+    logger.info(f"EIXA_DATA | sync_all_google_calendars_to_eixa: Aggregated sync for user {user_id} from {start_date_obj} to {end_date_obj}.")
+    try:
+        accounts = (await get_google_calendar_utils().list_accounts(user_id)).get("accounts", [])
+        account_ids = [a["account_id"] for a in accounts] or [None]
+
+        creds_list = await asyncio.gather(*(get_google_calendar_utils().get_credentials(user_id, acc) for acc in account_ids))
+        connected = [(acc, creds) for acc, creds in zip(account_ids, creds_list) if creds]
+        if not connected:
+            return {"status": "error", "message": "Credenciais do Google Calendar não encontradas. Por favor, conecte sua conta."}
+
+        semaphore = _calendar_sync_semaphore(user_id)
+
+        async def _calendars_for(acc, creds):
+            async with semaphore:
+                try:
+                    calendars = await get_google_calendar_utils().list_calendars(user_id, creds)
+                except Exception as e:
+                    logger.error(f"EIXA_DATA | Failed to list calendars for user {user_id}, account {acc}: {e}", exc_info=True)
+                    calendars = []
+            return [(acc, creds, _sync_calendar_id(c)) for c in calendars] or [(acc, creds, 'primary')]
+
+        sources = [src for group in await asyncio.gather(*(_calendars_for(acc, creds) for acc, creds in connected)) for src in group]
+        states = await asyncio.gather(*(get_google_calendar_utils().get_sync_state(user_id, acc, cal) for acc, _, cal in sources))
+
+        source_keys = [f"{acc or 'default'}__{cal}" for acc, _, cal in sources]
+        ical_owners = {}
+        for key, state in zip(source_keys, states):
+            for entry in state.get("event_index", {}).values():
+                if entry.get("ical_key"):
+                    ical_owners.setdefault(entry["ical_key"], key)
+
+        async def _fetch(i):
+            acc, creds, cal = sources[i]
+            async with semaphore:
+                return i, await _fetch_calendar_source_changes(user_id, creds, cal, states[i], start_date_obj, end_date_obj, isolated_http=True)
+
+        days = _AgendaDayBuffer(user_id)
+        totals = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "duplicates": 0}
+        had_events = False
+        all_incremental = True
+        new_states = {}
+
+        for next_done in asyncio.as_completed([_fetch(i) for i in range(len(sources))]):
+            try:
+                i, fetched = await next_done
+            except Exception as e:
+                logger.error(f"EIXA_DATA | Calendar source failed during aggregated sync for user {user_id}: {e}", exc_info=True)
+                continue
+            event_index = states[i].get("event_index", {})
+            counts = await _apply_calendar_event_changes(user_id, fetched["events"], event_index, days,
+                                                         source_key=source_keys[i], ical_owners=ical_owners)
+            for k in totals:
+                totals[k] += counts[k]
+            had_events = had_events or bool(fetched["events"])
+            all_incremental = all_incremental and fetched["incremental"]
+            new_states[i] = {
+                "sync_token": fetched["sync_token"],
+                "window_start": fetched["window_start"],
+                "window_end": fetched["window_end"],
+                "event_index": event_index,
+            }
+            logger.debug("EIXA_DATA | Merged calendar source %s for user %s: %s", source_keys[i], user_id, counts)
+
+        await days.flush()
+        keep_from = _event_index_keep_from(start_date_obj)
+        pruned = sum(_prune_event_index(state["event_index"], days, keep_from) for state in new_states.values())
+        if pruned:
+            logger.debug("EIXA_DATA | Pruned %d past/deleted events from the sync indexes of user %s.", pruned, user_id)
+        await asyncio.gather(*(
+            get_google_calendar_utils().save_sync_state(user_id, sources[i][0], sources[i][2], state)
+            for i, state in new_states.items()
+        ))
+
+        logger.info(f"EIXA_DATA | Aggregated Google Calendar sync for user {user_id} finished. Sources: {len(new_states)}/{len(sources)}, Added: {totals['added']}, Updated: {totals['updated']}, Removed: {totals['removed']}, Duplicates skipped: {totals['duplicates']}, Days written: {len(days.dirty)}.")
+        if not new_states:
+            return {"status": "error", "message": "Falha ao sincronizar com o Google Calendar."}
+        return _sync_result_message(totals, had_events, all_incremental)
+
+    except Exception as e:
+        logger.critical(f"EIXA_DATA | CRITICAL ERROR during aggregated Google Calendar sync for user {user_id}: {e}", exc_info=True)
+        return {"status": "error", "message": "Falha crítica ao sincronizar com o Google Calendar."}
+
+
 # --- Funções de Access to Data Projects ---
 
 async def get_project_data(user_id: str, project_id: str) -> dict:
     doc_ref = get_project_doc_ref(user_id, project_id)
-    logger.debug(f"EIXA_DATA | get_project_data: Getting project '{project_id}' for user '{user_id}'. Doc path: {doc_ref.path}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | get_project_data: Getting project '%s' for user '%s'. Doc path: %s", project_id, user_id, doc_ref.path)
     doc = await asyncio.to_thread(doc_ref.get)
     if not doc.exists:
         logger.info(f"EIXA_DATA | get_project_data: Project '{project_id}' not found for user '{user_id}'. Returning empty dict.")
         return {}
     data = doc.to_dict()
-    logger.debug(f"EIXA_DATA | get_project_data: Raw data fetched for project '{project_id}' for '{user_id}': {data}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | get_project_data: Raw data fetched for project '%s' for '%s'. Fields: %s", project_id, user_id, sorted(data or {}))
     return data
 
 async def save_project_data(user_id: str, project_id: str, data: dict):
     doc_ref = get_project_doc_ref(user_id, project_id)
-    logger.debug(f"EIXA_DATA | save_project_data: Attempting to save project '{project_id}' for user '{user_id}'. Doc path: {doc_ref.path}. Data: {data}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | save_project_data: Attempting to save project '%s' for user '%s'. Doc path: %s. Fields: %s", project_id, user_id, doc_ref.path, sorted(data))
     try:
         await asyncio.to_thread(doc_ref.set, data)
+        invalidate_semantic_cache(user_id)
+        await bump_view_versions(user_id, "projects")
         logger.info(f"EIXA_DATA | save_project_data: Project '{project_id}' for user '{user_id}' saved to Firestore successfully.")
     except Exception as e:
         logger.critical(f"EIXA_DATA | CRITICAL ERROR: Failed to save project '{project_id}' to Firestore for user '{user_id}'. Doc Path: {doc_ref.path}. Error: {e}", exc_info=True)
@@ -518,7 +969,8 @@ async def save_project_data(user_id: str, project_id: str, data: dict):
 
 async def get_all_projects(user_id: str) -> list[dict]:
     projects_ref = get_user_subcollection(user_id, 'projects')
-    logger.debug(f"EIXA_DATA | get_all_projects: Attempting to retrieve all projects for user '{user_id}' from collection ID: {projects_ref.id}. Full path: {projects_ref.parent.path}/{projects_ref.id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EIXA_DATA | get_all_projects: Attempting to retrieve all projects for user '%s'. Full path: %s/%s", user_id, projects_ref.parent.path, projects_ref.id)
     all_projects = []
     try:
         docs = await asyncio.to_thread(lambda: list(projects_ref.stream()))
@@ -553,7 +1005,7 @@ async def get_all_projects(user_id: str) -> list[dict]:
                 project_data.setdefault("micro_tasks", [])
             
             all_projects.append(project_data)
-            logger.debug(f"EIXA_DATA | get_all_projects: Retrieved project '{doc.id}' for user '{user_id}'.")
+            logger.debug("EIXA_DATA | get_all_projects: Retrieved project '%s' for user '%s'.", doc.id, user_id)
 
         logger.info(f"EIXA_DATA | get_all_projects: Retrieved all projects for user '{user_id}'. Total projects: {len(all_projects)}")
     except Exception as e:
@@ -566,7 +1018,7 @@ async def get_user_history(user_id: str, interactions_collection_logical_name: s
         collection_real_name = get_top_level_collection(interactions_collection_logical_name).id
         db = _initialize_firestore_client_instance()
         
-        logger.debug(f"EIXA_DATA | get_user_history: Querying history for user '{user_id}' from real collection '{collection_real_name}'. Limit: {limit}")
+        logger.debug("EIXA_DATA | get_user_history: Querying history for user '%s' from real collection '%s'. Limit: %d", user_id, collection_real_name, limit)
         query = db.collection(collection_real_name).where('user_id', '==', user_id).order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit)
 
         docs = await asyncio.to_thread(lambda: list(query.stream()))
@@ -22,13 +22,14 @@ from eixa_data import (
     get_all_daily_tasks,         
     get_all_projects,            
     get_all_routines, save_routine_template, apply_routine_to_day, delete_routine_template, get_routine_template,
-    sync_google_calendar_events_to_eixa
+    sync_google_calendar_events_to_eixa,
+    sync_all_google_calendars_to_eixa
 )
 
-from vertex_utils import call_gemini_api
+from vertex_utils import call_gemini_api, context_cache_manager
 from vectorstore_utils import get_embedding, add_memory_to_vectorstore, get_relevant_memories
 from bigquery_utils import bq_manager
-from metrics_utils import measure_async, record_latency
+from metrics_utils import measure_async, record_latency, spawn_background_task
 
 # Importações de firestore_utils para operar com o Firestore
 from firestore_utils import (
@@ -48,6 +49,15 @@ from personal_checkpoint import get_latest_self_eval, run_weekly_checkpoint
 from translation_utils import detect_language, translate_text
 
 from config import DEFAULT_MAX_OUTPUT_TOKENS, DEFAULT_TEMPERATURE, DEFAULT_TIMEZONE, USERS_COLLECTION, TOP_LEVEL_COLLECTIONS_MAP, GEMINI_VISION_MODEL, GEMINI_TEXT_MODEL, EMBEDDING_MODEL_NAME
+from config import MAX_PROMPT_TOKENS_BUDGET, CONVERSATION_HARD_LIMIT_TOKENS, PROMPT_SECTION_BUDGETS, GEMINI_CONTEXT_CACHE_ENABLED
+from config import INTENT_MODE, INTENT_CLASSIFIER_THRESHOLD, SEMANTIC_CACHE_ENABLED
+from config import DOCUMENT_INLINE_MAX_CHARS, DOCUMENT_INGESTION_DRAIN_SECONDS, SERVER_MODE
+from intent_classifier import get_intent_classifier
+from prompt_assembler import PromptSection, assemble_prompt_sections, prepend_context_to_history, trim_history
+from prompt_templates import INTENT_EXTRACTION_PROMPT, COMBINED_OUTPUT_INSTRUCTIONS, compile_main_prompt_prefix
+from semantic_cache import semantic_response_cache, context_hash, time_bucket
+from keyword_matcher import KeywordMatcher, get_keyword_matcher, profile_phrase
+import document_ingestion
 
 from input_parser import parse_incoming_input
 from app_config_loader import get_eixa_templates
@@ -58,11 +68,48 @@ from crud_orchestrator import (
 )
 from profile_settings_manager import parse_and_update_profile_settings, update_profile_from_inferred_data
 
-from google_calendar_utils import GoogleCalendarUtils, GOOGLE_CALENDAR_SCOPES
+from google_calendar_utils import get_google_calendar_utils, GOOGLE_CALENDAR_SCOPES
 
 logger = logging.getLogger(__name__)
 
-google_calendar_auth_manager = GoogleCalendarUtils()
+# Seções do system prompt principal que formam o prefixo estável enviado ao cache de contexto.
+# Só respeitam o próprio teto (PROMPT_SECTION_BUDGETS): o corte pelo orçamento global fica com
+# as seções dinâmicas, senão o prefixo mudaria de tamanho (e de hash) a cada turno.
+_CONTEXT_CACHE_SECTIONS = ("persona", "rich_ui", "combined_output", "profile", "routines")
+
+# Léxicos das detecções pós-resposta (casados com keyword_matcher, uma passada por texto).
+_EMOTIONAL_KEYWORDS = {
+    "ansiedade": ("ansioso", "ansiosa", "preocupado", "preocupada", "nervoso", "nervosa", "estressado", "estressada"),
+    "frustração": ("frustrado", "frustrada", "irritado", "irritada", "chateado", "chateada", "raiva"),
+    "alegria": ("feliz", "animado", "animada", "empolgado", "empolgada", "contente", "alegre"),
+    "esperança": ("esperançoso", "esperançosa", "otimista", "motivado", "motivada", "confiante"),
+    "exaustão": ("cansado", "cansada", "exausto", "exausta", "esgotado", "esgotada", "sem energia"),
+    "tristeza": ("triste", "deprimido", "deprimida", "desanimado", "desanimada", "melancólico"),
+    "procrastinação": ("deixar para depois", "amanhã eu faço", "procrastinar", "adiando"),
+    "dúvida": ("não sei", "confuso", "confusa", "perdido", "perdida", "bloqueado", "bloqueada"),
+}
+_INPUT_TONE_KEYWORDS = {
+    "frustração": ("frustrad", "cansad", "difícil", "procrastin", "adiando", "não consigo", "sobrecarregado"),
+    "positividade": ("animado", "feliz", "produtivo", "consegui"),
+}
+_EMOTIONAL_MATCHER = KeywordMatcher(_EMOTIONAL_KEYWORDS)
+_INPUT_TONE_MATCHER = KeywordMatcher(_INPUT_TONE_KEYWORDS)
+
+def _rank_tasks_for_context(all_tasks: dict, today_iso: str) -> list[tuple[str, dict]]:
+    """
+    Ordena as tarefas por relevância para o prompt: pendentes a partir de hoje (mais próximas
+    primeiro), pendentes atrasadas (mais recentes primeiro) e, por último, concluídas (mais recentes primeiro).
+    """
+    upcoming, overdue, completed = [], [], []
+    for date_key in sorted(all_tasks):
+        for task_data in all_tasks[date_key].get('tasks', []):
+            if task_data.get('completed', False):
+                completed.append((date_key, task_data))
+            elif date_key >= today_iso:
+                upcoming.append((date_key, task_data))
+            else:
+                overdue.append((date_key, task_data))
+    return upcoming + overdue[::-1] + completed[::-1]
 
 async def _extract_llm_action_intent(
     user_id: str,
@@ -100,87 +147,12 @@ async def _extract_llm_action_intent(
     if routines_list_for_llm:
         routines_context = "\nRotinas existentes:\n" + "\n".join(routines_list_for_llm) + "\n"
 
-    system_instruction_for_action_extraction = f"""
-    A data atual é {current_date_iso}. O fuso horário do usuário é {user_profile.get('timezone', DEFAULT_TIMEZONE)}.
-    Você é um assistente de extração de intenções altamente preciso e sem vieses. Sua função é analisar **EXCLUSIVAMENTE a última mensagem do usuário** para identificar INTENÇÕES CLARAS e DIRETAS de CRIAÇÃO, ATUALIZAÇÃO, EXCLUSÃO, MARCAÇÃO DE CONCLUSÃO (COMPLETE) de TAREFAS OU PROJETOS, ou GERENCIAMENTO de ROTINAS.
-
-    **REGRAS RÍGIDAS DE SAÍDA:**
-    1.  **SEMPRE** retorne APENAS um bloco JSON, sem texto conversacional.
-    2.  **PRIORIDADE ABSOLUTA:** Se a mensagem do usuário for uma resposta simples de confirmação ou negação (e.g., "Sim", "Não", "Certo", "Ok", "Por favor", "Deletar!", "Adicionar!", "Cancelar", "Concluir!", "Entendido", "Faça", "Prossiga", "Não quero", "Obrigado", "Bom dia", "Não sei por onde começar", "O que é EIXA?"), **VOCÊ DEVE RETORNAR SOMENTE:**
-        ```json
-        {{
-        "intent_detected": "none"
-        }}
-        ```
-        Não tente interpretar essas mensagens como novas intenções de CRUD/Gerenciamento. Elas são respostas a uma pergunta anterior.
-    3.  Se uma intenção de tarefa, projeto ou rotina for detectada **CLARAMENTE** na ÚLTIMA MENSAGEM (e não for uma resposta de confirmação/negação), retorne um JSON com a seguinte estrutura.
-
-    **ESTRUTURA DE SAÍDA DETALHADA:**
-    ```json
-    {{
-    "intent_detected": "task" | "project" | "routine" | "none",
-    "action": "create" | "update" | "delete" | "complete" | "apply_routine",
-    "item_details": {{
-        // Campos comuns para Task/Project/Routine Item
-        "id": "ID_DO_ITEM_SE_FOR_UPDATE_OU_DELETE_OU_APPLY_ROUTINE",
-        "name": "Nome do projeto ou rotina",
-        "description": "Descrição da tarefa ou da rotina",
-        "date": "YYYY-MM-DD" | null,
-        "time": "HH:MM" | null,
-        "duration_minutes": int | null,
-        "completed": true | false | null,
-        "status": "open" | "completed" | "in_progress" | null,
-
-        // Campos específicos para 'routine'
-        "routine_name": "Nome da Rotina (ex: Rotina Matinal)",
-        "routine_description": "Descrição da rotina (ex: Rotina de trabalho das 9h às 18h)",
-        "days_of_week": ["MONDAY", "TUESDAY", ...] | null,
-        "recurrence_rule": "Diário" | "Semanal" | "Mensal" | "Anual" | "Toda segunda-feira" | "Todo dia 15 do mês" | null, // NOVO CAMPO PARA RECORRÊNCIA
-        "schedule": [
-            {{"id": "UUID_GERADO_PELO_LLM", "time": "HH:MM", "description": "Descrição da atividade", "duration_minutes": int, "type": "task"}}
-        ] | null
-    }},
-    "confirmation_message": "Confirma que deseja...?"
-    }}
-    ```
-    **Regras para Datas, Horas e Duração:**
-    - Para datas, use YYYY-MM-DD. **"hoje" DEVE ser {current_date_iso}. "amanhã" DEVE ser {tomorrow_date_iso}.** "próxima segunda" DEVE ser a data da próxima segunda-feira no formato YYYY-MM-DD. Se nenhuma data for clara, use `null`.
-    - Para horários, use HH:MM. Se o usuário disser "às 2 da tarde", use "14:00". Se não for claro, use `null`.
-    - Para duração, use `duration_minutes` como um número inteiro. "por uma hora" = `60`. "por meia hora" = `30`.
-
-    **EXEMPLOS DE INTENÇÕES E SAÍDAS:**
-    - Usuário: "Crie uma rotina de estudo para mim que se repita semanalmente. Das 9h às 10h estudar python, 10h-10h30 pausa, 10h30-12h fazer exercícios."
-      ```json
-      {{
-      "intent_detected": "routine",
-      "action": "create",
-      "item_details": {{
-          "routine_name": "Rotina de Estudo",
-          "routine_description": "Plano de estudo customizado.",
-          "recurrence_rule": "Semanalmente",
-          "schedule": [
-              {{"id": "UUID_GERADO_PELO_LLM", "time": "09:00", "description": "Estudar Python", "duration_minutes": 60, "type": "task"}},
-              {{"id": "UUID_GERADO_PELO_LLM", "time": "10:00", "description": "Pausa", "duration_minutes": 30, "type": "break"}},
-              {{"id": "UUID_GERADO_PELO_LLM", "time": "10:30", "description": "Fazer exercícios", "duration_minutes": 90, "type": "task"}}
-          ]
-      }},
-      "confirmation_message": "Confirma a criação da rotina 'Rotina de Estudo' com esses horários, repetindo semanalmente?"
-      }}
-      ```
-    - Usuário: "Aplique minha 'Rotina Matinal' para amanhã."
-      ```json
-      {{
-      "intent_detected": "routine",
-      "action": "apply_routine",
-      "item_details": {{
-          "id": "ID_DA_ROTINA_MATINAL_DO_USUARIO_SE_EXISTIR",
-          "routine_name": "Rotina Matinal"
-      }},
-      "date": "{tomorrow_date_iso}",
-      "confirmation_message": "Confirma a aplicação da 'Rotina Matinal' para amanhã?"
-      }}
-      ```
-    """ + routines_context
+    system_instruction_for_action_extraction = INTENT_EXTRACTION_PROMPT.render(
+        current_date=current_date_iso,
+        tomorrow_date=tomorrow_date_iso,
+        timezone=user_profile.get('timezone', DEFAULT_TIMEZONE),
+        routines_context=routines_context,
+    )
 
     logger.debug(f"_extract_llm_action_intent: Processing message '{user_message[:50]}...' for CRUD/Routine intent.")
     llm_history = []
@@ -218,6 +190,311 @@ async def _extract_llm_action_intent(
         return {"intent_detected": "none"}
 
 
+async def _retrieve_relevant_memories(user_id: str, embedding_task: asyncio.Task) -> tuple[list[float] | None, list[dict]]:
+    """Aguarda o embedding da mensagem (compartilhado com o pré-classificador) e busca as memórias relevantes."""
+    user_query_embedding = await embedding_task
+    if not user_query_embedding:
+        return None, []
+    return user_query_embedding, await get_relevant_memories(user_id, user_query_embedding, n_results=5)
+
+
+async def _cancel_speculative_tasks(tasks: list):
+    """Cancela as buscas especulativas que não serão usadas e recolhe seus resultados/erros."""
+    pending = [task for task in tasks if task is not None]
+    for task in pending:
+        if not task.done():
+            task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _parse_combined_response(raw_response: str) -> tuple[dict, str]:
+    """
+    Separa a saída JSON do modo INTENT_MODE='combined' em (intenção de ação, texto da resposta).
+    Se o modelo não devolver JSON válido, o texto bruto é tratado como resposta sem intenção.
+    """
+    text = raw_response.strip()
+    fenced = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        try:
+            data = json.loads(json_match.group(0)) if json_match else None
+        except json.JSONDecodeError:
+            data = None
+    if not isinstance(data, dict):
+        logger.warning("ORCHESTRATOR | Combined response was not valid JSON; using raw text as the reply.")
+        return {"intent_detected": "none"}, raw_response
+    action_intent = data.get("action_intent")
+    if not isinstance(action_intent, dict):
+        action_intent = {"intent_detected": "none"}
+    return action_intent, data.get("response") or ""
+
+
+async def _process_llm_action_intent(
+    user_id: str,
+    action_intent_data: dict,
+    user_profile: Dict[str, Any],
+    all_routines: List[Dict[str, Any]],
+    response_payload: Dict[str, Any],
+    debug_info_logs: list,
+    mode_debug_on: bool,
+    user_input_for_saving: str,
+    source_language: str,
+    firestore_collection_interactions: str,
+    projects_task: asyncio.Task | None = None
+) -> dict | None:
+    """
+    Transforma a intenção de CRUD/Rotina extraída pelo LLM em um payload provisório e pede
+    confirmação ao usuário. Retorna o resultado final da requisição, ou None se não houver
+    intenção de ação (o fluxo segue para a conversa genérica).
+    `projects_task` reaproveita a busca de projetos já iniciada pelo orquestrador.
+    """
+    intent_detected_in_orchestrator = action_intent_data.get("intent_detected", "conversa")
+    if intent_detected_in_orchestrator in ["task", "project", "routine"]: # Google Calendar REMOVIDO AQUI
+        logger.debug(f"ORCHESTRATOR | Detected LLM intent: {intent_detected_in_orchestrator}.")
+        item_type = action_intent_data['intent_detected']
+        action = action_intent_data['action']
+        item_details = action_intent_data['item_details']
+        llm_generated_confirmation_message = action_intent_data.get('confirmation_message')
+
+        provisional_payload_data = item_details.copy() 
+
+        target_date_for_apply = action_intent_data.get('date') 
+
+        provisional_payload = {
+            "user_id": user_id,
+            "item_type": item_type,
+            "action": action,
+            "item_id": item_details.get("id"), 
+            "data": provisional_payload_data, 
+            "date": target_date_for_apply, 
+        }
+
+        confirmation_message = llm_generated_confirmation_message 
+
+        if item_type == 'task':
+            task_description = item_details.get("description")
+            if not task_description:
+                task_description = item_details.get("name") 
+            
+            task_date = provisional_payload_data.get("date") 
+            task_time = provisional_payload_data.get("time")
+            task_duration = provisional_payload_data.get("duration_minutes")
+            task_status = item_details.get("status")
+
+            # Fallback inteligente de data: se LLM não fornecer, usar hoje (UTC ajustado ao timezone do usuário se disponível)
+            if action == 'create' and not task_date:
+                try:
+                    user_tz_name = user_profile.get('timezone', DEFAULT_TIMEZONE)
+                    tz_obj = pytz.timezone(user_tz_name)
+                    task_date = datetime.now(tz_obj).date().isoformat()
+                    logger.info(f"ORCHESTRATOR | Fallback date aplicado para criação de tarefa sem data explícita: {task_date} (timezone {user_tz_name}).")
+                except Exception:
+                    task_date = datetime.utcnow().date().isoformat()
+                    logger.warning(f"ORCHESTRATOR | Timezone inválido '{user_profile.get('timezone')}'. Usando UTC hoje {task_date} como fallback de data.")
+
+            # Fallback de hora: se omitida, assumir '00:00' (início genérico do dia)
+            if action == 'create' and not task_time:
+                task_time = "00:00"
+                logger.info("ORCHESTRATOR | Fallback time aplicado (00:00) para criação de tarefa sem hora explícita.")
+
+            if action == 'create' and not task_description:
+                response_payload["response"] = "Para criar uma tarefa, preciso da descrição. Por favor, informe o que deseja adicionar."
+                response_payload["status"] = "error"
+                if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                return {"response_payload": response_payload}
+
+            if task_date:
+                try:
+                    parsed_date_obj = datetime.strptime(task_date, "%Y-%m-%d").date()
+                    current_date_today = datetime.now(timezone.utc).date()
+                    if parsed_date_obj < current_date_today:
+                        test_current_year = parsed_date_obj.replace(year=current_date_today.year)
+                        if test_current_year >= current_date_today:
+                            task_date = test_current_year.isoformat()
+                            logger.info(f"ORCHESTRATOR | Task date '{parsed_date_obj}' was in the past. Adjusted to {task_date} (current year).")
+                        else:
+                            test_next_year = parsed_date_obj.replace(year=current_date_today.year + 1)
+                            task_date = test_next_year.isoformat()
+                            logger.info(f"ORCHESTRATOR | Task date '{parsed_date_obj}' was in the past. Adjusted to {task_date} (next year).")
+                except ValueError as ve:
+                    logger.warning(f"ORCHESTRATOR | Task date '{task_date}' from LLM could not be parsed for year correction ({ve}). Using original from LLM as fallback.", exc_info=True)
+            
+            provisional_payload['data']['description'] = task_description
+            provisional_payload['data']['date'] = task_date
+            provisional_payload['data']['time'] = task_time
+            provisional_payload['data']['duration_minutes'] = task_duration
+            if task_status and action == 'update':
+                provisional_payload['data']['status'] = task_status
+
+            # Vinculação automática a projeto se o nome aparecer na descrição (melhor esforço)
+            try:
+                all_projects = await projects_task if projects_task is not None else await get_all_projects(user_id)
+                # get_all_projects devolve uma lista de projetos com 'id'; aceita também {project_id: data}.
+                if isinstance(all_projects, dict):
+                    all_projects = [dict(p_data, id=p_id) for p_id, p_data in all_projects.items()]
+                matched_project_id = None
+                for p_data in all_projects or []:
+                    p_name = (p_data.get('name') or '').strip()
+                    if p_name and re.search(rf"\b{re.escape(p_name)}\b", task_description, re.IGNORECASE):
+                        matched_project_id = p_data.get('id')
+                        break
+                if matched_project_id:
+                    provisional_payload['data']['project_id'] = matched_project_id
+                    logger.info(f"ORCHESTRATOR | Projeto '{matched_project_id}' vinculado automaticamente à tarefa pela descrição.")
+            except Exception as e:
+                logger.warning(f"ORCHESTRATOR | Falha ao tentar vincular projeto automático: {e}")
+            if action == 'complete':
+                provisional_payload['action'] = 'update'
+                provisional_payload['data']['completed'] = True
+
+            if not confirmation_message:
+                time_display = f" às {task_time}" if task_time else ""
+                duration_display = f" por {task_duration} minutos" if task_duration else ""
+                if action == 'create':
+                    proj_part = "" if not provisional_payload['data'].get('project_id') else " (vinculada a projeto)"
+                    confirmation_message = f"Confirma que deseja adicionar a tarefa '{task_description}' para {task_date}{time_display}{duration_display}{proj_part}?"
+                elif action == 'complete': confirmation_message = f"Confirma que deseja marcar a tarefa '{task_description}' como concluída?"
+                elif action == 'update': confirmation_message = f"Confirma que deseja atualizar a tarefa '{task_description}'?"
+                elif action == 'delete': confirmation_message = f"Confirma que deseja excluir a tarefa '{task_description}'?"
+
+        elif item_type == 'project':
+            project_name = item_details.get("name")
+            if action == 'create' and not project_name:
+                response_payload["response"] = "Não consegui extrair o nome do projeto. Por favor, seja mais específico."
+                response_payload["status"] = "error"
+                if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                return {"response_payload": response_payload}
+            
+            if not confirmation_message:
+                if action == 'create': confirmation_message = f"Confirma que deseja criar o projeto '{project_name}'?"
+                elif action == 'update': confirmation_message = f"Confirma que deseja atualizar o projeto '{project_name}'?"
+                elif action == 'delete': confirmation_message = f"Confirma que deseja excluir o projeto '{project_name}'?"
+                elif action == 'complete': confirmation_message = f"Confirma que deseja marcar o projeto '{project_name}' como concluído?"
+        
+        elif item_type == 'routine':
+            routine_name = item_details.get("routine_name")
+            target_date_for_apply = action_intent_data.get('date') 
+            
+            if action == 'create':
+                if not routine_name or not item_details.get('schedule'):
+                    response_payload["response"] = "Para criar uma rotina, preciso do nome e dos itens/tarefas que a compõem."
+                    response_payload["status"] = "error"
+                    if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                    await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                    return {"response_payload": response_payload}
+                
+                for task_item in item_details.get('schedule', []):
+                    if not task_item.get('id'):
+                        task_item['id'] = str(uuid.uuid4())
+                
+                provisional_payload['date'] = None
+                # Adiciona o recurrence_rule extraído pelo LLM ao payload
+                provisional_payload['data']['recurrence_rule'] = item_details.get('recurrence_rule', None)
+
+                if not confirmation_message: confirmation_message = f"Confirma a criação da rotina '{routine_name}' com {len(item_details.get('schedule', []))} tarefas?"
+                if provisional_payload['data']['recurrence_rule']:
+                    confirmation_message += f" Repetindo: {provisional_payload['data']['recurrence_rule']}?"
+
+            elif action == 'apply_routine':
+                routine_id_from_llm = item_details.get("id") 
+                routine_name_from_llm = item_details.get("routine_name") 
+
+                provisional_payload['item_id'] = routine_id_from_llm 
+                provisional_payload['date'] = target_date_for_apply 
+                provisional_payload['data'] = {"name": routine_name_from_llm, "id": routine_id_from_llm} 
+
+                # Fallback de data: se LLM não fornecer, assume hoje no timezone do usuário
+                if not target_date_for_apply:
+                    try:
+                        user_tz_name = user_profile.get('timezone', DEFAULT_TIMEZONE)
+                        tz_obj = pytz.timezone(user_tz_name)
+                        inferred_date = datetime.now(tz_obj).date().isoformat()
+                        target_date_for_apply = inferred_date
+                        provisional_payload['date'] = inferred_date
+                        logger.info(f"ORCHESTRATOR | Fallback date aplicado para apply_routine sem data explícita: {inferred_date} (timezone {user_tz_name}).")
+                    except Exception:
+                        inferred_date = datetime.utcnow().date().isoformat()
+                        target_date_for_apply = inferred_date
+                        provisional_payload['date'] = inferred_date
+                        logger.warning(f"ORCHESTRATOR | Timezone inválido em apply_routine. Usando UTC hoje {inferred_date} como fallback.")
+                    # Ajusta mensagem de confirmação posteriormente
+
+                if not routine_id_from_llm and routine_name_from_llm:
+                    found_routine = next((r for r in all_routines if r.get('name', '').lower() == routine_name_from_llm.lower()), None)
+                    if found_routine:
+                        provisional_payload['item_id'] = found_routine['id']
+                        confirmation_message = f"Confirma a aplicação da rotina '{routine_name_from_llm}' para {target_date_for_apply}?"
+                    else:
+                        response_payload["response"] = f"Não encontrei nenhuma rotina chamada '{routine_name_from_llm}'. Por favor, verifique o nome ou crie a rotina primeiro."
+                        response_payload["status"] = "error"
+                        if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                        await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                        return {"response_payload": response_payload}
+                elif routine_id_from_llm and target_date_for_apply:
+                     confirmation_message = f"Confirma a aplicação da rotina para {target_date_for_apply}?"
+                else: 
+                    response_payload["response"] = "Não consegui identificar qual rotina aplicar. Por favor, seja mais específico."
+                    response_payload["status"] = "error"
+                    if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                    await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                    return {"response_payload": response_payload}
+            
+            elif action == 'delete':
+                routine_id_to_delete = item_details.get("id")
+                routine_name_to_delete = item_details.get("routine_name")
+                
+                if not routine_id_to_delete and not routine_name_to_delete:
+                    response_payload["response"] = "Para excluir uma rotina, preciso do nome ou ID dela."
+                    response_payload["status"] = "error"
+                    if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                    await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                    return {"response_payload": response_payload}
+                
+                if not routine_id_to_delete and routine_name_to_delete:
+                    found_routine = next((r for r in all_routines if r.get('name', '').lower() == routine_name_to_delete.lower()), None)
+                    if found_routine:
+                        provisional_payload['item_id'] = found_routine['id']
+                        confirmation_message = f"Confirma a exclusão da rotina '{routine_name_to_delete}'?"
+                    else:
+                        response_payload["response"] = f"Não encontrei nenhuma rotina chamada '{routine_name_to_delete}' para excluir."
+                        response_payload["status"] = "info"
+                        if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+                        await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+                        return {"response_payload": response_payload}
+                else: 
+                    confirmation_message = f"Confirma a exclusão da rotina '{routine_name_to_delete or routine_id_to_delete}'?"
+
+        # Salva o estado de confirmação para todas as ações
+        await set_confirmation_state(
+            user_id,
+            {
+                'awaiting_confirmation': True,
+                'confirmation_payload_cache': provisional_payload,
+                'confirmation_message': confirmation_message
+            }
+        )
+        logger.info(f"ORCHESTRATOR | LLM inferred {item_type} {action} intent for user '{user_id}'. Awaiting confirmation. Provisional payload: {provisional_payload}")
+
+        response_payload["response"] = confirmation_message
+        response_payload["status"] = "awaiting_confirmation"
+        response_payload["debug_info"] = {
+            "intent_detected": intent_detected_in_orchestrator,
+            "action_awaiting_confirmation": action,
+            "item_type_awaiting_confirmation": item_type,
+            "provisional_payload": provisional_payload,
+        }
+        await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
+        if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
+        return {"response_payload": response_payload}
+    return None
+
+
 @measure_async("orchestrator.handle_request")
 async def orchestrate_eixa_response(user_id: str, user_message: str = None, uploaded_file_data: Dict[str, Any] = None,
                                      view_request: str = None, gcp_project_id: str = None, region: str = None,
@@ -361,7 +638,7 @@ async def orchestrate_eixa_response(user_id: str, user_message: str = None, uplo
                     logger.info(f"ORCHESTRATOR | Long-term memory (profile) requested but display is disabled for user '{user_id}'.")
             # NOVO: View Request para verificar status de conexão do Google Calendar
             elif view_request == "google_calendar_connection_status":
-                is_connected = await google_calendar_auth_manager.get_credentials(user_id) is not None
+                is_connected = await get_google_calendar_utils().is_connected(user_id)
                 response_payload["html_view_data"]["google_calendar_connected_status"] = is_connected
                 response_payload["response"] = f"Status de conexão Google Calendar: {'Conectado' if is_connected else 'Não Conectado'}."
                 logger.info(f"ORCHESTRATOR | Google Calendar connection status requested. Is Connected: {is_connected}")
@@ -481,12 +758,12 @@ async def orchestrate_eixa_response(user_id: str, user_message: str = None, uplo
         html_view_update = {}
 
         if action == "connect_calendar":
-            current_creds = await google_calendar_auth_manager.get_credentials(user_id)
+            current_creds = await get_google_calendar_utils().get_credentials(user_id)
             if current_creds:
                 result = {"status": "info", "message": "Você já está conectado ao Google Calendar."}
             else:
                 try:
-                    auth_url = await google_calendar_auth_manager.get_auth_url(user_id)
+                    auth_url = await get_google_calendar_utils().get_auth_url(user_id)
                     result = {"status": "success", "message": "Por favor, clique no link para conectar seu Google Calendar. Se a janela não abrir automaticamente, copie e cole no seu navegador:", "google_auth_redirect_url": auth_url}
                     logger.info(f"ORCHESTRATOR | Generated Google Auth URL for user {user_id}: {auth_url}")
                 except Exception as e:
@@ -500,17 +777,24 @@ async def orchestrate_eixa_response(user_id: str, user_message: str = None, uplo
             start_date_obj = datetime.fromisoformat(start_date_str) if start_date_str else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
             end_date_obj = datetime.fromisoformat(end_date_str) if end_date_str else start_date_obj + timedelta(days=7) # Padrão: 7 dias
 
-            creds = await google_calendar_auth_manager.get_credentials(user_id)
+            creds = await get_google_calendar_utils().get_credentials(user_id)
             if not creds:
                 result = {"status": "info", "message": "Para sincronizar, sua conta Google precisa estar conectada. Por favor, conecte-a primeiro."}
             else:
-                sync_result = await sync_google_calendar_events_to_eixa(user_id, start_date_obj, end_date_obj)
+                if action_data.get('account_id') or action_data.get('calendar_id'):
+                    sync_result = await sync_google_calendar_events_to_eixa(
+                        user_id, start_date_obj, end_date_obj,
+                        account_id=action_data.get('account_id'), calendar_id=action_data.get('calendar_id') or 'primary'
+                    )
+                else:
+                    # Padrão: todas as contas e agendas vinculadas, mescladas numa única sincronização.
+                    sync_result = await sync_all_google_calendars_to_eixa(user_id, start_date_obj, end_date_obj)
                 result = {"status": sync_result.get("status"), "message": sync_result.get("message", "Sincronização com Google Calendar concluída!")}
                 if result.get("status") == "success":
                     html_view_update["agenda"] = await get_all_daily_tasks(user_id)
         
         elif action == "disconnect_calendar":
-            delete_result = await google_calendar_auth_manager.delete_credentials(user_id)
+            delete_result = await get_google_calendar_utils().delete_credentials(user_id)
             if delete_result.get("status") == "success":
                 result = {"status": "success", "message": "Sua conta Google foi desconectada da EIXA."}
             else:
@@ -762,375 +1046,196 @@ async def orchestrate_eixa_response(user_id: str, user_message: str = None, uplo
             return {"response_payload": response_payload}
 
     # 7.3. Extração de Intenções CRUD/Rotina pela LLM
-    logger.debug(f"ORCHESTRATOR | Calling _extract_llm_action_intent.")
-    action_intent_data = await _extract_llm_action_intent(
-        user_id,
-        user_message_for_processing,
-        full_history,
-        gemini_api_key,
-        gemini_text_model,
-        user_profile,
-        all_routines,
-        gcp_project_id=gcp_project_id,
-        region=region
-    )
-    intent_detected_in_orchestrator = action_intent_data.get("intent_detected", "conversa")
-    logger.debug(f"ORCHESTRATOR | LLM intent extraction result: {intent_detected_in_orchestrator}")
-
-
-    # 7.4. Processamento de Intenções LLM (Task, Project, Routine)
-    if intent_detected_in_orchestrator in ["task", "project", "routine"]: # Google Calendar REMOVIDO AQUI
-        logger.debug(f"ORCHESTRATOR | Detected LLM intent: {intent_detected_in_orchestrator}.")
-        item_type = action_intent_data['intent_detected']
-        action = action_intent_data['action']
-        item_details = action_intent_data['item_details']
-        llm_generated_confirmation_message = action_intent_data.get('confirmation_message')
-
-        provisional_payload_data = item_details.copy() 
-
-        target_date_for_apply = action_intent_data.get('date') 
-
-        provisional_payload = {
-            "user_id": user_id,
-            "item_type": item_type,
-            "action": action,
-            "item_id": item_details.get("id"), 
-            "data": provisional_payload_data, 
-            "date": target_date_for_apply, 
-        }
-
-        confirmation_message = llm_generated_confirmation_message 
-
-        if item_type == 'task':
-            task_description = item_details.get("description")
-            if not task_description:
-                task_description = item_details.get("name") 
-            
-            task_date = provisional_payload_data.get("date") 
-            task_time = provisional_payload_data.get("time")
-            task_duration = provisional_payload_data.get("duration_minutes")
-            task_status = item_details.get("status")
-
-            # Fallback inteligente de data: se LLM não fornecer, usar hoje (UTC ajustado ao timezone do usuário se disponível)
-            if action == 'create' and not task_date:
-                try:
-                    user_tz_name = user_profile.get('timezone', DEFAULT_TIMEZONE)
-                    tz_obj = pytz.timezone(user_tz_name)
-                    task_date = datetime.now(tz_obj).date().isoformat()
-                    logger.info(f"ORCHESTRATOR | Fallback date aplicado para criação de tarefa sem data explícita: {task_date} (timezone {user_tz_name}).")
-                except Exception:
-                    task_date = datetime.utcnow().date().isoformat()
-                    logger.warning(f"ORCHESTRATOR | Timezone inválido '{user_profile.get('timezone')}'. Usando UTC hoje {task_date} como fallback de data.")
-
-            # Fallback de hora: se omitida, assumir '00:00' (início genérico do dia)
-            if action == 'create' and not task_time:
-                task_time = "00:00"
-                logger.info("ORCHESTRATOR | Fallback time aplicado (00:00) para criação de tarefa sem hora explícita.")
-
-            if action == 'create' and not task_description:
-                response_payload["response"] = "Para criar uma tarefa, preciso da descrição. Por favor, informe o que deseja adicionar."
-                response_payload["status"] = "error"
-                if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                return {"response_payload": response_payload}
-
-            if task_date:
-                try:
-                    parsed_date_obj = datetime.strptime(task_date, "%Y-%m-%d").date()
-                    current_date_today = datetime.now(timezone.utc).date()
-                    if parsed_date_obj < current_date_today:
-                        test_current_year = parsed_date_obj.replace(year=current_date_today.year)
-                        if test_current_year >= current_date_today:
-                            task_date = test_current_year.isoformat()
-                            logger.info(f"ORCHESTRATOR | Task date '{parsed_date_obj}' was in the past. Adjusted to {task_date} (current year).")
-                        else:
-                            test_next_year = parsed_date_obj.replace(year=current_date_today.year + 1)
-                            task_date = test_next_year.isoformat()
-                            logger.info(f"ORCHESTRATOR | Task date '{parsed_date_obj}' was in the past. Adjusted to {task_date} (next year).")
-                except ValueError as ve:
-                    logger.warning(f"ORCHESTRATOR | Task date '{task_date}' from LLM could not be parsed for year correction ({ve}). Using original from LLM as fallback.", exc_info=True)
-            
-            provisional_payload['data']['description'] = task_description
-            provisional_payload['data']['date'] = task_date
-            provisional_payload['data']['time'] = task_time
-            provisional_payload['data']['duration_minutes'] = task_duration
-            if task_status and action == 'update':
-                provisional_payload['data']['status'] = task_status
-
-            # Vinculação automática a projeto se o nome aparecer na descrição (melhor esforço)
-            try:
-                all_projects_map = await get_all_projects(user_id)
-                # all_projects_map esperado: {project_id: {data...}}
-                matched_project_id = None
-                if isinstance(all_projects_map, dict):
-                    for p_id, p_data in all_projects_map.items():
-                        p_name = (p_data.get('name') or '').strip()
-                        if p_name and re.search(rf"\b{re.escape(p_name)}\b", task_description, re.IGNORECASE):
-                            matched_project_id = p_id
-                            break
-                if matched_project_id:
-                    provisional_payload['data']['project_id'] = matched_project_id
-                    logger.info(f"ORCHESTRATOR | Projeto '{matched_project_id}' vinculado automaticamente à tarefa pela descrição.")
-            except Exception as e:
-                logger.warning(f"ORCHESTRATOR | Falha ao tentar vincular projeto automático: {e}")
-            if action == 'complete':
-                provisional_payload['action'] = 'update'
-                provisional_payload['data']['completed'] = True
-
-            if not confirmation_message:
-                time_display = f" às {task_time}" if task_time else ""
-                duration_display = f" por {task_duration} minutos" if task_duration else ""
-                if action == 'create':
-                    proj_part = "" if not provisional_payload['data'].get('project_id') else " (vinculada a projeto)"
-                    confirmation_message = f"Confirma que deseja adicionar a tarefa '{task_description}' para {task_date}{time_display}{duration_display}{proj_part}?"
-                elif action == 'complete': confirmation_message = f"Confirma que deseja marcar a tarefa '{task_description}' como concluída?"
-                elif action == 'update': confirmation_message = f"Confirma que deseja atualizar a tarefa '{task_description}'?"
-                elif action == 'delete': confirmation_message = f"Confirma que deseja excluir a tarefa '{task_description}'?"
-
-        elif item_type == 'project':
-            project_name = item_details.get("name")
-            if action == 'create' and not project_name:
-                response_payload["response"] = "Não consegui extrair o nome do projeto. Por favor, seja mais específico."
-                response_payload["status"] = "error"
-                if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                return {"response_payload": response_payload}
-            
-            if not confirmation_message:
-                if action == 'create': confirmation_message = f"Confirma que deseja criar o projeto '{project_name}'?"
-                elif action == 'update': confirmation_message = f"Confirma que deseja atualizar o projeto '{project_name}'?"
-                elif action == 'delete': confirmation_message = f"Confirma que deseja excluir o projeto '{project_name}'?"
-                elif action == 'complete': confirmation_message = f"Confirma que deseja marcar o projeto '{project_name}' como concluído?"
-        
-        elif item_type == 'routine':
-            routine_name = item_details.get("routine_name")
-            target_date_for_apply = action_intent_data.get('date') 
-            
-            if action == 'create':
-                if not routine_name or not item_details.get('schedule'):
-                    response_payload["response"] = "Para criar uma rotina, preciso do nome e dos itens/tarefas que a compõem."
-                    response_payload["status"] = "error"
-                    if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                    await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                    return {"response_payload": response_payload}
-                
-                for task_item in item_details.get('schedule', []):
-                    if not task_item.get('id'):
-                        task_item['id'] = str(uuid.uuid4())
-                
-                provisional_payload['date'] = None
-                # Adiciona o recurrence_rule extraído pelo LLM ao payload
-                provisional_payload['data']['recurrence_rule'] = item_details.get('recurrence_rule', None)
-
-                if not confirmation_message: confirmation_message = f"Confirma a criação da rotina '{routine_name}' com {len(item_details.get('schedule', []))} tarefas?"
-                if provisional_payload['data']['recurrence_rule']:
-                    confirmation_message += f" Repetindo: {provisional_payload['data']['recurrence_rule']}?"
-
-            elif action == 'apply_routine':
-                routine_id_from_llm = item_details.get("id") 
-                routine_name_from_llm = item_details.get("routine_name") 
-
-                provisional_payload['item_id'] = routine_id_from_llm 
-                provisional_payload['date'] = target_date_for_apply 
-                provisional_payload['data'] = {"name": routine_name_from_llm, "id": routine_id_from_llm} 
+    # No modo 'classifier', um pré-classificador local evita a chamada ao extrator para mensagens
+    # sem intenção de ação (a maioria). No modo 'combined', a intenção vem junto da resposta
+    # principal (seção 8) em uma única chamada estruturada.
+    # O contexto do prompt principal (embedding + memórias, tarefas, projetos, status do calendário)
+    # começa a ser buscado já aqui, em paralelo com a extração de intenção; se o turno sair antes de
+    # consumi-lo (fluxo de confirmação de CRUD, erro), as buscas pendentes são canceladas no finally.
+    user_query_embedding = None
+    embedding_task = memories_task = tasks_task = projects_task = calendar_connected_task = None
+    document_chunks_task = None
+    try:
+        if user_message_for_processing and gcp_project_id and region:
+            embedding_task = asyncio.create_task(get_embedding(user_message_for_processing, gcp_project_id, region, model_name=EMBEDDING_MODEL_NAME))
+            memories_task = asyncio.create_task(_retrieve_relevant_memories(user_id, embedding_task))
+        tasks_task = asyncio.create_task(get_all_daily_tasks(user_id))
+        projects_task = asyncio.create_task(get_all_projects(user_id))
+        calendar_connected_task = asyncio.create_task(get_google_calendar_utils().is_connected(user_id))
+        # PDF/DOCX deste turno: indexação vetorial (trechos + embeddings em lote) em paralelo com o resto do turno.
+        # Trechos de documentos enviados antes entram como contexto quando a mensagem se refere a eles.
+        uploaded_document = input_parser_results.get('document')
+        document_embeddings_task = document_chunks_task = None
+        if uploaded_document and gcp_project_id and region:
+            document_embeddings_task = document_ingestion.start_document_ingestion(user_id, uploaded_document, gcp_project_id, region)
+        if embedding_task is not None and document_ingestion.ingestion_available():
+            document_chunks_task = asyncio.create_task(document_ingestion.retrieve_document_chunks(user_id, embedding_task))
+
+        should_extract_intent = INTENT_MODE != "combined"
+        if INTENT_MODE == "classifier" and user_message_for_processing:
+            intent_classifier = get_intent_classifier()
+            if intent_classifier.uses_embedding and embedding_task is not None:
+                user_query_embedding = await embedding_task
+            intent_prediction = intent_classifier.predict(user_message_for_processing, user_query_embedding)
+            should_extract_intent = intent_prediction.probability >= INTENT_CLASSIFIER_THRESHOLD
+            debug_info_logs.append(
+                f"Intent pre-classifier: p={intent_prediction.probability:.2f} ({', '.join(intent_prediction.matched_features) or 'no features'}) -> "
+                f"{'LLM extraction' if should_extract_intent else 'extraction skipped'}."
+            )
 
-                # Fallback de data: se LLM não fornecer, assume hoje no timezone do usuário
-                if not target_date_for_apply:
-                    try:
-                        user_tz_name = user_profile.get('timezone', DEFAULT_TIMEZONE)
-                        tz_obj = pytz.timezone(user_tz_name)
-                        inferred_date = datetime.now(tz_obj).date().isoformat()
-                        target_date_for_apply = inferred_date
-                        provisional_payload['date'] = inferred_date
-                        logger.info(f"ORCHESTRATOR | Fallback date aplicado para apply_routine sem data explícita: {inferred_date} (timezone {user_tz_name}).")
-                    except Exception:
-                        inferred_date = datetime.utcnow().date().isoformat()
-                        target_date_for_apply = inferred_date
-                        provisional_payload['date'] = inferred_date
-                        logger.warning(f"ORCHESTRATOR | Timezone inválido em apply_routine. Usando UTC hoje {inferred_date} como fallback.")
-                    # Ajusta mensagem de confirmação posteriormente
+        if should_extract_intent:
+            logger.debug(f"ORCHESTRATOR | Calling _extract_llm_action_intent.")
+            action_intent_data = await _extract_llm_action_intent(
+                user_id,
+                user_message_for_processing,
+                full_history,
+                gemini_api_key,
+                gemini_text_model,
+                user_profile,
+                all_routines,
+                gcp_project_id=gcp_project_id,
+                region=region
+            )
+        else:
+            action_intent_data = {"intent_detected": "none"}
+        intent_detected_in_orchestrator = action_intent_data.get("intent_detected", "conversa")
+        detected_intent = intent_detected_in_orchestrator if should_extract_intent else None
+        logger.debug(f"ORCHESTRATOR | LLM intent extraction result: {intent_detected_in_orchestrator}")
 
-                if not routine_id_from_llm and routine_name_from_llm:
-                    found_routine = next((r for r in all_routines if r.get('name', '').lower() == routine_name_from_llm.lower()), None)
-                    if found_routine:
-                        provisional_payload['item_id'] = found_routine['id']
-                        confirmation_message = f"Confirma a aplicação da rotina '{routine_name_from_llm}' para {target_date_for_apply}?"
-                    else:
-                        response_payload["response"] = f"Não encontrei nenhuma rotina chamada '{routine_name_from_llm}'. Por favor, verifique o nome ou crie a rotina primeiro."
-                        response_payload["status"] = "error"
-                        if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                        await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                        return {"response_payload": response_payload}
-                elif routine_id_from_llm and target_date_for_apply:
-                     confirmation_message = f"Confirma a aplicação da rotina para {target_date_for_apply}?"
-                else: 
-                    response_payload["response"] = "Não consegui identificar qual rotina aplicar. Por favor, seja mais específico."
-                    response_payload["status"] = "error"
-                    if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                    await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                    return {"response_payload": response_payload}
-            
-            elif action == 'delete':
-                routine_id_to_delete = item_details.get("id")
-                routine_name_to_delete = item_details.get("routine_name")
-                
-                if not routine_id_to_delete and not routine_name_to_delete:
-                    response_payload["response"] = "Para excluir uma rotina, preciso do nome ou ID dela."
-                    response_payload["status"] = "error"
-                    if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                    await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                    return {"response_payload": response_payload}
-                
-                if not routine_id_to_delete and routine_name_to_delete:
-                    found_routine = next((r for r in all_routines if r.get('name', '').lower() == routine_name_to_delete.lower()), None)
-                    if found_routine:
-                        provisional_payload['item_id'] = found_routine['id']
-                        confirmation_message = f"Confirma a exclusão da rotina '{routine_name_to_delete}'?"
-                    else:
-                        response_payload["response"] = f"Não encontrei nenhuma rotina chamada '{routine_name_to_delete}' para excluir."
-                        response_payload["status"] = "info"
-                        if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-                        await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-                        return {"response_payload": response_payload}
-                else: 
-                    confirmation_message = f"Confirma a exclusão da rotina '{routine_name_to_delete or routine_id_to_delete}'?"
 
-        # Salva o estado de confirmação para todas as ações
-        await set_confirmation_state(
-            user_id,
-            {
-                'awaiting_confirmation': True,
-                'confirmation_payload_cache': provisional_payload,
-                'confirmation_message': confirmation_message
-            }
+        # 7.4. Processamento de Intenções LLM (Task, Project, Routine)
+        intent_result = await _process_llm_action_intent(
+            user_id, action_intent_data, user_profile, all_routines, response_payload, debug_info_logs,
+            mode_debug_on, user_input_for_saving, source_language, firestore_collection_interactions,
+            projects_task=projects_task
         )
-        logger.info(f"ORCHESTRATOR | LLM inferred {item_type} {action} intent for user '{user_id}'. Awaiting confirmation. Provisional payload: {provisional_payload}")
+        if intent_result:
+            return intent_result
 
-        response_payload["response"] = confirmation_message
-        response_payload["status"] = "awaiting_confirmation"
-        response_payload["debug_info"] = {
-            "intent_detected": intent_detected_in_orchestrator,
-            "action_awaiting_confirmation": action,
-            "item_type_awaiting_confirmation": item_type,
-            "provisional_payload": provisional_payload,
-        }
-        await save_interaction(user_id, user_input_for_saving, response_payload["response"], source_language, firestore_collection_interactions)
-        if mode_debug_on: response_payload["debug_info"].setdefault("orchestrator_debug_log", []).extend(debug_info_logs)
-        return {"response_payload": response_payload}
 
-
-    # --- 8. Lógica de Conversação Genérica com LLM (Se nenhuma intenção específica foi tratada) ---
-    logger.debug(f"ORCHESTRATOR | No specific intent or direct action detected. Proceeding with main inference flow.")
+        # --- 8. Lógica de Conversação Genérica com LLM (Se nenhuma intenção específica foi tratada) ---
+        logger.debug(f"ORCHESTRATOR | No specific intent or direct action detected. Proceeding with main inference flow.")
     
-    conversation_history = []
-    recent_history_for_llm = full_history[-5:]
-    for turn in recent_history_for_llm:
-        if turn.get("input"): conversation_history.append({"role": "user", "parts": [{"text": turn.get("input")}]})
-        if turn.get("output"): conversation_history.append({"role": "model", "parts": [{"text": turn.get("output")}]})
-    debug_info_logs.append(f"History prepared with {len(recent_history_for_llm)} turns for LLM context.")
-
-    current_datetime_utc = datetime.now(timezone.utc)
-    day_names_pt = {0: "segunda-feira", 1: "terça-feira", 2: "quarta-feira", 3: "quinta-feira", 4: "sexta-feira", 5: "sábado", 6: "domingo"}
-    current_date_iso_formatted = current_datetime_utc.strftime('%Y-%m-%d')
-    current_time_formatted = current_datetime_utc.strftime('%H:%M')
-
-    # CONTEXTO TEMPORAL MELHORADO
-    contexto_temporal = f"""--- CONTEXTO TEMPORAL ATUAL ---
+        conversation_history = []
+        recent_history_for_llm = full_history[-5:]
+        for turn in recent_history_for_llm:
+            if turn.get("input"): conversation_history.append({"role": "user", "parts": [{"text": turn.get("input")}]})
+            if turn.get("output"): conversation_history.append({"role": "model", "parts": [{"text": turn.get("output")}]})
+        debug_info_logs.append(f"History prepared with {len(recent_history_for_llm)} turns for LLM context.")
+
+        current_datetime_utc = datetime.now(timezone.utc)
+        day_names_pt = {0: "segunda-feira", 1: "terça-feira", 2: "quarta-feira", 3: "quinta-feira", 4: "sexta-feira", 5: "sábado", 6: "domingo"}
+        current_date_iso_formatted = current_datetime_utc.strftime('%Y-%m-%d')
+        current_time_formatted = current_datetime_utc.strftime('%H:%M')
+
+        # CONTEXTO TEMPORAL MELHORADO
+        contexto_temporal = f"""--- CONTEXTO TEMPORAL ATUAL ---
     A data atual é {current_date_iso_formatted} ({day_names_pt[current_datetime_utc.weekday()]}). O horário atual é {current_time_formatted}. O ano atual é {current_datetime_utc.year}.
     O fuso horário do usuário é {user_profile.get('timezone', DEFAULT_TIMEZONE)}.
+    user_display_name: {user_display_name}
     --- FIM DO CONTEXTO TEMPORAL ---\n\n"""
-    debug_info_logs.append("Temporal context generated for LLM.")
-
-    # Memória Vetorial (Contextualização de Longo prazo)
-    if user_message_for_processing and gcp_project_id and region:
-        logger.debug(f"ORCHESTRATOR | Attempting to generate embedding for user query.")
-        user_query_embedding = await get_embedding(user_message_for_processing, gcp_project_id, region, model_name=EMBEDDING_MODEL_NAME)
-        if user_query_embedding:
-            relevant_memories = await get_relevant_memories(user_id, user_query_embedding, n_results=5)
-            if relevant_memories:
-                context_string = "\n".join(["--- CONTEXTO DE MEMÓRIAS RELEVANTES DE LONGO PRAZO:"] + [f"- {mem['content']}" for mem in relevant_memories])
-                logger.info(f"ORCHESTRATOR | Adding {len(relevant_memories)} relevant memories to LLM context for user '{user_id}'.")
-                conversation_history.insert(0, {"role": "user", "parts": [{"text": context_string}]})
-        else:
-            logger.warning(f"ORCHESTRATOR | Could not generate embedding for user message. Skipping vector memory retrieval.", exc_info=True)
-            debug_info_logs.append("Warning: Embedding generation failed, vector memory not used.")
-
-    conversation_history.append({"role": "user", "parts": user_prompt_parts})
-
-    # Constrói o contexto crítico de tarefas, projetos e AGORA ROTINAS
-    contexto_critico = "--- TAREFAS PENDENTES, PROJETOS ATIVOS E ROTINAS SALVAS DO USUÁRIO ---\n"
-    logger.debug(f"ORCHESTRATOR | Fetching all daily tasks, projects and routines for critical context.")
-    current_tasks = await get_all_daily_tasks(user_id)
-    flat_current_tasks = []
-    for date_key, day_data in current_tasks.items():
-        for task_data in day_data.get('tasks', []):
+        debug_info_logs.append("Temporal context generated for LLM.")
+
+        # Memória Vetorial (Contextualização de Longo prazo)
+        memory_items = []
+        if memories_task is not None:
+            user_query_embedding, relevant_memories = await memories_task
+            if user_query_embedding:
+                if relevant_memories:
+                    # get_relevant_memories já devolve as memórias da mais para a menos similar.
+                    memory_items = [f"- {mem['content']}" for mem in relevant_memories]
+                    logger.info(f"ORCHESTRATOR | Adding {len(relevant_memories)} relevant memories to LLM context for user '{user_id}'.")
+            else:
+                logger.warning(f"ORCHESTRATOR | Could not generate embedding for user message. Skipping vector memory retrieval.", exc_info=True)
+                debug_info_logs.append("Warning: Embedding generation failed, vector memory not used.")
+
+        # Documento grande: só os trechos mais relevantes para a pergunta vão ao prompt; o documento
+        # inteiro fica indexado para as próximas perguntas.
+        if document_embeddings_task is not None and uploaded_document.text_chars > DOCUMENT_INLINE_MAX_CHARS:
+            try:
+                chunk_embeddings = await document_embeddings_task
+                selected_chunks = await document_ingestion.select_document_chunks(user_id, uploaded_document, user_query_embedding, chunk_embeddings)
+                user_prompt_parts[uploaded_document.part_index] = {"text": document_ingestion.format_document_excerpts(uploaded_document, selected_chunks)}
+                debug_info_logs.append(f"Document '{uploaded_document.filename}': {len(selected_chunks)}/{len(uploaded_document.chunks)} chunks sent to the LLM.")
+            except Exception as e:
+                logger.error(f"ORCHESTRATOR | Document chunk selection failed for user '{user_id}': {e}. Sending the extracted text.", exc_info=True)
+
+        document_items = []
+        if document_chunks_task is not None:
+            current_document_prefix = uploaded_document.memory_id_prefix(user_id) if uploaded_document else None
+            document_items = [
+                f"- [{chunk.get('input') or 'documento'}] {chunk['content']}"
+                for chunk in await document_chunks_task
+                if not (current_document_prefix and chunk.get('memory_id', '').startswith(current_document_prefix))
+            ]
+            if document_items:
+                logger.info(f"ORCHESTRATOR | Adding {len(document_items)} document chunks to LLM context for user '{user_id}'.")
+
+        conversation_history.append({"role": "user", "parts": user_prompt_parts})
+        conversation_history = trim_history(conversation_history, CONVERSATION_HARD_LIMIT_TOKENS)
+
+        # Constrói o contexto crítico de tarefas, projetos e AGORA ROTINAS
+        logger.debug(f"ORCHESTRATOR | Fetching all daily tasks, projects and routines for critical context.")
+        current_tasks = await tasks_task
+        # Ordem de relevância (o assembler corta do fim da lista).
+        flat_current_tasks = []
+        for date_key, task_data in _rank_tasks_for_context(current_tasks, current_date_iso_formatted):
             status = 'Concluída' if task_data.get('completed', False) else 'Pendente'
             time_info = f" às {task_data.get('time', 'N/A')}" if task_data.get('time') else ""
             duration_info = f" por {task_data.get('duration_minutes', 'N/A')} minutos" if task_data.get('duration_minutes') else ""
-            
+        
             origin_info = ""
             if task_data.get('origin') == 'routine':
                 origin_info = " (Origem: Rotina)"
             elif task_data.get('origin') == 'google_calendar':
                 origin_info = " (Origem: Google Calendar)"
-            
+        
             task_id_info = f" (ID: {task_data.get('id', 'N/A')})" if task_data.get('id') else ""
             created_at_info = f" (Adicionada em: {task_data.get('created_at', 'N/A')})" if task_data.get('created_at') else ""
 
 
             flat_current_tasks.append(f"- {task_data.get('description', 'N/A')} (Data: {date_key}{time_info}{duration_info}, Status: {status}{origin_info}{task_id_info}{created_at_info})")
 
-    current_projects = await get_all_projects(user_id)
-    formatted_projects = []
-    for project in current_projects:
-        status = project.get('status', 'N/A')
-        deadline = project.get('deadline', 'N/A')
-        formatted_projects.append(f"- {project.get('name', 'N/A')} (Status: {status}, Prazo: {deadline})")
+        current_projects = await projects_task
+        formatted_projects = []
+        for project in current_projects:
+            status = project.get('status', 'N/A')
+            deadline = project.get('deadline', 'N/A')
+            formatted_projects.append(f"- {project.get('name', 'N/A')} (Status: {status}, Prazo: {deadline})")
     
-    formatted_routines = []
-    if all_routines:
-        for routine in all_routines:
-            routine_name = routine.get('name', 'Rotina sem nome')
-            routine_id = routine.get('id', 'N/A')
-            routine_desc = routine.get('description', 'N/A')
-            routine_days = ", ".join(routine.get('applies_to_days', [])) if routine.get('applies_to_days') else 'Todos os dias'
-            recurrence_rule_info = f", Recorrência: {routine.get('recurrence_rule', 'N/A')}" if routine.get('recurrence_rule') else "" # NOVO
-            schedule_summary = []
-            for item in routine.get('schedule', []):
-                item_id = item.get('id', 'N/A')
-                item_time = item.get('time', 'N/A')
-                item_desc = item.get('description', 'N/A')
-                item_duration = item.get('duration_minutes', 'N/A')
-                item_created_at = item.get('created_at', 'N/A')
-                schedule_summary.append(f"({item_id}) {item_time} - {item_desc} ({item_duration}min, Criada em: {item_created_at})")
+        formatted_routines = []
+        if all_routines:
+            for routine in all_routines:
+                routine_name = routine.get('name', 'Rotina sem nome')
+                routine_id = routine.get('id', 'N/A')
+                routine_desc = routine.get('description', 'N/A')
+                routine_days = ", ".join(routine.get('applies_to_days', [])) if routine.get('applies_to_days') else 'Todos os dias'
+                recurrence_rule_info = f", Recorrência: {routine.get('recurrence_rule', 'N/A')}" if routine.get('recurrence_rule') else "" # NOVO
+                schedule_summary = []
+                for item in routine.get('schedule', []):
+                    item_id = item.get('id', 'N/A')
+                    item_time = item.get('time', 'N/A')
+                    item_desc = item.get('description', 'N/A')
+                    item_duration = item.get('duration_minutes', 'N/A')
+                    item_created_at = item.get('created_at', 'N/A')
+                    schedule_summary.append(f"({item_id}) {item_time} - {item_desc} ({item_duration}min, Criada em: {item_created_at})")
             
-            formatted_routines.append(f"- Rotina '{routine_name}' (ID: {routine_id}, Descrição: {routine_desc}, Aplica-se a: {routine_days}{recurrence_rule_info}). Itens: {'; '.join(schedule_summary)}")
+                formatted_routines.append(f"- Rotina '{routine_name}' (ID: {routine_id}, Descrição: {routine_desc}, Aplica-se a: {routine_days}{recurrence_rule_info}). Itens: {'; '.join(schedule_summary)}")
 
 
-    if flat_current_tasks:
-        contexto_critico += "Tarefas Pendentes:\n" + "\n".join(flat_current_tasks) + "\n"
-    else: contexto_critico += "Nenhuma tarefa pendente registrada.\n"
-    
-    if formatted_projects:
-        contexto_critico += "\nProjetos Ativos:\n" + "\n".join(formatted_projects) + "\n"
-    else: contexto_critico += "\nNenhum projeto ativo registrado.\n"
-
-    if formatted_routines:
-        contexto_critico += "\nRotinas Salvas:\n" + "\n".join(formatted_routines) + "\n"
-    else: contexto_critico += "\nNenhuma rotina salva.\n"
-
-    google_calendar_status = "Não Conectado"
-    if await google_calendar_auth_manager.get_credentials(user_id):
-        google_calendar_status = "Conectado"
-    contexto_critico += f"\nStatus do Google Calendar: {google_calendar_status}\n"
-    
-    contexto_critico += "--- FIM DO CONTEXTO CRÍTICO ---\n\n"
+        google_calendar_status = "Não Conectado"
+        if await calendar_connected_task:
+            google_calendar_status = "Conectado"
+    finally:
+        # No-op quando o turno já consumiu todas; cancela as pendentes em qualquer outra saída (intenção tratada, erro).
+        await _cancel_speculative_tasks([embedding_task, memories_task, tasks_task, projects_task, calendar_connected_task, document_chunks_task])
+
     debug_info_logs.append("Critical context generated for LLM.")
 
 
     # Constrói o contexto de perfil (detalhado) - SEM ALTERAÇÕES AQUI. Manter o que já tinha
-    base_persona_with_name = base_eixa_persona_template_text.replace("{{user_display_name}}", user_display_name)
-    contexto_perfil_str = f"--- CONTEXTO DO PERFIL DO USUÁRIO ({user_display_name}):\n"
+    # Persona + Rich UI formam o prefixo estático (compilado uma vez; o nome do usuário vai no contexto temporal).
+    static_prompt_prefix = compile_main_prompt_prefix(base_eixa_persona_template_text)
     profile_summary_parts = []
     if user_profile.get('psychological_profile'):
         psych = user_profile['psychological_profile']
@@ -1195,74 +1300,121 @@ async def orchestrate_eixa_response(user_id: str, user_message: str = None, uplo
     if user_profile.get('gender_identity'): profile_summary_parts.append(f"   - Gênero: {user_profile['gender_identity']}")
     if user_profile.get('education_level'): profile_summary_parts.append(f"   - Nível Educacional: {user_profile['education_level']}")
 
-    contexto_perfil_str += "\n".join(profile_summary_parts) if profile_summary_parts else "   Nenhum dado de perfil detalhado disponível.\n"
-    contexto_perfil_str += "--- FIM DO CONTEXTO DE PERFIL ---\n\n"
-
-    # Instruções de Rich UI Components para o LLM
-    rich_ui_instructions = """
-
---- INSTRUÇÕES PARA RICH UI COMPONENTS ---
-Você pode enriquecer suas respostas com componentes visuais interativos usando a sintaxe ```rich-ui```. Use quando apropriado:
-
-1. **Calendar Invite** (quando mencionar eventos/reuniões):
-```rich-ui
-{
-  "type": "calendar_invite",
-  "title": "Reunião de Planejamento",
-  "date": "2025-11-30",
-  "time": "14:00",
-  "duration": "60min"
-}
-```
-
-2. **Chart** (quando mostrar progresso/estatísticas):
-```rich-ui
-{
-  "type": "chart",
-  "title": "Tarefas Concluídas",
-  "chartType": "line",
-  "data": {
-    "labels": ["Seg", "Ter", "Qua", "Qui", "Sex"],
-    "values": [3, 5, 4, 7, 6]
-  }
-}
-```
-
-3. **Quick Action** (quando sugerir ações rápidas):
-```rich-ui
-{
-  "type": "quick_action",
-  "action": "create_task",
-  "label": "Criar Tarefa",
-  "icon": "add_task"
-}
-```
-
-**REGRAS:**
-- Use Rich UI APENAS quando houver contexto claro (datas, dados, ações)
-- NÃO use se faltar informações (date, time, labels, etc.)
-- Coloque o bloco ```rich-ui``` APÓS sua resposta textual
-- Um bloco Rich UI por resposta (escolha o mais relevante)
---- FIM DAS INSTRUÇÕES RICH UI ---
+    # Seções do system prompt, na ordem de saída. O prefixo estável (persona + Rich UI, que são
+    # estáticos, e perfil + rotinas, que mudam raramente) vem primeiro e vai para o cache de
+    # contexto do Gemini; o resto é dinâmico a cada turno. A prioridade decide o que é cortado
+    # primeiro quando o total passa de MAX_PROMPT_TOKENS_BUDGET.
+    prompt_sections = [
+        PromptSection("persona", priority=100, header=static_prompt_prefix.persona, required=True),
+        PromptSection("rich_ui", priority=100, header=static_prompt_prefix.rich_ui, required=True),
+        PromptSection("combined_output", priority=100, header=COMBINED_OUTPUT_INSTRUCTIONS, required=True) if INTENT_MODE == "combined" else None,
+        PromptSection("profile", priority=65, header=f"--- CONTEXTO DO PERFIL DO USUÁRIO ({user_display_name}):\n", items=profile_summary_parts,
+                      empty_text="   Nenhum dado de perfil detalhado disponível.\n", footer="--- FIM DO CONTEXTO DE PERFIL ---\n\n",
+                      budget_tokens=PROMPT_SECTION_BUDGETS["profile"]),
+        PromptSection("routines", priority=50, header="--- ROTINAS SALVAS DO USUÁRIO ---\n", items=formatted_routines,
+                      empty_text="Nenhuma rotina salva.\n", footer="\n", budget_tokens=PROMPT_SECTION_BUDGETS["routines"]),
+        PromptSection("temporal", priority=100, header=contexto_temporal, required=True),
+        PromptSection("tasks", priority=80, header="--- TAREFAS PENDENTES E PROJETOS ATIVOS DO USUÁRIO ---\nTarefas (pendentes primeiro, depois concluídas):\n",
+                      items=flat_current_tasks, empty_text="Nenhuma tarefa pendente registrada.\n", budget_tokens=PROMPT_SECTION_BUDGETS["tasks"]),
+        PromptSection("projects", priority=70, header="\nProjetos Ativos:\n", items=formatted_projects,
+                      empty_text="Nenhum projeto ativo registrado.\n", budget_tokens=PROMPT_SECTION_BUDGETS["projects"]),
+        PromptSection("calendar_status", priority=100, header=f"\nStatus do Google Calendar: {google_calendar_status}\n--- FIM DO CONTEXTO CRÍTICO ---\n\n", required=True),
+        PromptSection("memories", priority=60, header="--- CONTEXTO DE MEMÓRIAS RELEVANTES DE LONGO PRAZO:\n", items=memory_items,
+                      footer="\n", budget_tokens=PROMPT_SECTION_BUDGETS["memories"]) if memory_items else None,
+        PromptSection("documents", priority=55, header="--- TRECHOS RELEVANTES DE DOCUMENTOS ENVIADOS PELO USUÁRIO:\n", items=document_items,
+                      footer="\n", budget_tokens=PROMPT_SECTION_BUDGETS["documents"]) if document_items else None,
+    ]
+    rendered_sections, prompt_budget_report = assemble_prompt_sections(
+        [section for section in prompt_sections if section], MAX_PROMPT_TOKENS_BUDGET, fixed_sections=_CONTEXT_CACHE_SECTIONS
+    )
+    stable_prompt_prefix = "".join(text for name, text in rendered_sections if name in _CONTEXT_CACHE_SECTIONS)
+    dynamic_prompt_context = "".join(text for name, text in rendered_sections if name not in _CONTEXT_CACHE_SECTIONS)
+    debug_info_logs.append(f"Prompt assembled (~{prompt_budget_report['_total_tokens']} tokens, budget {MAX_PROMPT_TOKENS_BUDGET}, static prefix {static_prompt_prefix.prefix_hash}).")
+    logger.debug("ORCHESTRATOR | Prompt budget report for user '%s': %s", user_id, prompt_budget_report)
+
+    # Cache semântico (opt-in): mensagem quase idêntica + mesmo contexto crítico = mesma resposta.
+    # Só mensagens de texto puro; no modo combinado, mensagens com cara de ação sempre vão ao LLM.
+    semantic_cache_key = None
+    semantic_cache_hit = None
+    if (SEMANTIC_CACHE_ENABLED and user_query_embedding and user_message_for_processing
+            and all("text" in part for part in user_prompt_parts)
+            and (INTENT_MODE != "combined"
+                 or get_intent_classifier().predict(user_message_for_processing, user_query_embedding).probability < INTENT_CLASSIFIER_THRESHOLD)):
+        # Turnos recentes entram na chave: um "sim" ou "ok" só tem o mesmo sentido na mesma conversa.
+        recent_turns = [f"{turn.get('input', '')}\x1f{turn.get('output', '')}" for turn in recent_history_for_llm]
+        semantic_cache_key = context_hash(
+            gemini_final_model, current_date_iso_formatted, time_bucket(current_datetime_utc), user_display_name,
+            google_calendar_status, flat_current_tasks, formatted_projects, formatted_routines, profile_summary_parts,
+            recent_turns, memory_items, document_items
+        )
+        semantic_cache_hit = semantic_response_cache.lookup(user_id, user_query_embedding, semantic_cache_key)
 
-"""
-    
-    final_system_instruction = contexto_temporal + contexto_critico + contexto_perfil_str + rich_ui_instructions + base_persona_with_name
+    cached_content_name = None
+    if GEMINI_CONTEXT_CACHE_ENABLED and not semantic_cache_hit:
+        cached_content_name = await context_cache_manager.get_or_create(
+            user_id, gemini_final_model, stable_prompt_prefix,
+            api_key=gemini_api_key, project_id=gcp_project_id, region=region
+        )
+    # O contexto dinâmico (data/hora, tarefas, memórias) vai sempre junto da mensagem atual, e não no
+    # system instruction: assim system instruction + turnos anteriores formam um prefixo idêntico entre
+    # turnos, que o cache implícito do Gemini/Vertex reaproveita mesmo sem cache explícito.
+    conversation_history = prepend_context_to_history(conversation_history, dynamic_prompt_context)
+    if cached_content_name:
+        # Prefixo estável no cache explícito: não é reenviado.
+        final_system_instruction = None
+        debug_info_logs.append(f"Stable prompt prefix served from Gemini context cache ({cached_content_name}).")
+    else:
+        final_system_instruction = stable_prompt_prefix
 
     # Chamada LLM genérica
-    logger.debug(f"ORCHESTRATOR | Calling Gemini API for generic response. Model: {gemini_final_model}")
-    gemini_response_text_in_pt = await call_gemini_api(
-        api_key=gemini_api_key,  # Se ausente, SDK Vertex
-        model_name=gemini_final_model,
-        conversation_history=conversation_history,
-        system_instruction=final_system_instruction,
-        max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
-        temperature=DEFAULT_TEMPERATURE,
-        project_id=gcp_project_id,
-        region=region
-    )
+    response_mime_type = "application/json" if INTENT_MODE == "combined" else None
+    if semantic_cache_hit:
+        logger.info(f"ORCHESTRATOR | Semantic cache hit for user '{user_id}' (similarity {semantic_cache_hit.similarity:.3f}). Skipping Gemini call.")
+        debug_info_logs.append(f"Response served from semantic cache (similarity {semantic_cache_hit.similarity:.3f}).")
+        gemini_response_text_in_pt = semantic_cache_hit.response
+    else:
+        logger.debug(f"ORCHESTRATOR | Calling Gemini API for generic response. Model: {gemini_final_model}")
+        gemini_response_text_in_pt = await call_gemini_api(
+            api_key=gemini_api_key,  # Se ausente, SDK Vertex
+            model_name=gemini_final_model,
+            conversation_history=conversation_history,
+            system_instruction=final_system_instruction,
+            max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
+            temperature=DEFAULT_TEMPERATURE,
+            project_id=gcp_project_id,
+            region=region,
+            cached_content=cached_content_name,
+            response_mime_type=response_mime_type
+        )
+        if not gemini_response_text_in_pt and cached_content_name:
+            # Cache removido/expirado do lado do Gemini: descarta e repete com o prompt completo.
+            logger.warning(f"ORCHESTRATOR | Gemini call with cached content failed for user '{user_id}'. Retrying without context cache.")
+            await context_cache_manager.invalidate_user(user_id, api_key=gemini_api_key)
+            gemini_response_text_in_pt = await call_gemini_api(
+                api_key=gemini_api_key,
+                model_name=gemini_final_model,
+                conversation_history=conversation_history,
+                system_instruction=stable_prompt_prefix,
+                max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
+                temperature=DEFAULT_TEMPERATURE,
+                project_id=gcp_project_id,
+                region=region,
+                response_mime_type=response_mime_type
+            )
+
+    if INTENT_MODE == "combined" and gemini_response_text_in_pt and not semantic_cache_hit:
+        action_intent_data, gemini_response_text_in_pt = _parse_combined_response(gemini_response_text_in_pt)
+        detected_intent = action_intent_data.get("intent_detected", "none")
+        intent_result = await _process_llm_action_intent(
+            user_id, action_intent_data, user_profile, all_routines, response_payload, debug_info_logs,
+            mode_debug_on, user_input_for_saving, source_language, firestore_collection_interactions,
+            projects_task=projects_task
+        )
+        if intent_result:
+            return intent_result
 
     final_ai_response = gemini_response_text_in_pt
+    profile_update_json = None
 
     if not final_ai_response:
         final_ai_response = "Não consegui processar sua solicitação no momento. Tente novamente."
@@ -1271,7 +1423,7 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
     else:
         # Detecção de Mood Logs: padrão "humor X/10" ou "estou me sentindo X/10"
         mood_match = re.search(r'(?:humor|sentindo|sinto)\s*(?:está|estou|me)?\s*(\d+)\s*(?:/|de)\s*10', final_ai_response, re.IGNORECASE)
-        if mood_match:
+        if mood_match and not semantic_cache_hit:
             mood_score = int(mood_match.group(1))
             if 1 <= mood_score <= 10:
                 mood_note = user_message_for_processing[:200] if user_message_for_processing else ""
@@ -1279,8 +1431,9 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
                 logger.info(f"ORCHESTRATOR | Mood log saved for user '{user_id}': score={mood_score}")
         
         # Detecção de contexto para Rich UI Components
+        # A resposta em cache já passou pelo pós-processamento abaixo (Rich UI, profile_update).
         # 1. Calendar Invite: se mencionar "reunião", "evento", "agendamento"
-        if re.search(r'\b(reunião|evento|agendamento|encontro|call|meet)\b', final_ai_response, re.IGNORECASE):
+        if not semantic_cache_hit and re.search(r'\b(reunião|evento|agendamento|encontro|call|meet)\b', final_ai_response, re.IGNORECASE):
             # Extrair datas e horários para gerar convite
             date_match = re.search(r'(\d{4}-\d{2}-\d{2})', final_ai_response)
             time_match = re.search(r'(\d{1,2}:\d{2})', final_ai_response)
@@ -1296,7 +1449,7 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
                 logger.debug(f"ORCHESTRATOR | Rich UI calendar_invite generated for user '{user_id}'")
         
         # 2. Chart: se mencionar "progresso", "estatística", "gráfico", "desempenho"
-        if re.search(r'\b(progresso|estatística|gráfico|desempenho|evolução|avanço)\b', final_ai_response, re.IGNORECASE):
+        if not semantic_cache_hit and re.search(r'\b(progresso|estatística|gráfico|desempenho|evolução|avanço)\b', final_ai_response, re.IGNORECASE):
             # Buscar mood logs recentes para gerar gráfico de humor
             recent_mood_logs = await get_mood_logs(user_id, 7)
             if len(recent_mood_logs) >= 3:
@@ -1315,7 +1468,7 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
                 logger.debug(f"ORCHESTRATOR | Rich UI chart generated for user '{user_id}'")
         
         # 3. Quick Action: se mencionar "tarefa rápida", "adicionar", "lembrete"
-        if re.search(r'\b(tarefa rápida|adicionar tarefa|criar lembrete|novo item)\b', final_ai_response, re.IGNORECASE):
+        if not semantic_cache_hit and re.search(r'\b(tarefa rápida|adicionar tarefa|criar lembrete|novo item)\b', final_ai_response, re.IGNORECASE):
             rich_ui_action = {
                 "type": "quick_action",
                 "action": "create_task",
@@ -1324,8 +1477,7 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
             }
             final_ai_response += f"\n\n```rich-ui\n{json.dumps(rich_ui_action, ensure_ascii=False)}\n```"
             logger.debug(f"ORCHESTRATOR | Rich UI quick_action generated for user '{user_id}'")
-        profile_update_json = None
-        json_match = re.search(r'```json\s*(\{.*?\})\s*```', final_ai_response, re.DOTALL)
+        json_match = None if semantic_cache_hit else re.search(r'```json\s*(\{.*?\})\s*```', final_ai_response, re.DOTALL)
         if json_match:
             try:
                 profile_update_json_str = json_match.group(1)
@@ -1344,6 +1496,11 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
             except AttributeError as e:
                 logger.warning(f"ORCHESTRATOR | Profile update JSON missing 'profile_update' key or has unexpected structure: {e}. Raw data: {profile_update_data}", exc_info=True)
 
+        if semantic_cache_key and not semantic_cache_hit and not json_match:
+            # Chegou aqui sem intenção de ação: guarda a resposta já pós-processada (em pt). Respostas
+            # com profile_update ficam de fora, porque reaproveitá-las pularia a atualização do perfil.
+            semantic_response_cache.store(user_id, user_query_embedding, semantic_cache_key, final_ai_response)
+
         if source_language != "pt":
             logger.info(f"ORCHESTRATOR | Translating AI response from 'pt' to '{source_language}' for user '{user_id}'. Original: '{final_ai_response[:50]}...'.")
             translated_ai_response = await translate_text(final_ai_response, source_language, "pt")
@@ -1371,24 +1528,9 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
     # 🧠 DETECÇÃO DE EMOTIONAL MEMORIES
     # Detecta conteúdo emocional na mensagem do usuário e salva como emotional memory
     if user_message_for_processing:
-        emotional_keywords_map = {
-            "ansiedade": ["ansioso", "ansiosa", "preocupado", "preocupada", "nervoso", "nervosa", "estressado", "estressada"],
-            "frustração": ["frustrado", "frustrada", "irritado", "irritada", "chateado", "chateada", "raiva"],
-            "alegria": ["feliz", "animado", "animada", "empolgado", "empolgada", "contente", "alegre"],
-            "esperança": ["esperançoso", "esperançosa", "otimista", "motivado", "motivada", "confiante"],
-            "exaustão": ["cansado", "cansada", "exausto", "exausta", "esgotado", "esgotada", "sem energia"],
-            "tristeza": ["triste", "deprimido", "deprimida", "desanimado", "desanimada", "melancólico"],
-            "procrastinação": ["deixar para depois", "amanhã eu faço", "procrastinar", "adiando"],
-            "dúvida": ["não sei", "confuso", "confusa", "perdido", "perdida", "bloqueado", "bloqueada"]
-        }
-        
-        detected_emotions = []
-        message_lower = user_message_for_processing.lower()
-        
-        for emotion_tag, keywords in emotional_keywords_map.items():
-            if any(keyword in message_lower for keyword in keywords):
-                detected_emotions.append(emotion_tag)
-        
+        message_matches = _EMOTIONAL_MATCHER.matches(user_message_for_processing.lower())
+        detected_emotions = [emotion_tag for emotion_tag in _EMOTIONAL_KEYWORDS if emotion_tag in message_matches]
+
         # Se detectou emoções, salva emotional memory
         if detected_emotions:
             from memory_utils import add_emotional_memory
@@ -1436,29 +1578,17 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
     sabotage_patterns_detected = await get_sabotage_patterns(user_id, 20, user_profile)
     logger.debug(f"ORCHESTRATOR | Raw sabotage patterns detected: {sabotage_patterns_detected}")
 
-    if any(w in lower_input for w in ["frustrad", "cansad", "difícil", "procrastin", "adiando", "não consigo", "sobrecarregado"]):
-        emotional_tags.append("frustração")
-    if any(w in lower_input for w in ["animado", "feliz", "produtivo", "consegui"]):
-        emotional_tags.append("positividade")
+    emotional_tags.extend(_INPUT_TONE_MATCHER.matches(lower_input))
 
+    # Condições, padrões e mecanismos de coping do perfil citados na mensagem ou na resposta:
+    # um KeywordMatcher por perfil (em cache), com `frase in texto` parando no primeiro achado de cada item.
     psych_profile = user_profile.get('psychological_profile', {})
-    if psych_profile.get('diagnoses_and_conditions'):
-        for cond in psych_profile['diagnoses_and_conditions']:
-            cond_phrase = cond.lower().replace("_", " ")
-            if cond_phrase in lower_input or cond_phrase in final_ai_response.lower():
-                emotional_tags.append(cond.replace(" ", "_"))
-
-    if psych_profile.get('historical_behavioral_patterns'):
-        for pattern in psych_profile['historical_behavioral_patterns']:
-            pattern_phrase = pattern.lower().replace("_", " ")
-            if pattern_phrase in lower_input or pattern_phrase in final_ai_response.lower():
-                emotional_tags.append(pattern.replace(" ", "_"))
-
-    if psych_profile.get('coping_mechanisms'):
-        for coping_mechanism in psych_profile['coping_mechanisms']:
-            coping_phrase = coping_mechanism.lower().replace("_", " ")
-            if coping_phrase in lower_input or coping_phrase in final_ai_response.lower():
-                emotional_tags.append(coping_mechanism.replace(" ", "_"))
+    profile_lexicon = {}
+    for key in ('diagnoses_and_conditions', 'historical_behavioral_patterns', 'coping_mechanisms'):
+        for item in psych_profile.get(key) or []:
+            profile_lexicon.setdefault(item.replace(" ", "_"), set()).add(profile_phrase(item))
+    if profile_lexicon:
+        emotional_tags.extend(get_keyword_matcher(profile_lexicon).matches(lower_input, final_ai_response.lower()))
 
     if emotional_tags:
         await add_emotional_memory(user_id, user_input_for_saving + " | " + final_ai_response, list(set(emotional_tags)))
@@ -1490,7 +1620,7 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
     if bq_manager and user_message:
         try:
             interaction_id = str(uuid.uuid4())
-            asyncio.create_task(
+            spawn_background_task(
                 bq_manager.log_interaction(
                     user_id=user_id,
                     interaction_id=interaction_id,
@@ -1499,10 +1629,15 @@ Você pode enriquecer suas respostas com componentes visuais interativos usando
                     intent=detected_intent if 'detected_intent' in locals() else None,
                     language=response_payload.get("language", "pt"),
                     model_used=gemini_text_model,
-                )
+                ),
+                "bigquery",
             )
             logger.debug(f"ORCHESTRATOR | BigQuery logging scheduled for interaction {interaction_id}")
         except Exception as e:
             logger.error(f"ORCHESTRATOR | Failed to schedule BigQuery logging: {e}")
 
+    # No modo ASGI o loop é do worker e a gravação termina depois da resposta; no WSGI ela seria cancelada.
+    if uploaded_document and SERVER_MODE != "asgi":
+        await document_ingestion.drain_pending_ingestions(DOCUMENT_INGESTION_DRAIN_SECONDS)
+
     return {"response_payload": response_payload}
\ No newline at end of file
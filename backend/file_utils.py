@@ -1,22 +1,211 @@
 import base64
-import re
 import io
 import logging
-from PIL import Image
-import fitz # Importação para PDF (PyMuPDF)
-from docx import Document # Importação para DOCX (python-docx)
-from typing import Dict
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from config import DOCUMENT_EXTRACTION_MAX_CHARS, DOCUMENT_EXTRACTION_MAX_TOKENS
+from token_estimator import budget_tokens
 
 logger = logging.getLogger(__name__)
 
+# PyMuPDF (fitz), python-docx e Pillow são importados no primeiro uso (dentro das funções):
+# só uploads de PDF/DOCX/imagem precisam deles e o import custa centenas de ms no cold start.
+
 # --- Constantes de Configuração ---
 MAX_FILE_SIZE_BYTES = 10 * 1024 * 1024 # 10 MB
 MAX_PDF_PAGES = 50 # Limite para evitar abuso de processamento
+DOCX_PARAGRAPHS_PER_CHUNK = 50
+
+PDF_MIMETYPE = 'application/pdf'
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+TRUNCATION_NOTICE = "\n[AVISO: Documento truncado — apenas o início foi extraído para caber no limite de contexto.]"
+
+# Extração de texto de PDF/DOCX: os trechos (páginas / blocos de parágrafos) são coletados em
+# lista e juntados uma vez, em vez de `texto += trecho`. iter_document_text entrega os trechos
+# conforme são extraídos e para assim que o orçamento de caracteres/tokens do prompt é atingido,
+# sem extrair as páginas seguintes. A extração é em série: com o limite de MAX_PDF_PAGES páginas,
+# um PDF inteiro sai em ~0,13 s, menos que subir um processo e importar o fitz nele (~0,16 s).
+
+def _iter_pdf_text(pdf_bytes: bytes, filename: str = "") -> Iterator[str]:
+    import fitz  # PyMuPDF
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count > MAX_PDF_PAGES:
+            logger.warning(f"PDF '{filename}' excedeu o limite de {MAX_PDF_PAGES} páginas. Processamento interrompido.")
+            page_count = MAX_PDF_PAGES
+        for i in range(page_count):
+            yield doc[i].get_text("text")
+
+
+def _iter_docx_text(docx_bytes: bytes) -> Iterator[str]:
+    """Parágrafos do corpo na ordem do documento (incluindo os de tabelas), lendo os nós
+    w:t direto do XML, sem montar os objetos Paragraph/Cell do python-docx."""
+    from docx import Document
+    from docx.oxml.ns import qn
+    body = Document(io.BytesIO(docx_bytes)).element.body
+    paragraph_tag, text_tag = qn('w:p'), qn('w:t')
+    batch = []
+    for paragraph in body.iter(paragraph_tag):
+        batch.append("".join(node.text or "" for node in paragraph.iter(text_tag)))
+        if len(batch) >= DOCX_PARAGRAPHS_PER_CHUNK:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch)
+
+
+def iter_document_text(decoded_bytes: bytes, mimetype: str, filename: str = "",
+                       max_chars: Optional[int] = DOCUMENT_EXTRACTION_MAX_CHARS,
+                       max_tokens: Optional[int] = DOCUMENT_EXTRACTION_MAX_TOKENS,
+                       stats: Optional[dict] = None) -> Iterator[str]:
+    """
+    Gera o texto de um PDF/DOCX em trechos, na ordem, conforme são extraídos. Para quando o
+    orçamento (max_chars e/ou max_tokens estimados; None = sem limite) é atingido, cortando o
+    último trecho. Se `stats` for passado, recebe 'chunks', 'chars' e 'truncated'.
+    """
+    if mimetype == PDF_MIMETYPE:
+        chunks = _iter_pdf_text(decoded_bytes, filename)
+    elif mimetype == DOCX_MIMETYPE:
+        chunks = _iter_docx_text(decoded_bytes)
+    else:
+        raise ValueError(f"Tipo de documento não suportado para extração de texto: {mimetype}")
+
+    stats = stats if stats is not None else {}
+    stats.update(chunks=0, chars=0, truncated=False)
+    used_tokens = 0
+    try:
+        for chunk in chunks:
+            stats["chunks"] += 1
+            if not chunk:
+                continue
+            if max_chars is not None and stats["chars"] + len(chunk) > max_chars:
+                chunk = chunk[:max(0, max_chars - stats["chars"])]
+                stats["truncated"] = True
+            if max_tokens is not None:
+                tokens = budget_tokens(chunk)
+                if used_tokens + tokens > max_tokens:
+                    chunk = chunk[:int(len(chunk) * max(0, max_tokens - used_tokens) / tokens)]
+                    stats["truncated"] = True
+                    tokens = max_tokens - used_tokens
+                used_tokens += tokens
+            stats["chars"] += len(chunk)
+            if chunk:
+                yield chunk
+            if stats["truncated"]:
+                return
+    finally:
+        chunks.close()
+
+
+def extract_document_text(decoded_bytes: bytes, mimetype: str, filename: str = "", **budget) -> tuple[str, dict]:
+    """Texto completo (até o orçamento) e as estatísticas da extração."""
+    stats: dict = {}
+    parts = list(iter_document_text(decoded_bytes, mimetype, filename, stats=stats, **budget))
+    return "".join(parts), stats
+
+
+# --- Decodificação única do upload ---
+# O base64 recebido é decodificado uma vez em DecodedUpload; validação (magic bytes + verify do
+# PIL, sem decodificar pixels), upload ao GCS e inlineData do Gemini compartilham os mesmos
+# bytes e a mesma string base64 (sem o prefixo data:), em vez de cada etapa decodificar de novo.
+
+_MAGIC_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", PDF_MIMETYPE),
+    (b"PK\x03\x04", DOCX_MIMETYPE),  # zip; o conteúdo OOXML é validado ao abrir com python-docx
+)
+_DATA_URL_PREFIX_MAX_CHARS = 256
+
+
+def sniff_mime_type(header: bytes) -> Optional[str]:
+    """Tipo real do arquivo pelos primeiros bytes (None se desconhecido)."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _MAGIC_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return None
+
+
+@dataclass(frozen=True)
+class DecodedUpload:
+    filename: str
+    mime_type: str          # tipo detectado pelos magic bytes
+    declared_mime_type: str
+    data: bytes             # conteúdo decodificado (uma única cópia)
+    base64_text: str        # base64 sem prefixo data: (a própria string recebida quando não há prefixo)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def view(self) -> memoryview:
+        return memoryview(self.data)
+
+    def stream(self) -> io.BytesIO:
+        """BytesIO sobre os mesmos bytes (sem cópia enquanto não houver escrita)."""
+        return io.BytesIO(self.data)
+
+
+def decode_upload(base64_data: str, filename: str, mimetype: str, max_bytes: int = MAX_FILE_SIZE_BYTES) -> DecodedUpload:
+    """Remove o prefixo data:, checa o tamanho antes de alocar, decodifica uma vez e confere o
+    tipo pelos magic bytes. Levanta ValueError para entrada vazia, corrompida, grande demais ou
+    cujo conteúdo não corresponde ao tipo declarado."""
+    if not base64_data:
+        raise ValueError("Dados em base64 não podem estar vazios.")
+
+    # 1. Sanitização: Remove o prefixo 'data:...;base64,' comum em uploads de frontend
+    base64_clean = base64_data
+    if base64_data.startswith("data:"):
+        comma = base64_data.find(",", 0, _DATA_URL_PREFIX_MAX_CHARS)
+        if comma != -1:
+            base64_clean = base64_data[comma + 1:]
+
+    estimated_size = len(base64_clean) * 3 // 4 - base64_clean.count("=", -2)
+    if estimated_size > max_bytes:
+        raise ValueError(f"O tamanho do arquivo excede o limite de {max_bytes / (1024*1024):.1f} MB.")
+
+    try:
+        decoded_bytes = base64.b64decode(base64_clean)
+    except (TypeError, ValueError) as e:
+        logger.error(f"Falha ao decodificar base64 para o arquivo '{filename}': {e}", exc_info=True)
+        raise ValueError("Dados em base64 inválidos ou corrompidos.")
+
+    if len(decoded_bytes) > max_bytes:
+        raise ValueError(f"O tamanho do arquivo excede o limite de {max_bytes / (1024*1024):.1f} MB.")
+
+    declared = (mimetype or "").lower()
+    sniffed = sniff_mime_type(decoded_bytes[:16])
+    if sniffed is None:
+        if declared.startswith("image/") or declared in (PDF_MIMETYPE, DOCX_MIMETYPE):
+            logger.warning(f"Conteúdo de '{filename}' não corresponde ao tipo declarado '{mimetype}'.")
+            raise ValueError(f"O conteúdo do arquivo '{filename}' não corresponde ao tipo {mimetype}.")
+        sniffed = declared
+    elif sniffed != declared and not (sniffed.startswith("image/") and declared.startswith("image/")):
+        logger.warning(f"Conteúdo de '{filename}' ({sniffed}) não corresponde ao tipo declarado '{mimetype}'.")
+        raise ValueError(f"O conteúdo do arquivo '{filename}' não corresponde ao tipo {mimetype}.")
+
+    return DecodedUpload(filename=filename, mime_type=sniffed, declared_mime_type=mimetype,
+                         data=decoded_bytes, base64_text=base64_clean)
+
+
+def verify_image(upload: DecodedUpload):
+    """Valida a estrutura da imagem (cabeçalho e chunks) sem decodificar os pixels."""
+    from PIL import Image
+    with Image.open(upload.stream()) as image:
+        image.verify()
+
 
 def process_uploaded_file(base64_data: str, filename: str, mimetype: str) -> Dict:
     """
     Processa um arquivo enviado (base64), sanitiza a entrada e extrai o conteúdo relevante.
-    Retorna um dicionário estruturado com tipo, conteúdo e metadados.
+    Retorna um dicionário estruturado com tipo, conteúdo e metadados; para imagens, 'upload'
+    traz o DecodedUpload para reaproveitar os bytes já decodificados (ex.: upload ao GCS).
 
     Known Limitations:
     - PDF Processing: Does not perform Optical Character Recognition (OCR). PDFs containing
@@ -24,103 +213,71 @@ def process_uploaded_file(base64_data: str, filename: str, mimetype: str) -> Dic
     - DOCX Processing: Does not extract images or other embedded objects from DOCX files,
       only textual content from paragraphs and tables.
     - File Types: Does not support specialized formats like RAW, SVG, or older .doc files.
+    - Text Budget: PDF/DOCX text stops at DOCUMENT_EXTRACTION_MAX_CHARS / _MAX_TOKENS; the
+      result then ends with TRUNCATION_NOTICE and metadata['truncated'] is True.
     """
-    if not base64_data:
-        raise ValueError("Dados em base64 não podem estar vazios.")
+    return process_decoded_upload(decode_upload(base64_data, filename, mimetype))
 
-    # 1. Sanitização: Remove o prefixo 'data:...' comum em uploads de frontend
-    try:
-        base64_clean = re.sub(r'^data:.+;base64,', '', base64_data)
-        decoded_bytes = base64.b64decode(base64_clean)
-        file_size = len(decoded_bytes)
-    except (TypeError, ValueError) as e:
-        logger.error(f"Falha ao decodificar base64 para o arquivo '{filename}': {e}", exc_info=True)
-        raise ValueError("Dados em base64 inválidos ou corrompidos.")
-
-    if file_size > MAX_FILE_SIZE_BYTES:
-        raise ValueError(f"O tamanho do arquivo excede o limite de {MAX_FILE_SIZE_BYTES / (1024*1024):.1f} MB.")
 
+def process_decoded_upload(upload: DecodedUpload) -> Dict:
+    """process_uploaded_file para um upload já decodificado."""
+    filename, mimetype, decoded_bytes = upload.filename, upload.mime_type, upload.data
     metadata = {
         "filename": filename,
-        "size_bytes": file_size,
+        "size_bytes": upload.size,
         "mime_type": mimetype
     }
 
     # 2. Processamento por Tipo de Arquivo
     if mimetype.startswith('image/'):
         try:
-            # Apenas verifica se é uma imagem válida sem processar o conteúdo
-            Image.open(io.BytesIO(decoded_bytes))
+            # Apenas verifica se é uma imagem válida sem decodificar os pixels
+            verify_image(upload)
             logger.info(f"Arquivo de imagem processado: '{filename}' ({mimetype})")
             return {
                 'type': 'image',
-                'content': {'base64_image': base64_clean, 'mime_type': mimetype},
-                'metadata': metadata
+                'content': {'base64_image': upload.base64_text, 'mime_type': mimetype},
+                'metadata': metadata,
+                'upload': upload
             }
         except Exception as e:
             logger.error(f"Arquivo de imagem inválido '{filename}': {e}", exc_info=True)
             raise ValueError(f"Não foi possível processar o arquivo de imagem: {filename}")
 
-    elif mimetype == 'application/pdf':
+    elif mimetype in (PDF_MIMETYPE, DOCX_MIMETYPE):
+        kind = "PDF" if mimetype == PDF_MIMETYPE else "DOCX"
         try:
-            doc = fitz.open(stream=decoded_bytes, filetype="pdf")
-            text_content = ""
-            for i, page in enumerate(doc):
-                if i >= MAX_PDF_PAGES:
-                    logger.warning(f"PDF '{filename}' excedeu o limite de {MAX_PDF_PAGES} páginas. Processamento interrompido.")
-                    break
-                text_content += page.get_text("text")
-            doc.close()
-
-            if not text_content.strip():
-                logger.warning(f"PDF '{filename}' não contém texto extraível. Pode ser um arquivo de imagem escaneado ou sem texto selecionável.")
-                return {
-                    'type': 'text',
-                    'content': {'text_content': "[AVISO: O PDF não contém texto legível e pode ser uma imagem escaneada ou sem texto selecionável.]"},
-                    'metadata': metadata
-                }
-
-            logger.info(f"PDF processado: '{filename}', extraídos {len(text_content)} caracteres.")
-            return {
-                'type': 'text',
-                'content': {'text_content': text_content},
-                'metadata': metadata
-            }
+            text_content, stats = extract_document_text(decoded_bytes, mimetype, filename, max_chars=DOCUMENT_EXTRACTION_MAX_CHARS,
+                                                         max_tokens=DOCUMENT_EXTRACTION_MAX_TOKENS)
         except Exception as e:
-            logger.error(f"Erro ao processar PDF '{filename}' com PyMuPDF: {e}", exc_info=True)
-            raise ValueError(f"Não foi possível processar o arquivo PDF: {filename}")
+            logger.error(f"Erro ao processar {kind} '{filename}': {e}", exc_info=True)
+            raise ValueError(f"Não foi possível processar o arquivo {kind}: {filename}")
 
-    elif mimetype == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-        try:
-            doc = Document(io.BytesIO(decoded_bytes))
-            text_content_parts = []
-            for para in doc.paragraphs:
-                text_content_parts.append(para.text)
-            # Adiciona texto de tabelas, se houver
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        text_content_parts.append(cell.text)
-
-            text_content = "\n".join(text_content_parts)
-            
-            if not text_content.strip():
+        if not text_content.strip():
+            if kind == "PDF":
+                logger.warning(f"PDF '{filename}' não contém texto extraível. Pode ser um arquivo de imagem escaneado ou sem texto selecionável.")
+                warning = "[AVISO: O PDF não contém texto legível e pode ser uma imagem escaneada ou sem texto selecionável.]"
+            else:
                 logger.warning(f"DOCX '{filename}' não contém texto extraível. Pode ser um arquivo vazio ou com conteúdo não textual.")
-                return {
-                    'type': 'text',
-                    'content': {'text_content': "[AVISO: O DOCX não contém texto legível ou pode estar vazio.]"},
-                    'metadata': metadata
-                }
-
-            logger.info(f"Arquivo DOCX processado: '{filename}', extraídos {len(text_content)} caracteres.")
+                warning = "[AVISO: O DOCX não contém texto legível ou pode estar vazio.]"
             return {
                 'type': 'text',
-                'content': {'text_content': text_content},
+                'content': {'text_content': warning},
                 'metadata': metadata
             }
-        except Exception as e:
-            logger.error(f"Erro ao processar DOCX '{filename}': {e}", exc_info=True)
-            raise ValueError(f"Não foi possível processar o arquivo DOCX: {filename}")
+
+        metadata["extracted_chars"] = len(text_content)
+        metadata["truncated"] = stats["truncated"]
+        if stats["truncated"]:
+            logger.info(f"{kind} '{filename}' truncado no orçamento de extração após {stats['chunks']} trechos.")
+            text_content += TRUNCATION_NOTICE
+
+        logger.info(f"{kind} processado: '{filename}', extraídos {len(text_content)} caracteres.")
+        return {
+            'type': 'text',
+            'content': {'text_content': text_content},
+            'metadata': metadata
+        }
 
     else:
         logger.warning(f"Tipo de arquivo não suportado: '{mimetype}' para o arquivo '{filename}'.")
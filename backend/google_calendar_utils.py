@@ -3,22 +3,31 @@
 import asyncio
 import os
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 import uuid
 from urllib.parse import urlparse, parse_qs
 import json # Adicionado 'json' para creds.to_json() e json.loads()
 
+import google_auth_httplib2
+import httplib2
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth.exceptions import RefreshError
+from google.api_core.exceptions import NotFound
 
 from firestore_client_singleton import _initialize_firestore_client_instance
-from config import EIXA_GOOGLE_AUTH_COLLECTION
+from config import (
+    EIXA_GOOGLE_AUTH_COLLECTION,
+    CALENDAR_CONNECTION_CACHE_TTL_SECONDS,
+    CALENDAR_CREDENTIALS_CACHE_TTL_SECONDS,
+    CALENDAR_CREDENTIALS_CACHE_MAX_ENTRIES,
+    CALENDAR_SYNC_PAGE_SIZE,
+)
 
-logging.basicConfig(level=logging.INFO)
 CALENDAR_UTILS_LOGGER = logging.getLogger("CALENDAR_UTILS")
 
 GOOGLE_CALENDAR_SCOPES = [
@@ -26,6 +35,140 @@ GOOGLE_CALENDAR_SCOPES = [
     'https://www.googleapis.com/auth/userinfo.email'
 ]
 
+# google_auth_oauthlib (Flow) e googleapiclient.discovery são importados no primeiro uso: o fluxo
+# OAuth e a construção do service só acontecem em rotas do Calendar, não no cold start.
+
+
+class CalendarSyncTokenExpired(Exception):
+    """O Google respondeu 410 GONE: o syncToken armazenado expirou e é preciso um sync completo."""
+
+
+def _build_calendar_service(creds: Credentials):
+    """Constrói o service do Calendar v3 a partir do discovery cacheado (sem ida à rede)."""
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(_get_calendar_discovery_document(), credentials=creds)
+
+
+class _CalendarClient:
+    """
+    Credencial de um (user_id, account_id) e o service construído sobre ela, que vivem e saem do
+    cache juntos. `lock` serializa as execuções no httplib2.Http do service (que não é thread-safe);
+    `refresh_lock` garante um único refresh do token por vez para requisições concorrentes.
+    """
+
+    def __init__(self, creds: Credentials, expires_at: float):
+        self.creds = creds
+        self.expires_at = expires_at
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self._service = None
+
+    def service(self):
+        with self.lock:
+            if self._service is None:
+                self._service = _build_calendar_service(self.creds)
+            return self._service
+
+    def refresh_if_expired(self) -> bool:
+        """Executado fora do loop. Retorna True só para quem de fato refrescou o token."""
+        with self.refresh_lock:
+            if self.creds.valid:
+                return False
+            self.creds.refresh(Request())
+            return True
+
+
+class _CredentialsCache:
+    """
+    LRU limitado com TTL de _CalendarClient por (user_id, account_id). Uma credencial apagada por
+    outra instância (delete_credentials) deixa de ser servida quando a entrada expira: aí ela é
+    relida do Firestore. O service sai do cache junto com a credencial (expiração, LRU ou pop_user).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[str, str], _CalendarClient] = OrderedDict()
+        self._by_creds: dict[int, _CalendarClient] = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, key: tuple[str, str]):
+        client = self._entries.pop(key, None)
+        if client is not None:
+            self._by_creds.pop(id(client.creds), None)
+
+    def get(self, key: tuple[str, str]) -> _CalendarClient | None:
+        with self._lock:
+            client = self._entries.get(key)
+            if client is None:
+                return None
+            if client.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return client
+
+    def get_or_put(self, key: tuple[str, str], creds: Credentials) -> _CalendarClient:
+        """
+        Entrada ainda válida da chave (outra requisição já leu a credencial) ou uma nova para `creds`.
+        O prazo conta da leitura no Firestore: refrescar o token não renova a entrada.
+        """
+        with self._lock:
+            client = self._entries.get(key)
+            if client is None or client.expires_at <= time.monotonic():
+                self._remove(key)
+                client = _CalendarClient(creds, time.monotonic() + self.ttl_seconds)
+                self._entries[key] = client
+                self._by_creds[id(creds)] = client
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            return client
+
+    def find(self, creds: Credentials) -> _CalendarClient | None:
+        with self._lock:
+            return self._by_creds.get(id(creds))
+
+    def pop(self, key: tuple[str, str]):
+        with self._lock:
+            self._remove(key)
+
+    def pop_user(self, user_id: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                self._remove(key)
+
+
+# --- Caches em nível de processo (compartilhados por todas as instâncias de GoogleCalendarUtils) ---
+# Credenciais (e o service de cada uma) por (user_id, account_id): reaproveitadas enquanto o token
+# for válido (creds.valid já considera a margem de expiração da google-auth) e refrescadas no lugar.
+_credentials_cache = _CredentialsCache(CALENDAR_CREDENTIALS_CACHE_MAX_ENTRIES, CALENDAR_CREDENTIALS_CACHE_TTL_SECONDS)
+# Conta ativa por usuário e flag "conectado", com TTL curto para refletir mudanças feitas por outros workers.
+_active_account_cache: dict[str, tuple[str | None, float]] = {}
+_connection_flag_cache: dict[str, tuple[bool, float]] = {}
+# Documento de discovery do Calendar v3 carregado e parseado uma vez.
+_calendar_discovery_document = None
+_discovery_lock = threading.Lock()
+
+
+def _get_calendar_discovery_document() -> dict:
+    """Carrega o discovery document estático (empacotado no googleapiclient) e guarda já parseado."""
+    global _calendar_discovery_document
+    if _calendar_discovery_document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        with _discovery_lock:
+            if _calendar_discovery_document is None:
+                _calendar_discovery_document = json.loads(get_static_doc('calendar', 'v3'))
+                CALENDAR_UTILS_LOGGER.info("Discovery document do Calendar v3 carregado e cacheado.")
+    return _calendar_discovery_document
+
+
+def _invalidate_user_caches(user_id: str):
+    _credentials_cache.pop_user(user_id)
+    _active_account_cache.pop(user_id, None)
+    _connection_flag_cache.pop(user_id, None)
+
+
 class GoogleCalendarUtils:
     def __init__(self):
         self.db = _initialize_firestore_client_instance()
@@ -71,8 +214,35 @@ class GoogleCalendarUtils:
             return {"status": "error", "message": "Conta não encontrada."}
         root_doc_ref = await self._get_credentials_doc_ref(user_id)
         await asyncio.to_thread(root_doc_ref.set, {"active_account_id": account_id}, merge=True)
+        _invalidate_user_caches(user_id)
         return {"status": "success", "message": "Conta ativa atualizada.", "active_account_id": account_id}
 
+    async def _get_sync_state_doc_ref(self, user_id: str, account_id: str | None, calendar_id: str):
+        doc_ref = await self._get_credentials_doc_ref(user_id)
+        return doc_ref.collection('sync_state').document(f"{account_id or 'default'}__{calendar_id}")
+
+    async def get_sync_state(self, user_id: str, account_id: str | None, calendar_id: str = 'primary') -> dict:
+        """
+        Estado do sync incremental de uma agenda de uma conta:
+        {"sync_token", "window_start", "window_end", "event_index": {event_id: {"date", "task_id"}}}.
+        """
+        doc_ref = await self._get_sync_state_doc_ref(user_id, account_id, calendar_id)
+        doc = await asyncio.to_thread(doc_ref.get)
+        return doc.to_dict() if doc.exists else {}
+
+    async def save_sync_state(self, user_id: str, account_id: str | None, calendar_id: str, state: dict):
+        doc_ref = await self._get_sync_state_doc_ref(user_id, account_id, calendar_id)
+        await asyncio.to_thread(doc_ref.set, state | {"updated_at": datetime.now(timezone.utc).isoformat()})
+
+    async def get_active_account_id(self, user_id: str) -> str | None:
+        cached = _active_account_cache.get(user_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        root_doc = await asyncio.to_thread((await self._get_credentials_doc_ref(user_id)).get)
+        account_id = root_doc.to_dict().get('active_account_id') if root_doc.exists else None
+        _active_account_cache[user_id] = (account_id, time.monotonic() + CALENDAR_CONNECTION_CACHE_TTL_SECONDS)
+        return account_id
+
     async def _get_stored_credentials(self, user_id: str, account_id: str | None = None) -> dict | None:
         CALENDAR_UTILS_LOGGER.info(f"Buscando credenciais do Google para user_id: {user_id} (account_id={account_id})")
         if account_id:
@@ -100,13 +270,34 @@ class GoogleCalendarUtils:
         else:
             doc_ref = await self._get_credentials_doc_ref(user_id)
             await asyncio.to_thread(doc_ref.set, credentials_data)
+        _invalidate_user_caches(user_id)
         CALENDAR_UTILS_LOGGER.info(f"Credenciais salvas com sucesso para user_id: {user_id}")
+
+    async def _save_refreshed_token(self, user_id: str, creds: Credentials, account_id: str | None) -> bool:
+        """
+        Persiste o token refrescado no documento da conta (ou no doc raiz, no formato legado) sem apagar
+        os demais campos. Usa update(), que falha se o documento não existe: uma credencial apagada por
+        outra instância não é recriada. Retorna False nesse caso.
+        """
+        token_data = json.loads(creds.to_json())
+        if account_id:
+            accounts_col = await self._get_accounts_collection(user_id)
+            doc_ref = accounts_col.document(account_id)
+        else:
+            doc_ref = await self._get_credentials_doc_ref(user_id)
+        try:
+            await asyncio.to_thread(doc_ref.update, token_data)
+        except NotFound:
+            CALENDAR_UTILS_LOGGER.warning(f"Credenciais de {user_id} (account_id={account_id}) foram removidas durante o refresh; token descartado.")
+            return False
+        return True
     
     async def delete_credentials(self, user_id: str) -> dict:
         CALENDAR_UTILS_LOGGER.info(f"Deletando credenciais do Google para user_id: {user_id}")
         doc_ref = await self._get_credentials_doc_ref(user_id)
         try:
             await asyncio.to_thread(doc_ref.delete)
+            _invalidate_user_caches(user_id)
             CALENDAR_UTILS_LOGGER.info(f"Credenciais deletadas com sucesso para user_id: {user_id}.")
             return {"status": "success", "message": "Credenciais Google deletadas."}
         except Exception as e:
@@ -121,32 +312,43 @@ class GoogleCalendarUtils:
 
         # Buscar conta ativa se não fornecida
         if not account_id:
-            root_doc = await asyncio.to_thread((await self._get_credentials_doc_ref(user_id)).get)
-            if root_doc.exists:
-                account_id = root_doc.to_dict().get('active_account_id')
-
-        CALENDAR_UTILS_LOGGER.info(f"Obtendo e refrescando credenciais para user_id: {user_id} (account_id={account_id})")
-        stored_data = await self._get_stored_credentials(user_id, account_id)
-        if not stored_data:
-            CALENDAR_UTILS_LOGGER.warning(f"Não foi possível obter credenciais para {user_id}.")
-            return None
+            account_id = await self.get_active_account_id(user_id)
+
+        cache_key = (user_id, account_id or '')
+        client = _credentials_cache.get(cache_key)
+        if client is not None and client.creds.valid:
+            CALENDAR_UTILS_LOGGER.debug("Credenciais servidas do cache para user_id: %s (account_id=%s)", user_id, account_id)
+            return client.creds
+
+        if client is None:
+            CALENDAR_UTILS_LOGGER.info(f"Obtendo e refrescando credenciais para user_id: {user_id} (account_id={account_id})")
+            stored_data = await self._get_stored_credentials(user_id, account_id)
+            if not stored_data:
+                CALENDAR_UTILS_LOGGER.warning(f"Não foi possível obter credenciais para {user_id}.")
+                return None
 
-        required_fields = ['token', 'refresh_token', 'token_uri', 'client_id', 'client_secret', 'scopes']
-        if not all(k in stored_data for k in required_fields):
-            CALENDAR_UTILS_LOGGER.error(f"Dados de credenciais incompletos para user_id: {user_id}. Campos ausentes: {[k for k in required_fields if k not in stored_data]}")
-            return None
+            required_fields = ['token', 'refresh_token', 'token_uri', 'client_id', 'client_secret', 'scopes']
+            if not all(k in stored_data for k in required_fields):
+                CALENDAR_UTILS_LOGGER.error(f"Dados de credenciais incompletos para user_id: {user_id}. Campos ausentes: {[k for k in required_fields if k not in stored_data]}")
+                return None
 
-        creds = Credentials.from_authorized_user_info(stored_data)
+            creds = Credentials.from_authorized_user_info(stored_data)
 
-        creds.client_id = self.client_id
-        creds.client_secret = self.client_secret
-        
+            creds.client_id = self.client_id
+            creds.client_secret = self.client_secret
+            # Requisições concorrentes passam a compartilhar a mesma entrada (e o mesmo refresh).
+            client = _credentials_cache.get_or_put(cache_key, creds)
+
+        creds = client.creds
         if creds.expired and creds.refresh_token:
             CALENDAR_UTILS_LOGGER.info(f"Credenciais expiradas para {user_id}, tentando refrescar.")
             try:
-                await asyncio.to_thread(creds.refresh, Request())
-                CALENDAR_UTILS_LOGGER.info(f"Credenciais refrescadas com sucesso para {user_id}.")
-                await self._save_credentials(user_id, json.loads(creds.to_json()))
+                refreshed = await asyncio.to_thread(client.refresh_if_expired)
+                if refreshed:
+                    CALENDAR_UTILS_LOGGER.info(f"Credenciais refrescadas com sucesso para {user_id}.")
+                    if not await self._save_refreshed_token(user_id, creds, account_id):
+                        _invalidate_user_caches(user_id)
+                        return None
             except RefreshError as e:
                 CALENDAR_UTILS_LOGGER.error(f"Erro ao refrescar credenciais para {user_id}: {e}. Credenciais inválidas.", exc_info=True)
                 await self.delete_credentials(user_id)
@@ -156,11 +358,42 @@ class GoogleCalendarUtils:
                 return None
         elif not creds.valid:
             CALENDAR_UTILS_LOGGER.warning(f"Credenciais inválidas e não refrescáveis para {user_id}. Sugira reautenticação.")
+            _credentials_cache.pop(cache_key)
             return None
-        
+
         CALENDAR_UTILS_LOGGER.info(f"Credenciais válidas obtidas para {user_id}.")
         return creds
 
+    async def is_connected(self, user_id: str) -> bool:
+        """
+        Verificação barata de conexão com o Google Calendar: usa uma flag cacheada por
+        CALENDAR_CONNECTION_CACHE_TTL_SECONDS e só resolve as credenciais quando ela expira.
+        """
+        cached = _connection_flag_cache.get(user_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        connected = await self.get_credentials(user_id) is not None
+        _connection_flag_cache[user_id] = (connected, time.monotonic() + CALENDAR_CONNECTION_CACHE_TTL_SECONDS)
+        return connected
+
+    async def _execute_calendar_request(self, creds: Credentials, build_request, isolated_http: bool = False):
+        """
+        Executa build_request(service).execute() fora do event loop, reaproveitando o service da credencial.
+        Com isolated_http=True a requisição usa um transporte próprio em vez do compartilhado (e do lock),
+        permitindo várias requisições simultâneas com a mesma credencial (ex.: várias agendas de uma conta).
+        """
+        # Credencial fora do cache (expulsa pelo LRU entre a leitura e o uso): service avulso.
+        client = _credentials_cache.find(creds) or _CalendarClient(creds, 0.0)
+
+        def _run():
+            request = build_request(client.service())
+            if isolated_http:
+                return request.execute(http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()))
+            with client.lock:
+                return request.execute()
+
+        return await asyncio.to_thread(_run)
+
     async def get_auth_url(self, user_id: str, account_label: str | None = None) -> str | None:
         if not self.oauth_config_ready:
             CALENDAR_UTILS_LOGGER.error("Configurações de OAuth não prontas. Não é possível gerar URL de autorização.")
@@ -185,6 +418,7 @@ class GoogleCalendarUtils:
             }
         }
         
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_config(
             client_config, 
             scopes=GOOGLE_CALENDAR_SCOPES, 
@@ -286,6 +520,7 @@ class GoogleCalendarUtils:
                 "javascript_origins": [self.frontend_url]
             }
         }
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_config(
             client_config, 
             scopes=GOOGLE_CALENDAR_SCOPES, 
@@ -303,6 +538,7 @@ class GoogleCalendarUtils:
             creds = flow.credentials
             email = None
             try:
+                from googleapiclient.discovery import build
                 oauth2_service = await asyncio.to_thread(build, 'oauth2', 'v2', credentials=creds)
                 userinfo = await asyncio.to_thread(lambda: oauth2_service.userinfo().get().execute())
                 email = userinfo.get('email')
@@ -342,22 +578,21 @@ class GoogleCalendarUtils:
             return []
 
         try:
-            service = await asyncio.to_thread(build, 'calendar', 'v3', credentials=creds)
-
             CALENDAR_UTILS_LOGGER.info(f"Listando eventos do Google Calendar para user_id: {user_id} de {time_min.isoformat()} a {time_max.isoformat()}")
             
             time_min_utc = time_min.astimezone(timezone.utc) if time_min.tzinfo else time_min.replace(tzinfo=timezone.utc)
             time_max_utc = time_max.astimezone(timezone.utc) if time_max.tzinfo else time_max.replace(tzinfo=timezone.utc)
 
-            events_result = await asyncio.to_thread(
-                lambda: service.events().list(
+            events_result = await self._execute_calendar_request(
+                creds,
+                lambda service: service.events().list(
                     calendarId='primary', 
                     timeMin=time_min_utc.isoformat().replace('+00:00', 'Z'),
                     timeMax=time_max_utc.isoformat().replace('+00:00', 'Z'),
                     maxResults=100, 
                     singleEvents=True,
                     orderBy='startTime'
-                ).execute()
+                )
             )
 
             events = events_result.get('items', [])
@@ -374,6 +609,66 @@ class GoogleCalendarUtils:
             CALENDAR_UTILS_LOGGER.error(f"Erro inesperado ao listar eventos do Google Calendar para {user_id}: {e}", exc_info=True)
             return []
 
+    async def list_calendars(self, user_id: str, creds: Credentials) -> list[dict]:
+        """Lista as agendas visíveis (selecionadas na UI do Google ou a primária) de uma conta."""
+        calendars = []
+        page_token = None
+        while True:
+            result = await self._execute_calendar_request(
+                creds,
+                lambda service: service.calendarList().list(minAccessRole='reader', pageToken=page_token),
+                isolated_http=True
+            )
+            calendars.extend(c for c in result.get('items', []) if c.get('primary') or c.get('selected'))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+        CALENDAR_UTILS_LOGGER.info(f"{len(calendars)} agenda(s) visível(is) encontrada(s) para user_id: {user_id}.")
+        return calendars
+
+    async def fetch_event_changes(self, user_id: str, creds: Credentials, calendar_id: str = 'primary', sync_token: str | None = None,
+                                  time_min: datetime | None = None, time_max: datetime | None = None,
+                                  isolated_http: bool = False) -> tuple[list, str | None]:
+        """
+        Busca eventos seguindo todas as páginas (nextPageToken).
+        - Com sync_token: retorna apenas o delta desde o último sync, incluindo eventos cancelados.
+        - Sem sync_token: sync completo da janela [time_min, time_max].
+        Retorna (eventos, nextSyncToken). Lança CalendarSyncTokenExpired se o token expirou (HTTP 410).
+        """
+        params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": CALENDAR_SYNC_PAGE_SIZE}
+        if sync_token:
+            # A API não aceita timeMin/timeMax/orderBy junto com syncToken.
+            params["syncToken"] = sync_token
+        else:
+            if time_min:
+                params["timeMin"] = (time_min.astimezone(timezone.utc) if time_min.tzinfo else time_min.replace(tzinfo=timezone.utc)).isoformat().replace('+00:00', 'Z')
+            if time_max:
+                params["timeMax"] = (time_max.astimezone(timezone.utc) if time_max.tzinfo else time_max.replace(tzinfo=timezone.utc)).isoformat().replace('+00:00', 'Z')
+
+        events = []
+        page_token = None
+        pages = 0
+        while True:
+            page_params = params | ({"pageToken": page_token} if page_token else {})
+            try:
+                result = await self._execute_calendar_request(creds, lambda service: service.events().list(**page_params), isolated_http=isolated_http)
+            except HttpError as error:
+                if error.resp.status == 410:
+                    raise CalendarSyncTokenExpired(f"syncToken expirado para user_id: {user_id}, calendar: {calendar_id}") from error
+                if error.resp.status in [401, 403]:
+                    CALENDAR_UTILS_LOGGER.warning(f"Credenciais possivelmente inválidas ou revogadas para {user_id}. Sugira reautenticação.")
+                    await self.delete_credentials(user_id)
+                raise
+            pages += 1
+            events.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                next_sync_token = result.get('nextSyncToken')
+                break
+
+        CALENDAR_UTILS_LOGGER.info(f"{'Delta' if sync_token else 'Sync completo'} do Google Calendar para user_id: {user_id} (calendar={calendar_id}): {len(events)} evento(s) em {pages} página(s).")
+        return events, next_sync_token
+
     async def create_calendar_event(self, user_id: str, event_data: dict) -> dict | None:
         """Cria um evento no Google Calendar."""
         CALENDAR_UTILS_LOGGER.info(f"Tentando criar evento no Google Calendar para user_id: {user_id}")
@@ -382,9 +677,8 @@ class GoogleCalendarUtils:
             CALENDAR_UTILS_LOGGER.warning(f"Não há credenciais válidas para criar evento para user_id: {user_id}")
             return None
         try:
-            service = await asyncio.to_thread(build, 'calendar', 'v3', credentials=creds)
-            event = await asyncio.to_thread(
-                lambda: service.events().insert(calendarId='primary', body=event_data).execute()
+            event = await self._execute_calendar_request(
+                creds, lambda service: service.events().insert(calendarId='primary', body=event_data)
             )
             CALENDAR_UTILS_LOGGER.info(f"Evento criado no Google Calendar: {event.get('htmlLink')}")
             return event
@@ -403,9 +697,8 @@ class GoogleCalendarUtils:
             CALENDAR_UTILS_LOGGER.warning(f"Não há credenciais válidas para atualizar evento para user_id: {user_id}")
             return None
         try:
-            service = await asyncio.to_thread(build, 'calendar', 'v3', credentials=creds)
-            event = await asyncio.to_thread(
-                lambda: service.events().update(calendarId='primary', eventId=event_id, body=event_data).execute()
+            event = await self._execute_calendar_request(
+                creds, lambda service: service.events().update(calendarId='primary', eventId=event_id, body=event_data)
             )
             CALENDAR_UTILS_LOGGER.info(f"Evento {event_id} atualizado no Google Calendar: {event.get('htmlLink')}")
             return event
@@ -424,9 +717,8 @@ class GoogleCalendarUtils:
             CALENDAR_UTILS_LOGGER.warning(f"Não há credenciais válidas para deletar evento para user_id: {user_id}")
             return False
         try:
-            service = await asyncio.to_thread(build, 'calendar', 'v3', credentials=creds)
-            await asyncio.to_thread(
-                lambda: service.events().delete(calendarId='primary', eventId=event_id).execute()
+            await self._execute_calendar_request(
+                creds, lambda service: service.events().delete(calendarId='primary', eventId=event_id)
             )
             CALENDAR_UTILS_LOGGER.info(f"Evento {event_id} deletado do Google Calendar.")
             return True
@@ -436,4 +728,17 @@ class GoogleCalendarUtils:
         except Exception as e:
             CALENDAR_UTILS_LOGGER.error(f"Erro inesperado ao deletar evento {event_id} do Google Calendar para {user_id}: {e}", exc_info=True)
             return False
+
+_default_instance: "GoogleCalendarUtils | None" = None
+_default_instance_lock = threading.Lock()
+
+
+def get_google_calendar_utils() -> GoogleCalendarUtils:
+    """Instância compartilhada, criada no primeiro uso (ou no warm-up) em vez de no import do módulo."""
+    global _default_instance
+    if _default_instance is None:
+        with _default_instance_lock:
+            if _default_instance is None:
+                _default_instance = GoogleCalendarUtils()
+    return _default_instance
 # --- END OF FILE google_calendar_utils.py ---
\ No newline at end of file
@@ -0,0 +1,633 @@
+import os
+import json
+import logging
+import time
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
+
+from eixa_orchestrator import orchestrate_eixa_response
+from crud_orchestrator import orchestrate_crud_action, orchestrate_crud_batch
+from config import GEMINI_TEXT_MODEL, GEMINI_VISION_MODEL, INTERACT_REQUEST_DEADLINE_SECONDS
+from google_calendar_utils import get_google_calendar_utils
+import bigquery_utils
+from firestore_client_singleton import _initialize_firestore_client_instance
+from image_handler import upload_image_to_gcs, upload_avatar_with_thumbnails, create_signed_upload_url, GCS_AVATARS_FOLDER, GCS_IMAGES_FOLDER
+from file_utils import decode_upload, verify_image
+from firestore_utils import set_firestore_document
+from llm_resilience import request_deadline
+from response_utils import project_fields, apply_delta, etag_matches
+from eixa_data import get_all_daily_tasks, get_all_projects, get_all_routines
+from metrics_utils import record_latency
+from logging_utils import start_request_log_sampling
+from view_versions import get_view_versions, view_etag
+from vertex_utils import preload_vertex_sdk
+
+logger = logging.getLogger(__name__)
+
+# Lógica das rotas HTTP, independente de framework. main.py (Flask/gunicorn) e asgi_app.py
+# (Starlette/uvicorn) só traduzem a requisição (query, JSON, headers, URL) para estas funções
+# e o HandlerResponse de volta para a resposta do framework.
+
+GCP_PROJECT = None
+REGION = None
+GEMINI_API_KEY = None
+GOOGLE_CLIENT_ID = None
+GOOGLE_CLIENT_SECRET = None
+GOOGLE_REDIRECT_URI = None
+FRONTEND_URL = None
+
+
+@dataclass
+class HandlerResponse:
+    body: Optional[dict] = None        # None = resposta sem corpo (ex.: preflight 204)
+    status: int = 200
+    headers: dict = field(default_factory=dict)
+    redirect_url: Optional[str] = None
+
+
+def initialize_app_globals(warm_up_in_background: bool = True):
+    """
+    Carrega as variáveis de ambiente. Chamado uma vez quando o worker da aplicação inicia.
+    Clientes (BigQuery, Firestore, Calendar) e o SDK do Vertex ficam para o warm-up, que roda
+    em segundo plano para o worker aceitar conexões logo após o import (cold start do Cloud Run).
+    """
+    global GCP_PROJECT, REGION, GEMINI_API_KEY, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_REDIRECT_URI, FRONTEND_URL, _warmup_report
+
+    GCP_PROJECT = os.environ.get("GCP_PROJECT")
+    REGION = os.environ.get("REGION", "us-central1")
+    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+    GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
+    GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET")
+    GOOGLE_REDIRECT_URI = os.environ.get("GOOGLE_REDIRECT_URI")
+    FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
+
+    if not GCP_PROJECT:
+        logger.critical("Variável de ambiente 'GCP_PROJECT' não definida. A aplicação pode não funcionar.")
+    if not GEMINI_API_KEY:
+        logger.warning("Variável de ambiente 'GEMINI_API_KEY' não definida. Interações com LLM podem falhar.")
+    if not _calendar_oauth_configured():
+        logger.warning("Uma ou mais variáveis de ambiente do Google OAuth (GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_REDIRECT_URI, FRONTEND_URL) não estão definidas. A integração com o Google Calendar pode não funcionar corretamente.")
+
+    logger.info(f"Variáveis de ambiente carregadas. GCP Project: {GCP_PROJECT}, Region: {REGION}")
+    logger.info(f"Google OAuth Config: Client ID present: {bool(GOOGLE_CLIENT_ID)}, Redirect URI present: {bool(GOOGLE_REDIRECT_URI)}, Frontend URL present: {bool(FRONTEND_URL)}")
+
+    _warmup_report = None  # variáveis recarregadas: o próximo warm-up roda de novo
+    if warm_up_in_background:
+        threading.Thread(target=warm_up, name="eixa-warmup", daemon=True).start()
+
+
+def _calendar_oauth_configured() -> bool:
+    return bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET and GOOGLE_REDIRECT_URI and FRONTEND_URL)
+
+
+def _calendar_utils():
+    """GoogleCalendarUtils compartilhado (criado no primeiro uso ou no warm-up), ou None se indisponível."""
+    if not _calendar_oauth_configured():
+        return None
+    try:
+        return get_google_calendar_utils()
+    except Exception as e:
+        logger.error(f"GoogleCalendarUtils could not be initialized: {e}", exc_info=True)
+        return None
+
+
+# --- Warm-up ---
+
+_warmup_lock = threading.Lock()
+_warmup_report: Optional[dict] = None
+
+
+def _warm_up_bigquery():
+    if GCP_PROJECT and bigquery_utils.bq_manager is None:
+        bigquery_utils.initialize_bigquery(GCP_PROJECT)
+
+
+def _warm_up_firestore():
+    if GCP_PROJECT:
+        _initialize_firestore_client_instance()
+
+
+def _warm_up_calendar():
+    if _calendar_oauth_configured():
+        get_google_calendar_utils()
+
+
+_WARMUP_STEPS = (
+    ("bigquery", _warm_up_bigquery),
+    ("firestore", _warm_up_firestore),
+    ("calendar", _warm_up_calendar),
+    ("vertex_sdk", preload_vertex_sdk),  # embeddings usam o SDK em todo turno de chat
+)
+
+
+def warm_up() -> dict:
+    """
+    Cria os clientes e importa o SDK do Vertex, uma vez por processo (chamadas concorrentes
+    esperam a primeira). Devolve o tempo (ms) de cada etapa e as que falharam; uma falha não
+    impede as demais e a etapa é refeita na próxima chamada.
+    """
+    global _warmup_report
+    with _warmup_lock:
+        if _warmup_report is not None and not _warmup_report["failed"]:
+            return _warmup_report
+        report = {"steps_ms": {}, "failed": []}
+        for name, step in _WARMUP_STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                report["failed"].append(name)
+                logger.error(f"WARMUP | Step '{name}' failed: {e}", exc_info=True)
+            report["steps_ms"][name] = round((time.perf_counter() - start) * 1000, 1)
+        _warmup_report = report
+        logger.info(f"WARMUP | Done: {report}")
+        return report
+
+
+async def warmup_endpoint() -> HandlerResponse:
+    """/_warmup: executa (ou espera) o warm-up. Serve como startup probe / warmup request do Cloud Run."""
+    report = await asyncio.to_thread(warm_up)
+    # Sempre 200: BigQuery/Calendar são opcionais e a falha de um deles não deve reprovar a instância no probe.
+    return HandlerResponse({"status": "degraded" if report["failed"] else "ok", **report})
+
+
+def log_request_info(method: str, path: str, remote_addr: Optional[str], headers: Mapping[str, str]):
+    """Registra informações básicas de cada requisição HTTP recebida."""
+    # Uma decisão de amostragem de DEBUG por requisição; o trace do Cloud Run é "TRACE_ID/SPAN_ID;o=1".
+    trace_id = (headers.get('X-Cloud-Trace-Context') or '').split('/')[0]
+    start_request_log_sampling(trace_id or headers.get('X-Request-Id'))
+    if method != 'OPTIONS' and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s", json.dumps({
+            "event": "http_request_received",
+            "method": method,
+            "path": path,
+            "remote_addr": remote_addr,
+            "headers_snippet": {k: v for k, v in headers.items() if k.lower() in ['user-agent', 'x-forwarded-for', 'x-cloud-trace-context']}
+        }))
+
+
+# Métodos e headers aceitos no CORS das rotas que respondem ao preflight elas mesmas.
+_ROUTE_CORS = {
+    "/interact": ('POST, GET, OPTIONS', 'Content-Type, Authorization, X-Request-Timeout, If-None-Match'),
+    "/actions": ('POST, OPTIONS', 'Content-Type, Authorization, If-None-Match'),
+    "/actions/batch": ('POST, OPTIONS', 'Content-Type, Authorization, If-None-Match'),
+    "/upload": ('POST, OPTIONS', 'Content-Type, Authorization'),
+    "/upload/signed-url": ('POST, OPTIONS', 'Content-Type, Authorization'),
+    "/views": ('GET, OPTIONS', 'Content-Type, Authorization, If-None-Match'),
+}
+
+
+def cors_headers(path: str) -> dict:
+    methods, allowed_headers = _ROUTE_CORS[path]
+    if not FRONTEND_URL:
+        logger.warning("FRONTEND_URL não definido, usando Access-Control-Allow-Origin: '*' para CORS.")
+    return {
+        'Access-Control-Allow-Origin': FRONTEND_URL or '*',
+        'Access-Control-Allow-Methods': methods,
+        'Access-Control-Allow-Headers': allowed_headers,
+        'Access-Control-Expose-Headers': 'ETag',
+        'Access-Control-Max-Age': '3600'
+    }
+
+
+def preflight(path: str) -> HandlerResponse:
+    return HandlerResponse(status=204, headers=cors_headers(path))
+
+
+def root_check() -> HandlerResponse:
+    """Endpoint simples para verificar se a aplicação está no ar."""
+    logger.debug("Health check requested.")
+    return HandlerResponse({"status": "ok", "message": "EIXA está no ar. Use /interact para interagir."})
+
+
+async def google_auth(args: Mapping[str, str]) -> HandlerResponse:
+    """
+    Inicia o fluxo OAuth 2.0 para o Google Calendar.
+    O frontend deve chamar este endpoint com o `user_id` como query parameter.
+    """
+    user_id = args.get('user_id')
+    account_label = args.get('account_label')
+    if not user_id:
+        logger.error("/auth/google: Missing user_id for OAuth initiation.")
+        return HandlerResponse({"status": "error", "message": "Parâmetro 'user_id' é obrigatório para iniciar a autenticação Google."}, 400)
+
+    calendar_utils = _calendar_utils()
+    if calendar_utils is None or not calendar_utils.oauth_config_ready:
+        logger.critical("/auth/google: Google OAuth environment variables are not properly set or GoogleCalendarUtils not initialized.")
+        return HandlerResponse({"status": "error", "message": "Erro de configuração do servidor para autenticação Google. Contate o suporte."}, 500)
+
+    try:
+        authorization_url = await calendar_utils.get_auth_url(user_id=user_id, account_label=account_label)
+
+        if authorization_url:
+            logger.info(f"/auth/google: Generated authorization URL for user {user_id}. Returning URL.")
+            return HandlerResponse({"auth_url": authorization_url})
+        else:
+            logger.error(f"/auth/google: Failed to generate authorization URL for user {user_id}. check GoogleCalendarUtils logs for details.")
+            return HandlerResponse({"status": "error", "message": "Não foi possível gerar a URL de autenticação Google."}, 500)
+    except Exception as e:
+        logger.critical(f"/auth/google: Unexpected error during OAuth URL generation for user {user_id}: {e}", exc_info=True)
+        return HandlerResponse({"status": "error", "message": "Erro interno ao preparar autenticação Google."}, 500)
+
+
+async def list_calendar_accounts(args: Mapping[str, str]) -> HandlerResponse:
+    user_id = args.get('user_id')
+    if not user_id:
+        return HandlerResponse({"status": "error", "message": "'user_id' é obrigatório."}, 400)
+    calendar_utils = _calendar_utils()
+    if calendar_utils is None:
+        return HandlerResponse({"status": "error", "message": "Calendar utils indisponível."}, 500)
+    try:
+        result = await calendar_utils.list_accounts(user_id)
+        return HandlerResponse({"status": "success", **result})
+    except Exception as e:
+        logger.error(f"/calendar/accounts: Falha ao listar contas para {user_id}: {e}", exc_info=True)
+        return HandlerResponse({"status": "error", "message": "Falha ao listar contas."}, 500)
+
+
+async def select_calendar_account(body: Optional[dict]) -> HandlerResponse:
+    body = body or {}
+    user_id = body.get('user_id')
+    account_id = body.get('account_id')
+    if not user_id or not account_id:
+        return HandlerResponse({"status": "error", "message": "'user_id' e 'account_id' são obrigatórios."}, 400)
+    calendar_utils = _calendar_utils()
+    if calendar_utils is None:
+        return HandlerResponse({"status": "error", "message": "Calendar utils indisponível."}, 500)
+    try:
+        result = await calendar_utils.select_active_account(user_id, account_id)
+        code = 200 if result.get('status') == 'success' else 404
+        return HandlerResponse(result, code)
+    except Exception as e:
+        logger.error(f"/calendar/accounts/select: Falha ao selecionar conta '{account_id}' para {user_id}: {e}", exc_info=True)
+        return HandlerResponse({"status": "error", "message": "Falha ao selecionar conta."}, 500)
+
+
+async def oauth2callback(authorization_response_url: str) -> HandlerResponse:
+    """
+    Recebe o redirecionamento do Google após a autorização do usuário.
+    Delega o processamento do callback para GoogleCalendarUtils.
+    Redireciona o usuário de volta para o frontend.
+    """
+    logger.info(f"/oauth2callback: Received callback. Full URL: {authorization_response_url}")
+
+    calendar_utils = _calendar_utils()
+    if calendar_utils is None or not calendar_utils.oauth_config_ready:
+        logger.critical("/oauth2callback: GoogleCalendarUtils not initialized or OAuth config not ready.")
+        return HandlerResponse(redirect_url=f"{FRONTEND_URL}/dashboard?auth_status=error&message=Erro%20de%20configuração%20do%20servidor")
+
+    try:
+        result = await calendar_utils.handle_oauth2_callback(authorization_response_url)
+
+        user_id_from_callback = result.get("user_id")
+
+        if result.get("status") == "success":
+            logger.info(f"/oauth2callback: Successfully processed Google Calendar credentials for user: {user_id_from_callback}")
+            return HandlerResponse(redirect_url=f"{FRONTEND_URL}/dashboard?auth_status=success&message=Google%20Calendar%20conectado%20com%20sucesso&user_id={user_id_from_callback or ''}")
+        else:
+            logger.error(f"/oauth2callback: handle_oauth2_callback failed for user {user_id_from_callback}: {result.get('message')}")
+            return HandlerResponse(redirect_url=f"{FRONTEND_URL}/dashboard?auth_status=error&message=Falha%20ao%20conectar%20Google%20Calendar&user_id={user_id_from_callback or ''}")
+
+    except Exception as e:
+        logger.critical(f"/oauth2callback: Critical error during OAuth callback processing: {e}", exc_info=True)
+        return HandlerResponse(redirect_url=f"{FRONTEND_URL}/dashboard?auth_status=error&message=Falha%20crítica%20ao%20conectar%20Google%20Calendar")
+
+
+def _slim_payload(payload: dict, request_json: dict, request_headers: Mapping[str, str], user_id: str) -> tuple[dict, dict]:
+    """
+    Aplica ao payload de /interact ou /actions a projeção pedida em "fields" e o delta a partir de
+    "since" (ou do header If-None-Match). Devolve (corpo, headers extras com o ETag).
+    """
+    wrapped = isinstance(payload.get("response_payload"), dict)
+    inner = payload["response_payload"] if wrapped else payload
+    inner = project_fields(inner, request_json.get("fields"))
+    since = request_json.get("since") or request_headers.get("If-None-Match")
+    inner, etag = apply_delta(inner, user_id, since)
+    return ({**payload, "response_payload": inner} if wrapped else inner), {"ETag": etag}
+
+
+async def interact(request_json: Optional[dict], request_headers: Mapping[str, str]) -> HandlerResponse:
+    """
+    Ponto de entrada principal para todas as interações da EIXA (chat, CRUD, visualizações, etc.).
+    """
+    start_time = time.time()
+    logger.debug("interact_api: Function started.")
+    headers = cors_headers("/interact")
+
+    if not request_json:
+        logger.error("interact_api: Invalid request body or empty JSON.")
+        return HandlerResponse({"status": "error", "response": "Corpo da requisição inválido ou JSON vazio."}, 400, headers)
+
+    user_id = request_json.get('user_id')
+    request_type = request_json.get('request_type', 'chat_and_view') # Default para 'chat_and_view'
+    debug_mode = request_json.get('debug_mode', False)
+
+    logger.debug("interact_api: Received user_id='%s', request_type='%s', debug_mode='%s'.", user_id, request_type, debug_mode)
+
+    if not user_id or not isinstance(user_id, str):
+        logger.error(f"interact_api: Missing or invalid user_id: '{user_id}'.")
+        return HandlerResponse({"status": "error", "response": "O campo 'user_id' é obrigatório e deve ser uma string."}, 400, headers)
+
+    if not GCP_PROJECT:
+        logger.critical("GCP_PROJECT não definido. A aplicação não pode operar.")
+        return HandlerResponse({"status": "error", "response": "Erro de configuração do servidor (GCP_PROJECT ausente)."}, 500, headers)
+
+    gemini_api_key = GEMINI_API_KEY or os.environ.get("GEMINI_API_KEY")
+    if not gemini_api_key:
+        logger.warning("GEMINI_API_KEY não definido. Usando Vertex AI via credenciais padrão do serviço.")
+
+    # Prazo das chamadas ao LLM desta requisição; o cliente pode encurtar via X-Request-Timeout (segundos).
+    deadline_seconds = INTERACT_REQUEST_DEADLINE_SECONDS
+    try:
+        client_timeout = float(request_headers.get('X-Request-Timeout', 0))
+        if client_timeout > 0:
+            deadline_seconds = min(deadline_seconds, client_timeout)
+    except ValueError:
+        logger.debug("interact_api: Ignoring invalid X-Request-Timeout header.")
+
+    try:
+        # TODA a lógica principal foi movida para orchestrate_eixa_response
+        with request_deadline(deadline_seconds):
+            response_payload = await orchestrate_eixa_response(
+                user_id=user_id,
+                user_message=request_json.get('message'),
+                uploaded_file_data=request_json.get('uploaded_file_data'),
+                view_request=request_json.get('view_request'),
+                gcp_project_id=GCP_PROJECT,
+                region=REGION,
+                gemini_api_key=gemini_api_key,
+                gemini_text_model=GEMINI_TEXT_MODEL,
+                gemini_vision_model=GEMINI_VISION_MODEL,
+                firestore_collection_interactions='interactions',
+                debug_mode=debug_mode,
+                request_type=request_type, # Passa o request_type
+                action=request_json.get('action'), # Passa a ação para request_type=google_calendar_action
+                action_data=request_json.get('data') # Passa os dados para request_type=google_calendar_action
+            )
+
+        duration = time.time() - start_time
+        logger.info(json.dumps({
+            "event": "request_completed",
+            "user_id": user_id,
+            "request_type": request_type,
+            "duration_seconds": f"{duration:.2f}",
+            "response_status": response_payload.get("status", "unknown"),
+        }))
+        if logger.isEnabledFor(logging.DEBUG):
+            # Apenas o formato do payload; o conteúdo completo (HTML, agenda) não vai para o log.
+            logger.debug("interact_api: Response payload keys: %s", sorted((response_payload.get("response_payload") or response_payload).keys()))
+
+        body, slim_headers = _slim_payload(response_payload, request_json, request_headers, user_id)
+        return HandlerResponse(body, 200, {**headers, **slim_headers})
+
+    except Exception as e:
+        duration = time.time() - start_time
+        logger.critical(json.dumps({
+            "event": "orchestration_failed",
+            "user_id": user_id,
+            "request_type": request_type,
+            "duration_seconds": f"{duration:.2f}",
+            "error_type": type(e).__name__,
+            "error_message": str(e)
+        }), exc_info=True)
+
+        return HandlerResponse({
+            "status": "error",
+            "response": "Erro interno inesperado.",
+            "debug_info": [f"Erro interno: {type(e).__name__} - {str(e)}"]
+        }, 500, headers)
+
+
+async def actions(request_json: Optional[dict], request_headers: Mapping[str, str]) -> HandlerResponse:
+    """Ações CRUD estruturadas vindas diretamente da UI."""
+    headers = cors_headers("/actions")
+    if not request_json:
+        return HandlerResponse({"status": "error", "message": "JSON inválido."}, 400, headers)
+
+    user_id = request_json.get('user_id')
+    item_type = request_json.get('item_type')
+    action = request_json.get('action')
+    data = request_json.get('data', {})
+
+    if not user_id or not isinstance(user_id, str):
+        return HandlerResponse({"status": "error", "message": "'user_id' é obrigatório."}, 400, headers)
+    if not item_type or not action:
+        return HandlerResponse({"status": "error", "message": "Campos 'item_type' e 'action' são obrigatórios."}, 400, headers)
+
+    payload = {
+        "user_id": user_id,
+        "item_type": item_type,
+        "action": action,
+        "item_id": request_json.get('item_id'),
+        "data": data,
+        "date": request_json.get('date')
+    }
+
+    try:
+        result = await orchestrate_crud_action(payload)
+        if result.get("status") == "error":
+            return HandlerResponse(result, 400, headers)
+        body, slim_headers = _slim_payload(result, request_json, request_headers, user_id)
+        return HandlerResponse(body, 200, {**headers, **slim_headers})
+    except Exception as e:
+        logger.critical(f"/actions: Failed to process payload for user {user_id}: {e}", exc_info=True)
+        return HandlerResponse({"status": "error", "message": "Erro interno inesperado."}, 500, headers)
+
+
+async def actions_batch(request_json: Optional[dict], request_headers: Mapping[str, str]) -> HandlerResponse:
+    """
+    Lote ordenado de ações CRUD da UI (arrastar e soltar, seleção múltipla, Kanban):
+    {"user_id", "operations": [{"item_type", "action", "item_id", "data", "date"}, ...]}.
+    Uma gravação em WriteBatch e um payload de view no fim; resultados por operação em "results".
+    """
+    headers = cors_headers("/actions/batch")
+    if not request_json:
+        return HandlerResponse({"status": "error", "message": "JSON inválido."}, 400, headers)
+    user_id = request_json.get('user_id')
+    if not user_id or not isinstance(user_id, str):
+        return HandlerResponse({"status": "error", "message": "'user_id' é obrigatório."}, 400, headers)
+
+    try:
+        result = await orchestrate_crud_batch(user_id, request_json.get('operations'))
+    except Exception as e:
+        logger.critical(f"/actions/batch: Failed to process batch for user {user_id}: {e}", exc_info=True)
+        return HandlerResponse({"status": "error", "message": "Erro interno inesperado."}, 500, headers)
+    if result.get("committed") is False:
+        return HandlerResponse(result, 500, headers)
+    if result.get("status") == "error" and not result.get("results"):
+        return HandlerResponse(result, 400, headers)
+    body, slim_headers = _slim_payload(result, request_json, request_headers, user_id)
+    return HandlerResponse(body, 200, {**headers, **slim_headers})
+
+
+# Views de leitura: contador de versão (view_versions) -> carregador e chave em html_view_data,
+# a mesma do /interact com view_request equivalente ("agenda", "projetos", "rotinas_templates_view").
+_READ_VIEWS = {
+    "agenda": (get_all_daily_tasks, "agenda"),
+    "projects": (get_all_projects, "projetos"),
+    "routines": (get_all_routines, "routines"),
+}
+
+
+async def read_view(view_name: str, args: Mapping[str, str], request_headers: Mapping[str, str]) -> HandlerResponse:
+    """
+    GET /views/<agenda|projects|routines>?user_id=...: a view direto do Firestore, sem a
+    inicialização do orquestrador. O ETag vem do contador de versão do usuário; If-None-Match
+    igual devolve 304 depois de ler só o documento de versões.
+    """
+    headers = {**cors_headers("/views"), "Cache-Control": "private, no-cache"}
+    user_id = args.get('user_id')
+    if not user_id:
+        return HandlerResponse({"status": "error", "message": "'user_id' é obrigatório."}, 400, headers)
+    if view_name not in _READ_VIEWS:
+        return HandlerResponse({"status": "error", "message": f"View '{view_name}' não existe. Use: {', '.join(_READ_VIEWS)}."}, 404, headers)
+
+    start = time.perf_counter()
+    success = False
+    try:
+        etag = view_etag(view_name, (await get_view_versions(user_id))[view_name])
+        headers["ETag"] = etag
+        if etag_matches(request_headers.get("If-None-Match"), etag):
+            success = True
+            return HandlerResponse(status=304, headers=headers)
+        loader, view_key = _READ_VIEWS[view_name]
+        data = await loader(user_id)
+        success = True
+        return HandlerResponse({"status": "success", "html_view_data": {view_key: data}}, 200, headers)
+    except Exception as e:
+        logger.error(f"/views/{view_name}: Failed to read view for user {user_id}: {e}", exc_info=True)
+        return HandlerResponse({"status": "error", "message": "Erro interno ao carregar a view."}, 500, headers)
+    finally:
+        record_latency(f"views.{view_name}", (time.perf_counter() - start) * 1000.0, success)
+
+
+async def upload(request_json: Optional[dict]) -> HandlerResponse:
+    """
+    Upload de imagens (avatares, imagens de chat, anexos) em base64 para o Google Cloud Storage.
+
+    Request JSON:
+    {
+        "user_id": "user123",
+        "image_data": "data:image/png;base64,iVBORw0KGgo...",
+        "upload_type": "avatar" | "chat_image",
+        "filename": "optional_custom_filename.png"
+    }
+
+    Response JSON:
+    {
+        "status": "success" | "error",
+        "image_url": "https://storage.googleapis.com/...",
+        "thumbnails": {"64": "...", "128": "...", "256": "..."},  // só para avatar
+        "message": "Upload successful"
+    }
+    """
+    headers = cors_headers("/upload")
+    if not request_json:
+        logger.error("/upload: Invalid request body or empty JSON.")
+        return HandlerResponse({"status": "error", "message": "Corpo da requisição inválido ou JSON vazio."}, 400, headers)
+
+    user_id = request_json.get('user_id')
+    image_data = request_json.get('image_data')
+    upload_type = request_json.get('upload_type', 'chat_image')  # 'avatar' ou 'chat_image'
+    filename = request_json.get('filename')
+
+    if not user_id or not image_data:
+        logger.error(f"/upload: Missing user_id or image_data. user_id={user_id}, image_data_present={bool(image_data)}")
+        return HandlerResponse({"status": "error", "message": "Campos 'user_id' e 'image_data' são obrigatórios."}, 400, headers)
+
+    # Decodifica e valida uma única vez; o GCS recebe os mesmos bytes.
+    try:
+        decoded = await asyncio.to_thread(decode_upload, image_data, filename or "upload", "image/png")
+        await asyncio.to_thread(verify_image, decoded)
+    except Exception as e:
+        logger.warning(f"/upload: Invalid image for user '{user_id}': {e}")
+        return HandlerResponse({"status": "error", "message": "Imagem inválida ou corrompida."}, 400, headers)
+
+    thumbnails = None
+    try:
+        # Upload baseado no tipo
+        if upload_type == 'avatar':
+            avatar = await upload_avatar_with_thumbnails(user_id, decoded, filename)
+            image_url = avatar["url"] if avatar else None
+            thumbnails = avatar["thumbnails"] if avatar else None
+
+            # Atualizar perfil do usuário com novo avatar
+            if image_url:
+                try:
+                    await set_firestore_document(
+                        'profiles',
+                        user_id,
+                        {"user_profile": {"avatar_url": image_url, "avatar_thumbnails": thumbnails}},
+                        merge=True
+                    )
+                    logger.info(f"/upload: Avatar URL updated in user profile for user '{user_id}'.")
+                except Exception as e:
+                    logger.error(f"/upload: Failed to update avatar_url in user profile for user '{user_id}': {e}", exc_info=True)
+                    # Não retorna erro, pois o upload foi bem-sucedido
+        else:
+            image_url = await upload_image_to_gcs(user_id, decoded, filename)
+
+        if image_url:
+            logger.info(f"/upload: Image uploaded successfully for user '{user_id}'. Type: {upload_type}")
+            response_body = {
+                "status": "success",
+                "image_url": image_url,
+                "message": "Upload realizado com sucesso.",
+                "upload_type": upload_type
+            }
+            if thumbnails:
+                response_body["thumbnails"] = thumbnails
+            return HandlerResponse(response_body, 200, headers)
+        else:
+            logger.error(f"/upload: Image upload failed for user '{user_id}'. No URL returned.")
+            return HandlerResponse({
+                "status": "error",
+                "message": "Falha ao fazer upload da imagem. Tente novamente."
+            }, 500, headers)
+
+    except Exception as e:
+        logger.critical(f"/upload: Unexpected error during image upload for user '{user_id}': {e}", exc_info=True)
+        return HandlerResponse({
+            "status": "error",
+            "message": "Erro interno inesperado ao processar upload."
+        }, 500, headers)
+
+
+async def signed_upload_url(request_json: Optional[dict]) -> HandlerResponse:
+    """
+    Gera uma URL V4 assinada (PUT) para o navegador enviar a imagem direto ao Google Cloud Storage,
+    sem o arquivo passar por esta instância.
+
+    Request JSON:
+    {
+        "user_id": "user123",
+        "content_type": "image/png",
+        "upload_type": "avatar" | "chat_image"
+    }
+
+    Response JSON:
+    {
+        "status": "success",
+        "upload_url": "https://storage.googleapis.com/...",
+        "method": "PUT",
+        "headers": {"Content-Type": "image/png", "x-goog-content-length-range": "0,26214400"},
+        "blob_path": "images/user123/uploads/<uuid>.png",
+        "object_url": "https://storage.googleapis.com/eixa-files/...",
+        "expires_at": "2025-01-01T00:15:00+00:00"
+    }
+    """
+    headers = cors_headers("/upload/signed-url")
+    request_json = request_json or {}
+    user_id = request_json.get('user_id')
+    content_type = request_json.get('content_type')
+    if not user_id or not content_type:
+        logger.error(f"/upload/signed-url: Missing user_id or content_type. user_id={user_id}, content_type={content_type}")
+        return HandlerResponse({"status": "error", "message": "Campos 'user_id' e 'content_type' são obrigatórios."}, 400, headers)
+
+    folder = GCS_AVATARS_FOLDER if request_json.get('upload_type') == 'avatar' else GCS_IMAGES_FOLDER
+    signed = await create_signed_upload_url(user_id, content_type, folder)
+    if not signed:
+        return HandlerResponse({"status": "error", "message": "Não foi possível gerar a URL de upload."}, 400, headers)
+    return HandlerResponse({"status": "success", **signed}, 200, headers)
@@ -4,12 +4,28 @@ Handler para upload de imagens para Google Cloud Storage.
 Usado para armazenar imagens enviadas pelo usuário no chat e avatares de perfil.
 """
 
+import asyncio
+import functools
 import logging
+import tempfile
+import threading
 import uuid
-import base64
-from datetime import timedelta
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Union
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.cloud import storage
+from requests.adapters import HTTPAdapter
+
+from config import (
+    GCS_HTTP_POOL_SIZE, GCS_UPLOAD_WORKERS, GCS_RESUMABLE_MIN_BYTES, GCS_RESUMABLE_CHUNK_SIZE,
+    GCS_PARALLEL_UPLOAD_MIN_BYTES, GCS_PARALLEL_UPLOAD_CHUNK_BYTES,
+    GCS_SIGNED_UPLOAD_URL_TTL_SECONDS, GCS_SIGNED_UPLOAD_MAX_BYTES,
+)
+from file_utils import DecodedUpload, decode_upload, verify_image
+from image_processing import ProcessedImage, prepare_image_for_storage_async, make_avatar_thumbnails_async
 
 logger = logging.getLogger(__name__)
 
@@ -17,115 +33,257 @@ logger = logging.getLogger(__name__)
 GCS_BUCKET_NAME = "eixa-files"
 GCS_IMAGES_FOLDER = "images"
 GCS_AVATARS_FOLDER = "avatars"
+GCS_DIRECT_UPLOADS_FOLDER = "uploads"
+_IMAGE_MIME_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+_IMAGE_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/gif": "gif", "image/webp": "webp"}
+_STORAGE_SCOPES = ("https://www.googleapis.com/auth/devstorage.read_write",)
+
+_storage_client: Optional[storage.Client] = None
+_storage_credentials = None
+_storage_client_lock = threading.Lock()
+# Executor próprio e limitado: uploads lentos não esgotam o executor padrão usado por asyncio.to_thread.
+_gcs_executor = ThreadPoolExecutor(max_workers=GCS_UPLOAD_WORKERS, thread_name_prefix="gcs")
+
 
 def _get_storage_client() -> storage.Client:
     """
-    Retorna um cliente do Google Cloud Storage.
-    Usa as credenciais padrão do ambiente (Application Default Credentials).
+    Retorna o cliente do Google Cloud Storage (singleton, criado na primeira chamada).
+    Usa as credenciais padrão do ambiente (Application Default Credentials) numa sessão HTTP
+    com pool de conexões dimensionado para as threads de upload.
     """
+    global _storage_client, _storage_credentials
+    if _storage_client is not None:
+        return _storage_client
+    with _storage_client_lock:
+        if _storage_client is None:
+            try:
+                credentials, project = google.auth.default(scopes=_STORAGE_SCOPES)
+                session = AuthorizedSession(credentials)
+                adapter = HTTPAdapter(pool_connections=GCS_HTTP_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                _storage_client = storage.Client(project=project, credentials=credentials, _http=session)
+                _storage_credentials = credentials
+                logger.debug(f"IMAGE_HANDLER | Storage client initialized successfully.")
+            except Exception as e:
+                logger.error(f"IMAGE_HANDLER | Error initializing Storage client: {e}", exc_info=True)
+                raise
+    return _storage_client
+
+
+async def _run_gcs(fn, *args, **kwargs):
+    """Executa uma chamada bloqueante do GCS no executor limitado, fora do event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_gcs_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _upload_bytes(blob: storage.Blob, data: bytes, content_type: str):
+    """Upload simples para arquivos pequenos, resumable em blocos acima de GCS_RESUMABLE_MIN_BYTES e
+    XML multipart em paralelo (transfer_manager) acima de GCS_PARALLEL_UPLOAD_MIN_BYTES."""
+    size = len(data)
+    if size >= GCS_PARALLEL_UPLOAD_MIN_BYTES:
+        from google.cloud.storage import transfer_manager
+        # O multipart paralelo só aceita caminho de arquivo.
+        with tempfile.NamedTemporaryFile(suffix=".upload") as tmp:
+            tmp.write(data)
+            tmp.flush()
+            blob.content_type = content_type
+            transfer_manager.upload_chunks_concurrently(
+                tmp.name, blob, content_type=content_type, chunk_size=GCS_PARALLEL_UPLOAD_CHUNK_BYTES,
+                worker_type=transfer_manager.THREAD, max_workers=max(2, GCS_UPLOAD_WORKERS // 2))
+        return
+    if size >= GCS_RESUMABLE_MIN_BYTES:
+        blob.chunk_size = GCS_RESUMABLE_CHUNK_SIZE
+    blob.upload_from_string(data, content_type=content_type)
+
+
+def _store_blob(user_id: str, blob_path: str, data: bytes, content_type: str, original_filename: str = None) -> str:
+    """Grava o blob (se ainda não existir: o nome é o hash do conteúdo) e devolve a URL pública ou assinada."""
+    client = _get_storage_client()
+    bucket = client.bucket(GCS_BUCKET_NAME)
+    blob = bucket.blob(blob_path)
+
+    if blob.exists():
+        logger.info(f"IMAGE_HANDLER | Identical image already stored, skipping upload: {blob_path}")
+    else:
+        if original_filename:
+            blob.metadata = {"original_filename": original_filename}
+        blob.cache_control = "public, max-age=31536000, immutable"  # conteúdo endereçado por hash
+        _upload_bytes(blob, data, content_type)
+        logger.info(f"IMAGE_HANDLER | Image uploaded to GCS: {blob_path}")
+
+    # Torna o objeto público e retorna URL pública (fallback sem assinatura)
+    # Observação: requer que o bucket permita objetos públicos; ajuste a política conforme necessário.
     try:
-        client = storage.Client()
-        logger.debug(f"IMAGE_HANDLER | Storage client initialized successfully.")
-        return client
-    except Exception as e:
-        logger.error(f"IMAGE_HANDLER | Error initializing Storage client: {e}", exc_info=True)
-        raise
+        blob.make_public()
+        public_url = blob.public_url
+        logger.info(f"IMAGE_HANDLER | Public URL generated for user '{user_id}': {blob_path}")
+        return public_url
+    except Exception:
+        # Se não conseguir tornar público, tenta URL assinada (ambiente com chave privada)
+        signed_url = blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(days=7),
+            method="GET"
+        )
+        logger.info(f"IMAGE_HANDLER | Signed URL generated for user '{user_id}': {blob_path}")
+        return signed_url
+
+
+def _content_blob_path(folder: str, user_id: str, image: ProcessedImage, suffix: str = "") -> str:
+    return f"{folder}/{user_id}/{image.content_hash[:32]}{suffix}.{image.extension}"
+
+
+async def _decode_image(image_data: Union[str, DecodedUpload], filename: str = None) -> DecodedUpload:
+    if isinstance(image_data, DecodedUpload):
+        upload = image_data
+    else:
+        upload = await asyncio.to_thread(decode_upload, image_data, filename or "upload", "image/png")
+        await asyncio.to_thread(verify_image, upload)
+    if upload.mime_type not in _IMAGE_MIME_TYPES:
+        raise ValueError(f"Tipo de imagem não suportado: {upload.mime_type}")
+    return upload
+
 
 async def upload_image_to_gcs(
     user_id: str,
-    image_data: str,
+    image_data: Union[str, DecodedUpload],
     filename: str = None,
     folder: str = GCS_IMAGES_FOLDER
 ) -> Optional[str]:
     """
     Faz upload de uma imagem em base64 para o Google Cloud Storage.
+    A imagem é reduzida para IMAGE_STORAGE_MAX_DIMENSION, reencodada sem EXIF e gravada como
+    folder/user_id/<hash do conteúdo>.<ext>: o mesmo conteúdo enviado de novo não é regravado.
     
     Args:
         user_id: ID do usuário (usado para organizar arquivos)
-        image_data: String base64 da imagem (pode incluir prefixo 'data:image/...')
-        filename: Nome do arquivo (opcional, gera UUID se ausente)
+        image_data: String base64 da imagem (pode incluir prefixo 'data:image/...') ou um
+            DecodedUpload já validado (evita decodificar de novo)
+        filename: Nome original do arquivo (opcional; guardado nos metadados do blob)
         folder: Pasta no bucket (padrão: 'images')
     
     Returns:
         URL pública assinada da imagem (válida por 7 dias) ou None em caso de erro
     """
     try:
-        # Remove prefixo 'data:image/...;base64,' se presente
-        if ',' in image_data and image_data.startswith('data:'):
-            image_data = image_data.split(',', 1)[1]
-        
-        # Decodifica base64
-        image_bytes = base64.b64decode(image_data)
-        
-        # Gera nome do arquivo se não fornecido
-        if not filename:
-            file_extension = "png"  # padrão
-            filename = f"{uuid.uuid4()}.{file_extension}"
-        
-        # Caminho completo no bucket: folder/user_id/filename
-        blob_path = f"{folder}/{user_id}/{filename}"
-        
-        # Upload para GCS
-        client = _get_storage_client()
-        bucket = client.bucket(GCS_BUCKET_NAME)
-        blob = bucket.blob(blob_path)
-        
-        # Define content-type baseado na extensão
-        content_type = "image/png"
-        if filename.endswith(".jpg") or filename.endswith(".jpeg"):
-            content_type = "image/jpeg"
-        elif filename.endswith(".gif"):
-            content_type = "image/gif"
-        elif filename.endswith(".webp"):
-            content_type = "image/webp"
-        
-        blob.upload_from_string(image_bytes, content_type=content_type)
-        logger.info(f"IMAGE_HANDLER | Image uploaded to GCS: {blob_path}")
-        
-        # Torna o objeto público e retorna URL pública (fallback sem assinatura)
-        # Observação: requer que o bucket permita objetos públicos; ajuste a política conforme necessário.
-        try:
-            blob.make_public()
-            public_url = blob.public_url
-            logger.info(f"IMAGE_HANDLER | Public URL generated for user '{user_id}': {blob_path}")
-            return public_url
-        except Exception:
-            # Se não conseguir tornar público, tenta URL assinada (ambiente com chave privada)
-            signed_url = blob.generate_signed_url(
-                version="v4",
-                expiration=timedelta(days=7),
-                method="GET"
-            )
-            logger.info(f"IMAGE_HANDLER | Signed URL generated for user '{user_id}': {blob_path}")
-            return signed_url
-        
+        upload = await _decode_image(image_data, filename)
+        image = await prepare_image_for_storage_async(upload.data)
+        blob_path = _content_blob_path(folder, user_id, image)
+        return await _run_gcs(_store_blob, user_id, blob_path, image.data, image.mime_type, filename)
     except Exception as e:
         logger.error(f"IMAGE_HANDLER | Error uploading image for user '{user_id}': {e}", exc_info=True)
         return None
 
+async def upload_avatar_with_thumbnails(
+    user_id: str,
+    avatar_data: Union[str, DecodedUpload],
+    filename: str = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Faz upload do avatar (tamanho de armazenamento) e das miniaturas quadradas de
+    AVATAR_THUMBNAIL_SIZES, para o frontend não baixar o original.
+    
+    Returns:
+        {"url": <avatar>, "thumbnails": {"64": <url>, ...}} ou None em caso de erro
+    """
+    try:
+        upload = await _decode_image(avatar_data, filename)
+        image, thumbnails = await asyncio.gather(
+            prepare_image_for_storage_async(upload.data),
+            make_avatar_thumbnails_async(upload.data),
+        )
+        uploads = [(None, _content_blob_path(GCS_AVATARS_FOLDER, user_id, image), image)]
+        uploads += [(size, _content_blob_path(GCS_AVATARS_FOLDER, user_id, image, f"_{size}"), thumb) for size, thumb in thumbnails.items()]
+        urls = await asyncio.gather(*(_run_gcs(_store_blob, user_id, path, img.data, img.mime_type, filename)
+                                      for _, path, img in uploads))
+        result = {"url": urls[0], "thumbnails": {}}
+        for (size, _, _), url in zip(uploads[1:], urls[1:]):
+            result["thumbnails"][str(size)] = url
+        return result
+    except Exception as e:
+        logger.error(f"IMAGE_HANDLER | Error uploading avatar for user '{user_id}': {e}", exc_info=True)
+        return None
+
 async def upload_avatar_to_gcs(
     user_id: str,
-    avatar_data: str,
+    avatar_data: Union[str, DecodedUpload],
     filename: str = None
 ) -> Optional[str]:
     """
     Faz upload de um avatar de perfil para o Google Cloud Storage.
-    Wrapper de upload_image_to_gcs com pasta específica para avatares.
+    Wrapper de upload_avatar_with_thumbnails que devolve só a URL do avatar.
     
     Args:
         user_id: ID do usuário
-        avatar_data: String base64 do avatar
-        filename: Nome do arquivo (opcional, gera UUID se ausente)
+        avatar_data: String base64 do avatar ou DecodedUpload
+        filename: Nome original do arquivo (opcional)
     
     Returns:
         URL pública assinada do avatar ou None em caso de erro
     """
-    return await upload_image_to_gcs(
-        user_id=user_id,
-        image_data=avatar_data,
-        filename=filename or f"avatar_{uuid.uuid4()}.png",
-        folder=GCS_AVATARS_FOLDER
+    result = await upload_avatar_with_thumbnails(user_id, avatar_data, filename)
+    return result["url"] if result else None
+
+def _signing_kwargs() -> Dict[str, Any]:
+    """Credenciais sem chave privada (Cloud Run, ADC de metadata server) assinam via IAM signBlob,
+    o que exige o e-mail da service account e um access token válido."""
+    credentials = _storage_credentials
+    if hasattr(credentials, "sign_bytes") and getattr(credentials, "signer", None) is not None:
+        return {}
+    if not credentials.valid:
+        credentials.refresh(Request())
+    return {"service_account_email": credentials.service_account_email, "access_token": credentials.token}
+
+
+def _create_signed_upload_url(user_id: str, content_type: str, folder: str, max_bytes: int) -> Dict[str, Any]:
+    extension = _IMAGE_EXTENSIONS.get(content_type, "bin")
+    blob_path = f"{folder}/{user_id}/{GCS_DIRECT_UPLOADS_FOLDER}/{uuid.uuid4()}.{extension}"
+    client = _get_storage_client()
+    blob = client.bucket(GCS_BUCKET_NAME).blob(blob_path)
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=GCS_SIGNED_UPLOAD_URL_TTL_SECONDS)
+    # O navegador precisa enviar exatamente estes cabeçalhos no PUT (fazem parte da assinatura).
+    required_headers = {"Content-Type": content_type, "x-goog-content-length-range": f"0,{max_bytes}"}
+    upload_url = blob.generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=GCS_SIGNED_UPLOAD_URL_TTL_SECONDS),
+        method="PUT",
+        content_type=content_type,
+        headers={"x-goog-content-length-range": required_headers["x-goog-content-length-range"]},
+        **_signing_kwargs(),
     )
+    return {
+        "upload_url": upload_url,
+        "method": "PUT",
+        "headers": required_headers,
+        "blob_path": blob_path,
+        "object_url": blob.public_url,
+        "expires_at": expires_at.isoformat(),
+    }
+
+
+async def create_signed_upload_url(
+    user_id: str,
+    content_type: str,
+    folder: str = GCS_IMAGES_FOLDER,
+    max_bytes: int = GCS_SIGNED_UPLOAD_MAX_BYTES
+) -> Optional[Dict[str, Any]]:
+    """
+    Gera uma URL V4 assinada de *upload* (PUT) para o navegador enviar o arquivo direto ao GCS,
+    sem o conteúdo passar pela API. O objeto vai para folder/user_id/uploads/<uuid>.<ext>;
+    uploads diretos não passam pelo redimensionamento de image_processing.
+    
+    Returns:
+        {"upload_url", "method", "headers", "blob_path", "object_url", "expires_at"} ou None em caso de erro
+    """
+    if content_type not in _IMAGE_MIME_TYPES:
+        logger.warning(f"IMAGE_HANDLER | Signed upload URL refused for content type '{content_type}' (user '{user_id}').")
+        return None
+    try:
+        result = await _run_gcs(_create_signed_upload_url, user_id, content_type, folder, max_bytes)
+        logger.info(f"IMAGE_HANDLER | Signed upload URL generated for user '{user_id}': {result['blob_path']}")
+        return result
+    except Exception as e:
+        logger.error(f"IMAGE_HANDLER | Error generating signed upload URL for user '{user_id}': {e}", exc_info=True)
+        return None
 
 def delete_image_from_gcs(blob_path: str) -> bool:
     """
@@ -148,4 +306,7 @@ def delete_image_from_gcs(blob_path: str) -> bool:
         logger.error(f"IMAGE_HANDLER | Error deleting image from GCS ({blob_path}): {e}", exc_info=True)
         return False
 
+async def delete_image_from_gcs_async(blob_path: str) -> bool:
+    return await _run_gcs(delete_image_from_gcs, blob_path)
+
 # --- END OF FILE image_handler.py ---
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from config import (
+    IMAGE_LLM_MAX_DIMENSION, IMAGE_STORAGE_MAX_DIMENSION, IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY,
+    AVATAR_THUMBNAIL_SIZES, IMAGE_PROCESSING_WORKERS,
+)
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Redimensionamento e reencode de imagens enviadas, num pool de processos (decodificar e
+# reamostrar uma foto de 12 MP leva centenas de ms de CPU, que não devem ocupar a thread da
+# requisição nem disputar o GIL). A orientação EXIF é aplicada aos pixels antes do reencode e os
+# metadados (EXIF/GPS) não são copiados para a saída. Imagens já pequenas, sem EXIF e em formato
+# aceito pelo Gemini passam sem reencode. O Pillow é importado no primeiro uso (fora do cold start).
+
+_MIME_BY_FORMAT = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+_PASSTHROUGH_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+@dataclass(frozen=True)
+class ProcessedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    content_hash: str  # sha256 dos bytes finais
+
+    @property
+    def extension(self) -> str:
+        return self.mime_type.split("/", 1)[1].replace("jpeg", "jpg")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _encode(image: "Image.Image", output_format: str, quality: int) -> bytes:
+    if output_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("P", "PA") else "RGB")
+    buffer = io.BytesIO()
+    # Sem exif=/icc_profile=: a saída não carrega metadados do original.
+    if output_format == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format=output_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _resize_image(data: bytes, max_dimension: int, output_format: str, quality: int) -> tuple[Optional[bytes], str, int, int]:
+    """Executado no worker. Devolve (bytes, mime, largura, altura); bytes=None = usar o original."""
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        source_format = image.format
+        has_metadata = bool(image.info.get("exif")) or bool(image.getexif())
+        if (source_format in _PASSTHROUGH_FORMATS and not has_metadata and not getattr(image, "is_animated", False)
+                and max(image.size) <= max_dimension):
+            return None, Image.MIME.get(source_format, "image/png"), image.width, image.height
+        if source_format == "JPEG":
+            # Decodifica já reduzido (DCT scaling): bem mais rápido e sem alocar a imagem inteira.
+            image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        return _encode(image, output_format, quality), _MIME_BY_FORMAT[output_format], image.width, image.height
+
+
+def _make_thumbnails(data: bytes, sizes: tuple, output_format: str, quality: int) -> dict[int, bytes]:
+    """Executado no worker: miniaturas quadradas (recorte central) para avatares."""
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        if image.format == "JPEG":
+            image.draft("RGB", (max(sizes) * 2, max(sizes) * 2))
+        image = ImageOps.exif_transpose(image)
+        return {size: _encode(ImageOps.fit(image, (size, size), Image.LANCZOS), output_format, quality) for size in sizes}
+
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESSING_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _image_pool
+
+
+def _reset_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+def _run_in_pool(fn, *args):
+    """Executa no pool de processos (chamada síncrona, para código que já roda fora do event loop)."""
+    if IMAGE_PROCESSING_WORKERS <= 1:
+        return fn(*args)
+    try:
+        return _get_image_pool().submit(fn, *args).result()
+    except (BrokenProcessPool, RuntimeError, OSError) as e:
+        logger.warning(f"IMAGE_PROCESSING | Process pool unavailable ({e}). Processing in-thread.")
+        _reset_image_pool()
+        return fn(*args)
+
+
+def process_image(data: bytes, max_dimension: int, output_format: str = IMAGE_OUTPUT_FORMAT,
+                  quality: int = IMAGE_OUTPUT_QUALITY) -> ProcessedImage:
+    """Reduz a imagem para caber em max_dimension, sem EXIF. Levanta ValueError se não for uma imagem válida."""
+    from PIL import Image
+    try:
+        resized, mime_type, width, height = _run_in_pool(_resize_image, data, max_dimension, output_format, quality)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Não foi possível processar a imagem: {e}")
+    output = data if resized is None else resized
+    if resized is not None:
+        logger.debug(f"IMAGE_PROCESSING | {len(data)} -> {len(output)} bytes ({width}x{height}, {mime_type}).")
+    return ProcessedImage(data=output, mime_type=mime_type, width=width, height=height, content_hash=content_hash(output))
+
+
+def prepare_image_for_llm(data: bytes) -> ProcessedImage:
+    return process_image(data, IMAGE_LLM_MAX_DIMENSION)
+
+
+def prepare_image_for_storage(data: bytes) -> ProcessedImage:
+    return process_image(data, IMAGE_STORAGE_MAX_DIMENSION)
+
+
+def make_avatar_thumbnails(data: bytes, sizes: tuple = AVATAR_THUMBNAIL_SIZES, output_format: str = IMAGE_OUTPUT_FORMAT,
+                           quality: int = IMAGE_OUTPUT_QUALITY) -> dict[int, ProcessedImage]:
+    from PIL import Image
+    try:
+        thumbnails = _run_in_pool(_make_thumbnails, data, tuple(sizes), output_format, quality)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Não foi possível gerar as miniaturas: {e}")
+    return {size: ProcessedImage(data=thumb, mime_type=_MIME_BY_FORMAT[output_format], width=size, height=size,
+                                 content_hash=content_hash(thumb))
+            for size, thumb in thumbnails.items()}
+
+
+async def prepare_image_for_storage_async(data: bytes) -> ProcessedImage:
+    return await asyncio.to_thread(prepare_image_for_storage, data)
+
+
+async def make_avatar_thumbnails_async(data: bytes, sizes: tuple = AVATAR_THUMBNAIL_SIZES) -> dict[int, ProcessedImage]:
+    return await asyncio.to_thread(make_avatar_thumbnails, data, sizes)
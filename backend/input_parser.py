@@ -3,6 +3,8 @@ import base64
 import logging
 # Reutiliza a lógica de processamento de arquivos do file_utils
 import file_utils  # ALTERADO: Importa o módulo inteiro
+import document_ingestion
+import image_processing
 from typing import Dict
 
 logger = logging.getLogger(__name__)
@@ -18,11 +20,13 @@ def parse_incoming_input(
     - 'user_input_for_saving': String para salvar (mensagem ou descrição do arquivo)
     - 'prompt_parts_for_gemini': Lista de partes (texto/imagem) para o prompt do Gemini
     - 'gemini_model_override': 'gemini-pro-vision' se for imagem, senão None
+    - 'document': PreparedDocument (trechos + hash) de PDF/DOCX para indexação vetorial, senão None
     """
     
     processed_file_content = None
     prompt_parts_for_gemini = []
     gemini_model_override = None
+    document = None
     input_type = 'text'
     user_input_for_saving = user_message  # Default para salvar, será sobrescrito se houver arquivo
 
@@ -38,10 +42,13 @@ def parse_incoming_input(
             logger.info(f"Arquivo '{uploaded_file_data.get('filename')}' processado com sucesso. Tipo: {processed_file_content['type']}.")
 
             if processed_file_content['type'] == 'image':
+                # Reduzida para IMAGE_LLM_MAX_DIMENSION e sem EXIF; imagens já pequenas seguem como vieram.
+                upload = processed_file_content['upload']
+                llm_image = image_processing.prepare_image_for_llm(upload.data)
                 prompt_parts_for_gemini.append({
                     "inlineData": {
-                        "mimeType": processed_file_content['metadata']['mime_type'],
-                        "data": processed_file_content['content']['base64_image']
+                        "mimeType": llm_image.mime_type,
+                        "data": upload.base64_text if llm_image.data is upload.data else base64.b64encode(llm_image.data).decode('ascii')
                     }
                 })
                 gemini_model_override = 'gemini-pro-vision'
@@ -49,6 +56,13 @@ def parse_incoming_input(
                 user_input_for_saving = f"[IMAGEM: {uploaded_file_data['filename']}] {user_message or ''}".strip()
 
             elif processed_file_content['type'] == 'text':  # PDF ou DOCX
+                text_content = processed_file_content['content']['text_content']
+                if document_ingestion.ingestion_available() and not text_content.startswith("[AVISO:"):
+                    document = document_ingestion.prepare_document(
+                        uploaded_file_data['filename'],
+                        text_content.removesuffix(file_utils.TRUNCATION_NOTICE),
+                        part_index=len(prompt_parts_for_gemini)
+                    )
                 prompt_parts_for_gemini.append({
                     "text": f"Conteúdo do arquivo '{uploaded_file_data['filename']}':\n{processed_file_content['content']['text_content']}\n\n"
                 })
@@ -76,5 +90,6 @@ def parse_incoming_input(
         'input_type': input_type,
         'user_input_for_saving': user_input_for_saving,
         'prompt_parts_for_gemini': prompt_parts_for_gemini,
-        'gemini_model_override': gemini_model_override
+        'gemini_model_override': gemini_model_override,
+        'document': document
     }
\ No newline at end of file
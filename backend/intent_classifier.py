@@ -0,0 +1,199 @@
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+from config import INTENT_CLASSIFIER_WEIGHTS_PATH
+
+logger = logging.getLogger(__name__)
+
+# Pré-classificador local de intenção de ação (CRUD de tarefas/projetos/rotinas).
+# Decide, sem chamar o LLM, se vale a pena rodar _extract_llm_action_intent: a maioria das
+# mensagens é conversa e não tem intenção de CRUD. É uma regressão logística sobre features
+# de palavras-chave/regex (pt/en), opcionalmente combinada com uma logística sobre o
+# embedding da mensagem (que o orquestrador já calcula para a memória vetorial).
+# Os pesos padrão são calibrados à mão para favorecer recall; pesos treinados podem ser
+# carregados de um JSON (INTENT_CLASSIFIER_WEIGHTS_PATH), gerado por
+# benchmarks/eval_intent_classifier.py --fit-weights.
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFD", text) if unicodedata.category(ch) != "Mn")
+
+
+def _compile(*patterns: str) -> re.Pattern:
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
+# Padrões sobre o texto minúsculo e sem acentos.
+_FEATURE_PATTERNS = {
+    "action_verb": _compile(
+        r"\b(adicion|acrescent|inclu|cri|cadastr|colo(c|qu)|agend|mar(c|qu)|lembr|anot|registr|salv)\w*",
+        r"\b(remov|delet|apag|exclu|cancel|tir[ae])\w*",
+        r"\b(atualiz|alter|mud|edit|renome|adi[ae]|reagend|transfer|mov)\w*",
+        r"\b(conclu|finaliz|complet)\w*",
+        r"\bapli(c|qu)\w*\s+(a\s+|minha\s+)?rotina",
+        r"\b(add|create|schedule|remind|delete|remove|cancel|update|rename|reschedule|move|mark|complete|finish|apply)\b",
+        r"\bpoe\b|\bbot[ae]\b",
+    ),
+    "imperative_start": _compile(
+        r"^\s*(por favor,?\s*)?(me\s+)?(adicion|acrescent|cri|colo(c|qu)|agend|mar(c|qu)|lembr|anot|remov|delet|apag|exclu|cancel|atualiz|alter|mud|renome|adi|reagend|conclu|finaliz|apli(c|qu)|poe|ponha|bot)\w*",
+        r"^\s*(please\s+)?(add|create|schedule|remind|delete|remove|cancel|update|rename|reschedule|move|mark|complete|apply|put)\b",
+    ),
+    "item_noun": _compile(
+        r"\b(tarefa|projeto|rotina|compromisso|reuniao|lembrete|evento|consulta|agenda|afazer|pendencia)s?\b",
+        r"\b(task|project|routine|meeting|reminder|event|appointment|to-?do)s?\b",
+    ),
+    "schedule_expr": _compile(
+        r"\b(hoje|amanha|depois de amanha|semana que vem|proxim[ao] (semana|mes)|fim de semana)\b",
+        r"\b(segunda|terca|quarta|quinta|sexta|sabado|domingo)(-feira)?\b",
+        r"\bas\s+\d{1,2}\b|\b\d{1,2}\s*(h|hs|horas)\b|\b\d{1,2}:\d{2}\b|\bdia\s+\d{1,2}\b|\b\d{1,2}/\d{1,2}\b",
+        r"\b(today|tomorrow|tonight|next week|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b|\bat\s+\d{1,2}\b",
+        r"\b(diari|semanal|mensal|toda(s)? (as )?(segunda|terca|quarta|quinta|sexta|manha|noite)|todo dia)\w*",
+    ),
+    "completion_report": _compile(
+        r"\b(terminei|conclui|finalizei|acabei|ja fiz|fiz a tarefa|feito|entreguei)\b",
+        r"\b(i (finished|completed|did)|done with)\b",
+    ),
+    "request_phrase": _compile(
+        r"\b(preciso|tenho que|quero|vou|gostaria de|pode|poderia|me ajuda a)\b",
+        r"\b(i need to|i have to|i want to|can you|could you)\b",
+    ),
+    # Compromissos sem verbo de CRUD ("pagar conta de luz dia 10", "tenho médico quinta 10h"):
+    # só contam junto com uma expressão de data/hora (ver extract_features).
+    "errand_phrase": _compile(
+        r"^\s*\w+(ar|er|ir)\b",
+        r"\b(tenho|terei|marquei)\b",
+        r"^\s*(i (have|need|want)|i'?ve got)\b",
+    ),
+    "question": _compile(
+        r"\?\s*$",
+        r"^\s*(o que|oque|como|por que|porque|quais?|quando|onde|quem|sera que)\b",
+        r"^\s*(what|how|why|which|when|where|who)\b",
+    ),
+    "emotional": _compile(
+        r"\b(estou|to|me sinto|sentindo|sinto)\b.*\b(cansad|ansios|trist|desanimad|sobrecarregad|estressad|feliz|bem|mal)\w*",
+        r"\b(i feel|i am|i'm)\b.*\b(tired|anxious|sad|overwhelmed|stressed|happy)\b",
+    ),
+}
+
+DEFAULT_FEATURE_WEIGHTS = {
+    "action_verb": 2.2,
+    "imperative_start": 2.0,
+    "item_noun": 1.6,
+    "schedule_expr": 1.2,
+    "completion_report": 2.5,
+    "request_phrase": 0.6,
+    "scheduled_request": 1.6,
+    "question": -1.2,
+    "emotional": -0.8,
+    "short_message": -1.5,
+}
+DEFAULT_BIAS = -3.0
+
+FEATURE_NAMES = tuple(DEFAULT_FEATURE_WEIGHTS)
+
+
+def extract_features(text: str) -> dict[str, float]:
+    """Features binárias (0/1) usadas pela logística de palavras-chave."""
+    normalized = _strip_accents((text or "").lower()).strip()
+    matches = {name: pattern.search(normalized) is not None for name, pattern in _FEATURE_PATTERNS.items()}
+    features = {name: 1.0 if matches[name] else 0.0 for name in _FEATURE_PATTERNS if name != "errand_phrase"}
+    features["scheduled_request"] = 1.0 if matches["schedule_expr"] and (matches["request_phrase"] or matches["errand_phrase"]) else 0.0
+    features["short_message"] = 1.0 if len(normalized.split()) <= 2 else 0.0
+    return features
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+@dataclass
+class IntentPrediction:
+    probability: float
+    keyword_probability: float
+    embedding_probability: float | None = None
+    features: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def matched_features(self) -> list[str]:
+        return [name for name, value in self.features.items() if value]
+
+
+class IntentClassifier:
+    def __init__(self, feature_weights: dict[str, float] | None = None, bias: float = DEFAULT_BIAS,
+                 embedding_weights: list[float] | None = None, embedding_bias: float = 0.0,
+                 embedding_blend: float = 0.5):
+        self.feature_weights = dict(DEFAULT_FEATURE_WEIGHTS, **(feature_weights or {}))
+        self.bias = bias
+        self.embedding_weights = embedding_weights
+        self.embedding_bias = embedding_bias
+        self.embedding_blend = embedding_blend
+
+    @classmethod
+    def from_json(cls, path: str) -> "IntentClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        embedding = data.get("embedding") or {}
+        return cls(
+            feature_weights=data.get("feature_weights"),
+            bias=data.get("bias", DEFAULT_BIAS),
+            embedding_weights=embedding.get("weights"),
+            embedding_bias=embedding.get("bias", 0.0),
+            embedding_blend=data.get("embedding_blend", 0.5),
+        )
+
+    def to_json(self) -> dict:
+        data = {"feature_weights": self.feature_weights, "bias": self.bias, "embedding_blend": self.embedding_blend}
+        if self.embedding_weights:
+            data["embedding"] = {"weights": self.embedding_weights, "bias": self.embedding_bias}
+        return data
+
+    @property
+    def uses_embedding(self) -> bool:
+        return bool(self.embedding_weights)
+
+    def keyword_score(self, features: dict[str, float]) -> float:
+        return self.bias + sum(self.feature_weights.get(name, 0.0) * value for name, value in features.items())
+
+    def embedding_score(self, embedding: list[float]) -> float:
+        return self.embedding_bias + sum(w * x for w, x in zip(self.embedding_weights, embedding))
+
+    def predict(self, text: str, embedding: list[float] | None = None) -> IntentPrediction:
+        features = extract_features(text)
+        keyword_probability = _sigmoid(self.keyword_score(features))
+        prediction = IntentPrediction(keyword_probability, keyword_probability, features=features)
+        if self.uses_embedding and embedding and len(embedding) == len(self.embedding_weights):
+            prediction.embedding_probability = _sigmoid(self.embedding_score(embedding))
+            prediction.probability = (self.embedding_blend * prediction.embedding_probability
+                                      + (1 - self.embedding_blend) * keyword_probability)
+        return prediction
+
+
+_classifier: IntentClassifier | None = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Singleton: pesos do JSON configurado, se existir; senão os pesos padrão."""
+    global _classifier
+    if _classifier is None:
+        if INTENT_CLASSIFIER_WEIGHTS_PATH and os.path.exists(INTENT_CLASSIFIER_WEIGHTS_PATH):
+            try:
+                _classifier = IntentClassifier.from_json(INTENT_CLASSIFIER_WEIGHTS_PATH)
+                logger.info("INTENT_CLASSIFIER | Loaded weights from %s (embedding model: %s).",
+                            INTENT_CLASSIFIER_WEIGHTS_PATH, _classifier.uses_embedding)
+            except Exception as e:
+                logger.error("INTENT_CLASSIFIER | Could not load weights from %s: %s. Using defaults.", INTENT_CLASSIFIER_WEIGHTS_PATH, e, exc_info=True)
+        if _classifier is None:
+            _classifier = IntentClassifier()
+    return _classifier
+
+
+def classify_intent(text: str, embedding: list[float] | None = None) -> IntentPrediction:
+    return get_intent_classifier().predict(text, embedding)
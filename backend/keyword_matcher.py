@@ -0,0 +1,50 @@
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+# Casamento de múltiplas palavras-chave das detecções de emoção, auto-sabotagem, tags de
+# perfil e nudges. A semântica é a do `in` (substring, sem fronteira de palavra); quem chama
+# normaliza o texto e as frases (ex.: .lower(), "_" -> " ").
+# A varredura é feita com `frase in texto` (busca de substring do CPython, em C), parando na
+# primeira frase de cada rótulo: medido nos léxicos daqui, é mais rápida que um autômato de
+# Aho-Corasick em Python puro e que uma alternação única em `re`, em mensagens curtas e em
+# textos de 2 KB. Os matchers ficam em cache pelo conteúdo do léxico (sem ordenar).
+
+
+class KeywordMatcher:
+    def __init__(self, lexicon: dict[str, Iterable[str]]):
+        """`lexicon`: rótulo -> frases. Uma frase pode pertencer a vários rótulos; frases vazias são ignoradas."""
+        self._lexicon = tuple((label, tuple(dict.fromkeys(p for p in phrases if p))) for label, phrases in lexicon.items())
+        self.labels = frozenset(lexicon)
+
+    def iter_matches(self, text: str) -> Iterator[str]:
+        """Rótulo de cada ocorrência encontrada (com repetição, ocorrências sobrepostas incluídas)."""
+        for label, phrases in self._lexicon:
+            for phrase in phrases:
+                start = text.find(phrase)
+                while start != -1:
+                    yield label
+                    start = text.find(phrase, start + 1)
+
+    def matches(self, *texts: str) -> set[str]:
+        """Rótulos com ao menos uma ocorrência em algum dos textos."""
+        texts = [text for text in texts if text]
+        return {label for label, phrases in self._lexicon if any(phrase in text for text in texts for phrase in phrases)}
+
+    def counts(self, text: str) -> Counter:
+        return Counter(self.iter_matches(text))
+
+
+@lru_cache(maxsize=256)
+def _compile(frozen_lexicon: frozenset) -> KeywordMatcher:
+    return KeywordMatcher(dict(frozen_lexicon))
+
+
+def get_keyword_matcher(lexicon: dict[str, Iterable[str]]) -> KeywordMatcher:
+    """Matcher em cache pelo conteúdo do léxico (estático + frases do perfil), independente da ordem."""
+    return _compile(frozenset((label, frozenset(phrases)) for label, phrases in lexicon.items()))
+
+
+def profile_phrase(value: str) -> str:
+    """Normalização usada para frases vindas do perfil (ex.: 'abandono_de_projetos' -> 'abandono de projetos')."""
+    return value.lower().replace("_", " ")
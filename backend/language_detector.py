@@ -0,0 +1,175 @@
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Identificador de idioma local (offline) baseado em n-gramas de caracteres.
+# Serve de fast path para translation_utils.detect_language: a grande maioria das
+# mensagens é em português e não precisa de uma ida à Cloud Translation API.
+# O modelo é um Naive Bayes sobre trigramas (com padding de espaço, o que captura
+# palavras curtas como " de ", " the ", " el ") treinado num corpus-semente embutido,
+# somado a evidências de caracteres exclusivos (ã/õ/ç para pt, ñ/¿/¡ para es).
+
+SUPPORTED_LANGUAGES = ('pt', 'en', 'es')
+
+_NGRAM_SIZE = 3
+
+_SEED_CORPUS = {
+    'pt': """
+        olá eixa, tudo bem com você? preciso organizar minha semana
+        adicione uma tarefa para amanhã às nove horas da manhã
+        quero marcar uma reunião com o time na quinta-feira
+        estou muito cansado hoje e não consegui fazer nada do que planejei
+        me lembra de ligar para a minha mãe depois do almoço
+        quais são as minhas tarefas pendentes para hoje
+        cria um projeto novo chamado lançamento do site
+        não sei por onde começar, tenho muitas coisas para fazer
+        conclui a tarefa de revisar o relatório, pode marcar como feita
+        você pode me ajudar a priorizar o que é mais importante
+        estou ansiosa com a entrega do trabalho da faculdade
+        tira da agenda a consulta médica de sexta
+        obrigado pela ajuda, isso foi muito útil para mim
+        preciso estudar para a prova e também terminar o projeto
+        como foi o meu desempenho nesta semana? estou procrastinando demais
+        acordei sem energia, mas quero pelo menos fazer uma caminhada
+        muda o horário da academia para as dezoito horas
+        quero criar uma rotina matinal com meditação e leitura
+        que dia é hoje? e o que tenho marcado para depois de amanhã
+        então vamos lá, me mostra a minha agenda e os meus projetos
+        ela disse que não vai dar tempo, mas eu acho que consigo
+        isso não é uma boa ideia, prefiro deixar para a próxima semana
+    """,
+    'en': """
+        hello eixa, how are you? i need to organize my week
+        add a task for tomorrow at nine in the morning
+        i want to schedule a meeting with the team on thursday
+        i am very tired today and could not do anything i planned
+        remind me to call my mother after lunch
+        what are my pending tasks for today
+        create a new project called website launch
+        i do not know where to start, i have too many things to do
+        i finished the task of reviewing the report, you can mark it as done
+        can you help me prioritize what is most important
+        i am anxious about the deadline for my college assignment
+        remove the doctor appointment on friday from my schedule
+        thank you for the help, this was really useful for me
+        i need to study for the exam and also finish the project
+        how was my performance this week? i have been procrastinating too much
+        i woke up without energy, but i want to at least go for a walk
+        change the gym time to six in the evening
+        i want to create a morning routine with meditation and reading
+        what day is it today? and what do i have after tomorrow
+        so let us go, show me my agenda and my projects
+        she said there would not be enough time, but i think i can do it
+        this is not a good idea, i would rather leave it for next week
+    """,
+    'es': """
+        hola eixa, ¿cómo estás? necesito organizar mi semana
+        añade una tarea para mañana a las nueve de la mañana
+        quiero programar una reunión con el equipo el jueves
+        estoy muy cansado hoy y no pude hacer nada de lo que planeé
+        recuérdame llamar a mi madre después del almuerzo
+        cuáles son mis tareas pendientes para hoy
+        crea un proyecto nuevo llamado lanzamiento del sitio
+        no sé por dónde empezar, tengo demasiadas cosas que hacer
+        terminé la tarea de revisar el informe, puedes marcarla como hecha
+        ¿puedes ayudarme a priorizar lo que es más importante?
+        estoy ansiosa por la entrega del trabajo de la universidad
+        quita de la agenda la cita médica del viernes
+        gracias por la ayuda, esto fue muy útil para mí
+        necesito estudiar para el examen y también terminar el proyecto
+        ¿cómo fue mi rendimiento esta semana? estoy postergando demasiado
+        me desperté sin energía, pero quiero por lo menos salir a caminar
+        cambia el horario del gimnasio a las seis de la tarde
+        quiero crear una rutina matutina con meditación y lectura
+        ¿qué día es hoy? y qué tengo para pasado mañana
+        entonces vamos, muéstrame mi agenda y mis proyectos
+        ella dijo que no habría tiempo, pero creo que puedo hacerlo
+        esto no es una buena idea, prefiero dejarlo para la próxima semana
+    """,
+}
+
+# Caracteres praticamente exclusivos de um idioma entre os suportados.
+_MARKER_CHARS = {
+    'pt': set('ãõç'),
+    'es': set('ñ¿¡'),
+}
+_MARKER_LOG_BONUS = 4.0
+
+_NON_LETTERS_RE = re.compile(r"[^\w\s¿¡]+|\d+|_")
+_SPACES_RE = re.compile(r"\s+")
+
+_model = None
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFC', text.lower())
+    text = _NON_LETTERS_RE.sub(' ', text)
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def _ngrams(normalized: str):
+    for word in normalized.split(' '):
+        padded = f" {word} "
+        for i in range(len(padded) - _NGRAM_SIZE + 1):
+            yield padded[i:i + _NGRAM_SIZE]
+
+
+class _NgramLanguageModel:
+    """Naive Bayes multinomial sobre trigramas de caracteres com suavização add-one."""
+
+    def __init__(self, corpus: dict[str, str]):
+        counts = {lang: Counter(_ngrams(_normalize(text))) for lang, text in corpus.items()}
+        vocabulary_size = len(set().union(*counts.values()))
+        self._log_probs = {}
+        self._unseen_log_prob = {}
+        for lang, counter in counts.items():
+            denominator = sum(counter.values()) + vocabulary_size
+            self._log_probs[lang] = {gram: math.log((n + 1) / denominator) for gram, n in counter.items()}
+            self._unseen_log_prob[lang] = math.log(1 / denominator)
+
+    def scores(self, normalized: str) -> dict[str, float]:
+        grams = list(_ngrams(normalized))
+        scores = {}
+        for lang, log_probs in self._log_probs.items():
+            unseen = self._unseen_log_prob[lang]
+            score = sum(log_probs.get(gram, unseen) for gram in grams)
+            markers = _MARKER_CHARS.get(lang)
+            if markers:
+                score += _MARKER_LOG_BONUS * sum(1 for ch in normalized if ch in markers)
+            scores[lang] = score
+        return scores
+
+
+def _get_model() -> _NgramLanguageModel:
+    global _model
+    if _model is None:
+        _model = _NgramLanguageModel(_SEED_CORPUS)
+    return _model
+
+
+def detect_language_local(text: str) -> tuple[str | None, float]:
+    """
+    Retorna (idioma, confiança) para o texto, com confiança em [0, 1].
+    Retorna (None, 0.0) quando não há letras suficientes para decidir.
+    A confiança é a probabilidade posterior normalizada por n-grama, de forma que
+    textos curtos e ambíguos ficam naturalmente com confiança baixa.
+    """
+    normalized = _normalize(text or "")
+    if not normalized:
+        return None, 0.0
+
+    scores = _get_model().scores(normalized)
+    n_grams = max(1, sum(1 for _ in _ngrams(normalized)))
+    # Posterior com os log-scores escalonados pelo nº de n-gramas (evita 1.0 absoluto
+    # para qualquer texto longo) e por um fator de temperatura que deixa frases curtas
+    # abaixo do limiar de confiança.
+    scale = min(1.0, n_grams / 40)
+    best_lang = max(scores, key=scores.get)
+    best = scores[best_lang]
+    exps = {lang: math.exp((score - best) * scale) for lang, score in scores.items()}
+    confidence = exps[best_lang] / sum(exps.values())
+    return best_lang, confidence
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+from config import (
+    GEMINI_DEFAULT_DEADLINE_SECONDS, GEMINI_ATTEMPT_TIMEOUT_SECONDS, GEMINI_MAX_ATTEMPTS,
+    GEMINI_RETRY_BASE_DELAY_SECONDS, GEMINI_RETRY_MAX_DELAY_SECONDS,
+    GEMINI_HEDGING_ENABLED, GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_MIN_SAMPLES, GEMINI_LATENCY_WINDOW,
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD, GEMINI_CIRCUIT_OPEN_SECONDS, GEMINI_FALLBACK_BUDGET_SECONDS,
+)
+from metrics_utils import record_latency
+
+logger = logging.getLogger(__name__)
+
+# Camada de resiliência das chamadas ao LLM.
+# - Deadline: a requisição HTTP define um prazo absoluto (contextvar) que todas as chamadas
+#   ao LLM daquela requisição respeitam; cada tentativa usa no máximo o tempo que sobra.
+# - Retries com backoff exponencial e jitter completo para erros retentáveis (429/5xx/timeout),
+#   respeitando Retry-After quando cabe no prazo.
+# - Hedging opcional: se a tentativa passar do p95 observado do modelo, dispara uma segunda
+#   em paralelo e fica com a primeira que responder.
+# - Circuit breaker por modelo e fallback para um modelo mais rápido.
+# A função de tentativa recebe (modelo, timeout) e retorna texto/None, ou levanta
+# RetryableLLMError. None é resultado definitivo (ex.: bloqueio, resposta vazia) e não é repetido.
+
+_request_deadline: ContextVar[float | None] = ContextVar("llm_request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """Define o prazo (em segundos a partir de agora) das chamadas ao LLM feitas dentro do bloco.
+    Um prazo externo mais curto já definido prevalece."""
+    deadline = time.monotonic() + seconds
+    current = _request_deadline.get()
+    token = _request_deadline.set(min(deadline, current) if current else deadline)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def remaining_seconds() -> float | None:
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class RetryableLLMError(Exception):
+    def __init__(self, message: str, status_code: int | None = None, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fechado -> aberto após `failure_threshold` falhas seguidas; após `open_seconds`
+    deixa passar uma sonda (meio-aberto): sucesso fecha, falha reabre."""
+
+    def __init__(self, failure_threshold: int = GEMINI_CIRCUIT_FAILURE_THRESHOLD, open_seconds: float = GEMINI_CIRCUIT_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._failures: dict[str, int] = {}
+        self._opened_at: dict[str, float] = {}
+        self._probing: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - opened_at < self.open_seconds:
+                return False
+            # Uma sonda por vez; uma sonda que nunca reportou (cancelada) expira após o cooldown.
+            if now - self._probing.get(key, float("-inf")) < self.open_seconds:
+                return False
+            self._probing[key] = now
+            return True
+
+    def is_open(self, key: str) -> bool:
+        with self._lock:
+            return key in self._opened_at
+
+    def record_success(self, key: str):
+        with self._lock:
+            self._failures.pop(key, None)
+            self._probing.pop(key, None)
+            if self._opened_at.pop(key, None) is not None:
+                logger.info("LLM_RESILIENCE | Circuit for model '%s' closed.", key)
+
+    def record_failure(self, key: str):
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            was_probing = self._probing.pop(key, None) is not None
+            if was_probing or failures >= self.failure_threshold:
+                if key not in self._opened_at or was_probing:
+                    logger.warning("LLM_RESILIENCE | Circuit for model '%s' opened after %d consecutive failure(s).", key, failures)
+                self._opened_at[key] = time.monotonic()
+
+
+class LatencyTracker:
+    """Janela deslizante das latências bem-sucedidas por modelo (segundos)."""
+
+    def __init__(self, window: int = GEMINI_LATENCY_WINDOW, min_samples: int = GEMINI_HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: str, q: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+circuit_breaker = CircuitBreaker()
+latency_tracker = LatencyTracker()
+
+AttemptFn = Callable[[str, float], Awaitable[str | None]]
+
+
+def _backoff_delay(attempt_index: int, retry_after: float | None) -> float:
+    delay = random.uniform(0, min(GEMINI_RETRY_MAX_DELAY_SECONDS, GEMINI_RETRY_BASE_DELAY_SECONDS * (2 ** attempt_index)))
+    return max(delay, retry_after or 0.0)
+
+
+async def _timed_attempt(attempt: AttemptFn, model_name: str, timeout: float) -> str | None:
+    start = time.monotonic()
+    try:
+        result = await asyncio.wait_for(attempt(model_name, timeout), timeout)
+    except asyncio.TimeoutError:
+        raise RetryableLLMError(f"timeout after {timeout:.1f}s")
+    latency_tracker.record(model_name, time.monotonic() - start)
+    return result
+
+
+async def _attempt_with_hedge(attempt: AttemptFn, model_name: str, timeout: float, hedging: bool) -> str | None:
+    hedge_after = latency_tracker.percentile(model_name, GEMINI_HEDGE_PERCENTILE) if hedging else None
+    if hedge_after is None or hedge_after >= timeout:
+        return await _timed_attempt(attempt, model_name, timeout)
+
+    start = time.monotonic()
+    primary = asyncio.create_task(_timed_attempt(attempt, model_name, timeout))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    logger.info("LLM_RESILIENCE | Hedging call to '%s' after %.2fs (p%d).", model_name, hedge_after, int(GEMINI_HEDGE_PERCENTILE * 100))
+    record_latency("llm.hedge_fired", hedge_after * 1000, True, {"model": model_name})
+    pending = {primary, asyncio.create_task(_timed_attempt(attempt, model_name, timeout - hedge_after))}
+    last_error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, timeout - (time.monotonic() - start)),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        if last_error is not None:
+            raise last_error
+        raise RetryableLLMError(f"timeout after {timeout:.1f}s (hedged)")
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def resilient_llm_call(attempt: AttemptFn, model_name: str, fallback_model: str | None = None,
+                             max_attempts: int = GEMINI_MAX_ATTEMPTS, hedging: bool = GEMINI_HEDGING_ENABLED) -> str | None:
+    """
+    Executa `attempt` com deadline, retries, hedging e circuit breaker; cai para `fallback_model`
+    quando o modelo principal esgota as tentativas, está com o circuito aberto ou o prazo está curto.
+    Retorna o texto da primeira tentativa concluída, ou None.
+    """
+    remaining = remaining_seconds()
+    deadline = time.monotonic() + (GEMINI_DEFAULT_DEADLINE_SECONDS if remaining is None else remaining)
+
+    models = [model_name]
+    if fallback_model and fallback_model != model_name:
+        if remaining is not None and remaining < GEMINI_FALLBACK_BUDGET_SECONDS:
+            logger.info("LLM_RESILIENCE | Only %.1fs left in the request budget. Using fallback model '%s'.", remaining, fallback_model)
+            models = [fallback_model]
+        else:
+            models.append(fallback_model)
+
+    for model in models:
+        if not circuit_breaker.allow(model):
+            logger.warning("LLM_RESILIENCE | Circuit open for model '%s'. Skipping.", model)
+            continue
+        for attempt_index in range(max_attempts):
+            time_left = deadline - time.monotonic()
+            if time_left <= 0.5:
+                logger.warning("LLM_RESILIENCE | Deadline reached before calling '%s' (attempt %d).", model, attempt_index + 1)
+                return None
+            try:
+                result = await _attempt_with_hedge(attempt, model, min(GEMINI_ATTEMPT_TIMEOUT_SECONDS, time_left), hedging)
+                circuit_breaker.record_success(model)
+                if model != model_name:
+                    record_latency("llm.fallback_used", 0.0, result is not None, {"model": model, "primary": model_name})
+                return result
+            except RetryableLLMError as e:
+                circuit_breaker.record_failure(model)
+                delay = _backoff_delay(attempt_index, e.retry_after)
+                is_last = attempt_index == max_attempts - 1 or circuit_breaker.is_open(model)
+                logger.warning("LLM_RESILIENCE | Retryable failure calling '%s' (attempt %d/%d, status %s): %s.%s",
+                               model, attempt_index + 1, max_attempts, e.status_code, e,
+                               "" if is_last else f" Retrying in {delay:.2f}s.")
+                if is_last:
+                    break
+                if deadline - time.monotonic() - delay <= 0.5:
+                    break
+                await asyncio.sleep(delay)
+    return None
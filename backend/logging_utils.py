@@ -0,0 +1,117 @@
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+from contextvars import ContextVar
+
+# Camada de logging estruturado da EIXA.
+# - Nível configurável via LOG_LEVEL (default INFO; DEBUG só quando pedido explicitamente).
+# - Handler assíncrono: os registros entram numa fila em memória e um QueueListener
+#   faz a formatação/I/O numa thread própria, fora da thread da requisição.
+# - Amostragem de registros DEBUG por requisição (LOG_DEBUG_SAMPLE_RATE), para que
+#   ativar DEBUG em produção não multiplique o volume de logs. A decisão é tomada uma vez
+#   por requisição (hash do trace/request id) e vale para todos os registros dela, inclusive
+#   das threads e tarefas que herdam o contexto; fora de requisições, vale por registro.
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+_queue_listener = None
+_sampling_filter = None
+
+# Decisão de amostragem da requisição atual (None = fora de requisição).
+_request_debug_sampled: ContextVar[bool | None] = ContextVar("log_request_debug_sampled", default=None)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Deixa passar todos os registros INFO+ e apenas uma fração dos registros DEBUG.
+    sample_rate=1.0 desativa a amostragem; 0.0 descarta todo DEBUG.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+
+    def is_sampled(self, request_id: str) -> bool:
+        # Determinístico: o mesmo trace id dá a mesma decisão em qualquer worker ou serviço.
+        bucket = int.from_bytes(hashlib.blake2b(request_id.encode("utf-8"), digest_size=8).digest(), "big") / 2 ** 64
+        return bucket < self.sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.sample_rate >= 1.0:
+            return True
+        sampled = _request_debug_sampled.get()
+        if sampled is not None:
+            return sampled
+        return random.random() < self.sample_rate
+
+
+def start_request_log_sampling(request_id: str | None = None) -> bool:
+    """
+    Decide, no início da requisição, se os registros DEBUG dela são mantidos e guarda a
+    decisão no contexto. Sem id (header de trace), sorteia um.
+    """
+    if _sampling_filter is None or _sampling_filter.sample_rate >= 1.0:
+        sampled = True
+    else:
+        sampled = _sampling_filter.is_sampled(request_id or uuid.uuid4().hex)
+    _request_debug_sampled.set(sampled)
+    return sampled
+
+
+def _resolve_level(level_name: str | None) -> int:
+    level = logging.getLevelName((level_name or "INFO").upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def configure_logging(level: str | None = None, sample_rate: float | None = None, use_queue: bool | None = None) -> None:
+    """
+    Configura o logger raiz uma única vez por processo. Chamadas repetidas são ignoradas,
+    então qualquer entrypoint (main.py, scripts) pode chamar sem se preocupar com a ordem.
+    """
+    global _queue_listener, _sampling_filter
+
+    root = logging.getLogger()
+    if getattr(root, "_eixa_configured", False):
+        return
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if sample_rate is None:
+        sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    if use_queue is None:
+        use_queue = os.getenv("LOG_ASYNC", "true").lower() != "false"
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    sampling_filter = _sampling_filter = DebugSamplingFilter(sample_rate)
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(sampling_filter)
+        root.addHandler(queue_handler)
+        _queue_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _queue_listener.start()
+        atexit.register(stop_logging)
+    else:
+        stream_handler.addFilter(sampling_filter)
+        root.addHandler(stream_handler)
+
+    root.setLevel(_resolve_level(level))
+    root._eixa_configured = True
+
+
+def stop_logging() -> None:
+    """Esvazia a fila e encerra o listener (chamado no shutdown do worker)."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
@@ -9,6 +9,7 @@ from google.cloud import firestore
 
 from firestore_client_singleton import _initialize_firestore_client_instance
 from collections_manager import get_top_level_collection
+from keyword_matcher import get_keyword_matcher, profile_phrase
 import eixa_data # Importação necessária para get_user_history, como já estava no seu código.
 
 logger = logging.getLogger(__name__)
@@ -59,35 +60,28 @@ async def get_emotional_memories(user_id: str, n: int = 5) -> list[dict]:
         logger.error(f"Erro ao recuperar memórias emocionais para o usuário '{user_id}': {e}", exc_info=True)
         return []
 
+SABOTAGE_PHRASES = (
+    "deixar para depois", "amanhã eu faço", "não consigo", "é muito difícil",
+    "procrastinar", "estou adiando", "não vou dar conta", "desisto",
+    "sem energia", "cansado demais", "sem vontade", "perdido", "sobrecarregado",
+    "bloqueado", "não sei por onde começar"
+)
+
+
 def detect_sabotage_patterns(texts: list[str], user_profile: Dict[str, Any]) -> dict:
-    sabotage_phrases = [
-        "deixar para depois", "amanhã eu faço", "não consigo", "é muito difícil",
-        "procrastinar", "estou adiando", "não vou dar conta", "desisto",
-        "sem energia", "cansado demais", "sem vontade", "perdido", "sobrecarregado",
-        "bloqueado", "não sei por onde começar"
-    ]
+    sabotage_phrases = list(SABOTAGE_PHRASES)
 
     if user_profile and user_profile.get('psychological_profile'):
         psych_profile = user_profile['psychological_profile']
+        for key in ('historical_behavioral_patterns', 'diagnoses_and_conditions', 'coping_mechanisms'):
+            sabotage_phrases.extend(profile_phrase(phrase) for phrase in psych_profile.get(key) or [])
 
-        if psych_profile.get('historical_behavioral_patterns'):
-            for pattern_phrase in psych_profile['historical_behavioral_patterns']:
-                sabotage_phrases.append(pattern_phrase.lower().replace("_", " "))
-
-        if psych_profile.get('diagnoses_and_conditions'):
-            for condition_phrase in psych_profile['diagnoses_and_conditions']:
-                sabotage_phrases.append(condition_phrase.lower().replace("_", " "))
-
-        if psych_profile.get('coping_mechanisms'):
-            for coping_mechanism in psych_profile['coping_mechanisms']:
-                sabotage_phrases.append(coping_mechanism.lower().replace("_", " "))
-
+    # Cada frase é seu próprio rótulo; uma passada por texto conta em quantos textos ela aparece.
+    matcher = get_keyword_matcher({phrase: (phrase,) for phrase in sabotage_phrases})
     patterns_found = {}
     for text in texts:
-        lower_text = text.lower()
-        for phrase in sabotage_phrases:
-            if phrase in lower_text:
-                patterns_found[phrase] = patterns_found.get(phrase, 0) + 1
+        for phrase in matcher.matches(text.lower()):
+            patterns_found[phrase] = patterns_found.get(phrase, 0) + 1
 
     return patterns_found
 
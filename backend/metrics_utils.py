@@ -10,6 +10,12 @@ from typing import Callable, Any, Dict, Awaitable
 
 logger = logging.getLogger(__name__)
 
+# Registro das tarefas "fire-and-forget" (métricas, logs de interação, ingestão de documentos).
+# Guarda uma referência forte até a tarefa terminar (o loop só mantém referências fracas) e
+# permite esperá-las: no modo WSGI, antes do fim da requisição (o loop é descartado junto com
+# ela); no modo ASGI, no shutdown do worker (lifespan).
+_background_tasks: Dict[asyncio.Task, str] = {}
+
 _bq_manager = None  # será configurado após inicialização do BigQuery
 
 def set_bq_manager(manager):
@@ -17,11 +23,37 @@ def set_bq_manager(manager):
     global _bq_manager
     _bq_manager = manager
 
+def track_background_task(task: asyncio.Task, group: str = "default") -> asyncio.Task:
+    """Registra uma tarefa em segundo plano já criada; ela sai do registro ao terminar."""
+    _background_tasks[task] = group
+    task.add_done_callback(lambda t: _background_tasks.pop(t, None))
+    return task
+
+def spawn_background_task(coro: Awaitable[Any], group: str = "default") -> asyncio.Task:
+    """asyncio.create_task + track_background_task. Exige um event loop em execução."""
+    return track_background_task(asyncio.create_task(coro), group)
+
+def pending_background_tasks(group: str | None = None) -> list[asyncio.Task]:
+    """Tarefas ainda em execução no loop atual (de um grupo ou de todos)."""
+    loop = asyncio.get_running_loop()
+    return [task for task, task_group in list(_background_tasks.items())
+            if not task.done() and task.get_loop() is loop and (group is None or task_group == group)]
+
+async def drain_background_tasks(timeout: float, group: str | None = None) -> int:
+    """Espera (até timeout) as tarefas em segundo plano do loop atual. Devolve quantas ficaram pendentes."""
+    pending = pending_background_tasks(group)
+    if not pending:
+        return 0
+    _, still_pending = await asyncio.wait(pending, timeout=timeout)
+    if still_pending:
+        logger.warning(f"{len(still_pending)} background task(s) ({group or 'all'}) still running after {timeout}s.")
+    return len(still_pending)
+
 def record_latency(operation: str, duration_ms: float, success: bool, extra: Dict[str, Any] | None = None):
     """Encapsula envio para BigQuery se _bq_manager estiver definido."""
     if _bq_manager:
         try:
-            asyncio.create_task(_bq_manager.log_operation_metric(operation, duration_ms, success, extra))
+            spawn_background_task(_bq_manager.log_operation_metric(operation, duration_ms, success, extra), "metrics")
         except Exception as e:
             logger.warning(f"Falha ao agendar log de métrica {operation}: {e}")
     else:
@@ -6,9 +6,21 @@ import asyncio
 
 from collections_manager import get_top_level_collection
 from firestore_utils import get_firestore_document_data, set_firestore_document
+from keyword_matcher import get_keyword_matcher, profile_phrase
 
 logger = logging.getLogger(__name__)
 
+# Gatilhos fixos dos nudges; os do perfil (sobrecarga, burnout, projeto atual) entram no mesmo
+# léxico do KeywordMatcher, que testa `frase in mensagem` parando na primeira frase de cada gatilho.
+_NUDGE_TRIGGERS = {
+    "thirst": ("sede",),
+    "eye_strain": ("cansaço visual", "tela demais"),
+    "high_energy": ("muita energia", "não consigo parar", "meio acelerado"),
+    "low_energy": ("sem energia", "desanimado", "só quero ficar na cama"),
+    "adding_work": ("adicionar tarefa", "crie projeto"),
+    "big_task": ("tarefa grande", "complexo"),
+}
+
 async def get_nudger_state(user_id: str) -> Dict[str, Any]:
     """
     Recupera o estado do nudger para um usuário do Firestore de forma assíncrona.
@@ -89,12 +101,21 @@ async def analyze_for_nudges(
         daily_routine = user_profile.get('daily_routine_elements', {})
         comm_prefs = user_profile.get('communication_preferences', {})
         eixa_prefs = user_profile.get('eixa_interaction_preferences', {})
+        alerts_and_reminders = daily_routine.get('alerts_and_reminders', {})
+        overwhelm_triggers = alerts_and_reminders.get('overwhelm_triggers', [])
+        burnout_indicators = alerts_and_reminders.get('burnout_indicators', [])
+        current_projects = user_profile.get('current_projects', [])
+
+        lexicon = dict(_NUDGE_TRIGGERS)
+        lexicon["overwhelm_trigger"] = tuple(profile_phrase(t) for t in overwhelm_triggers)
+        lexicon["burnout_indicator"] = tuple(profile_phrase(i) for i in burnout_indicators)
+        lexicon["current_project"] = tuple(p.get('name', '').lower() for p in current_projects[:1])
+        triggered = get_keyword_matcher(lexicon).matches(user_message_lower)
 
         # Nudges baseados em rotina e alertas de bem-estar
-        alerts_and_reminders = daily_routine.get('alerts_and_reminders', {})
-        if alerts_and_reminders.get('hydration') and "sede" in user_message_lower:
+        if alerts_and_reminders.get('hydration') and "thirst" in triggered:
             nudges.append(f"Você mencionou sede. Lembre-se da sua meta de hidratação: {alerts_and_reminders['hydration']}!")
-        if alerts_and_reminders.get('eye_strain') and ("cansaço visual" in user_message_lower or "tela demais" in user_message_lower):
+        if alerts_and_reminders.get('eye_strain') and "eye_strain" in triggered:
             nudges.append(f"Seus olhos estão cansados? Lembre-se da sua orientação de {alerts_and_reminders['eye_strain']} para a saúde ocular.")
 
         # Nudges baseados em condições/histórico de padrões comportamentais
@@ -102,9 +123,9 @@ async def analyze_for_nudges(
         historical_behavioral_patterns = psych_profile.get('historical_behavioral_patterns', [])
 
         if "Transtorno_de_Humor_Bipolar" in diagnoses_and_conditions:
-            if any(term in user_message_lower for term in ["muita energia", "não consigo parar", "meio acelerado"]):
+            if "high_energy" in triggered:
                 nudges.append("Percebo que você está com muita energia. Podemos canalizar isso para as suas prioridades, mas lembre-se também da importância do equilíbrio e da calma.")
-            elif any(term in user_message_lower for term in ["sem energia", "desanimado", "só quero ficar na cama"]):
+            elif "low_energy" in triggered:
                  nudges.append("Sinto que você está sem energia hoje. Lembre-se que é ok ter dias assim. Vamos focar em um passo pequeno para reacender seu fluxo, ou prefere apenas conversar?")
 
         if "ciclos_de_hiperfoco_seguidos_de_esgotamento" in historical_behavioral_patterns:
@@ -112,25 +133,21 @@ async def analyze_for_nudges(
                  nudges.append("Percebo sua concentração intensa e o quanto você está focada(o) neste tópico. Lembre-se do seu padrão de hiperfoco seguido de esgotamento. Que tal uma breve pausa, ou quebrar a tarefa em partes menores?")
 
         if "abandono_de_projetos_longos" in historical_behavioral_patterns:
-            current_projects = user_profile.get('current_projects', [])
-            if current_projects and any(p.get('name', '').lower() in user_message_lower for p in current_projects[:1]):
+            if current_projects and "current_project" in triggered:
                 nudges.append(f"Falando em '{current_projects[0].get('name', 'seus projetos')}', como ele está? Lembre-se do seu padrão de 'abandono de projetos', podemos pensar em como mantê-lo em movimento, mesmo com um pequeno passo.")
 
         if "overcommitment_e_dificuldade_em_dizer_não" in historical_behavioral_patterns:
-            if ("adicionar tarefa" in user_message_lower or "crie projeto" in user_message_lower) and len(history) < 5:
+            if "adding_work" in triggered and len(history) < 5:
                 nudges.append("Notei que você está adicionando bastante coisa. Lembre-se do seu padrão de overcommitment. Podemos revisar suas prioridades para ter certeza de que tudo se encaixa na sua capacidade atual?")
 
-        alerts_and_reminders = daily_routine.get('alerts_and_reminders', {}) # Recarrega para usar os triggers
-        overwhelm_triggers = alerts_and_reminders.get('overwhelm_triggers', [])
-        if any(trigger.lower().replace("_", " ") in user_message_lower for trigger in overwhelm_triggers):
+        if "overwhelm_trigger" in triggered:
             nudges.append("Sinto que você pode estar se sentindo sobrecarregado(a). Seus gatilhos de sobrecarga (como 'muitas notificações') foram mencionados. Que tal uma pausa ou focar em uma coisa por vez?")
 
-        burnout_indicators = alerts_and_reminders.get('burnout_indicators', [])
-        if any(indicator.lower().replace("_", " ") in user_message_lower for indicator in burnout_indicators):
+        if "burnout_indicator" in triggered:
             nudges.append(f"Seus indicadores de burnout (como '{burnout_indicators[0].replace('_', ' ')}') foram detectados. É crucial cuidar do seu bem-estar. Que tal reduzir a carga ou focar em algo relaxante?")
 
         expected_eixa_actions = eixa_prefs.get('expected_eixa_actions', [])
-        if "propor_divisao_de_tarefas_grandes_em_passos_menores" in expected_eixa_actions and ("tarefa grande" in user_message_lower or "complexo" in user_message_lower):
+        if "propor_divisao_de_tarefas_grandes_em_passos_menores" in expected_eixa_actions and "big_task" in triggered:
             nudges.append("Essa tarefa parece grande. Você gostaria que a dividíssemos em passos menores para facilitar o início?")
 
     nudger_state["last_interaction_timestamp"] = datetime.datetime.now(datetime.timezone.utc)
@@ -6,6 +6,7 @@ from datetime import datetime, timezone
 
 # Importa as funções de utilidade do Firestore
 from firestore_utils import get_user_profile_data, set_firestore_document, _normalize_goals_structure # Importa _normalize_goals_structure
+from semantic_cache import invalidate_user as invalidate_semantic_cache
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +83,8 @@ async def parse_and_update_profile_settings(user_id: str, message: str, user_pro
         else:
             action_message = "Não foi possível atualizar seu perfil. Tente novamente."
 
+    if profile_updated:
+        invalidate_semantic_cache(user_id)
     return {"action_message": action_message, "profile_updated": profile_updated}
 
 
@@ -221,6 +224,7 @@ async def update_profile_from_inferred_data(user_id: str, inferred_profile_data:
         # Considerando a complexidade do merge acima, é mais seguro substituir a sub-chave 'user_profile'
         # para garantir que todas as modificações da lógica de merge sejam aplicadas.
         await set_firestore_document('profiles', user_id, {'user_profile': updated_profile}, merge=False)
+        invalidate_semantic_cache(user_id)
         logger.info(f"User profile for '{user_id}' updated with inferred data from LLM.")
     except Exception as e:
         logger.error(f"Failed to save inferred profile data for user '{user_id}': {e}", exc_info=True)
\ No newline at end of file
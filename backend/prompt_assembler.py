@@ -0,0 +1,167 @@
+import logging
+from dataclasses import dataclass, field
+
+from token_estimator import budget_tokens as estimate_tokens  # limite superior: o orçamento não pode passar do limite real
+
+logger = logging.getLogger(__name__)
+
+# Montagem do system prompt com orçamento de tokens.
+# Cada seção tem prioridade (maior = mais importante) e um orçamento próprio opcional.
+# Quando o total passa do orçamento global, as seções de menor prioridade perdem itens
+# do fim da lista (os itens devem vir ordenados do mais para o menos relevante) e, se
+# ainda for preciso, são removidas por inteiro. Seções `required` nunca são cortadas.
+
+IMAGE_PART_TOKENS = 258  # custo fixo aproximado de uma imagem inline no Gemini
+
+
+@dataclass
+class PromptSection:
+    name: str
+    priority: int
+    header: str = ""
+    items: list[str] = field(default_factory=list)
+    footer: str = ""
+    empty_text: str = ""
+    budget_tokens: int | None = None
+    required: bool = False
+    omitted_template: str = "- ... (+{n} itens omitidos para caber no limite de contexto)"
+
+    def render(self, n_items: int) -> str:
+        if not self.items:
+            return f"{self.header}{self.empty_text}{self.footer}"
+        lines = self.items[:n_items]
+        omitted = len(self.items) - n_items
+        if omitted > 0:
+            lines = lines + [self.omitted_template.format(n=omitted)]
+        return f"{self.header}" + "\n".join(lines) + ("\n" if lines else "") + f"{self.footer}"
+
+
+@dataclass
+class _SectionPlan:
+    section: PromptSection
+    item_costs: list[int]  # custos dos itens mantidos, na ordem
+    fixed_cost: int
+    items_cost: int = 0  # soma corrente de item_costs[:n_items]
+    dropped: bool = False
+
+    @property
+    def n_items(self) -> int:
+        return len(self.item_costs)
+
+    @property
+    def cost(self) -> int:
+        if self.dropped:
+            return 0
+        return self.fixed_cost + self.items_cost
+
+    def pop_item(self) -> int:
+        item_cost = self.item_costs.pop()
+        self.items_cost -= item_cost
+        return item_cost
+
+
+def _plan(section: PromptSection) -> _SectionPlan:
+    omitted_cost = estimate_tokens(section.omitted_template) if section.items else 0
+    fixed_cost = estimate_tokens(section.header) + estimate_tokens(section.footer) + estimate_tokens(section.empty_text) + omitted_cost
+    plan = _SectionPlan(section, [], fixed_cost)
+    limit = section.budget_tokens if section.budget_tokens is not None and not section.required else None
+    for item in section.items:
+        item_cost = estimate_tokens(item) + 1
+        if limit is not None and fixed_cost + plan.items_cost + item_cost > limit:
+            break  # os itens seguintes também ficam de fora; não vale estimá-los
+        plan.item_costs.append(item_cost)
+        plan.items_cost += item_cost
+    return plan
+
+
+def assemble_prompt_sections(sections: list[PromptSection], total_budget_tokens: int,
+                             fixed_sections: tuple[str, ...] = ()) -> tuple[list[tuple[str, str]], dict]:
+    """
+    Aplica os orçamentos e retorna [(nome da seção, texto renderizado)] das seções mantidas,
+    na ordem da lista, junto com o relatório. Útil para separar o prefixo estável (que vai
+    para o cache de contexto) do contexto dinâmico depois do corte conjunto.
+    As seções em `fixed_sections` só respeitam o próprio orçamento: o corte conjunto não as
+    toca, então o texto delas não depende do tamanho das demais (o prefixo do cache fica
+    estável entre turnos) e as outras dividem o que sobra do orçamento global.
+    """
+    plans = [_plan(section) for section in sections]
+    total = sum(p.cost for p in plans)
+
+    if total > total_budget_tokens:
+        trimmable = (p for p in plans if not p.section.required and p.section.name not in fixed_sections)
+        for plan in sorted(trimmable, key=lambda p: p.section.priority):
+            while plan.n_items > 0 and total > total_budget_tokens:
+                total -= plan.pop_item()
+            if total <= total_budget_tokens:
+                break
+            total -= plan.cost
+            plan.dropped = True
+        if total > total_budget_tokens:
+            logger.warning("PROMPT_ASSEMBLER | Required and fixed sections alone exceed the budget (%d > %d tokens).", total, total_budget_tokens)
+
+    rendered = [(p.section.name, p.section.render(p.n_items)) for p in plans if not p.dropped]
+    report = {
+        p.section.name: {"items": p.n_items, "of": len(p.section.items), "tokens": p.cost, "dropped": p.dropped}
+        for p in plans
+    }
+    report["_total_tokens"] = total
+    return rendered, report
+
+
+def assemble_prompt(sections: list[PromptSection], total_budget_tokens: int) -> tuple[str, dict]:
+    """
+    Monta o prompt respeitando os orçamentos por seção e o orçamento global.
+    A ordem de saída é a ordem da lista; a prioridade só decide quem é cortado primeiro.
+    Retorna (texto, relatório por seção) — o relatório vai para o debug_info.
+    """
+    rendered, report = assemble_prompt_sections(sections, total_budget_tokens)
+    return "".join(text for _, text in rendered), report
+
+
+def estimate_message_tokens(message: dict) -> int:
+    tokens = 4  # papel + delimitadores
+    for part in message.get("parts", []):
+        if "text" in part:
+            tokens += estimate_tokens(part["text"])
+        elif "inlineData" in part or "inline_data" in part:
+            tokens += IMAGE_PART_TOKENS
+    return tokens
+
+
+def trim_history(conversation_history: list[dict], budget_tokens: int, keep_last: int = 1) -> list[dict]:
+    """
+    Mantém as mensagens mais recentes que cabem no orçamento. As `keep_last` últimas
+    (a mensagem atual do usuário) são sempre mantidas. O histórico resultante sempre
+    começa com uma mensagem 'user', como o Gemini espera.
+    """
+    if not conversation_history:
+        return []
+    kept = list(conversation_history[-keep_last:]) if keep_last else []
+    used = sum(estimate_message_tokens(m) for m in kept)
+    older = conversation_history[:-keep_last] if keep_last else conversation_history
+    start = len(older)
+    for i in range(len(older) - 1, -1, -1):
+        cost = estimate_message_tokens(older[i])
+        if used + cost > budget_tokens:
+            break
+        used += cost
+        start = i
+    trimmed = older[start:] + kept
+    while len(trimmed) > keep_last and trimmed[0].get("role") != "user":
+        trimmed.pop(0)
+    if start > 0:
+        logger.debug("PROMPT_ASSEMBLER | History trimmed: kept %d of %d messages (~%d tokens).", len(trimmed), len(conversation_history), used)
+    return trimmed
+
+
+def prepend_context_to_history(conversation_history: list[dict], context_text: str) -> list[dict]:
+    """
+    Insere `context_text` como primeira parte da última mensagem do usuário. Usado quando o
+    system instruction está no cache de contexto e o contexto dinâmico precisa ir no turno.
+    Não altera a lista nem as mensagens originais.
+    """
+    if not context_text or not conversation_history:
+        return conversation_history
+    last = conversation_history[-1]
+    merged = dict(last, parts=[{"text": context_text}] + list(last.get("parts", [])))
+    return conversation_history[:-1] + [merged]
@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Templates de system prompt compilados uma única vez (no import ou no primeiro uso).
+# Cada prompt é dividido em um prefixo ESTÁTICO (idêntico entre requisições e usuários) e
+# um bloco DINÂMICO no final, que é o único pedaço renderizado a cada requisição.
+# O hash do prefixo estático é estável entre processos e serve de chave para o cache
+# de contexto do Gemini (cachedContents): enquanto o texto não muda, o prefixo não é
+# reenviado nem recobrado como token de entrada.
+
+_FIELD_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def prefix_hash(text: str) -> str:
+    """Hash curto e estável (sha256) de um prefixo estático."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class CompiledTemplate:
+    """
+    Template com campos no formato {{nome}} (mesma sintaxe do prompt_config.yaml).
+    O texto é dividido em literais e nomes de campos na construção; render() só concatena.
+    Chaves simples (JSON de exemplo) não são interpretadas.
+    """
+
+    __slots__ = ("source", "fields", "_literals", "_field_names")
+
+    def __init__(self, source: str):
+        parts = _FIELD_RE.split(source)
+        self.source = source
+        self._literals = parts[0::2]
+        self._field_names = parts[1::2]
+        self.fields = frozenset(self._field_names)
+
+    def render(self, **values) -> str:
+        missing = self.fields.difference(values)
+        if missing:
+            raise KeyError(f"Missing template field(s): {', '.join(sorted(missing))}")
+        out = [self._literals[0]]
+        for name, literal in zip(self._field_names, self._literals[1:]):
+            out.append(str(values[name]))
+            out.append(literal)
+        return "".join(out)
+
+
+@dataclass(frozen=True)
+class SystemPromptTemplate:
+    name: str
+    static_prefix: str
+    dynamic: CompiledTemplate
+    prefix_hash: str = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "prefix_hash", prefix_hash(self.static_prefix))
+
+    def render(self, **values) -> str:
+        return self.static_prefix + self.dynamic.render(**values)
+
+
+_INTENT_RULES = """Você é um assistente de extração de intenções altamente preciso e sem vieses. Sua função é analisar **EXCLUSIVAMENTE a última mensagem do usuário** para identificar INTENÇÕES CLARAS e DIRETAS de CRIAÇÃO, ATUALIZAÇÃO, EXCLUSÃO, MARCAÇÃO DE CONCLUSÃO (COMPLETE) de TAREFAS OU PROJETOS, ou GERENCIAMENTO de ROTINAS.
+A data de hoje (DATA_HOJE), a de amanhã (DATA_AMANHA), o fuso horário do usuário e as rotinas existentes estão no bloco CONTEXTO DINÂMICO, ao final destas instruções.
+
+**REGRAS RÍGIDAS DE SAÍDA:**
+1.  **SEMPRE** retorne APENAS um bloco JSON, sem texto conversacional.
+2.  **PRIORIDADE ABSOLUTA:** Se a mensagem do usuário for uma resposta simples de confirmação ou negação (e.g., "Sim", "Não", "Certo", "Ok", "Por favor", "Deletar!", "Adicionar!", "Cancelar", "Concluir!", "Entendido", "Faça", "Prossiga", "Não quero", "Obrigado", "Bom dia", "Não sei por onde começar", "O que é EIXA?"), **VOCÊ DEVE RETORNAR SOMENTE:**
+    ```json
+    {
+    "intent_detected": "none"
+    }
+    ```
+    Não tente interpretar essas mensagens como novas intenções de CRUD/Gerenciamento. Elas são respostas a uma pergunta anterior.
+3.  Se uma intenção de tarefa, projeto ou rotina for detectada **CLARAMENTE** na ÚLTIMA MENSAGEM (e não for uma resposta de confirmação/negação), retorne um JSON com a seguinte estrutura.
+
+"""
+
+# Estrutura do JSON de intenção + regras de data e exemplos; compartilhado com o modo combinado.
+_INTENT_SCHEMA_AND_EXAMPLES = """**ESTRUTURA DE SAÍDA DETALHADA:**
+```json
+{
+"intent_detected": "task" | "project" | "routine" | "none",
+"action": "create" | "update" | "delete" | "complete" | "apply_routine",
+"item_details": {
+    // Campos comuns para Task/Project/Routine Item
+    "id": "ID_DO_ITEM_SE_FOR_UPDATE_OU_DELETE_OU_APPLY_ROUTINE",
+    "name": "Nome do projeto ou rotina",
+    "description": "Descrição da tarefa ou da rotina",
+    "date": "YYYY-MM-DD" | null,
+    "time": "HH:MM" | null,
+    "duration_minutes": int | null,
+    "completed": true | false | null,
+    "status": "open" | "completed" | "in_progress" | null,
+
+    // Campos específicos para 'routine'
+    "routine_name": "Nome da Rotina (ex: Rotina Matinal)",
+    "routine_description": "Descrição da rotina (ex: Rotina de trabalho das 9h às 18h)",
+    "days_of_week": ["MONDAY", "TUESDAY", ...] | null,
+    "recurrence_rule": "Diário" | "Semanal" | "Mensal" | "Anual" | "Toda segunda-feira" | "Todo dia 15 do mês" | null,
+    "schedule": [
+        {"id": "UUID_GERADO_PELO_LLM", "time": "HH:MM", "description": "Descrição da atividade", "duration_minutes": int, "type": "task"}
+    ] | null
+},
+"confirmation_message": "Confirma que deseja...?"
+}
+```
+**Regras para Datas, Horas e Duração:**
+- Para datas, use YYYY-MM-DD. **"hoje" DEVE ser DATA_HOJE. "amanhã" DEVE ser DATA_AMANHA.** "próxima segunda" DEVE ser a data da próxima segunda-feira no formato YYYY-MM-DD. Se nenhuma data for clara, use `null`.
+- Para horários, use HH:MM. Se o usuário disser "às 2 da tarde", use "14:00". Se não for claro, use `null`.
+- Para duração, use `duration_minutes` como um número inteiro. "por uma hora" = `60`. "por meia hora" = `30`.
+
+**EXEMPLOS DE INTENÇÕES E SAÍDAS:**
+- Usuário: "Crie uma rotina de estudo para mim que se repita semanalmente. Das 9h às 10h estudar python, 10h-10h30 pausa, 10h30-12h fazer exercícios."
+  ```json
+  {
+  "intent_detected": "routine",
+  "action": "create",
+  "item_details": {
+      "routine_name": "Rotina de Estudo",
+      "routine_description": "Plano de estudo customizado.",
+      "recurrence_rule": "Semanalmente",
+      "schedule": [
+          {"id": "UUID_GERADO_PELO_LLM", "time": "09:00", "description": "Estudar Python", "duration_minutes": 60, "type": "task"},
+          {"id": "UUID_GERADO_PELO_LLM", "time": "10:00", "description": "Pausa", "duration_minutes": 30, "type": "break"},
+          {"id": "UUID_GERADO_PELO_LLM", "time": "10:30", "description": "Fazer exercícios", "duration_minutes": 90, "type": "task"}
+      ]
+  },
+  "confirmation_message": "Confirma a criação da rotina 'Rotina de Estudo' com esses horários, repetindo semanalmente?"
+  }
+  ```
+- Usuário: "Aplique minha 'Rotina Matinal' para amanhã." (exemplo com DATA_AMANHA = 2025-01-16)
+  ```json
+  {
+  "intent_detected": "routine",
+  "action": "apply_routine",
+  "item_details": {
+      "id": "ID_DA_ROTINA_MATINAL_DO_USUARIO_SE_EXISTIR",
+      "routine_name": "Rotina Matinal"
+  },
+  "date": "2025-01-16",
+  "confirmation_message": "Confirma a aplicação da 'Rotina Matinal' para amanhã?"
+  }
+  ```
+"""
+
+_INTENT_EXTRACTION_STATIC = _INTENT_RULES + _INTENT_SCHEMA_AND_EXAMPLES
+
+_INTENT_EXTRACTION_DYNAMIC = """
+--- CONTEXTO DINÂMICO ---
+DATA_HOJE: {{current_date}}
+DATA_AMANHA: {{tomorrow_date}}
+Fuso horário do usuário: {{timezone}}
+{{routines_context}}"""
+
+INTENT_EXTRACTION_PROMPT = SystemPromptTemplate(
+    name="intent_extraction",
+    static_prefix=_INTENT_EXTRACTION_STATIC,
+    dynamic=CompiledTemplate(_INTENT_EXTRACTION_DYNAMIC),
+)
+
+# Modo INTENT_MODE='combined': a resposta principal e a intenção de ação saem de uma única
+# chamada com responseMimeType JSON. Entra no prefixo estável do prompt principal.
+COMBINED_OUTPUT_INSTRUCTIONS = """
+--- FORMATO DE SAÍDA OBRIGATÓRIO (JSON) ---
+Responda SEMPRE com um único objeto JSON, sem texto fora dele:
+{"action_intent": <objeto de intenção>, "response": "<sua resposta ao usuário, incluindo blocos rich-ui se houver>"}
+`action_intent` descreve a intenção de CRIAÇÃO, ATUALIZAÇÃO, EXCLUSÃO ou CONCLUSÃO de TAREFAS/PROJETOS ou de GERENCIAMENTO de ROTINAS presente **EXCLUSIVAMENTE na última mensagem do usuário**.
+- Se não houver intenção clara (conversa, perguntas, desabafos, confirmações como "sim", "ok", "obrigado"), use {"intent_detected": "none"} e responda normalmente em `response`.
+- Se houver intenção clara, preencha `action_intent` com a estrutura abaixo e deixe `response` vazio: a confirmação é pedida ao usuário pelo sistema.
+- DATA_HOJE é a data atual do CONTEXTO TEMPORAL e DATA_AMANHA é o dia seguinte. Use os IDs das rotinas salvas do usuário quando aplicável.
+
+"""+_INTENT_SCHEMA_AND_EXAMPLES+"""--- FIM DO FORMATO DE SAÍDA ---
+
+"""
+
+
+RICH_UI_INSTRUCTIONS = """
+
+--- INSTRUÇÕES PARA RICH UI COMPONENTS ---
+Você pode enriquecer suas respostas com componentes visuais interativos usando a sintaxe ```rich-ui```. Use quando apropriado:
+
+1. **Calendar Invite** (quando mencionar eventos/reuniões):
+```rich-ui
+{
+  "type": "calendar_invite",
+  "title": "Reunião de Planejamento",
+  "date": "2025-11-30",
+  "time": "14:00",
+  "duration": "60min"
+}
+```
+
+2. **Chart** (quando mostrar progresso/estatísticas):
+```rich-ui
+{
+  "type": "chart",
+  "title": "Tarefas Concluídas",
+  "chartType": "line",
+  "data": {
+    "labels": ["Seg", "Ter", "Qua", "Qui", "Sex"],
+    "values": [3, 5, 4, 7, 6]
+  }
+}
+```
+
+3. **Quick Action** (quando sugerir ações rápidas):
+```rich-ui
+{
+  "type": "quick_action",
+  "action": "create_task",
+  "label": "Criar Tarefa",
+  "icon": "add_task"
+}
+```
+
+**REGRAS:**
+- Use Rich UI APENAS quando houver contexto claro (datas, dados, ações)
+- NÃO use se faltar informações (date, time, labels, etc.)
+- Coloque o bloco ```rich-ui``` APÓS sua resposta textual
+- Um bloco Rich UI por resposta (escolha o mais relevante)
+--- FIM DAS INSTRUÇÕES RICH UI ---
+
+"""
+
+# O nome do usuário é o único campo da persona; ele vai para o contexto dinâmico para
+# que a persona continue idêntica entre usuários. Aspas, e não crases: o placeholder no
+# prompt_config.yaml já está entre crases.
+_PERSONA_DISPLAY_NAME_REFERENCE = 'o nome em "user_display_name" informado no contexto'
+
+
+@dataclass(frozen=True)
+class StaticPromptPrefix:
+    persona: str
+    rich_ui: str
+    prefix_hash: str
+
+    @property
+    def text(self) -> str:
+        return self.persona + self.rich_ui
+
+
+@lru_cache(maxsize=4)
+def compile_main_prompt_prefix(persona_template_text: str) -> StaticPromptPrefix:
+    """
+    Compila o prefixo estático do prompt principal (persona + instruções de Rich UI).
+    Cacheado pelo texto do template, então só roda de novo se o YAML mudar.
+    """
+    persona = CompiledTemplate(persona_template_text)
+    persona_text = persona.render(**{name: _PERSONA_DISPLAY_NAME_REFERENCE for name in persona.fields})
+    if persona_text and not persona_text.endswith("\n"):
+        persona_text += "\n"
+    prefix = StaticPromptPrefix(persona_text, RICH_UI_INSTRUCTIONS, prefix_hash(persona_text + RICH_UI_INSTRUCTIONS))
+    logger.info("PROMPT_TEMPLATES | Main prompt prefix compiled (hash %s, %d chars).", prefix.prefix_hash, len(prefix.text))
+    return prefix
@@ -0,0 +1,256 @@
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from config import (
+    RESPONSE_COMPRESSION_MIN_BYTES,
+    RESPONSE_GZIP_LEVEL,
+    RESPONSE_BROTLI_QUALITY,
+    RESPONSE_DELTA_SNAPSHOTS_MAX,
+)
+
+logger = logging.getLogger(__name__)
+
+# Emagrecimento das respostas de /interact e /actions, independente de framework:
+# - project_fields: o cliente pede só os campos que renderiza ("fields").
+# - apply_delta: ETag do corpo e, com "since" (ou If-None-Match), só os dias/itens de
+#   html_view_data que mudaram desde aquele ETag.
+# - compress_body: gzip/br conforme Accept-Encoding, aplicado pelos adaptadores (main.py, asgi_app.py).
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+# --- Projeção de campos ---
+
+def parse_fields(value) -> Optional[list[str]]:
+    """Aceita "a,b.c" ou ["a", "b.c"]; None/vazio = resposta completa."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = [f.strip() for f in value if isinstance(f, str) and f.strip()]
+    return fields or None
+
+
+def _fields_tree(fields: Iterable[str]) -> dict:
+    # {} num nó = manter tudo abaixo dele.
+    tree: dict = {}
+    for path in fields:
+        node = tree
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if part in node and not node[part]:
+                break  # um prefixo já pede a subárvore inteira
+            if i == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _merge_trees(a: dict, b: dict) -> dict:
+    if not a or not b:
+        return {}
+    merged = dict(a)
+    for key, sub in b.items():
+        merged[key] = _merge_trees(merged[key], sub) if key in merged else sub
+    return merged
+
+
+def _project(node: Any, tree: dict) -> Any:
+    if not tree:
+        return node
+    if isinstance(node, list):
+        return [_project(item, tree) for item in node]
+    if not isinstance(node, dict):
+        return node
+    projected = {}
+    for key, value in node.items():
+        explicit, wildcard = tree.get(key), tree.get("*")
+        if explicit is None and wildcard is None:
+            continue
+        sub = _merge_trees(explicit, wildcard) if explicit is not None and wildcard is not None else (explicit if explicit is not None else wildcard)
+        projected[key] = _project(value, sub)
+    return projected
+
+
+def project_fields(body: dict, fields) -> dict:
+    """
+    Mantém só os caminhos pedidos. Caminhos com ponto descem em dicts, '*' casa qualquer chave
+    e listas aplicam o resto do caminho a cada elemento.
+    Ex.: "status,response,html_view_data.agenda.by_date.*.tasks.description".
+    """
+    fields = parse_fields(fields)
+    if not fields or not isinstance(body, dict):
+        return body
+    return _project(body, _fields_tree(fields))
+
+
+# --- ETag e delta ---
+
+def _digest(value: Any) -> str:
+    canonical = json.dumps(value, ensure_ascii=False, default=str, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def compute_etag(body: Any) -> str:
+    return f'"{_digest(body)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparação fraca do If-None-Match (lista separada por vírgulas ou '*') com o ETag atual."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == current for candidate in if_none_match.split(","))
+
+
+def _delta_units(node: Any, path: str = "") -> dict[str, Any]:
+    """
+    Quebra html_view_data nas unidades do delta, endereçadas por caminho com '/':
+    dicts de datas ISO viram um item por dia (agenda/by_date/2025-01-31), listas de objetos com
+    'id' viram um item por id (projetos/<id>) e o resto desce até valores que não são dicts.
+    """
+    if isinstance(node, list) and node and all(isinstance(item, dict) and item.get("id") for item in node):
+        return {f"{path}/{item['id']}": item for item in node}
+    if isinstance(node, dict) and node:
+        if all(_ISO_DATE.match(str(key)) for key in node):
+            return {f"{path}/{key}": value for key, value in node.items()}
+        units = {}
+        for key, value in node.items():
+            units.update(_delta_units(value, f"{path}/{key}" if path else str(key)))
+        return units
+    return {path: node}
+
+
+class _SnapshotStore:
+    """LRU por worker: (escopo, ETag) -> hashes das unidades de html_view_data naquela resposta."""
+
+    def __init__(self, max_entries: int = RESPONSE_DELTA_SNAPSHOTS_MAX):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], dict[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, scope: str, etag: str, digests: dict[str, str]):
+        with self._lock:
+            self._entries[(scope, etag)] = digests
+            self._entries.move_to_end((scope, etag))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, scope: str, etag: str) -> Optional[dict[str, str]]:
+        with self._lock:
+            digests = self._entries.get((scope, etag))
+            if digests is not None:
+                self._entries.move_to_end((scope, etag))
+            return digests
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_snapshots = _SnapshotStore()
+
+
+def apply_delta(body: dict, scope: str, since: Optional[str] = None) -> tuple[dict, str]:
+    """
+    Calcula o ETag do corpo e guarda o snapshot de html_view_data. Com `since` conhecido, troca
+    html_view_data por html_view_data_delta {since, changed: {caminho: valor}, removed: [caminho]}.
+    ETag desconhecido (outro worker, snapshot expulso do LRU) devolve a resposta completa,
+    que o cliente reconhece pela ausência de html_view_data_delta.
+    """
+    etag = compute_etag(body)
+    view_data = body.get("html_view_data")
+    if not isinstance(view_data, dict) or not view_data:
+        return body, etag
+
+    units = _delta_units(view_data)
+    digests = {path: _digest(value) for path, value in units.items()}
+    _snapshots.put(scope, etag, digests)
+
+    if not since:
+        return body, etag
+    previous = _snapshots.get(scope, since.split(",")[0].strip().removeprefix("W/"))
+    if previous is None:
+        logger.debug("RESPONSE | Delta requested from unknown ETag %s; sending full payload.", since)
+        return body, etag
+
+    delta = {
+        "since": since,
+        "changed": {path: units[path] for path, digest in digests.items() if previous.get(path) != digest},
+        "removed": sorted(path for path in previous if path not in digests),
+    }
+    slim = {key: value for key, value in body.items() if key != "html_view_data"}
+    slim["html_view_data_delta"] = delta
+    return slim, etag
+
+
+# --- Compressão ---
+
+_brotli_module = None
+_brotli_checked = False
+
+
+def _brotli():
+    global _brotli_module, _brotli_checked
+    if not _brotli_checked:
+        try:
+            import brotli
+            _brotli_module = brotli
+        except ImportError:
+            logger.info("RESPONSE | 'brotli' not installed; responses will use gzip only.")
+        _brotli_checked = True
+    return _brotli_module
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    accepted = {}
+    for token in (accept_encoding or "").split(","):
+        name, _, params = token.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """'br' se aceito e disponível, senão 'gzip'; None = identity."""
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    if accepted.get("br", wildcard) > 0 and _brotli() is not None:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(raw: bytes, accept_encoding: str) -> tuple[bytes, dict]:
+    """Comprime o corpo serializado; devolve (bytes, headers a acrescentar na resposta)."""
+    headers = {"Vary": "Accept-Encoding"}
+    if len(raw) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return raw, headers
+    encoding = choose_encoding(accept_encoding)
+    if encoding == "br":
+        raw = _brotli().compress(raw, quality=RESPONSE_BROTLI_QUALITY)
+    elif encoding == "gzip":
+        raw = gzip.compress(raw, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+    else:
+        return raw, headers
+    headers["Content-Encoding"] = encoding
+    return raw, headers
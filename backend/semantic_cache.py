@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_SIMILARITY_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES_PER_USER,
+    SEMANTIC_CACHE_TIME_BUCKET_MINUTES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cache semântico de respostas do chat principal (opt-in: SEMANTIC_CACHE_ENABLED).
+# Chave: (user_id, vizinhança do embedding da mensagem, hash do contexto crítico).
+# Uma resposta só é reaproveitada se o contexto crítico (data e faixa de horário, tarefas,
+# projetos, rotinas, perfil, status do calendário, turnos recentes da conversa, memórias e
+# trechos de documentos recuperados) tiver exatamente o mesmo hash e a mensagem for
+# semanticamente quase idêntica (cosseno >= limiar). Como o hash do contexto entra na
+# chave, uma escrita feita por outro worker nunca produz resposta velha: o invalidate_user
+# local só libera memória mais cedo.
+
+
+def context_hash(*parts) -> str:
+    """Hash estável de um snapshot do contexto crítico (strings ou listas de strings)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (list, tuple)):
+            part = "\n".join(str(p) for p in part)
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def time_bucket(moment: datetime, minutes: int = SEMANTIC_CACHE_TIME_BUCKET_MINUTES) -> int:
+    """Faixa de horário da chave: respostas não atravessam faixas de `minutes` minutos."""
+    return int(moment.timestamp() // (max(1, minutes) * 60))
+
+
+def _normalize(vector: list[float]) -> tuple[float, ...] | None:
+    norm = math.sqrt(sum(x * x for x in vector))
+    if not norm:
+        return None
+    return tuple(x / norm for x in vector)
+
+
+@dataclass
+class _CacheEntry:
+    embedding: tuple[float, ...]
+    context_hash: str
+    response: str
+    expires_at: float
+
+
+@dataclass
+class SemanticCacheHit:
+    response: str
+    similarity: float
+
+
+class SemanticResponseCache:
+    def __init__(self, max_entries_per_user: int = SEMANTIC_CACHE_MAX_ENTRIES_PER_USER,
+                 ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = SEMANTIC_CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries_per_user = max_entries_per_user
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: dict[str, list[_CacheEntry]] = {}
+        # Flask roda cada request async num event loop próprio: lock de thread, não de asyncio.
+        self._lock = threading.Lock()
+
+    def lookup(self, user_id: str, embedding: list[float], context_hash: str) -> SemanticCacheHit | None:
+        query = _normalize(embedding) if embedding else None
+        if query is None:
+            return None
+        now = time.monotonic()
+        best = None
+        with self._lock:
+            entries = self._entries.get(user_id)
+            if not entries:
+                return None
+            entries[:] = [e for e in entries if e.expires_at > now]
+            for entry in entries:
+                if entry.context_hash != context_hash or len(entry.embedding) != len(query):
+                    continue
+                similarity = sum(a * b for a, b in zip(entry.embedding, query))
+                if similarity >= self.similarity_threshold and (best is None or similarity > best.similarity):
+                    best = SemanticCacheHit(entry.response, similarity)
+        return best
+
+    def store(self, user_id: str, embedding: list[float], context_hash: str, response: str):
+        normalized = _normalize(embedding) if embedding else None
+        if normalized is None or not response:
+            return
+        now = time.monotonic()
+        with self._lock:
+            entries = [e for e in self._entries.get(user_id, []) if e.expires_at > now]
+            # Respostas para o mesmo contexto e mensagem equivalente são substituídas.
+            entries = [e for e in entries if not (e.context_hash == context_hash and e.embedding == normalized)]
+            entries.append(_CacheEntry(normalized, context_hash, response, now + self.ttl_seconds))
+            self._entries[user_id] = entries[-self.max_entries_per_user:]
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            removed = self._entries.pop(user_id, None)
+        if removed:
+            logger.debug("SEMANTIC_CACHE | Invalidated %d cached response(s) for user '%s'.", len(removed), user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+semantic_response_cache = SemanticResponseCache()
+
+
+def invalidate_user(user_id: str):
+    """Chamado pelas escritas de tarefas, projetos, rotinas e perfil. Barato se o cache estiver desligado."""
+    if SEMANTIC_CACHE_ENABLED:
+        semantic_response_cache.invalidate_user(user_id)
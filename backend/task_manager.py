@@ -1,7 +1,6 @@
 import logging
 import re
 import asyncio
-import dateparser
 from datetime import datetime, date, timedelta, timezone
 import pytz
 
@@ -26,6 +25,7 @@ def _parse_date_from_text_sync(text: str, current_datetime_base: datetime) -> st
     Tenta parsear uma data de uma string de texto, usando uma data/hora base.
     Retorna a data no formato 'YYYY-MM-DD' ou None.
     """
+    import dateparser  # pesado (tabelas de idiomas e regex); só carregado quando há data a interpretar
     try:
         parsed_dt = dateparser.parse(
             text,
@@ -0,0 +1,26 @@
+import asyncio
+import threading
+
+from starlette.responses import JSONResponse
+from starlette.testclient import TestClient
+
+import asgi_app
+
+
+async def _executor_threads(request):
+    loop = asyncio.get_running_loop()
+    names = await asyncio.gather(*(loop.run_in_executor(None, lambda: threading.current_thread().name) for _ in range(6)))
+    return JSONResponse(sorted(set(names)))
+
+
+def test_lifespan_sizes_the_default_executor(monkeypatch):
+    monkeypatch.setattr(asgi_app, "ASGI_THREADPOOL_WORKERS", 3)
+    monkeypatch.setattr(asgi_app, "initialize_app_globals", lambda: None)
+    monkeypatch.setattr(asgi_app.app.router, "routes", [*asgi_app.app.router.routes])
+    asgi_app.app.add_route("/_executor", _executor_threads)
+
+    with TestClient(asgi_app.app) as client:
+        names = client.get("/_executor").json()
+
+    assert names and all(name.startswith("asgi-io") for name in names)
+    assert len(names) <= 3
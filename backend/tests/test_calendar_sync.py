@@ -0,0 +1,108 @@
+import asyncio
+import copy
+import weakref
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import eixa_data
+
+TODAY = datetime.now(timezone.utc).date()
+DAY = (TODAY + timedelta(days=1)).isoformat()
+
+
+def _event(event_id: str, date_str: str) -> dict:
+    return {"id": event_id, "summary": event_id, "iCalUID": f"{event_id}@google.com",
+            "start": {"dateTime": f"{date_str}T09:00:00+00:00"}, "end": {"dateTime": f"{date_str}T10:00:00+00:00"}}
+
+
+class FakeCalendarUtils:
+    def __init__(self, states: dict, events: list):
+        self.states = states
+        self.events = events
+        self.saved = {}
+        self.calendars = [{"id": "ana@example.com", "primary": True}, {"id": "team@group.calendar.google.com", "selected": True}]
+        self.running = self.peak = 0
+
+    async def list_accounts(self, user_id):
+        return {"accounts": []}
+
+    async def list_calendars(self, user_id, creds):
+        return list(self.calendars)
+
+    async def get_credentials(self, user_id, account_id=None):
+        return object()
+
+    async def get_active_account_id(self, user_id):
+        return None
+
+    async def get_sync_state(self, user_id, account_id, calendar_id='primary'):
+        return copy.deepcopy(self.states.get(f"{account_id or 'default'}__{calendar_id}", {}))
+
+    async def save_sync_state(self, user_id, account_id, calendar_id, state):
+        self.saved[f"{account_id or 'default'}__{calendar_id}"] = state
+
+    async def fetch_event_changes(self, user_id, creds, calendar_id, sync_token=None, time_min=None, time_max=None,
+                                  isolated_http=False):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return list(self.events), "next-token"
+
+
+@pytest.fixture()
+def agenda(monkeypatch):
+    days = {DAY: {"tasks": [{"id": "t-kept", "description": "kept", "google_calendar_event_id": "kept"}]}}
+
+    async def fake_read(user_id, date_str):
+        return copy.deepcopy(days.get(date_str, {"tasks": []}))
+
+    async def fake_save(user_id, date_str, data, bump_version=True):
+        days[date_str] = data
+
+    async def fake_bump(user_id, *views):
+        pass
+
+    monkeypatch.setattr(eixa_data, "_read_daily_tasks_data", fake_read)
+    monkeypatch.setattr(eixa_data, "save_daily_tasks_data", fake_save)
+    monkeypatch.setattr(eixa_data, "bump_view_versions", fake_bump)
+    return days
+
+
+@pytest.mark.asyncio
+async def test_sync_prunes_past_and_deleted_events_from_the_index(agenda, monkeypatch):
+    state = {
+        "sync_token": "token",
+        "window_start": "2019-12-01T00:00:00+00:00",
+        "window_end": f"{(TODAY + timedelta(days=60)).isoformat()}T00:00:00+00:00",
+        "event_index": {
+            "past": {"date": "2020-01-01", "task_id": "t-past", "ical_key": "past@google.com"},
+            "kept": {"date": DAY, "task_id": "t-kept", "ical_key": "kept@google.com"},
+            "deleted-in-eixa": {"date": DAY, "task_id": "t-gone", "ical_key": "deleted-in-eixa@google.com"},
+        },
+    }
+    utils = FakeCalendarUtils({"default__primary": state}, [_event("new", DAY)])
+    monkeypatch.setattr(eixa_data, "get_google_calendar_utils", lambda: utils)
+
+    result = await eixa_data.sync_google_calendar_events_to_eixa(
+        "u1", datetime.now(timezone.utc), datetime.now(timezone.utc) + timedelta(days=30))
+
+    assert result["status"] == "success"
+    assert sorted(utils.saved["default__primary"]["event_index"]) == ["kept", "new"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_syncs_share_the_per_user_limit_and_primary_id(agenda, monkeypatch):
+    monkeypatch.setattr(eixa_data, "CALENDAR_SYNC_MAX_CONCURRENCY_PER_USER", 1)
+    monkeypatch.setattr(eixa_data, "_calendar_sync_semaphores", weakref.WeakKeyDictionary())
+    utils = FakeCalendarUtils({}, [_event("new", DAY)])
+    monkeypatch.setattr(eixa_data, "get_google_calendar_utils", lambda: utils)
+    start, end = datetime.now(timezone.utc), datetime.now(timezone.utc) + timedelta(days=30)
+
+    results = await asyncio.gather(eixa_data.sync_all_google_calendars_to_eixa("u1", start, end),
+                                   eixa_data.sync_google_calendar_events_to_eixa("u1", start, end))
+
+    assert [r["status"] for r in results] == ["success", "success"]
+    assert utils.peak == 1
+    assert sorted(utils.saved) == ["default__primary", "default__team@group.calendar.google.com"]
@@ -0,0 +1,64 @@
+import pytest
+
+from prompt_assembler import prepend_context_to_history
+from vertex_utils import GeminiContextCacheManager
+
+LONG_PREFIX = "Você é a EIXA. " * 800
+
+
+class FakeBackendManager(GeminiContextCacheManager):
+    def __init__(self, fail=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail
+        self.created = []
+        self.deleted = []
+
+    async def _create(self, user_id, model_name, system_instruction, backend, api_key, project_id, region):
+        if self.fail:
+            return None
+        self.created.append(system_instruction)
+        return f"cachedContents/{len(self.created)}"
+
+    async def _delete(self, name, backend, api_key):
+        self.deleted.append(name)
+
+    async def _extend_ttl(self, entry, backend, api_key):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_reuses_cache_until_prefix_changes():
+    manager = FakeBackendManager(ttl_seconds=3600)
+    first = await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX, api_key="k")
+    again = await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX, api_key="k")
+    assert first == again == "cachedContents/1"
+
+    changed = await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX + "Nova rotina.", api_key="k")
+    assert changed == "cachedContents/2"
+    assert manager.deleted == ["cachedContents/1"]
+
+
+@pytest.mark.asyncio
+async def test_skips_small_prefixes_and_backs_off_after_failure():
+    manager = FakeBackendManager(fail=True)
+    assert await manager.get_or_create("u1", "gemini-2.5-flash", "curto", api_key="k") is None
+    assert await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX, api_key="k") is None
+    manager.fail = False
+    assert await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX, api_key="k") is None
+    assert manager.created == []
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_recreated():
+    manager = FakeBackendManager(ttl_seconds=0, refresh_margin_seconds=60)
+    await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX, api_key="k")
+    await manager.get_or_create("u1", "gemini-2.5-flash", LONG_PREFIX, api_key="k")
+    assert len(manager.created) == 2
+
+
+def test_prepend_context_to_history_does_not_mutate_input():
+    history = [{"role": "user", "parts": [{"text": "oi"}]}, {"role": "model", "parts": [{"text": "olá"}]},
+               {"role": "user", "parts": [{"text": "minhas tarefas?"}]}]
+    merged = prepend_context_to_history(history, "CONTEXTO")
+    assert merged[-1]["parts"] == [{"text": "CONTEXTO"}, {"text": "minhas tarefas?"}]
+    assert history[-1]["parts"] == [{"text": "minhas tarefas?"}]
@@ -0,0 +1,95 @@
+import copy
+
+import pytest
+
+import crud_orchestrator
+import eixa_data
+
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, doc_ref, data):
+        self.writes.append(("set", doc_ref, copy.deepcopy(data)))
+
+    def delete(self, doc_ref):
+        self.writes.append(("delete", doc_ref, None))
+
+    def commit(self):
+        self.db.commits.append(self.writes)
+
+
+class FakeDB:
+    def __init__(self):
+        self.commits = []
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+
+@pytest.fixture()
+def fake_agenda(monkeypatch):
+    days = {
+        "2025-03-10": {"tasks": [{"id": "t1", "description": "Ler", "time": "09:00", "completed": False}]},
+        "2025-03-11": {"tasks": [{"id": "t2", "description": "Treinar", "time": "18:00", "completed": False}]},
+    }
+    reads, payload_builds, db = [], [], FakeDB()
+
+    async def fake_read(user_id, date_str):
+        reads.append(date_str)
+        return copy.deepcopy(days.get(date_str, {"tasks": []}))
+
+    async def fake_all_daily_tasks(user_id):
+        payload_builds.append(user_id)
+        return {}
+
+    async def fake_bump(user_id, *views):
+        pass
+
+    async def fake_unscheduled(user_id):
+        return []
+
+    monkeypatch.setattr(eixa_data, "_read_daily_tasks_data", fake_read)
+    monkeypatch.setattr(eixa_data, "get_task_doc_ref", lambda user_id, date_str: ("agenda", date_str))
+    monkeypatch.setattr(eixa_data, "_initialize_firestore_client_instance", lambda: db)
+    monkeypatch.setattr(eixa_data, "bump_view_versions", fake_bump)
+    monkeypatch.setattr(crud_orchestrator, "get_all_daily_tasks", fake_all_daily_tasks)
+    monkeypatch.setattr(crud_orchestrator, "get_all_unscheduled_tasks", fake_unscheduled)
+    return reads, payload_builds, db
+
+
+@pytest.mark.asyncio
+async def test_batch_groups_writes_per_day_and_builds_view_once(fake_agenda):
+    reads, payload_builds, db = fake_agenda
+    operations = [
+        {"item_type": "task", "action": "update", "item_id": "t1", "data": {"date": "2025-03-10", "completed": True}},
+        {"item_type": "task", "action": "create", "data": {"date": "2025-03-10", "description": "Revisar", "time": "10:00"}},
+        {"item_type": "task", "action": "delete", "item_id": "t2", "data": {"date": "2025-03-11"}},
+        {"item_type": "routine", "action": "delete", "item_id": "r1"},
+    ]
+
+    result = await crud_orchestrator.orchestrate_crud_batch("u1", operations)
+
+    assert result["status"] == "partial"
+    assert [r["status"] for r in result["results"]] == ["success", "success", "success", "error"]
+    assert sorted(reads) == ["2025-03-10", "2025-03-11"]  # cada dia lido uma vez
+    assert len(db.commits) == 1
+    writes = {doc_ref[1]: (kind, data) for kind, doc_ref, data in db.commits[0]}
+    assert writes["2025-03-11"] == ("delete", None)
+    kind, day = writes["2025-03-10"]
+    assert kind == "set" and [t["description"] for t in day["tasks"]] == ["Ler", "Revisar"]
+    assert day["tasks"][0]["completed"] is True
+    assert payload_builds == ["u1"]
+    assert "agenda" in result["html_view_data"]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_oversized_or_empty_operation_lists(fake_agenda, monkeypatch):
+    monkeypatch.setattr(crud_orchestrator, "ACTIONS_BATCH_MAX_OPERATIONS", 2)
+    assert (await crud_orchestrator.orchestrate_crud_batch("u1", []))["status"] == "error"
+    too_many = [{"item_type": "task", "action": "delete", "item_id": "x"}] * 3
+    result = await crud_orchestrator.orchestrate_crud_batch("u1", too_many)
+    assert result["status"] == "error" and result["results"] == []
+    assert fake_agenda[2].commits == []
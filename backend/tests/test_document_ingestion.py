@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+import document_ingestion
+from document_ingestion import chunk_text, format_document_excerpts, prepare_document, rank_chunks
+from metrics_utils import spawn_background_task
+
+
+def test_chunks_overlap_and_respect_size():
+    paragraphs = [f"Parágrafo {i}: " + "texto de exemplo com várias palavras " * 8 for i in range(40)]
+    text = "\n\n".join(paragraphs)
+    chunks = chunk_text(text, chunk_chars=800, overlap_chars=120)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 800 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current[:20] in previous  # sobreposição com o trecho anterior
+    assert chunks[-1].endswith(paragraphs[-1].strip())
+
+
+def test_prepare_document_hash_is_content_based():
+    a = prepare_document("a.pdf", "mesmo conteúdo", part_index=0)
+    b = prepare_document("b.pdf", "mesmo conteúdo", part_index=1)
+    assert a.doc_hash == b.doc_hash
+    assert a.memory_id("u1", 3) == f"u1_doc_{a.doc_hash[:16]}_0003"
+    assert a.memory_id("u1", 3).startswith(a.memory_id_prefix("u1"))
+
+
+def test_rank_chunks_returns_top_k_in_document_order():
+    embeddings = [[1.0, 0.0], None, [0.0, 1.0], [0.7, 0.7], [0.9, 0.1]]
+    assert rank_chunks([1.0, 0.0], embeddings, top_k=2) == [0, 4]
+    assert rank_chunks([0.0, 1.0], embeddings, top_k=2) == [2, 3]
+    assert rank_chunks([], embeddings, top_k=2) == []
+
+
+@pytest.mark.asyncio
+async def test_select_without_question_uses_document_start():
+    document = prepare_document("relatorio.pdf", "\n\n".join(f"Seção {i}. " + "conteúdo " * 200 for i in range(6)), part_index=0)
+    selected = await document_ingestion.select_document_chunks("u1", document, None, None, top_k=2)
+    assert selected == [0, 1]
+    text = format_document_excerpts(document, selected)
+    assert f"[Trecho 1/{len(document.chunks)}]" in text and "relatorio.pdf" in text
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_pending_ingestion():
+    done = []
+
+    async def store():
+        await asyncio.sleep(0.01)
+        done.append(True)
+
+    spawn_background_task(store(), document_ingestion.DOCUMENT_TASK_GROUP)
+    await document_ingestion.drain_pending_ingestions(1.0)
+    assert done == [True]
+
+
+class FakeDocumentStore:
+    def __init__(self, stored=()):
+        self.stored = set(stored)
+        self.inserted = []
+
+    async def list_memory_ids(self, user_id, memory_id_prefix):
+        return {memory_id for memory_id in self.stored if memory_id.startswith(memory_id_prefix)}
+
+    async def insert_memory_embeddings(self, rows):
+        self.inserted.append([row["memory_id"] for row in rows])
+        self.stored.update(row["memory_id"] for row in rows)
+        return True
+
+
+@pytest.fixture()
+def document_store(monkeypatch):
+    store = FakeDocumentStore()
+    monkeypatch.setattr(document_ingestion.bigquery_utils, "bq_manager", store)
+    monkeypatch.setattr(document_ingestion, "_known_documents", document_ingestion.OrderedDict())
+    return store
+
+
+@pytest.mark.asyncio
+async def test_document_with_failed_chunk_is_not_indexed(document_store, monkeypatch):
+    document = prepare_document("a.pdf", "\n\n".join(f"Seção {i}. " + "conteúdo " * 200 for i in range(4)), part_index=0)
+    calls = []
+
+    async def flaky_embeddings(texts, *args, **kwargs):
+        calls.append(len(texts))
+        return [None] + [[1.0, 0.0]] * (len(texts) - 1)  # o primeiro trecho sempre falha
+
+    monkeypatch.setattr(document_ingestion, "get_embeddings_batch", flaky_embeddings)
+    embeddings = await document_ingestion._embed_new_document("u1", document, "proj", "region")
+    await document_ingestion.drain_pending_ingestions(1.0)
+
+    assert embeddings[0] is None and calls == [len(document.chunks), 1]  # um retry só do que falhou
+    assert document_store.inserted == []
+    assert not document_ingestion._is_known_document("u1", document.doc_hash)
+
+
+@pytest.mark.asyncio
+async def test_partially_stored_document_only_writes_missing_chunks(document_store, monkeypatch):
+    document = prepare_document("b.pdf", "\n\n".join(f"Parte {i}. " + "texto " * 250 for i in range(4)), part_index=0)
+    document_store.stored.add(document.memory_id("u1", 0))
+
+    async def embeddings(texts, *args, **kwargs):
+        return [[1.0, 0.0]] * len(texts)
+
+    monkeypatch.setattr(document_ingestion, "get_embeddings_batch", embeddings)
+    assert await document_ingestion._embed_new_document("u1", document, "proj", "region") is not None
+    await document_ingestion.drain_pending_ingestions(1.0)
+    assert document_store.inserted == [[document.memory_id("u1", i) for i in range(1, len(document.chunks))]]
+
+    document_ingestion._known_documents.clear()  # outro worker: confere no BigQuery
+    assert await document_ingestion._embed_new_document("u1", document, "proj", "region") is None
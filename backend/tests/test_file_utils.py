@@ -0,0 +1,86 @@
+import base64
+import io
+
+import fitz
+import pytest
+from docx import Document
+
+import file_utils
+
+
+def _pdf_bytes(pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Pagina {i} do relatorio")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _docx_bytes() -> bytes:
+    doc = Document()
+    doc.add_paragraph("Antes da tabela")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "A1"
+    table.cell(0, 1).text = "B1"
+    doc.add_paragraph("Depois da tabela")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def test_pdf_pages_extracted_in_order():
+    data = _pdf_bytes(12)
+    serial, stats = file_utils.extract_document_text(data, file_utils.PDF_MIMETYPE, max_chars=None, max_tokens=None)
+    assert [line for line in serial.splitlines() if line] == [f"Pagina {i} do relatorio" for i in range(12)]
+    assert stats["truncated"] is False
+
+
+def test_budget_stops_extraction_early():
+    data = _pdf_bytes(10)
+    chunks = list(file_utils.iter_document_text(data, file_utils.PDF_MIMETYPE, max_chars=50, max_tokens=None))
+    assert len("".join(chunks)) == 50
+    assert len(chunks) <= 3
+
+    stats = {}
+    text = "".join(file_utils.iter_document_text(data, file_utils.PDF_MIMETYPE, max_chars=None, max_tokens=12, stats=stats))
+    assert stats["truncated"] and 0 < len(text) < 60
+
+
+def test_docx_keeps_document_order_and_budget_notice(monkeypatch):
+    text, _ = file_utils.extract_document_text(_docx_bytes(), file_utils.DOCX_MIMETYPE)
+    assert text.splitlines() == ["Antes da tabela", "A1", "B1", "Depois da tabela"]
+
+    monkeypatch.setattr(file_utils, "DOCUMENT_EXTRACTION_MAX_CHARS", 10)
+    result = file_utils.process_uploaded_file(base64.b64encode(_docx_bytes()).decode(), "notas.docx", file_utils.DOCX_MIMETYPE)
+    assert result["content"]["text_content"] == "Antes da t" + file_utils.TRUNCATION_NOTICE
+    assert result["metadata"]["truncated"] is True
+
+
+def _png_base64() -> str:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_decode_upload_strips_prefix_and_sniffs_type():
+    encoded = _png_base64()
+    upload = file_utils.decode_upload("data:image/jpeg;base64," + encoded, "foto.jpg", "image/jpeg")
+    assert upload.mime_type == "image/png"
+    assert upload.base64_text == encoded
+    assert file_utils.decode_upload(encoded, "foto.png", "image/png").base64_text is encoded
+
+    result = file_utils.process_decoded_upload(upload)
+    assert result["type"] == "image"
+    assert result["content"] == {"base64_image": encoded, "mime_type": "image/png"}
+    assert result["upload"] is upload
+
+
+def test_decode_upload_rejects_mismatch_and_oversize():
+    with pytest.raises(ValueError):
+        file_utils.decode_upload(_png_base64(), "doc.pdf", file_utils.PDF_MIMETYPE)
+    with pytest.raises(ValueError):
+        file_utils.decode_upload(base64.b64encode(b"not an image").decode(), "x.png", "image/png")
+    with pytest.raises(ValueError, match="excede"):
+        file_utils.decode_upload("A" * 4000, "big.pdf", file_utils.PDF_MIMETYPE, max_bytes=1000)
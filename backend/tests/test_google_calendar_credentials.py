@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from google.api_core.exceptions import NotFound
+
+import google_calendar_utils
+from google_calendar_utils import GoogleCalendarUtils, _CalendarClient, _CredentialsCache
+
+
+class FakeCreds:
+    def __init__(self, token="novo"):
+        self.token = token
+
+    def to_json(self):
+        return f'{{"token": "{self.token}"}}'
+
+
+class DeletedDocRef:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, data):
+        self.updates.append(data)
+        raise NotFound("credencial removida")
+
+    def set(self, *args, **kwargs):
+        raise AssertionError("o token refrescado não pode recriar o documento")
+
+
+def test_credentials_cache_is_bounded_and_expires(monkeypatch):
+    cache = _CredentialsCache(max_entries=2, ttl_seconds=60)
+    first, second, third = FakeCreds("a"), FakeCreds("b"), FakeCreds("c")
+    cache.get_or_put(("u1", ""), first)
+    cache.get_or_put(("u2", ""), second)
+    cache.get_or_put(("u3", ""), third)
+    assert cache.get(("u1", "")) is None and cache.get(("u3", "")).creds is third
+    assert cache.find(first) is None  # o service sai junto com a credencial expulsa
+
+    clock = [1000.0]
+    monkeypatch.setattr(google_calendar_utils.time, "monotonic", lambda: clock[0])
+    cache = _CredentialsCache(max_entries=2, ttl_seconds=60)
+    client = cache.get_or_put(("u1", ""), first)
+    clock[0] += 45
+    assert cache.get_or_put(("u1", ""), FakeCreds("outra")) is client  # leitura concorrente reaproveita a entrada
+    clock[0] += 30
+    assert cache.get(("u1", "")) is None
+
+
+def test_pop_user_drops_credentials_and_service_together(monkeypatch):
+    monkeypatch.setattr(google_calendar_utils, "_build_calendar_service", lambda creds: ("service", creds))
+    cache = _CredentialsCache(max_entries=8, ttl_seconds=60)
+    creds = FakeCreds()
+    client = cache.get_or_put(("u1", "conta"), creds)
+    assert client.service() == ("service", creds) and client.service() is client.service()
+    assert cache.find(creds) is client
+
+    cache.pop_user("u1")
+    assert cache.get(("u1", "conta")) is None and cache.find(creds) is None
+
+
+def test_concurrent_refreshes_of_a_shared_credential_run_once():
+    class ExpiredCreds(FakeCreds):
+        valid = False
+        refreshes = 0
+
+        def refresh(self, request):
+            time.sleep(0.05)
+            self.refreshes += 1
+            self.valid = True
+
+    creds = ExpiredCreds()
+    client = _CalendarClient(creds, expires_at=float("inf"))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: client.refresh_if_expired(), range(4)))
+    assert creds.refreshes == 1 and sorted(results) == [False, False, False, True]
+
+
+@pytest.mark.asyncio
+async def test_refreshed_token_is_not_written_over_a_deleted_credential():
+    utils = GoogleCalendarUtils.__new__(GoogleCalendarUtils)
+    doc_ref = DeletedDocRef()
+
+    async def credentials_doc_ref(user_id):
+        return doc_ref
+
+    utils._get_credentials_doc_ref = credentials_doc_ref
+    assert await utils._save_refreshed_token("u1", FakeCreds(), None) is False
+    assert doc_ref.updates == [{"token": "novo"}]
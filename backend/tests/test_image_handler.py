@@ -0,0 +1,19 @@
+import image_handler
+
+
+class _FakeBlob:
+    def __init__(self):
+        self.chunk_size = None
+        self.uploads = []
+
+    def upload_from_string(self, data, content_type=None):
+        self.uploads.append((len(data), content_type, self.chunk_size))
+
+
+def test_small_uploads_are_single_shot_and_large_ones_resumable():
+    small, large = _FakeBlob(), _FakeBlob()
+    image_handler._upload_bytes(small, b"x" * 1024, "image/webp")
+    image_handler._upload_bytes(large, b"x" * image_handler.GCS_RESUMABLE_MIN_BYTES, "image/webp")
+
+    assert small.uploads == [(1024, "image/webp", None)]
+    assert large.uploads == [(image_handler.GCS_RESUMABLE_MIN_BYTES, "image/webp", image_handler.GCS_RESUMABLE_CHUNK_SIZE)]
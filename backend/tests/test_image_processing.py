@@ -0,0 +1,49 @@
+import io
+
+from PIL import Image
+
+import image_processing
+
+
+def _jpeg_with_exif(size=(3000, 2000)) -> bytes:
+    image = Image.new("RGB", size, "blue")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: girar 90°
+    exif[0x010F] = "CameraMaker"
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def test_large_image_is_downscaled_rotated_and_stripped(monkeypatch):
+    monkeypatch.setattr(image_processing, "IMAGE_PROCESSING_WORKERS", 1)
+    processed = image_processing.process_image(_jpeg_with_exif(), max_dimension=1024, output_format="WEBP")
+
+    assert processed.mime_type == "image/webp"
+    assert (processed.width, processed.height) == (683, 1024)  # orientação aplicada antes de reduzir
+    with Image.open(io.BytesIO(processed.data)) as result:
+        assert result.format == "WEBP"
+        assert not result.getexif()
+    assert processed.content_hash == image_processing.content_hash(processed.data)
+
+
+def test_small_clean_image_passes_through(monkeypatch):
+    monkeypatch.setattr(image_processing, "IMAGE_PROCESSING_WORKERS", 1)
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), "red").save(buffer, format="PNG")
+    data = buffer.getvalue()
+
+    processed = image_processing.process_image(data, max_dimension=1024)
+    assert processed.data is data
+    assert processed.mime_type == "image/png"
+
+
+def test_avatar_thumbnails_are_square_in_pool():
+    try:
+        thumbnails = image_processing.make_avatar_thumbnails(_jpeg_with_exif((800, 500)), sizes=(32, 64))
+    finally:
+        image_processing._reset_image_pool()
+    assert sorted(thumbnails) == [32, 64]
+    for size, thumb in thumbnails.items():
+        with Image.open(io.BytesIO(thumb.data)) as result:
+            assert result.size == (size, size)
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from intent_classifier import IntentClassifier, classify_intent
+
+
+@pytest.mark.parametrize("message", [
+    "adicione uma tarefa para amanhã às 9h",
+    "Aplique minha rotina matinal amanhã",
+    "marque dentista na sexta",
+    "Exclui o projeto site",
+    "add a meeting tomorrow at 3pm",
+    "Preciso ligar para o dentista amanhã",
+    "tenho médico quinta 10h",
+    "pagar conta de luz dia 10",
+    "quero estudar inglês toda segunda às 19h",
+])
+def test_action_messages_are_sent_to_the_extractor(message):
+    assert classify_intent(message).probability >= 0.3
+
+
+@pytest.mark.parametrize("message", [
+    "sim",
+    "bom dia, tudo bem?",
+    "estou muito cansado hoje",
+    "o que você acha da minha semana?",
+])
+def test_conversational_messages_skip_the_extractor(message):
+    assert classify_intent(message).probability < 0.3
+
+
+def test_weights_round_trip_and_embedding_blend(tmp_path):
+    classifier = IntentClassifier(embedding_weights=[4.0, -4.0], embedding_bias=0.0, embedding_blend=1.0)
+    path = tmp_path / "weights.json"
+    path.write_text(json.dumps(classifier.to_json()))
+
+    loaded = IntentClassifier.from_json(str(path))
+    assert loaded.uses_embedding
+    assert loaded.predict("bom dia", embedding=[1.0, 0.0]).probability > 0.9
+    # Embedding com dimensão diferente é ignorado: vale só a logística de palavras-chave.
+    fallback = loaded.predict("bom dia", embedding=[1.0, 0.0, 0.0])
+    assert fallback.embedding_probability is None
+    assert fallback.probability == fallback.keyword_probability
@@ -0,0 +1,26 @@
+import random
+
+from keyword_matcher import KeywordMatcher, get_keyword_matcher
+
+
+def test_overlapping_and_nested_phrases_are_all_reported():
+    matcher = KeywordMatcher({"he": ["he"], "she": ["she"], "his": ["his"], "hers": ["hers"]})
+    assert matcher.matches("ushers") == {"he", "she", "hers"}
+    assert matcher.counts("she sells, he hers") == {"she": 1, "he": 3, "hers": 1}
+
+
+def test_matches_equal_naive_substring_scan():
+    lexicon = {
+        "exaustão": ("cansado", "sem energia", "esgotado"),
+        "procrastinação": ("deixar para depois", "adiando", "procrastin"),
+        "dúvida": ("não sei", "perdido"),
+        "vazio": ("",),
+    }
+    matcher = get_keyword_matcher(lexicon)
+    words = ["cansado", "não", "sei", "adiando", "sem", "energia", "perdido", "deixar", "para", "depois", "ok", "procrastinando"]
+    rng = random.Random(7)
+    for _ in range(200):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(0, 8)))
+        naive = {label for label, phrases in lexicon.items() if any(p and p in text for p in phrases)}
+        assert matcher.matches(text) == naive
+    assert get_keyword_matcher(dict(reversed(list(lexicon.items())))) is matcher
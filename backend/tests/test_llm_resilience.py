@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import llm_resilience
+from llm_resilience import CircuitBreaker, LatencyTracker, RetryableLLMError, request_deadline, resilient_llm_call
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "circuit_breaker", CircuitBreaker(failure_threshold=2, open_seconds=60))
+    monkeypatch.setattr(llm_resilience, "latency_tracker", LatencyTracker(min_samples=1))
+    monkeypatch.setattr(llm_resilience, "_backoff_delay", lambda attempt_index, retry_after: 0.0)
+
+
+@pytest.mark.asyncio
+async def test_retries_retryable_errors_then_succeeds():
+    calls = []
+
+    async def attempt(model, timeout):
+        calls.append(model)
+        if len(calls) < 2:
+            raise RetryableLLMError("503", status_code=503)
+        return "ok"
+
+    assert await resilient_llm_call(attempt, "primary", max_attempts=3) == "ok"
+    assert calls == ["primary", "primary"]
+
+
+@pytest.mark.asyncio
+async def test_falls_back_when_circuit_opens():
+    calls = []
+
+    async def attempt(model, timeout):
+        calls.append(model)
+        if model == "primary":
+            raise RetryableLLMError("429", status_code=429)
+        return f"answer from {model}"
+
+    assert await resilient_llm_call(attempt, "primary", fallback_model="lite", max_attempts=3) == "answer from lite"
+    assert calls == ["primary", "primary", "lite"]
+
+    calls.clear()
+    assert await resilient_llm_call(attempt, "primary", fallback_model="lite") == "answer from lite"
+    assert calls == ["lite"]
+
+
+@pytest.mark.asyncio
+async def test_tight_deadline_goes_straight_to_fallback_and_none_is_final():
+    calls = []
+
+    async def attempt(model, timeout):
+        calls.append((model, timeout))
+        return None
+
+    with request_deadline(5):
+        assert await resilient_llm_call(attempt, "primary", fallback_model="lite") is None
+    assert len(calls) == 1 and calls[0][0] == "lite" and calls[0][1] <= 5
+
+
+@pytest.mark.asyncio
+async def test_hedge_returns_first_completed_attempt():
+    llm_resilience.latency_tracker.record("primary", 0.05)
+    calls = []
+
+    async def attempt(model, timeout):
+        calls.append(model)
+        await asyncio.sleep(5 if len(calls) == 1 else 0.01)
+        return f"attempt {len(calls)}"
+
+    result = await asyncio.wait_for(resilient_llm_call(attempt, "primary", hedging=True), 2)
+    assert result == "attempt 2"
+    assert len(calls) == 2
@@ -0,0 +1,24 @@
+import contextvars
+import logging
+
+import logging_utils
+from logging_utils import DebugSamplingFilter, start_request_log_sampling
+
+
+def _debug_record(msg):
+    return logging.LogRecord("eixa", logging.DEBUG, __file__, 1, msg, None, None)
+
+
+def test_debug_sampling_is_decided_once_per_request(monkeypatch):
+    sampling_filter = DebugSamplingFilter(0.5)
+    monkeypatch.setattr(logging_utils, "_sampling_filter", sampling_filter)
+
+    def run_request(request_id):
+        start_request_log_sampling(request_id)
+        return {sampling_filter.filter(_debug_record(f"r{i}")) for i in range(20)}
+
+    decisions = [contextvars.copy_context().run(run_request, f"trace-{n}") for n in range(100)]
+    assert all(len(kept) == 1 for kept in decisions)  # nunca um trace pela metade
+    assert 20 < sum(kept == {True} for kept in decisions) < 80
+    assert contextvars.copy_context().run(run_request, "trace-7") == decisions[7]
+    assert sampling_filter.filter(logging.LogRecord("eixa", logging.INFO, __file__, 1, "info", None, None))
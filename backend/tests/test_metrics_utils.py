@@ -1,6 +1,6 @@
 import pytest
 import asyncio
-from metrics_utils import set_bq_manager, measure_async
+from metrics_utils import set_bq_manager, measure_async, spawn_background_task, drain_background_tasks
 
 @pytest.mark.asyncio
 async def test_measure_async_records_metric(fake_bq_manager):
@@ -15,3 +15,20 @@ async def test_measure_async_records_metric(fake_bq_manager):
     # Aguarda tick do loop para tarefa de log
     await asyncio.sleep(0.01)
     assert any(m["operation"] == "test.op" for m in fake_bq_manager.logged_metrics)
+
+
+@pytest.mark.asyncio
+async def test_drain_background_tasks_waits_only_for_group():
+    done = []
+
+    async def job(label, delay):
+        await asyncio.sleep(delay)
+        done.append(label)
+
+    spawn_background_task(job("docs", 0.01), "document_ingestion")
+    slow = spawn_background_task(job("metrics", 0.5), "metrics")
+
+    assert await drain_background_tasks(1.0, "document_ingestion") == 0
+    assert done == ["docs"]
+    assert await drain_background_tasks(0.01) == 1  # só a tarefa lenta continua pendente
+    slow.cancel()
@@ -0,0 +1,67 @@
+from prompt_assembler import PromptSection, assemble_prompt, assemble_prompt_sections, estimate_tokens, trim_history
+
+
+def _items(prefix, n):
+    return [f"- {prefix} {i} com uma descrição razoavelmente longa para ocupar espaço" for i in range(n)]
+
+
+def test_section_budget_truncates_tail_items():
+    section = PromptSection("tasks", priority=80, header="Tarefas:\n", items=_items("tarefa", 50), budget_tokens=100)
+    text, report = assemble_prompt([section], total_budget_tokens=10_000)
+    assert report["tasks"]["items"] < 50
+    assert "tarefa 0 " in text
+    assert "tarefa 49 " not in text
+    assert "itens omitidos" in text
+    assert report["tasks"]["tokens"] <= 100
+
+
+def test_global_budget_cuts_lowest_priority_first_and_keeps_required():
+    sections = [
+        PromptSection("temporal", priority=100, header="DATA: 2025-01-01\n", required=True),
+        PromptSection("tasks", priority=80, items=_items("tarefa", 20)),
+        PromptSection("routines", priority=50, items=_items("rotina", 20)),
+        PromptSection("persona", priority=100, header="Você é a EIXA.\n", required=True),
+    ]
+    full_text, full_report = assemble_prompt(sections, total_budget_tokens=100_000)
+    budget = full_report["_total_tokens"] - full_report["routines"]["tokens"] // 2
+    text, report = assemble_prompt(sections, total_budget_tokens=budget)
+
+    assert report["_total_tokens"] <= budget
+    assert report["tasks"]["items"] == 20
+    assert report["routines"]["items"] < 20
+    assert text.startswith("DATA: 2025-01-01") and text.endswith("Você é a EIXA.\n")
+
+
+def test_fixed_sections_keep_their_text_when_dynamic_sections_grow():
+    def render(n_tasks):
+        sections = [
+            PromptSection("routines", priority=50, items=_items("rotina", 30), budget_tokens=300),
+            PromptSection("tasks", priority=80, items=_items("tarefa", n_tasks)),
+        ]
+        rendered, report = assemble_prompt_sections(sections, total_budget_tokens=600, fixed_sections=("routines",))
+        return dict(rendered), report
+
+    few, _ = render(2)
+    many, report = render(200)
+    assert few["routines"] == many["routines"]  # prefixo do cache igual entre turnos
+    assert report["tasks"]["items"] < 200 and report["_total_tokens"] <= 600
+
+
+def test_estimate_tokens_is_monotonic_and_cheap():
+    assert estimate_tokens("") == 0
+    short = estimate_tokens("Olá, tudo bem?")
+    long = estimate_tokens("Olá, tudo bem? " * 20)
+    assert 0 < short < long
+
+
+def test_trim_history_keeps_latest_and_starts_with_user():
+    history = []
+    for i in range(10):
+        history.append({"role": "user", "parts": [{"text": f"pergunta {i} " * 30}]})
+        history.append({"role": "model", "parts": [{"text": f"resposta {i} " * 30}]})
+    history.append({"role": "user", "parts": [{"text": "mensagem atual"}]})
+
+    trimmed = trim_history(history, budget_tokens=300)
+    assert trimmed[-1]["parts"][0]["text"] == "mensagem atual"
+    assert trimmed[0]["role"] == "user"
+    assert len(trimmed) < len(history)
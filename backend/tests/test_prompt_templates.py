@@ -0,0 +1,32 @@
+import pytest
+
+from prompt_templates import INTENT_EXTRACTION_PROMPT, CompiledTemplate, compile_main_prompt_prefix
+
+
+def test_compiled_template_substitutes_fields_and_keeps_json_braces():
+    template = CompiledTemplate('{"a": 1} hoje é {{date}}, {{ name }}!')
+    assert template.fields == {"date", "name"}
+    assert template.render(date="2025-01-15", name="Ana") == '{"a": 1} hoje é 2025-01-15, Ana!'
+    with pytest.raises(KeyError):
+        template.render(date="2025-01-15")
+
+
+def test_intent_prompt_keeps_static_prefix_and_hash_across_requests():
+    first = INTENT_EXTRACTION_PROMPT.render(current_date="2025-01-15", tomorrow_date="2025-01-16",
+                                            timezone="America/Sao_Paulo", routines_context="")
+    second = INTENT_EXTRACTION_PROMPT.render(current_date="2025-02-01", tomorrow_date="2025-02-02",
+                                             timezone="Europe/Lisbon", routines_context="\nRotinas existentes:\n- Rotina X\n")
+    prefix = INTENT_EXTRACTION_PROMPT.static_prefix
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert "DATA_AMANHA: 2025-02-02" in second
+    assert len(INTENT_EXTRACTION_PROMPT.prefix_hash) == 16
+
+
+def test_main_prefix_is_user_independent_and_cached():
+    persona = "Você é a EIXA. Chame o usuário de {{user_display_name}}.\n"
+    prefix = compile_main_prompt_prefix(persona)
+    assert "{{" not in prefix.persona
+    quoted = compile_main_prompt_prefix("Use `{{user_display_name}}` se fornecido.\n")
+    assert quoted.persona.count("`") == 2
+    assert compile_main_prompt_prefix(persona) is prefix
+    assert compile_main_prompt_prefix(persona + "Extra.\n").prefix_hash != prefix.prefix_hash
@@ -0,0 +1,42 @@
+import pytest
+
+import http_handlers
+
+
+@pytest.fixture()
+def agenda_view(monkeypatch):
+    versions = {"agenda": 7, "projects": 0, "routines": 0}
+    loads = []
+
+    async def fake_versions(user_id):
+        return dict(versions)
+
+    async def fake_agenda(user_id):
+        loads.append(user_id)
+        return {"2025-01-01": {"tasks": [{"id": "t1", "description": "Ler"}]}}
+
+    monkeypatch.setattr(http_handlers, "get_view_versions", fake_versions)
+    monkeypatch.setitem(http_handlers._READ_VIEWS, "agenda", (fake_agenda, "agenda"))
+    return versions, loads
+
+
+@pytest.mark.asyncio
+async def test_read_view_returns_304_without_loading_data_when_etag_matches(agenda_view):
+    versions, loads = agenda_view
+    first = await http_handlers.read_view("agenda", {"user_id": "u1"}, {})
+    assert first.status == 200 and first.body["html_view_data"]["agenda"]["2025-01-01"]["tasks"][0]["id"] == "t1"
+    etag = first.headers["ETag"]
+
+    cached = await http_handlers.read_view("agenda", {"user_id": "u1"}, {"If-None-Match": etag})
+    assert cached.status == 304 and cached.body is None and cached.headers["ETag"] == etag
+    assert loads == ["u1"]
+
+    versions["agenda"] += 1  # escrita na agenda
+    fresh = await http_handlers.read_view("agenda", {"user_id": "u1"}, {"If-None-Match": etag})
+    assert fresh.status == 200 and fresh.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_read_view_rejects_unknown_view_and_missing_user(agenda_view):
+    assert (await http_handlers.read_view("dashboard", {"user_id": "u1"}, {})).status == 404
+    assert (await http_handlers.read_view("agenda", {}, {})).status == 400
@@ -0,0 +1,68 @@
+import gzip
+import json
+
+from response_utils import project_fields, apply_delta, compress_body, choose_encoding
+
+
+def _agenda_payload(day_two_tasks):
+    return {
+        "status": "success",
+        "message": "ok",
+        "html_view_data": {"agenda": {
+            "by_date": {
+                "2025-01-01": {"tasks": [{"id": "a", "description": "Ler", "time": "09:00"}]},
+                "2025-01-02": {"tasks": day_two_tasks},
+            },
+            "unscheduled": [{"id": "u1", "title": "Sem data"}],
+        }},
+    }
+
+
+def test_project_fields_keeps_requested_paths_with_wildcards_and_lists():
+    body = _agenda_payload([{"id": "b", "description": "Treinar", "time": "18:00"}])
+    projected = project_fields(body, "status,html_view_data.agenda.by_date.*.tasks.description")
+    assert projected == {
+        "status": "success",
+        "html_view_data": {"agenda": {"by_date": {
+            "2025-01-01": {"tasks": [{"description": "Ler"}]},
+            "2025-01-02": {"tasks": [{"description": "Treinar"}]},
+        }}},
+    }
+    assert project_fields(body, None) is body
+
+
+def test_apply_delta_returns_only_changed_days_and_removed_items():
+    first, etag = apply_delta(_agenda_payload([{"id": "b", "description": "Treinar"}]), "user-delta")
+    assert first["html_view_data"]  # sem 'since': resposta completa
+
+    changed = _agenda_payload([{"id": "b", "description": "Treinar", "completed": True}])
+    changed["html_view_data"]["agenda"]["unscheduled"] = []
+    slim, new_etag = apply_delta(changed, "user-delta", etag)
+
+    assert new_etag != etag
+    assert "html_view_data" not in slim and slim["message"] == "ok"
+    delta = slim["html_view_data_delta"]
+    assert list(delta["changed"]) == ["agenda/by_date/2025-01-02", "agenda/unscheduled"]
+    assert delta["removed"] == ["agenda/unscheduled/u1"]
+
+    unchanged, _ = apply_delta(changed, "user-delta", new_etag)
+    assert unchanged["html_view_data_delta"]["changed"] == {}
+
+
+def test_apply_delta_from_unknown_etag_sends_full_payload():
+    body = _agenda_payload([])
+    slim, _ = apply_delta(body, "user-delta", '"desconhecido"')
+    assert slim is body
+    _, etag = apply_delta(_agenda_payload([{"id": "b"}]), "outro-usuario")
+    assert apply_delta(body, "user-delta", etag)[0] is body  # snapshots são por usuário
+
+
+def test_compress_body_negotiates_gzip_and_skips_small_payloads():
+    raw = json.dumps(_agenda_payload([{"id": str(i), "description": "x" * 40} for i in range(50)])).encode()
+    compressed, headers = compress_body(raw, "gzip;q=1.0, identity;q=0.5")
+    assert headers == {"Vary": "Accept-Encoding", "Content-Encoding": "gzip"}
+    assert gzip.decompress(compressed) == raw and len(compressed) < len(raw)
+
+    small, headers = compress_body(b'{"status":"ok"}', "gzip")
+    assert small == b'{"status":"ok"}' and "Content-Encoding" not in headers
+    assert choose_encoding("gzip;q=0, deflate") is None
@@ -0,0 +1,48 @@
+from semantic_cache import SemanticResponseCache, context_hash
+
+
+def test_hit_requires_similar_embedding_and_same_context():
+    cache = SemanticResponseCache(max_entries_per_user=8, ttl_seconds=60, similarity_threshold=0.95)
+    ctx = context_hash("2025-01-15", ["- Reunião 10:00"], [])
+    cache.store("u1", [1.0, 0.0, 0.1], ctx, "Você tem uma reunião às 10:00.")
+
+    hit = cache.lookup("u1", [0.98, 0.01, 0.1], ctx)
+    assert hit is not None and hit.response == "Você tem uma reunião às 10:00."
+    assert hit.similarity >= 0.95
+
+    assert cache.lookup("u1", [0.0, 1.0, 0.0], ctx) is None
+    assert cache.lookup("u2", [1.0, 0.0, 0.1], ctx) is None
+    changed_ctx = context_hash("2025-01-15", ["- Reunião 10:00", "- Dentista 15:00"], [])
+    assert cache.lookup("u1", [1.0, 0.0, 0.1], changed_ctx) is None
+
+
+def test_ttl_invalidation_and_capacity():
+    cache = SemanticResponseCache(max_entries_per_user=2, ttl_seconds=0, similarity_threshold=0.9)
+    cache.store("u1", [1.0, 0.0], "ctx", "resposta")
+    assert cache.lookup("u1", [1.0, 0.0], "ctx") is None
+
+    cache = SemanticResponseCache(max_entries_per_user=2, ttl_seconds=60, similarity_threshold=0.9)
+    for i, vector in enumerate(([1.0, 0.0], [0.0, 1.0], [-1.0, 0.0])):
+        cache.store("u1", vector, "ctx", f"resposta {i}")
+    assert cache.lookup("u1", [1.0, 0.0], "ctx") is None
+    assert cache.lookup("u1", [-1.0, 0.0], "ctx").response == "resposta 2"
+
+    cache.invalidate_user("u1")
+    assert cache.lookup("u1", [-1.0, 0.0], "ctx") is None
+
+
+def test_short_follow_ups_and_time_sensitive_questions_do_not_cross_turns():
+    from datetime import datetime, timezone
+
+    from semantic_cache import time_bucket
+
+    cache = SemanticResponseCache(max_entries_per_user=8, ttl_seconds=900, similarity_threshold=0.95)
+    morning = datetime(2025, 1, 15, 9, 0, tzinfo=timezone.utc)
+    ctx = context_hash("2025-01-15", time_bucket(morning, 10), ["Posso remarcar a reunião?\x1fQuer que eu remarque?"], [])
+    cache.store("u1", [1.0, 0.0], ctx, "Certo, remarquei.")
+
+    other_turn = context_hash("2025-01-15", time_bucket(morning, 10), ["Quer ajuda com o relatório?\x1fPosso ajudar."], [])
+    assert cache.lookup("u1", [1.0, 0.0], other_turn) is None
+    later = context_hash("2025-01-15", time_bucket(morning.replace(minute=12), 10), ["Posso remarcar a reunião?\x1fQuer que eu remarque?"], [])
+    assert cache.lookup("u1", [1.0, 0.0], later) is None
+    assert time_bucket(morning.replace(minute=9), 10) == time_bucket(morning, 10)
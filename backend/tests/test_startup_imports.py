@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependências pesadas que ficam para o primeiro uso ou para o warm-up (GET /_warmup).
+LAZY_MODULES = ("vertexai", "fitz", "docx", "PIL", "dateparser", "googleapiclient.discovery",
+                "google_auth_oauthlib", "google.cloud.translate_v2", "google.cloud.aiplatform")
+
+
+def _loaded_after_import(module: str) -> list[str]:
+    # Processo limpo e sem GCP_PROJECT: o import também não pode construir clientes do Google.
+    env = {k: v for k, v in os.environ.items() if k not in ("GCP_PROJECT", "GOOGLE_CLOUD_PROJECT")}
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+@pytest.mark.parametrize("module", ["http_handlers", "asgi_app"])
+def test_app_import_does_not_load_heavy_dependencies(module):
+    assert _loaded_after_import(module) == []
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+import math
+import re
+
+from token_estimator import (TokenEstimator, conservative_estimate, extract_features, fit_token_estimator,
+                             get_token_estimator, relative_error_percentile)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "data")
+
+
+def _load(name):
+    path = os.path.join(DATA_DIR, name)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_features_count_words_digits_and_accents():
+    features = extract_features("Reunião às 14:30\n🚀")
+    assert features["words"] == 2
+    assert features["digits"] == 4
+    assert features["accented_letters"] == 2
+    assert features["newlines"] == 1
+    assert features["other_symbols"] == 1
+
+
+def _subword_tokens(text):
+    # Referência fora do espaço das features: palavras em pedaços de até 4 caracteres
+    # (o espaço vai junto da palavra), dígitos um a um e cada símbolo um token.
+    return sum(math.ceil(len(piece) / 4) if piece[0].isalpha() else 1
+               for piece in re.findall(r"[^\W\d_]+|\d|\S", text))
+
+
+def test_fit_approximates_a_nonlinear_tokenizer_and_bounds_it():
+    texts = [row["text"] for row in _load("token_calibration_corpus.jsonl")]
+    counts = [_subword_tokens(t) for t in texts]
+
+    fitted = fit_token_estimator(texts, counts)
+    assert all(value >= 0 for value in fitted.coefficients.values())
+    assert fitted.relative_error <= 0.2
+    covered = sum(fitted.upper_bound(t) >= y for t, y in zip(texts, counts))
+    assert covered >= 0.9 * len(texts)
+
+
+def test_uncalibrated_estimator_keeps_the_previous_heuristics():
+    texts = [row["text"] for row in _load("token_calibration_corpus.jsonl")]
+    estimator = TokenEstimator()
+    assert all(estimator.estimate(t) == max(1, int(len(t) / 4)) for t in texts)
+    assert all(estimator.upper_bound(t) == conservative_estimate(t) for t in texts)
+    calibrated = TokenEstimator(calibrated=True)
+    assert calibrated.upper_bound("thank you") == math.ceil(calibrated.estimate("thank you") * 1.15)
+
+
+@pytest.mark.skipif(not any("gemini_tokens" in row for row in _load("token_calibration_labeled.jsonl")),
+                    reason="sem contagens de referência (rode benchmarks/calibrate_token_estimator.py --save-labeled)")
+def test_estimator_error_is_bounded_against_gemini_counts():
+    rows = [row for row in _load("token_calibration_labeled.jsonl") if row.get("gemini_tokens")]
+    estimator = get_token_estimator()
+    p95 = relative_error_percentile(estimator, [r["text"] for r in rows], [r["gemini_tokens"] for r in rows], 0.95)
+    assert p95 <= max(estimator.relative_error, 0.15) + 0.05
@@ -0,0 +1,76 @@
+import pytest
+
+import translation_utils
+from language_detector import detect_language_local
+
+
+class FakeTranslateClient:
+    def __init__(self):
+        self.translate_calls = []
+        self.detect_calls = 0
+        self.detection = {"language": "pt", "confidence": 0.99}
+
+    def translate(self, values, target_language, source_language=None):
+        self.translate_calls.append(list(values))
+        return [{"translatedText": f"[{target_language}] {v}"} for v in values]
+
+    def detect_language(self, text):
+        self.detect_calls += 1
+        return dict(self.detection)
+
+
+@pytest.fixture()
+def fake_client(monkeypatch):
+    client = FakeTranslateClient()
+    monkeypatch.setattr(translation_utils, "_translate_client", client)
+    translation_utils._translation_cache.clear()
+    translation_utils._detection_cache.clear()
+    return client
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Preciso terminar o relatório até sexta e depois ir ao mercado", "pt"),
+    ("I need to finish the report by friday and then go shopping", "en"),
+    ("Necesito terminar el informe antes del viernes y luego ir al mercado", "es"),
+])
+def test_local_detector_identifies_common_languages(text, expected):
+    lang, confidence = detect_language_local(text)
+    assert lang == expected
+    assert confidence >= 0.9
+
+
+def test_local_detector_has_low_confidence_on_tiny_input():
+    _, confidence = detect_language_local("ok")
+    assert confidence < 0.9
+
+
+@pytest.mark.asyncio
+async def test_detect_language_uses_local_fast_path(fake_client):
+    assert await translation_utils.detect_language("quais são as minhas tarefas de hoje?") == "pt"
+    assert fake_client.detect_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_detect_language_keeps_confident_short_text(fake_client):
+    fake_client.detection = {"language": "en", "confidence": 0.97}
+    assert await translation_utils.detect_language("thank you") == "en"
+    assert fake_client.detect_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_translate_many_batches_misses_and_caches(fake_client):
+    first = await translation_utils.translate_many(["hello there", "", "good night", "hello there"], "pt", "en")
+    assert first == ["[pt] hello there", "", "[pt] good night", "[pt] hello there"]
+    assert fake_client.translate_calls == [["hello there", "good night"]]
+
+    second = await translation_utils.translate_text("good night", "pt", "en")
+    assert second == "[pt] good night"
+    assert len(fake_client.translate_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_translation_cache_expires(fake_client, monkeypatch):
+    monkeypatch.setattr(translation_utils._translation_cache, "ttl_seconds", -1)
+    await translation_utils.translate_text("good morning", "pt", "en")
+    await translation_utils.translate_text("good morning", "pt", "en")
+    assert len(fake_client.translate_calls) == 2
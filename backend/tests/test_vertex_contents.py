@@ -0,0 +1,85 @@
+import asyncio
+import base64
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+
+import pytest
+
+import vertex_utils
+from vertex_utils import history_to_vertex_contents
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+def test_history_preserves_roles_order_and_inline_images():
+    history = [
+        {"role": "user", "parts": [{"text": "oi"}]},
+        {"role": "model", "parts": [{"text": "Olá! Como posso ajudar?"}]},
+        {"role": "user", "parts": [{"text": "o que tem nesta foto?"},
+                                   {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(PNG_BYTES).decode()}}]},
+    ]
+    contents = history_to_vertex_contents(history)
+
+    assert [c.role for c in contents] == ["user", "model", "user"]
+    assert contents[1].parts[0].text == "Olá! Como posso ajudar?"
+    image = contents[2].parts[1].to_dict()["inline_data"]
+    assert image["mime_type"] == "image/png"
+    assert base64.b64decode(image["data"]) == PNG_BYTES
+
+
+def test_consecutive_roles_are_merged_and_empty_turns_dropped():
+    history = [
+        {"role": "user", "parts": [{"text": "primeira"}]},
+        {"role": "model", "parts": [{"text": ""}]},
+        {"role": "user", "parts": [{"text": "segunda"}]},
+        {"role": "model", "parts": [{"text": "resposta"}]},
+    ]
+    contents = history_to_vertex_contents(history)
+    assert [c.role for c in contents] == ["user", "model"]
+    assert [p.text for p in contents[0].parts] == ["primeira", "segunda"]
+    assert history_to_vertex_contents(history)[0].to_dict() == contents[0].to_dict()
+
+
+def test_sdk_request_carries_the_attempt_timeout():
+    calls = []
+
+    class FakeClient:
+        def generate_content(self, request, timeout):
+            calls.append((request, timeout))
+            return "raw"
+
+    model = SimpleNamespace(_prepare_request=lambda contents, generation_config: ("req", contents),
+                            _parse_response=lambda raw: f"parsed-{raw}", _prediction_client=FakeClient())
+    assert vertex_utils._generate_content_blocking(model, ["oi"], {}, 7.5) == "parsed-raw"
+    assert calls == [(("req", ["oi"]), 7.5)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_sdk_calls_are_capped(monkeypatch):
+    monkeypatch.setattr(vertex_utils, "GEMINI_SDK_MAX_CONCURRENCY", 1)
+    # O loop do pytest é de sessão: um semáforo novo evita vazar o limite 1 para outros testes.
+    monkeypatch.setattr(vertex_utils, "_sdk_semaphores", weakref.WeakKeyDictionary())
+    lock, state, timeouts = threading.Lock(), {"running": 0, "peak": 0}, []
+
+    def fake_generate(model, contents, generation_config, timeout):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        timeouts.append(timeout)
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return SimpleNamespace(text="ok", usage_metadata=None)
+
+    monkeypatch.setattr(vertex_utils, "_generate_content_blocking", fake_generate)
+    history = [{"role": "user", "parts": [{"text": "oi"}]}]
+    results = await asyncio.gather(*(
+        vertex_utils._call_gemini_sdk("gemini-2.5-flash", history, "sys", 64, 0.2, False,
+                                      "demo-proj", "us-central1", None, None, 5.0)
+        for _ in range(3)))
+
+    assert results == ["ok", "ok", "ok"]
+    assert state["peak"] == 1
+    assert all(0 < t <= 5.0 for t in timeouts)
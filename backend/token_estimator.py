@@ -0,0 +1,223 @@
+import json
+import logging
+import math
+import os
+import re
+
+from config import TOKEN_ESTIMATOR_COEFFICIENTS_PATH, TOKEN_ESTIMATOR_SPM_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+# Estimativa local do nº de tokens do Gemini, sem chamada de rede.
+# Modelo linear sobre contagens baratas do texto (palavras, comprimento excedente das
+# palavras longas, letras acentuadas, dígitos, pontuação, quebras de linha, outros símbolos).
+# O tokenizer do Gemini (SentencePiece) junta o espaço à palavra seguinte, quebra dígitos um
+# a um e parte palavras longas/raras em subpalavras, o que essas features capturam bem para
+# pt/en. Os coeficientes são calibrados contra o countTokens da API por
+# benchmarks/calibrate_token_estimator.py e carregados de TOKEN_ESTIMATOR_COEFFICIENTS_PATH,
+# junto com o erro relativo p95 medido na calibração. Se TOKEN_ESTIMATOR_SPM_MODEL_PATH apontar
+# para um modelo SentencePiece compatível e o pacote `sentencepiece` estiver instalado, a
+# contagem passa a ser exata por tokenização local.
+# Enquanto não houver coeficientes calibrados, o modelo linear não é usado: a estimativa é a
+# antiga (~4 caracteres por token) e os orçamentos (budget_tokens/upper_bound) usam a heurística
+# conservadora anterior (o maior entre caracteres/4 e 1.3 token por palavra).
+
+_PIECE_RE = re.compile(r"(?P<word>[^\W\d_]+)|(?P<digit>\d)|(?P<newline>\n)|(?P<space>\s+)|(?P<punct>[!-/:-@\[-`{-~])|(?P<other>.)", re.UNICODE)
+
+FEATURE_NAMES = ("words", "long_word_chars", "accented_letters", "digits", "punctuation", "newlines", "other_symbols")
+
+# Ponto de partida e nomes das features; só entram na estimativa depois de uma calibração.
+DEFAULT_COEFFICIENTS = {
+    "words": 1.0,
+    "long_word_chars": 0.22,   # por caractere além de LONG_WORD_CHARS
+    "accented_letters": 0.3,
+    "digits": 1.0,
+    "punctuation": 0.8,
+    "newlines": 0.6,
+    "other_symbols": 1.6,      # emoji e símbolos fora do ASCII costumam virar vários bytes/tokens
+}
+DEFAULT_INTERCEPT = 0.0
+DEFAULT_RELATIVE_ERROR = 0.15
+LONG_WORD_CHARS = 6
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def extract_features(text: str) -> dict[str, float]:
+    features = dict.fromkeys(FEATURE_NAMES, 0.0)
+    for match in _PIECE_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "word":
+            word = match.group()
+            features["words"] += 1
+            if len(word) > LONG_WORD_CHARS:
+                features["long_word_chars"] += len(word) - LONG_WORD_CHARS
+            if not word.isascii():
+                features["accented_letters"] += sum(1 for ch in word if ord(ch) > 127)
+        elif kind == "digit":
+            features["digits"] += 1
+        elif kind == "punct":
+            features["punctuation"] += 1
+        elif kind == "newline":
+            features["newlines"] += 1
+        elif kind == "other":
+            features["other_symbols"] += 1
+    return features
+
+
+def conservative_estimate(text: str) -> int:
+    """Heurística anterior ao modelo linear: o maior entre ~4 caracteres/token e ~1.3 token/palavra."""
+    if not text:
+        return 0
+    return max(int(len(text) / 4 + 0.5), int(len(_WORD_RE.findall(text)) * 1.3 + 0.5))
+
+
+class TokenEstimator:
+    def __init__(self, coefficients: dict[str, float] | None = None, intercept: float = DEFAULT_INTERCEPT,
+                 relative_error: float = DEFAULT_RELATIVE_ERROR, sentencepiece_model=None, calibrated: bool = False):
+        self.coefficients = dict(DEFAULT_COEFFICIENTS, **(coefficients or {}))
+        self.intercept = intercept
+        self.relative_error = relative_error
+        self.calibrated = calibrated
+        self._sentencepiece = sentencepiece_model
+
+    @classmethod
+    def from_json(cls, path: str) -> "TokenEstimator":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            coefficients=data.get("coefficients"),
+            intercept=data.get("intercept", DEFAULT_INTERCEPT),
+            relative_error=data.get("p95_relative_error", DEFAULT_RELATIVE_ERROR),
+            calibrated=True,
+        )
+
+    def to_json(self) -> dict:
+        return {"coefficients": self.coefficients, "intercept": self.intercept, "p95_relative_error": self.relative_error}
+
+    @property
+    def exact(self) -> bool:
+        return self._sentencepiece is not None
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._sentencepiece is not None:
+            return len(self._sentencepiece.encode(text))
+        if not self.calibrated:
+            return max(1, int(len(text) / 4))
+        features = extract_features(text)
+        raw = self.intercept + sum(self.coefficients.get(name, 0.0) * value for name, value in features.items())
+        return max(1, int(raw + 0.5))
+
+    def upper_bound(self, text: str) -> int:
+        """
+        Estimativa acrescida do erro relativo p95 da calibração (exata com SentencePiece).
+        Sem calibração, é a heurística conservadora anterior (conservative_estimate).
+        """
+        if self.exact:
+            return self.estimate(text)
+        if not self.calibrated:
+            return conservative_estimate(text)
+        return math.ceil(self.estimate(text) * (1 + self.relative_error))
+
+
+def _load_sentencepiece(path: str):
+    try:
+        import sentencepiece
+    except ImportError:
+        logger.warning("TOKEN_ESTIMATOR | TOKEN_ESTIMATOR_SPM_MODEL_PATH is set but 'sentencepiece' is not installed. Using the linear estimator.")
+        return None
+    try:
+        return sentencepiece.SentencePieceProcessor(model_file=path)
+    except Exception as e:
+        logger.error("TOKEN_ESTIMATOR | Could not load SentencePiece model %s: %s", path, e, exc_info=True)
+        return None
+
+
+def _solve(matrix: list[list[float]], rhs: list[float]) -> list[float] | None:
+    """Eliminação de Gauss com pivoteamento parcial (sistemas pequenos, sem numpy)."""
+    n = len(rhs)
+    a = [row[:] + [rhs[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < 1e-12:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(n):
+            if r != col:
+                factor = a[r][col] / a[col][col]
+                for c in range(col, n + 1):
+                    a[r][c] -= factor * a[col][c]
+    return [a[i][n] / a[i][i] for i in range(n)]
+
+
+def fit_token_estimator(texts: list[str], token_counts: list[int], ridge: float = 1e-3) -> TokenEstimator:
+    """
+    Ajusta os coeficientes por mínimos quadrados (ridge leve) contra contagens de referência
+    (countTokens da API). Coeficientes negativos são zerados e o ajuste refeito sem eles,
+    para o estimador continuar monótono. O erro relativo p95 vem do próprio conjunto;
+    use um holdout para uma medida honesta (o script de calibração faz isso).
+    """
+    rows = [[extract_features(t)[name] for name in FEATURE_NAMES] for t in texts]
+    active = list(range(len(FEATURE_NAMES)))
+    coefficients = [0.0] * len(FEATURE_NAMES)
+    intercept = 0.0
+    while active:
+        x = [[row[j] for j in active] + [1.0] for row in rows]
+        dim = len(active) + 1
+        xtx = [[sum(r[i] * r[j] for r in x) + (ridge if i == j else 0.0) for j in range(dim)] for i in range(dim)]
+        xty = [sum(r[i] * y for r, y in zip(x, token_counts)) for i in range(dim)]
+        solution = _solve(xtx, xty)
+        if solution is None:
+            break
+        negative = [(value, j) for value, j in zip(solution, active) if value < 0]
+        if not negative:
+            coefficients = [0.0] * len(FEATURE_NAMES)
+            for value, j in zip(solution, active):
+                coefficients[j] = value
+            intercept = solution[-1]
+            break
+        active.remove(min(negative)[1])
+    estimator = TokenEstimator(dict(zip(FEATURE_NAMES, coefficients)), intercept=intercept, calibrated=True)
+    estimator.relative_error = relative_error_percentile(estimator, texts, token_counts, 0.95)
+    return estimator
+
+
+def relative_error_percentile(estimator: TokenEstimator, texts: list[str], token_counts: list[int], q: float) -> float:
+    errors = sorted(abs(estimator.estimate(t) - y) / y for t, y in zip(texts, token_counts) if y)
+    if not errors:
+        return DEFAULT_RELATIVE_ERROR
+    return errors[min(len(errors) - 1, int(q * len(errors)))]
+
+
+_estimator: TokenEstimator | None = None
+
+
+def get_token_estimator() -> TokenEstimator:
+    """Singleton: SentencePiece se configurado; senão coeficientes calibrados (JSON) ou a heurística antiga."""
+    global _estimator
+    if _estimator is None:
+        estimator = None
+        if TOKEN_ESTIMATOR_COEFFICIENTS_PATH and os.path.exists(TOKEN_ESTIMATOR_COEFFICIENTS_PATH):
+            try:
+                estimator = TokenEstimator.from_json(TOKEN_ESTIMATOR_COEFFICIENTS_PATH)
+                logger.info("TOKEN_ESTIMATOR | Loaded calibrated coefficients from %s (p95 relative error %.1f%%).",
+                            TOKEN_ESTIMATOR_COEFFICIENTS_PATH, estimator.relative_error * 100)
+            except Exception as e:
+                logger.error("TOKEN_ESTIMATOR | Could not load coefficients from %s: %s. Using the chars/4 heuristic.", TOKEN_ESTIMATOR_COEFFICIENTS_PATH, e, exc_info=True)
+        if estimator is None:
+            estimator = TokenEstimator()
+        if TOKEN_ESTIMATOR_SPM_MODEL_PATH and os.path.exists(TOKEN_ESTIMATOR_SPM_MODEL_PATH):
+            estimator._sentencepiece = _load_sentencepiece(TOKEN_ESTIMATOR_SPM_MODEL_PATH)
+        _estimator = estimator
+    return _estimator
+
+
+def estimate_tokens(text: str) -> int:
+    return get_token_estimator().estimate(text)
+
+
+def budget_tokens(text: str) -> int:
+    """Limite superior para orçamentos: errar para cima só corta um pouco mais de contexto."""
+    return get_token_estimator().upper_bound(text)
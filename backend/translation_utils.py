@@ -1,10 +1,59 @@
 import logging
-from google.cloud import translate_v2 as translate
 import os
 import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+from config import (
+    LANG_DETECT_LOCAL_MIN_CONFIDENCE,
+    TRANSLATION_CACHE_MAX_SIZE,
+    TRANSLATION_CACHE_TTL_SECONDS,
+)
+from language_detector import detect_language_local, SUPPORTED_LANGUAGES
 
 logger = logging.getLogger(__name__)
 
+
+class _TTLTranslationCache:
+    """
+    Cache LRU com expiração por TTL para traduções e detecções de idioma.
+    A chave usa o hash do texto (não o texto em si) para manter a memória previsível.
+    """
+    def __init__(self, max_size: int = 512, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._store = OrderedDict()
+
+    @staticmethod
+    def make_key(text: str, source_language: str | None, target_language: str | None) -> tuple:
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return (text_hash, source_language or '', target_language or '')
+
+    def get(self, key):
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._store[key]
+            return None
+        self._store.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._store[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._store.move_to_end(key)
+        if len(self._store) > self.max_size:
+            self._store.popitem(last=False)
+
+    def clear(self):
+        self._store.clear()
+
+
+_translation_cache = _TTLTranslationCache(max_size=TRANSLATION_CACHE_MAX_SIZE, ttl_seconds=TRANSLATION_CACHE_TTL_SECONDS)
+_detection_cache = _TTLTranslationCache(max_size=TRANSLATION_CACHE_MAX_SIZE, ttl_seconds=TRANSLATION_CACHE_TTL_SECONDS)
+
 # Instancia o cliente de tradução (uma única vez por instância da função/processo)
 _translate_client = None
 
@@ -12,6 +61,8 @@ def _get_translate_client():
     global _translate_client
     if _translate_client is None:
         try:
+            # Import no primeiro uso: o detector local resolve a maioria dos textos sem a API.
+            from google.cloud import translate_v2 as translate
             _translate_client = translate.Client()
             logger.info("Google Cloud Translate client initialized successfully.")
         except Exception as e:
@@ -21,12 +72,32 @@ def _get_translate_client():
 
 async def detect_language(text: str) -> str:
     """
-    Detecta o idioma de um dado texto usando a Google Cloud Translation API.
+    Detecta o idioma de um dado texto.
+    Primeiro tenta o identificador local (n-gramas, sem rede); só consulta a
+    Google Cloud Translation API quando a confiança local é baixa.
     Retorna o código do idioma (ex: 'en', 'pt') ou 'pt' como fallback.
     """
     if not text or not text.strip():
         return 'pt' # Fallback para português se o texto for vazio ou só espaços
 
+    cache_key = _TTLTranslationCache.make_key(text, None, None)
+    cached = _detection_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    local_lang, local_confidence = detect_language_local(text)
+    if local_lang in SUPPORTED_LANGUAGES and local_confidence >= LANG_DETECT_LOCAL_MIN_CONFIDENCE:
+        logger.debug("Idioma detectado localmente: '%s' (confiança %.2f).", local_lang, local_confidence)
+        _detection_cache.put(cache_key, local_lang)
+        return local_lang
+
+    logger.debug("Confiança local baixa (%s, %.2f). Consultando a Translation API.", local_lang, local_confidence)
+    detected = await _detect_language_remote(text)
+    _detection_cache.put(cache_key, detected)
+    return detected
+
+async def _detect_language_remote(text: str) -> str:
+    """Detecção via Google Cloud Translation API, com a normalização/fallbacks para 'pt'."""
     try:
         client = _get_translate_client()
         
@@ -74,6 +145,16 @@ async def translate_text(text: str, target_language: str, source_language: str =
     if not text or not text.strip():
         return "" # Retorna string vazia se não houver texto para traduzir
 
+    translations = await translate_many([text], target_language, source_language)
+    return translations[0]
+
+async def translate_many(texts: list[str], target_language: str, source_language: str = None) -> list[str | None]:
+    """
+    Traduz vários textos com uma única chamada à API para os que não estão em cache.
+    Retorna uma lista na mesma ordem da entrada; entradas que falharem ficam None.
+    """
+    results: list[str | None] = [None] * len(texts)
+
     # NORMALIZAÇÃO PARA VERIFICAÇÃO DE IDIOMAS IGUAIS/SIMILARES
     # Isso resolve o erro 'Bad language pair: pt-PT|pt'
     normalized_source = source_language.split('-')[0] if source_language else None
@@ -81,21 +162,40 @@ async def translate_text(text: str, target_language: str, source_language: str =
 
     # Se a base do idioma de origem é igual à base do idioma de destino, pular tradução
     if normalized_source == normalized_target:
-        logger.info(f"Translation skipped: Normalized source language '{normalized_source}' is same as normalized target language '{normalized_target}'. Returning original text.")
-        return text
+        logger.debug("Translation skipped: normalized source '%s' is the same as target '%s'.", normalized_source, normalized_target)
+        return [text if text and text.strip() else "" for text in texts]
+
+    pending: dict[tuple, list[int]] = OrderedDict()
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            results[index] = ""
+            continue
+        key = _TTLTranslationCache.make_key(text, source_language, target_language)
+        cached = _translation_cache.get(key)
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.setdefault(key, []).append(index)
 
+    if not pending:
+        return results
+
+    unique_texts = [texts[indexes[0]] for indexes in pending.values()]
     try:
         client = _get_translate_client()
-        
-        # A tradução é uma operação síncrona
+
+        # A tradução é uma operação síncrona; a API aceita uma lista de valores numa única requisição.
         if source_language:
-            result = await asyncio.to_thread(client.translate, text, target_language=target_language, source_language=source_language)
+            api_results = await asyncio.to_thread(client.translate, unique_texts, target_language=target_language, source_language=source_language)
         else:
-            result = await asyncio.to_thread(client.translate, text, target_language=target_language) # API detectará source automaticamente
-
-        translated_text = result['translatedText']
-        logger.info(f"Texto traduzido de '{result.get('detectedSourceLanguage', source_language)}' para '{target_language}'. Original: '{text[:50]}...', Traduzido: '{translated_text[:50]}...'.")
-        return translated_text
+            api_results = await asyncio.to_thread(client.translate, unique_texts, target_language=target_language) # API detectará source automaticamente
+
+        for (key, indexes), result in zip(pending.items(), api_results):
+            translated_text = result['translatedText']
+            _translation_cache.put(key, translated_text)
+            for index in indexes:
+                results[index] = translated_text
+        logger.info(f"{len(unique_texts)} texto(s) traduzido(s) para '{target_language}' (origem: '{source_language or 'auto'}'); {len(texts) - len(unique_texts)} servido(s) do cache ou vazio(s).")
     except Exception as e:
         logger.error(f"Erro ao traduzir texto para '{target_language}': {e}", exc_info=True)
-        return None # Retorna None em caso de falha na tradução
\ No newline at end of file
+    return results
@@ -1,13 +1,13 @@
 import logging
 import asyncio
+import math
 from typing import List, Dict, Optional
 
 import numpy as np
 from metrics_utils import measure_async, record_latency
 from google.cloud import firestore
-# CORREÇÃO AQUI: Importe 'TextEmbeddingModel' do local correto
-# Mudado de vertexai.preview.language_models para vertexai.language_models
-from vertexai.language_models import TextEmbeddingModel # Importação corrigida para a versão estável!
+# TextEmbeddingModel (vertexai.language_models) é importado dentro das funções: o SDK do Vertex
+# custa ~2 s de import e não deve pesar no cold start (ver vertex_utils.preload_vertex_sdk).
 
 # Importa o gerenciador de coleções e os utilitários do Firestore
 from collections_manager import get_top_level_collection
@@ -59,6 +59,7 @@ async def get_embedding(text: str, project_id: str, location: str, model_name: s
         cached = _embedding_cache.get(text)
         if cached is not None:
             return cached
+        from vertexai.language_models import TextEmbeddingModel
         model = TextEmbeddingModel.from_pretrained(model_name)
 
         # CORREÇÃO: Mude 'predict' para 'get_embeddings'
@@ -81,6 +82,35 @@ async def get_embedding(text: str, project_id: str, location: str, model_name: s
         logger.error(f"Error generating embedding for text: '{text[:50]}...': {e}", exc_info=True)
         return None
 
+@measure_async("vector.get_embeddings_batch")
+async def get_embeddings_batch(texts: list[str], project_id: str, location: str, model_name: str = EMBEDDING_MODEL_NAME,
+                               batch_size: int = 16, max_concurrency: int = 4) -> list[list[float] | None]:
+    """Embeddings de vários textos com uma chamada a get_embeddings por lote (em vez de uma por texto).
+    Mesma normalização/quantização de get_embedding; posições que falharem voltam como None."""
+    results: list[list[float] | None] = [None] * len(texts)
+    if not texts:
+        return results
+    from vertexai.language_models import TextEmbeddingModel
+    model = TextEmbeddingModel.from_pretrained(model_name)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _embed_batch(start: int):
+        batch = texts[start:start + batch_size]
+        async with semaphore:
+            try:
+                response = await asyncio.to_thread(model.get_embeddings, batch)
+            except Exception as e:
+                logger.error(f"Error generating embeddings for batch {start}-{start + len(batch)}: {e}", exc_info=True)
+                return
+        for offset, embedding in enumerate(response or []):
+            if embedding is not None and getattr(embedding, 'values', None):
+                emb = list(embedding.values)
+                norm = math.sqrt(sum(e*e for e in emb)) or 1.0
+                results[start + offset] = [round(e / norm, 4) for e in emb]
+
+    await asyncio.gather(*(_embed_batch(start) for start in range(0, len(texts), batch_size)))
+    return results
+
 # --- Funções de Armazenamento e Busca Vetorial no Firestore ---
 
 @measure_async("vector.add_memory")
@@ -144,7 +174,8 @@ async def get_relevant_memories(user_id: str, query_embedding: list[float], n_re
     # Tenta BigQuery primeiro
     if bq_manager:
         try:
-            bq_results = await bq_manager.search_memory_embeddings(user_id=user_id, query_embedding=query_embedding, top_k=n_results)
+            bq_results = await bq_manager.search_memory_embeddings(user_id=user_id, query_embedding=query_embedding, top_k=n_results,
+                                                                  exclude_memory_types=("document",))
             if bq_results:
                 formatted = []
                 for r in bq_results:
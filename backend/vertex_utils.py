@@ -1,17 +1,148 @@
 import os
+import base64
 import httpx
 import json
 import logging
 import asyncio
+import contextlib
+import functools
+import hashlib
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import TYPE_CHECKING
 from metrics_utils import measure_async, record_latency
 
-from config import DEFAULT_MAX_OUTPUT_TOKENS, DEFAULT_TEMPERATURE, EMBEDDING_MODEL_NAME
-from vertexai.language_models import TextEmbeddingModel
-import vertexai
-from vertexai.generative_models import GenerativeModel
+from config import (
+    DEFAULT_MAX_OUTPUT_TOKENS, DEFAULT_TEMPERATURE, EMBEDDING_MODEL_NAME,
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS, GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+    GEMINI_CONTEXT_CACHE_FAILURE_BACKOFF_SECONDS, GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+    GEMINI_CONTEXT_CACHE_DEFAULT_MIN_TOKENS, GEMINI_FALLBACK_MODEL, GEMINI_RETRYABLE_STATUS_CODES,
+    GEMINI_SDK_MAX_CONCURRENCY,
+    HTTP_POOL_MAX_CONNECTIONS, HTTP_POOL_MAX_KEEPALIVE,
+)
+from llm_resilience import RetryableLLMError, resilient_llm_call
+from prompt_assembler import IMAGE_PART_TOKENS, estimate_tokens
+from token_estimator import estimate_tokens as estimate_text_tokens
+from google.api_core import exceptions as google_api_exceptions
+
+if TYPE_CHECKING:
+    from vertexai.generative_models import Content, Part
 
 logger = logging.getLogger(__name__)
 
+# O SDK do Vertex (vertexai -> google.cloud.aiplatform, pandas, ...) é o import mais caro da
+# aplicação (~2 s). Ele é importado no primeiro uso dentro das funções, ou antecipado pelo
+# warm-up (preload_vertex_sdk), para não pesar no cold start de quem só chama a API REST.
+
+
+def preload_vertex_sdk():
+    import vertexai.generative_models  # noqa: F401
+    import vertexai.language_models  # noqa: F401
+    _vertex_caching()
+
+
+@functools.lru_cache(maxsize=1)
+def _vertex_caching():
+    try:  # Disponível apenas em versões mais novas do SDK
+        from vertexai.preview import caching
+    except ImportError:
+        return None
+    return caching
+
+GENERATIVE_LANGUAGE_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+_GEMINI_SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
+]
+
+
+# Pool HTTP compartilhado: aberto no lifespan do worker ASGI (um loop de longa duração) e usado por
+# todas as chamadas REST ao Gemini, reaproveitando conexões TLS. Sem ele (modo WSGI, um loop por
+# requisição) cada chamada abre e fecha o próprio cliente, como antes.
+_shared_http_client: httpx.AsyncClient | None = None
+
+
+def open_http_client() -> httpx.AsyncClient:
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAX_CONNECTIONS, max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE),
+        )
+    return _shared_http_client
+
+
+async def close_http_client():
+    global _shared_http_client
+    client, _shared_http_client = _shared_http_client, None
+    if client is not None:
+        await client.aclose()
+
+
+@contextlib.asynccontextmanager
+async def _http_client(timeout: float):
+    """Cliente para uma chamada; o timeout deve ser repassado também a cada request (o pool tem o seu)."""
+    if _shared_http_client is not None and not _shared_http_client.is_closed:
+        yield _shared_http_client
+    else:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            yield client
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _vertex_part(part: dict) -> "Part | None":
+    """Converte uma part no formato REST (text / inlineData / fileData, camelCase ou snake_case) em Part do SDK."""
+    from vertexai.generative_models import Part
+    if "text" in part:
+        return Part.from_text(part["text"]) if part["text"] else None
+    inline = part.get("inlineData") or part.get("inline_data")
+    if inline:
+        data = inline.get("data")
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        return Part.from_data(data=data, mime_type=inline.get("mimeType") or inline.get("mime_type"))
+    file_data = part.get("fileData") or part.get("file_data")
+    if file_data:
+        return Part.from_uri(file_data.get("fileUri") or file_data.get("file_uri"),
+                             mime_type=file_data.get("mimeType") or file_data.get("mime_type"))
+    logger.warning("Vertex SDK: ignoring unsupported part with keys %s.", sorted(part))
+    return None
+
+
+def history_to_vertex_contents(conversation_history: list[dict]) -> "list[Content]":
+    """
+    Histórico no formato REST ({"role", "parts"}) -> lista de Content do SDK, preservando papéis,
+    ordem e partes multimodais. Turnos consecutivos do mesmo papel são unidos (a API exige
+    alternância) e turnos sem partes válidas são descartados. A conversão é determinística:
+    o mesmo histórico gera sempre o mesmo prefixo, o que mantém o cache implícito do Vertex.
+    """
+    from vertexai.generative_models import Content
+    contents: list[tuple[str, list]] = []
+    for turn in conversation_history:
+        role = "model" if turn.get("role") in ("model", "assistant") else "user"
+        parts = [p for p in (_vertex_part(raw) for raw in turn.get("parts", []) if isinstance(raw, dict)) if p is not None]
+        if not parts:
+            continue
+        if contents and contents[-1][0] == role:
+            contents[-1][1].extend(parts)
+        else:
+            contents.append((role, parts))
+    return [Content(role=role, parts=parts) for role, parts in contents]
+
+
 @measure_async("vertex.call_gemini_api")
 async def call_gemini_api(
     api_key: str,
@@ -22,61 +153,115 @@ async def call_gemini_api(
     temperature: float = DEFAULT_TEMPERATURE,
     debug_mode: bool = False,
     project_id: str | None = None,
-    region: str | None = None
+    region: str | None = None,
+    cached_content: str | None = None,
+    response_mime_type: str | None = None
 ) -> str | None:
     """Chama Gemini.
     Se api_key fornecida => usa REST generativelanguage.
     Caso contrário => usa Vertex AI SDK (ADC) para evitar dependência de API key.
+    Com `cached_content` (nome retornado por context_cache_manager), o system instruction
+    já está no cache e não é reenviado. `response_mime_type="application/json"` pede saída estruturada.
+    As tentativas passam por llm_resilience (deadline da requisição, retries, hedging, circuit
+    breaker e fallback para GEMINI_FALLBACK_MODEL). Sem fallback com `cached_content`: o cache
+    pertence ao modelo principal, e o orquestrador já repete sem cache quando a chamada falha.
     """
-    if not api_key:
-        # Vertex AI SDK path
-        try:
-            if project_id and region:
-                vertexai.init(project=project_id, location=region)
+    fallback_model = GEMINI_FALLBACK_MODEL or None
+    if cached_content:
+        fallback_model = None
+
+    async def attempt(model: str, timeout: float) -> str | None:
+        if not api_key:
+            return await _call_gemini_sdk(model, conversation_history, system_instruction, max_output_tokens, temperature,
+                                          debug_mode, project_id, region, cached_content, response_mime_type, timeout)
+        return await _call_gemini_rest(api_key, model, conversation_history, system_instruction, max_output_tokens,
+                                       temperature, debug_mode, cached_content, response_mime_type, timeout)
+
+    return await resilient_llm_call(attempt, model_name, fallback_model)
+
+
+# O asyncio.wait_for de llm_resilience não interrompe uma chamada síncrona em asyncio.to_thread:
+# a thread só é liberada quando o SDK retorna. Por isso o timeout da tentativa vai para o próprio
+# request gRPC e as chamadas simultâneas são limitadas por um semáforo (um por event loop: no ASGI
+# é o loop do worker; no Flask, cada requisição tem o seu).
+_sdk_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _sdk_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _sdk_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _sdk_semaphores[loop] = asyncio.Semaphore(GEMINI_SDK_MAX_CONCURRENCY)
+    return semaphore
+
+
+def _generate_content_blocking(model, contents, generation_config, timeout: float):
+    """
+    generate_content com timeout no request gRPC. GenerativeModel.generate_content não aceita
+    timeout, então o request é montado e enviado pelo cliente de predição do próprio modelo;
+    versões do SDK sem esses métodos caem no generate_content sem timeout.
+    """
+    prepare = getattr(model, "_prepare_request", None)
+    parse = getattr(model, "_parse_response", None)
+    client = getattr(model, "_prediction_client", None)
+    if prepare is None or parse is None or client is None:
+        return model.generate_content(contents, generation_config=generation_config)
+    request = prepare(contents=contents, generation_config=generation_config)
+    return parse(client.generate_content(request=request, timeout=timeout))
+
+
+async def _call_gemini_sdk(model_name, conversation_history, system_instruction, max_output_tokens, temperature,
+                           debug_mode, project_id, region, cached_content, response_mime_type, timeout) -> str | None:
+    deadline = time.monotonic() + timeout
+    try:
+        import vertexai
+        from vertexai.generative_models import GenerativeModel
+        if project_id and region:
+            vertexai.init(project=project_id, location=region)
+        if cached_content and hasattr(GenerativeModel, "from_cached_content"):
+            model = GenerativeModel.from_cached_content(cached_content=cached_content)
+        else:
             model = GenerativeModel(model_name, system_instruction=system_instruction)
-            # Converter conversation_history (formato parts) para lista de Content simples
-            messages = []
-            for turn in conversation_history:
-                role = turn.get("role")
-                parts = turn.get("parts", [])
-                text_parts = []
-                for p in parts:
-                    if isinstance(p, dict) and 'text' in p:
-                        text_parts.append(p['text'])
-                combined = "\n".join(text_parts)
-                if combined:
-                    messages.append({"role": role, "content": combined})
-
-            # generate_content aceita lista de strings ou Content; simplificamos para lista concatenada
-            # Juntar sequência user/model alternada em um único prompt preservando ordem
-            prompt_segments = []
-            for m in messages:
-                prefix = "User:" if m["role"] == "user" else "Model:"
-                prompt_segments.append(f"{prefix} {m['content']}")
-            final_prompt = "\n".join(prompt_segments)
-
-            response = await asyncio.to_thread(
-                model.generate_content,
-                [final_prompt],
-                generation_config={
-                    "temperature": temperature,
-                    "max_output_tokens": max_output_tokens,
-                    "top_p": 0.95,
-                    "top_k": 40,
-                }
-            )
-            text = getattr(response, 'text', None)
-            if debug_mode and text:
-                logger.debug(f"Vertex Gemini response (first 500 chars): {text[:500]}")
-            # Métrica adicional de sucesso lógico (texto retornado)
-            record_latency("vertex.gemini.sdk.result", 0.0, bool(text))
-            return text
-        except Exception as e:
-            logger.error(f"Vertex AI SDK call failed (fallback to REST not possible without api_key): {e}", exc_info=True)
-            return None
+        contents = history_to_vertex_contents(conversation_history)
 
-    # REST path (api_key provided)
-    api_endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent"
+        generation_config = {
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "top_p": 0.95,
+            "top_k": 40,
+        }
+        if response_mime_type:
+            generation_config["response_mime_type"] = response_mime_type
+        async with _sdk_semaphore():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RetryableLLMError(f"timeout after {timeout:.1f}s waiting for an SDK slot")
+            response = await asyncio.to_thread(_generate_content_blocking, model, contents, generation_config, remaining)
+        text = getattr(response, 'text', None)
+        if debug_mode and text:
+            logger.debug(f"Vertex Gemini response (first 500 chars): {text[:500]}")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Vertex Gemini usage: prompt=%s cached=%s output=%s tokens.", usage.prompt_token_count,
+                         getattr(usage, "cached_content_token_count", None), usage.candidates_token_count)
+        # Métrica adicional de sucesso lógico (texto retornado)
+        record_latency("vertex.gemini.sdk.result", 0.0, bool(text))
+        return text
+    except RetryableLLMError:
+        raise
+    except google_api_exceptions.GoogleAPICallError as e:
+        if e.code in GEMINI_RETRYABLE_STATUS_CODES:
+            raise RetryableLLMError(str(e), status_code=e.code)
+        logger.error(f"Vertex AI SDK call failed (fallback to REST not possible without api_key): {e}", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"Vertex AI SDK call failed (fallback to REST not possible without api_key): {e}", exc_info=True)
+        return None
+
+
+async def _call_gemini_rest(api_key, model_name, conversation_history, system_instruction, max_output_tokens,
+                            temperature, debug_mode, cached_content, response_mime_type, timeout) -> str | None:
+    api_endpoint = f"{GENERATIVE_LANGUAGE_BASE_URL}/models/{model_name}:generateContent"
     headers = {"Content-Type": "application/json"}
     payload = {
         "contents": conversation_history,
@@ -86,19 +271,19 @@ async def call_gemini_api(
             "topP": 0.95,
             "topK": 40
         },
-        "safetySettings": [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "HARM_BLOCK_THRESHOLD_UNSPECIFIED"},
-        ],
+        "safetySettings": _GEMINI_SAFETY_SETTINGS,
     }
-    if system_instruction:
+    if response_mime_type:
+        payload["generationConfig"]["responseMimeType"] = response_mime_type
+    if cached_content:
+        # A API rejeita systemInstruction junto com cachedContent: ele já está no cache.
+        payload["cachedContent"] = cached_content
+    elif system_instruction:
         payload["system_instruction"] = {"parts": [{"text": system_instruction}]}
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(api_endpoint, headers=headers, json=payload, params={"key": api_key})
+        async with _http_client(timeout) as client:
+            response = await client.post(api_endpoint, headers=headers, json=payload, params={"key": api_key}, timeout=timeout)
             response.raise_for_status()
             response_json = response.json()
             if debug_mode:
@@ -114,7 +299,7 @@ async def call_gemini_api(
                 else:
                     logger.warning(f"Gemini API response has candidates but no parts or text. Reason: {finish_reason}")
                 if generated_text:
-                    if finish_reason != 'STOP':
+                    if finish_reason != 'STOP' and not response_mime_type:
                         generated_text += "\n\n[⚠️ AVISO: A resposta pode estar incompleta, limite atingido.]"
                     record_latency("vertex.gemini.rest.result", 0.0, True)
                     return generated_text
@@ -129,9 +314,14 @@ async def call_gemini_api(
                 record_latency("vertex.gemini.rest.result", 0.0, False)
                 return None
     except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP Error calling Gemini API: {e.response.status_code} - {e.response.text}", exc_info=True)
         record_latency("vertex.gemini.rest.result", 0.0, False)
+        if e.response.status_code in GEMINI_RETRYABLE_STATUS_CODES:
+            raise RetryableLLMError(e.response.text[:300], status_code=e.response.status_code,
+                                    retry_after=_retry_after_seconds(e.response))
+        logger.error(f"HTTP Error calling Gemini API: {e.response.status_code} - {e.response.text}", exc_info=True)
         return None
+    except (httpx.TimeoutException, httpx.TransportError) as e:
+        raise RetryableLLMError(f"{type(e).__name__}: {e}")
     except json.JSONDecodeError as e:
         logger.error(f"JSON decode error da resposta Gemini: {e}", exc_info=True)
         return None
@@ -141,16 +331,166 @@ async def call_gemini_api(
 
 @measure_async("vertex.count_gemini_tokens")
 async def count_gemini_tokens(api_key: str, model_name: str, parts_to_count: list[dict], debug_mode: bool = False) -> int:
-    api_endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:countTokens"
+    api_endpoint = f"{GENERATIVE_LANGUAGE_BASE_URL}/models/{model_name}:countTokens"
     payload = {"contents": [{"role": "user", "parts": parts_to_count}]}
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(api_endpoint, json=payload, params={"key": api_key})
+        async with _http_client(30.0) as client:
+            response = await client.post(api_endpoint, json=payload, params={"key": api_key}, timeout=30.0)
             response.raise_for_status()
             response_json = response.json()
             if debug_mode: logger.debug(f"Gemini token count response: {response_json}")
             return response_json.get("totalTokens", 0)
     except Exception as e:
-        logger.warning(f"Falha ao contar tokens via API: {e}. Usando contagem de caracteres como fallback (aproximado).", exc_info=True)
-        total_chars = sum(len(p.get("text", "")) for p in parts_to_count if "text" in p)
-        return int(total_chars / 4)
\ No newline at end of file
+        logger.warning(f"Falha ao contar tokens via API: {e}. Usando a estimativa local (token_estimator) como fallback.", exc_info=True)
+        return sum(estimate_text_tokens(p["text"]) if "text" in p else IMAGE_PART_TOKENS for p in parts_to_count)
+
+
+@dataclass
+class _ContextCacheEntry:
+    name: str
+    content_hash: str
+    expires_at: float
+
+
+class GeminiContextCacheManager:
+    """
+    Gerencia cachedContents do Gemini para o prefixo estável do system prompt de cada usuário.
+    A chave é (usuário, modelo, backend) e o conteúdo é identificado pelo hash do texto:
+    quando perfil/rotinas mudam, o hash muda, um novo cache é criado e o antigo é apagado,
+    então a invalidação é automática. Caches perto de expirar têm o TTL renovado.
+    Retorna None (e quem chama envia o system instruction completo) quando o prefixo está
+    abaixo do mínimo de tokens do modelo ou quando a API falha — neste caso com backoff.
+    """
+
+    def __init__(self, ttl_seconds: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+                 refresh_margin_seconds: int = GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+                 failure_backoff_seconds: int = GEMINI_CONTEXT_CACHE_FAILURE_BACKOFF_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.failure_backoff_seconds = failure_backoff_seconds
+        self._entries: dict[tuple, _ContextCacheEntry] = {}
+        self._failures: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(model_name: str, system_instruction: str) -> str:
+        return hashlib.sha256(f"{model_name}\n{system_instruction}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def min_tokens_for(model_name: str) -> int:
+        return GEMINI_CONTEXT_CACHE_MIN_TOKENS.get(model_name, GEMINI_CONTEXT_CACHE_DEFAULT_MIN_TOKENS)
+
+    async def get_or_create(self, user_id: str, model_name: str, system_instruction: str,
+                            api_key: str | None = None, project_id: str | None = None,
+                            region: str | None = None) -> str | None:
+        if not system_instruction or estimate_tokens(system_instruction) < self.min_tokens_for(model_name):
+            return None
+        backend = "rest" if api_key else "vertex"
+        if backend == "vertex" and _vertex_caching() is None:
+            return None
+
+        key = (user_id, model_name, backend)
+        content_hash = self.content_hash(model_name, system_instruction)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._failures.get(key, 0) > now:
+                return None
+
+        if entry and entry.content_hash == content_hash:
+            if entry.expires_at - now > self.refresh_margin_seconds:
+                record_latency("vertex.context_cache.hit", 0.0, True)
+                return entry.name
+            if await self._extend_ttl(entry, backend, api_key):
+                return entry.name
+
+        start = time.perf_counter()
+        name = await self._create(user_id, model_name, system_instruction, backend, api_key, project_id, region)
+        record_latency("vertex.context_cache.create", (time.perf_counter() - start) * 1000, bool(name))
+        with self._lock:
+            if not name:
+                self._failures[key] = now + self.failure_backoff_seconds
+                return None
+            self._failures.pop(key, None)
+            self._entries[key] = _ContextCacheEntry(name, content_hash, now + self.ttl_seconds)
+        if entry and entry.name != name:
+            await self._delete(entry.name, backend, api_key)
+        logger.info("VERTEX_CONTEXT_CACHE | Created cache %s for user '%s' (model %s, hash %s).", name, user_id, model_name, content_hash[:12])
+        return name
+
+    async def invalidate_user(self, user_id: str, api_key: str | None = None):
+        """Remove (local e remotamente, best-effort) os caches do usuário."""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == user_id]
+            entries = [(k[2], self._entries.pop(k)) for k in keys]
+        for backend, entry in entries:
+            await self._delete(entry.name, backend, api_key)
+
+    async def _create(self, user_id, model_name, system_instruction, backend, api_key, project_id, region) -> str | None:
+        display_name = f"eixa-{hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:12]}"
+        try:
+            if backend == "rest":
+                payload = {
+                    "model": f"models/{model_name}",
+                    "displayName": display_name,
+                    "systemInstruction": {"parts": [{"text": system_instruction}]},
+                    "ttl": f"{self.ttl_seconds}s",
+                }
+                async with _http_client(30.0) as client:
+                    response = await client.post(f"{GENERATIVE_LANGUAGE_BASE_URL}/cachedContents", json=payload, params={"key": api_key}, timeout=30.0)
+                    response.raise_for_status()
+                    return response.json().get("name")
+
+            def _create_sync():
+                import vertexai
+                vertex_caching = _vertex_caching()
+                if project_id and region:
+                    vertexai.init(project=project_id, location=region)
+                cached = vertex_caching.CachedContent.create(
+                    model_name=model_name,
+                    system_instruction=system_instruction,
+                    display_name=display_name,
+                    ttl=timedelta(seconds=self.ttl_seconds),
+                )
+                return cached.name
+            return await asyncio.to_thread(_create_sync)
+        except httpx.HTTPStatusError as e:
+            logger.warning("VERTEX_CONTEXT_CACHE | Cache creation rejected for user '%s': %s - %s", user_id, e.response.status_code, e.response.text[:300])
+        except Exception as e:
+            logger.warning("VERTEX_CONTEXT_CACHE | Cache creation failed for user '%s': %s", user_id, e, exc_info=True)
+        return None
+
+    async def _extend_ttl(self, entry: _ContextCacheEntry, backend: str, api_key: str | None) -> bool:
+        try:
+            if backend == "rest":
+                async with _http_client(15.0) as client:
+                    response = await client.patch(f"{GENERATIVE_LANGUAGE_BASE_URL}/{entry.name}", json={"ttl": f"{self.ttl_seconds}s"},
+                                                  params={"key": api_key, "updateMask": "ttl"}, timeout=15.0)
+                    response.raise_for_status()
+            else:
+                def _update_sync():
+                    _vertex_caching().CachedContent(cached_content_name=entry.name).update(ttl=timedelta(seconds=self.ttl_seconds))
+                await asyncio.to_thread(_update_sync)
+            entry.expires_at = time.time() + self.ttl_seconds
+            return True
+        except Exception as e:
+            logger.info("VERTEX_CONTEXT_CACHE | Could not extend TTL of %s (%s); recreating.", entry.name, e)
+            return False
+
+    async def _delete(self, name: str, backend: str, api_key: str | None):
+        try:
+            if backend == "rest":
+                if not api_key:
+                    return
+                async with _http_client(15.0) as client:
+                    response = await client.delete(f"{GENERATIVE_LANGUAGE_BASE_URL}/{name}", params={"key": api_key}, timeout=15.0)
+                    if response.status_code not in (200, 404):
+                        response.raise_for_status()
+            elif _vertex_caching() is not None:
+                await asyncio.to_thread(lambda: _vertex_caching().CachedContent(cached_content_name=name).delete())
+        except Exception as e:
+            # O TTL garante a remoção de qualquer forma.
+            logger.info("VERTEX_CONTEXT_CACHE | Could not delete cache %s: %s", name, e)
+
+
+context_cache_manager = GeminiContextCacheManager()
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+
+from google.cloud import firestore
+
+from collections_manager import get_view_versions_doc_ref
+from config import VIEW_ETAG_EPOCH
+
+logger = logging.getLogger(__name__)
+
+# Contadores de versão por usuário ({usuário}/meta/view_versions), um por view de leitura.
+# Toda escrita que muda uma view incrementa o contador DEPOIS de gravar os dados: um GET que
+# leia a versão antiga e os dados novos só devolve um ETag velho, que a próxima leitura troca.
+# GET /views/<view> responde 304 ao If-None-Match igual lendo apenas este documento.
+
+VIEWS = ("agenda", "projects", "routines")
+
+
+async def bump_view_versions(user_id: str, *views: str):
+    """Incrementa (firestore.Increment) os contadores das views alteradas por uma escrita."""
+    doc_ref = get_view_versions_doc_ref(user_id)
+    try:
+        await asyncio.to_thread(doc_ref.set, {view: firestore.Increment(1) for view in views}, merge=True)
+    except Exception as e:
+        # A escrita dos dados já foi feita; sem o incremento, o cliente pode receber 304 até a próxima escrita.
+        logger.error(f"VIEW_VERSIONS | Failed to bump {views} for user '{user_id}': {e}", exc_info=True)
+
+
+async def get_view_versions(user_id: str) -> dict[str, int]:
+    doc = await asyncio.to_thread(get_view_versions_doc_ref(user_id).get)
+    data = (doc.to_dict() or {}) if doc.exists else {}
+    return {view: int(data.get(view, 0)) for view in VIEWS}
+
+
+def view_etag(view: str, version: int) -> str:
+    # Fraco: o mesmo conteúdo pode ser serializado com outra ordem de chaves ou defaults.
+    return f'W/"{view}.{VIEW_ETAG_EPOCH}.{version}"'